@@ -31,6 +31,7 @@ from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
 from chia.types.full_block import FullBlock
 from chia.util.ints import uint8, uint32, uint64, uint128
+from chia.util.lru_cache import LRUCache
 
 # to run this benchmark:
 # python -m benchmarks.coin_store
@@ -488,6 +489,51 @@ async def run_add_block_benchmark(version: int) -> None:
         print(f"{total_time:0.4f}s, get_random_not_compactified")
         all_test_time += total_time
 
+        # === dictionary compression ===
+        # the size of the compressed blocks and the time to decode them, with
+        # and without a trained zstd dictionary
+        async def blocks_size() -> int:
+            async with db_wrapper.reader_no_transaction() as conn:
+                async with conn.execute("SELECT SUM(LENGTH(block)) FROM full_blocks") as cursor:
+                    row = await cursor.fetchone()
+                    assert row is not None
+                    return int(row[0])
+
+        async def decode_time() -> float:
+            start = monotonic()
+            for h in header_hashes:
+                block_bs = await block_store.get_full_block_bytes(h)
+                assert block_bs is not None
+            return monotonic() - start
+
+        # don't let the block cache hide the decompression cost
+        block_store.block_cache = LRUCache(0)
+        plain_size = await blocks_size()
+        plain_time = await decode_time()
+
+        if verbose:
+            print("profiling train_compression_dictionary")
+        start = monotonic()
+        await block_store.train_compression_dictionary(2000)
+        stop = monotonic()
+        print(f"{stop - start:0.4f}s, train_compression_dictionary")
+        all_test_time += stop - start
+
+        if verbose:
+            print("profiling recompress_blocks")
+        start = monotonic()
+        async for _ in block_store.recompress_blocks(1000):
+            pass
+        stop = monotonic()
+        print(f"{stop - start:0.4f}s, recompress_blocks")
+        all_test_time += stop - start
+
+        dict_size = await blocks_size()
+        dict_time = await decode_time()
+        print(f"{plain_time:0.4f}s, get_full_block_bytes (no dictionary)")
+        print(f"{dict_time:0.4f}s, get_full_block_bytes (dictionary)")
+        print(f"blocks size: {plain_size/1000000:.3f} MB (no dictionary) {dict_size/1000000:.3f} MB (dictionary)")
+
         print(f"all tests completed in {all_test_time:0.4f}s")
 
         db_size = os.path.getsize(Path("block-store-benchmark.db"))
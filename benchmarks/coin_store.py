@@ -6,11 +6,12 @@ import random
 import sys
 from pathlib import Path
 from time import monotonic
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from benchmarks.utils import setup_db
 from chia._tests.util.benchmarks import rand_hash, rewards
 from chia.full_node.coin_store import CoinStore
+from chia.full_node.hint_store import HintStore
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.util.ints import uint32, uint64
@@ -47,9 +48,12 @@ async def run_new_block_benchmark(version: int) -> None:
 
     async with setup_db("coin-store-benchmark.db", version) as db_wrapper:
         coin_store = await CoinStore.create(db_wrapper)
+        hint_store = await HintStore.create(db_wrapper)
 
         all_unspent: List[bytes32] = []
         all_coins: List[bytes32] = []
+        # the puzzle hashes and hints a wallet would subscribe to
+        all_puzzle_hashes: List[bytes32] = []
 
         block_height = 1
         timestamp = 1631794488
@@ -59,6 +63,12 @@ async def run_new_block_benchmark(version: int) -> None:
             # add some new coins
             additions, hashes = make_coins(2000)
 
+            # every 10th coin is hinted
+            hints = [(c.name(), bytes(rand_hash())) for c in additions[::10]]
+            await hint_store.add_hints(hints)
+            all_puzzle_hashes += [c.puzzle_hash for c in additions[1::10]]
+            all_puzzle_hashes += [bytes32(hint) for _, hint in hints]
+
             # farm rewards
             farmer_coin, pool_coin = rewards(uint32(height))
             all_coins += hashes
@@ -298,6 +308,77 @@ async def run_new_block_benchmark(version: int) -> None:
             f"found {found_coins} coins in total"
         )
         all_test_time += total_time
+
+        if verbose:
+            print("profiling get_coin_states_by_ids ", end="")
+        total_time = 0
+        found_coins = 0
+        for i in range(NUM_ITERS // 10):
+            lookup = random.sample(all_coins, 10000)
+            start = monotonic()
+            states = await coin_store.get_coin_states_by_ids(True, lookup)
+            total_time += monotonic() - start
+            assert len(states) == 10000
+            found_coins += len(states)
+            if verbose:
+                print(".", end="")
+                sys.stdout.flush()
+
+        if verbose:
+            print("")
+        print(
+            f"{total_time:0.4f}s, GET COIN STATES BY IDS {NUM_ITERS // 10} "
+            f"lookups found {found_coins} coins in total"
+        )
+        all_test_time += total_time
+
+        if verbose:
+            print("profiling get_coin_states_by_puzzle_hashes ", end="")
+        total_time = 0
+        found_coins = 0
+        for i in range(NUM_ITERS // 10):
+            puzzle_hashes = set(random.sample(all_puzzle_hashes, 10000))
+            start = monotonic()
+            state_set = await coin_store.get_coin_states_by_puzzle_hashes(True, puzzle_hashes)
+            total_time += monotonic() - start
+            found_coins += len(state_set)
+            if verbose:
+                print(".", end="")
+                sys.stdout.flush()
+
+        if verbose:
+            print("")
+        print(
+            f"{total_time:0.4f}s, GET COIN STATES BY PUZZLE HASHES {NUM_ITERS // 10} "
+            f"lookups found {found_coins} coins in total"
+        )
+        all_test_time += total_time
+
+        if verbose:
+            print("profiling batch_coin_states_by_puzzle_hashes ", end="")
+        total_time = 0
+        found_coins = 0
+        for i in range(NUM_ITERS // 10):
+            lookup = random.sample(all_puzzle_hashes, CoinStore.MAX_PUZZLE_HASH_BATCH_SIZE)
+            start = monotonic()
+            next_height: Optional[uint32] = uint32(0)
+            while next_height is not None:
+                states, next_height = await coin_store.batch_coin_states_by_puzzle_hashes(
+                    lookup, min_height=next_height
+                )
+                found_coins += len(states)
+            total_time += monotonic() - start
+            if verbose:
+                print(".", end="")
+                sys.stdout.flush()
+
+        if verbose:
+            print("")
+        print(
+            f"{total_time:0.4f}s, BATCH COIN STATES BY PUZZLE HASHES {NUM_ITERS // 10} "
+            f"subscriptions found {found_coins} coins in total"
+        )
+        all_test_time += total_time
         print(f"all tests completed in {all_test_time:0.4f}s")
 
     db_size = os.path.getsize(Path("coin-store-benchmark.db"))
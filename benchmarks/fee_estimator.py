@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import hashlib
+import random
+from time import perf_counter
+from typing import Dict, List
+
+import click
+
+from chia.full_node.fee_estimate_store import FeeStore
+from chia.full_node.fee_estimation import MempoolItemInfo
+from chia.full_node.fee_tracker import EstimateResult, FeeTracker
+from chia.util.ints import uint32, uint64
+
+# the target times requested by the get_fee_estimate RPC by default
+TARGET_TIMES = [60, 120, 300, 600, 1200, 3600]
+
+
+def result_digest(results: List[EstimateResult]) -> str:
+    # the estimates are deterministic, so this can be compared across
+    # implementations (and commits) to make sure they agree
+    h = hashlib.sha256()
+    for r in results:
+        h.update(repr(r).encode())
+    return h.hexdigest()[:16]
+
+
+@click.command()
+@click.option("-b", "--blocks", default=1000, help="Number of blocks to simulate")
+@click.option("-t", "--txs-per-block", default=40, help="Number of transactions added to the mempool per block")
+@click.option("-e", "--estimates-per-block", default=10, help="Number of fee estimate requests per block")
+def main(blocks: int, txs_per_block: int, estimates_per_block: int) -> None:
+    random.seed(0x5EE0)
+    tracker = FeeTracker(FeeStore())
+
+    timings: Dict[str, float] = {"add_tx": 0.0, "remove_tx": 0.0, "process_block": 0.0, "estimate_fee": 0.0}
+    mempool: List[MempoolItemInfo] = []
+    results: List[EstimateResult] = []
+    for height in range(1, blocks + 1):
+        new_items = [
+            MempoolItemInfo(
+                random.randint(1_000_000, 50_000_000),
+                random.choice([0, random.randint(1, 10_000_000)]),
+                uint32(height - 1),
+            )
+            for _ in range(txs_per_block)
+        ]
+        start = perf_counter()
+        for item in new_items:
+            tracker.add_tx(item)
+        timings["add_tx"] += perf_counter() - start
+        mempool.extend(new_items)
+
+        # higher fee rates are more likely to be included in a block, a few
+        # items are evicted
+        mempool.sort(key=lambda i: i.fee_per_cost, reverse=True)
+        included = mempool[: random.randint(0, 2 * txs_per_block)]
+        mempool = mempool[len(included) :]
+        evicted = [mempool.pop() for _ in range(min(len(mempool), random.randint(0, 3)))]
+
+        start = perf_counter()
+        for item in evicted:
+            tracker.remove_tx(item)
+        timings["remove_tx"] += perf_counter() - start
+
+        start = perf_counter()
+        tracker.process_block(uint32(height), included)
+        timings["process_block"] += perf_counter() - start
+
+        start = perf_counter()
+        for i in range(estimates_per_block):
+            results.append(tracker.estimate_fee(uint64(TARGET_TIMES[i % len(TARGET_TIMES)])))
+        timings["estimate_fee"] += perf_counter() - start
+
+    for name, duration in timings.items():
+        print(f"{name:14s} {duration:8.3f}s")
+    print(f"{'total':14s} {sum(timings.values()):8.3f}s")
+    print(f"estimates digest: {result_digest(results)}")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable = no-value-for-parameter
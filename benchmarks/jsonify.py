@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import json
 import random
 from time import perf_counter
 
 from chia._tests.util.test_full_block_utils import get_full_blocks
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.util.ints import uint32, uint64
+from chia.util.json_util import EnhancedJSONEncoder, dict_to_json_str
 
 random.seed(123456789)
 
 
+def rand_bytes32() -> bytes32:
+    return bytes32(random.getrandbits(256).to_bytes(32, "big"))
+
+
 def main() -> None:
     total_time = 0.0
     counter = 0
@@ -20,6 +30,31 @@ def main() -> None:
 
     print(f"total time: {total_time:0.2f}s ({counter} iterations)")
 
+    # a response like the one of get_coin_records_by_puzzle_hashes
+    response = {
+        "coin_records": [
+            CoinRecord(
+                Coin(rand_bytes32(), rand_bytes32(), uint64(random.getrandbits(64))),
+                uint32(random.randint(0, 5000000)),
+                uint32(random.choice([0, random.randint(0, 5000000)])),
+                random.choice([True, False]),
+                uint64(random.getrandbits(64)),
+            )
+            for _ in range(10000)
+        ],
+        "success": True,
+    }
+    iterations = 20
+    start = perf_counter()
+    for _ in range(iterations):
+        reference = json.dumps(response, cls=EnhancedJSONEncoder, sort_keys=True)
+    print(f"json.dumps:       {perf_counter() - start:0.2f}s ({iterations} iterations)")
+    start = perf_counter()
+    for _ in range(iterations):
+        result = dict_to_json_str(response)
+    print(f"dict_to_json_str: {perf_counter() - start:0.2f}s ({iterations} iterations)")
+    assert result == reference
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import List
+
+import pytest
+
+from chia.consensus.augmented_chain import AugmentedBlockchain
+from chia.consensus.blockchain import AddBlockResult, Blockchain
+from chia.consensus.full_block_to_block_record import block_to_block_record
+from chia.consensus.multiprocess_validation import PreValidationResult
+from chia.types.full_block import FullBlock
+
+
+async def pre_validate(
+    blockchain: Blockchain, blocks: List[FullBlock], augmented_chain: AugmentedBlockchain
+) -> List[PreValidationResult]:
+    results = await blockchain.pre_validate_blocks_multiprocessing(
+        blocks, {}, validate_signatures=False, augmented_chain=augmented_chain
+    )
+    for block, result in zip(blocks, results):
+        assert result.error is None
+        assert result.required_iters is not None
+        block_record = block_to_block_record(blockchain.constants, augmented_chain, result.required_iters, block, None)
+        augmented_chain.add_extra_block(block, block_record)
+    return results
+
+
+@pytest.mark.anyio
+async def test_validate_on_top_of_extra_blocks(
+    empty_blockchain: Blockchain, default_400_blocks: List[FullBlock]
+) -> None:
+    blockchain = empty_blockchain
+    blocks = default_400_blocks
+
+    augmented_chain = AugmentedBlockchain(blockchain)
+    # each batch is validated on top of the previous ones, none of which have
+    # been added to the blockchain
+    batches = [blocks[0:100], blocks[100:250], blocks[250:400]]
+    all_results: List[List[PreValidationResult]] = []
+    for batch in batches:
+        all_results.append(await pre_validate(blockchain, batch, augmented_chain))
+
+    assert blockchain.get_peak() is None
+    for block in blocks:
+        assert augmented_chain.contains_block(block.header_hash)
+        assert augmented_chain.height_to_hash(block.height) == block.header_hash
+        assert not blockchain.contains_block(block.header_hash)
+        assert not await blockchain.contains_block_from_db(block.header_hash)
+
+    for batch, results in zip(batches, all_results):
+        for block, result in zip(batch, results):
+            add_result, err, _ = await blockchain.add_block(block, result, None)
+            assert err is None
+            assert add_result == AddBlockResult.NEW_PEAK
+            augmented_chain.remove_extra_block(block.header_hash)
+
+    peak = blockchain.get_peak()
+    assert peak is not None
+    assert peak.header_hash == blocks[-1].header_hash
+    # once the blocks are removed, lookups fall back to the blockchain
+    assert augmented_chain.height_to_hash(blocks[-1].height) == blocks[-1].header_hash
+    assert augmented_chain.block_record(blocks[-1].header_hash) == peak
+
+
+@pytest.mark.anyio
+async def test_remove_extra_block(empty_blockchain: Blockchain, default_400_blocks: List[FullBlock]) -> None:
+    blocks = default_400_blocks[:10]
+    augmented_chain = AugmentedBlockchain(empty_blockchain)
+    await pre_validate(empty_blockchain, blocks, augmented_chain)
+
+    block = blocks[-1]
+    assert augmented_chain.contains_height(block.height)
+    assert await augmented_chain.get_block_record_from_db(block.header_hash) is not None
+    assert block.header_hash in augmented_chain.full_blocks
+
+    augmented_chain.remove_extra_block(block.header_hash)
+    assert not augmented_chain.contains_block(block.header_hash)
+    assert not augmented_chain.contains_height(block.height)
+    assert augmented_chain.height_to_hash(block.height) is None
+    assert await augmented_chain.get_block_record_from_db(block.header_hash) is None
+    assert block.header_hash not in augmented_chain.full_blocks
@@ -87,7 +87,7 @@ async def test_farmer_responds_with_signed_values(farmer_one_harvester: FarmerOn
     assert incoming_queue.qsize() == 1
     request_signatures_message = await incoming_queue.get()
     assert ProtocolMessageTypes(request_signatures_message.type).name == "request_signatures"
-    await dummy_wsc.outgoing_queue.put(
+    await dummy_wsc.send_message(
         Message(
             uint8(ProtocolMessageTypes.respond_signatures.value),
             request_signatures_message.id,
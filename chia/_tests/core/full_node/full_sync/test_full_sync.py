@@ -164,6 +164,19 @@ class TestFullSync:
         await time_out_assert(300, node_height_exactly, True, full_node_2, num_blocks_initial - 1)
         await time_out_assert(180, node_height_exactly, True, full_node_3, num_blocks_initial - 1)
 
+        # every block that was pre-validated by the sync pipeline was also added
+        def sync_pipeline_done(full_node_api: FullNodeAPI) -> bool:
+            stats = full_node_api.full_node.sync_store.pipeline_stats
+            return (
+                not stats.active
+                and stats.apply.blocks > 0
+                and stats.apply.blocks == stats.pre_validate.blocks
+                and sum(peer.requests for peer in stats.fetch_peers.values()) == stats.fetch.batches
+            )
+
+        await time_out_assert(60, sync_pipeline_done, True, full_node_2)
+        await time_out_assert(60, sync_pipeline_done, True, full_node_3)
+
         def fn3_is_not_syncing():
             return not full_node_3.full_node.sync_store.get_sync_mode()
 
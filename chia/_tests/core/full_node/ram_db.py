@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import contextlib
 import random
+import tempfile
 from pathlib import Path
 from typing import AsyncIterator, Tuple
 
@@ -17,10 +18,14 @@ async def create_ram_blockchain(
     consensus_constants: ConsensusConstants,
 ) -> AsyncIterator[Tuple[DBWrapper2, Blockchain]]:
     uri = f"file:db_{random.randint(0, 99999999)}?mode=memory&cache=shared"
-    async with DBWrapper2.managed(database=uri, uri=True, reader_count=1, db_version=2) as db_wrapper:
+    async with contextlib.AsyncExitStack() as exit_stack:
+        db_wrapper = await exit_stack.enter_async_context(
+            DBWrapper2.managed(database=uri, uri=True, reader_count=1, db_version=2)
+        )
+        blockchain_dir = exit_stack.enter_context(tempfile.TemporaryDirectory())
         block_store = await BlockStore.create(db_wrapper)
         coin_store = await CoinStore.create(db_wrapper)
-        blockchain = await Blockchain.create(coin_store, block_store, consensus_constants, Path("."), 2)
+        blockchain = await Blockchain.create(coin_store, block_store, consensus_constants, Path(blockchain_dir), 2)
         try:
             yield db_wrapper, blockchain
         finally:
@@ -16,8 +16,10 @@ from clvm.casts import int_to_bytes
 from chia._tests.blockchain.blockchain_test_utils import _validate_and_add_block
 from chia._tests.util.db_connection import DBConnection, PathDBConnection
 from chia.consensus.blockchain import Blockchain
+from chia.consensus.constants import ConsensusConstants
 from chia.consensus.default_constants import DEFAULT_CONSTANTS
 from chia.consensus.full_block_to_block_record import header_block_to_sub_block_record
+from chia.full_node.block_compression import frame_dictionary_id
 from chia.full_node.block_store import BlockStore
 from chia.full_node.coin_store import CoinStore
 from chia.simulator.block_tools import BlockTools
@@ -27,7 +29,7 @@ from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.vdf import VDFProof
 from chia.types.full_block import FullBlock
 from chia.types.spend_bundle import SpendBundle
-from chia.util.db_wrapper import get_host_parameter_limit
+from chia.util.db_wrapper import DBWrapper2, get_host_parameter_limit
 from chia.util.full_block_utils import GeneratorBlockInfo
 from chia.util.ints import uint8, uint32, uint64
 
@@ -474,3 +476,54 @@ async def test_get_prev_hash(tmp_dir: Path, bt: BlockTools, db_version: int, use
 
         with pytest.raises(KeyError, match="missing block in chain"):
             await store.get_prev_hash(bytes32.from_bytes(b"yolo" * 8))
+
+
+@pytest.mark.limit_consensus_modes(reason="save time")
+@pytest.mark.anyio
+async def test_compression_dictionary(
+    tmp_dir: Path, blockchain_constants: ConsensusConstants, default_400_blocks: List[FullBlock]
+) -> None:
+    blocks = default_400_blocks[:100]
+
+    async def dictionary_ids(db_wrapper: DBWrapper2) -> List[int]:
+        async with db_wrapper.reader_no_transaction() as conn:
+            async with conn.execute("SELECT block FROM full_blocks ORDER BY height") as cursor:
+                return [frame_dictionary_id(row[0]) for row in await cursor.fetchall()]
+
+    async with DBConnection(2) as db_wrapper:
+        coin_store = await CoinStore.create(db_wrapper)
+        store = await BlockStore.create(db_wrapper, use_cache=False)
+        bc = await Blockchain.create(coin_store, store, blockchain_constants, tmp_dir, 2)
+        # this store doesn't know about the dictionary, it has to pick it up
+        # from the database
+        other_store = await BlockStore.create(db_wrapper, use_cache=False)
+
+        for block in blocks[:50]:
+            await _validate_and_add_block(bc, block)
+        assert store.compressor.current_dictionary_id == 0
+
+        assert await store.train_compression_dictionary(50) == 1
+        for block in blocks[50:]:
+            await _validate_and_add_block(bc, block)
+        assert await dictionary_ids(db_wrapper) == [0] * 50 + [1] * 50
+
+        progress = [p async for p in store.recompress_blocks(batch_size=30)]
+        assert len(progress) == 4
+        assert progress[-1].blocks_scanned == 100
+        assert progress[-1].blocks_recompressed == 50
+        assert progress[-1].bytes_after < progress[-1].bytes_before
+        assert await dictionary_ids(db_wrapper) == [1] * 100
+
+        for block in blocks:
+            assert await other_store.get_full_block_bytes(block.header_hash) == bytes(block)
+            assert await store.get_full_block(block.header_hash) == block
+        assert await other_store.get_block_bytes_in_range(0, 99) == [bytes(b) for b in blocks]
+
+        # a new dictionary replaces the old one for new and recompressed
+        # blocks. Resuming after the last block doesn't recompress anything
+        assert await store.train_compression_dictionary(50) == 2
+        assert [p async for p in store.recompress_blocks(100, progress[-1].last_rowid)] == []
+        progress = [p async for p in store.recompress_blocks(batch_size=100)]
+        assert progress[-1].blocks_recompressed == 100
+        assert await dictionary_ids(db_wrapper) == [2] * 100
+        assert await other_store.get_block_bytes_in_range(0, 99) == [bytes(b) for b in blocks]
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
 from dataclasses import dataclass
 from pathlib import Path
@@ -9,13 +11,13 @@ import pytest
 from clvm.casts import int_to_bytes
 
 from chia._tests.blockchain.blockchain_test_utils import _validate_and_add_block
-from chia._tests.util.db_connection import DBConnection
+from chia._tests.util.db_connection import DBConnection, PathDBConnection
 from chia._tests.util.misc import Marks, datacases
 from chia.consensus.block_rewards import calculate_base_farmer_reward, calculate_pool_reward
 from chia.consensus.blockchain import AddBlockResult, Blockchain
 from chia.consensus.coinbase import create_farmer_coin, create_pool_coin
 from chia.full_node.block_store import BlockStore
-from chia.full_node.coin_store import CoinStore
+from chia.full_node.coin_store import BULK_QUERY_THRESHOLD, CoinStore
 from chia.full_node.hint_store import HintStore
 from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions
 from chia.protocols.wallet_protocol import CoinState
@@ -732,6 +734,46 @@ async def test_duplicate_by_hint(db_version: int) -> None:
         assert height is None
 
 
+@pytest.mark.anyio
+@pytest.mark.parametrize("in_transaction", [True, False])
+async def test_coin_states_bulk_query(random_coin_records: RandomCoinRecords, in_transaction: bool) -> None:
+    async with DBConnection(2) as db_wrapper:
+        coin_store = await CoinStore.create(db_wrapper)
+        await coin_store._add_coin_records(random_coin_records.items)
+
+        # these are a lot more keys than can be passed as query parameters
+        records = random_coin_records.items
+        puzzle_hashes = {cr.coin.puzzle_hash for cr in records}
+        coin_ids = [cr.name for cr in records]
+
+        def coin_state(cr: CoinRecord) -> CoinState:
+            # unlike CoinRecord.coin_state, the store reports a created height of 0
+            return CoinState(cr.coin, cr.spent_block_index or None, cr.confirmed_block_index)
+
+        expected = {coin_state(cr) for cr in records}
+        assert len(puzzle_hashes) > BULK_QUERY_THRESHOLD
+
+        async with contextlib.AsyncExitStack() as stack:
+            if in_transaction:
+                await stack.enter_async_context(db_wrapper.reader())
+            for _ in range(2):
+                # the keys are cleaned up between queries
+                assert await coin_store.get_coin_states_by_puzzle_hashes(True, puzzle_hashes) == expected
+                assert set(await coin_store.get_coin_states_by_ids(True, coin_ids)) == expected
+            assert await coin_store.get_coin_states_by_puzzle_hashes(False, puzzle_hashes) == {
+                cs for cs in expected if cs.spent_height is None
+            }
+            states = await coin_store.get_coin_states_by_ids(True, coin_ids, uint32(100), max_items=1000)
+            assert len(states) == 1000
+            assert all(cs in expected and max(cs.created_height or 0, cs.spent_height or 0) >= 100 for cs in states)
+
+            # a small set of keys is passed as query parameters
+            small = records[:BULK_QUERY_THRESHOLD]
+            assert set(await coin_store.get_coin_states_by_ids(True, [cr.name for cr in small])) == {
+                coin_state(cr) for cr in small
+            }
+
+
 @pytest.mark.anyio
 async def test_unsupported_version() -> None:
     with pytest.raises(RuntimeError, match="CoinStore does not support database schema v1"):
@@ -886,3 +928,146 @@ async def test_get_unspent_lineage_info_for_puzzle_hash(case: UnspentLineageInfo
             )
         else:
             assert result is None
+
+
+@dataclass(frozen=True)
+class CoinChanges:
+    height: uint32
+    rewards: List[Coin]
+    additions: List[Coin]
+    removals: List[bytes32]
+
+
+def make_coin_changes(num_heights: int) -> List[CoinChanges]:
+    changes: List[CoinChanges] = []
+    unspent: List[Coin] = []
+    for height in range(1, num_heights + 1):
+        prefix = height.to_bytes(4, byteorder="big")
+        rewards = [Coin(std_hash(b"r" + prefix + bytes([i])), std_hash(b"ph"), uint64(1750)) for i in range(2)]
+        additions = [Coin(std_hash(b"a" + prefix + bytes([i])), std_hash(b"ph"), uint64(height)) for i in range(3)]
+        # spend the oldest coins, as well as one that was created in this block
+        removals = [c.name() for c in unspent[:2]] + [additions[0].name()]
+        unspent = unspent[2:] + rewards + additions[1:]
+        changes.append(CoinChanges(uint32(height), rewards, additions, removals))
+    return changes
+
+
+async def apply_coin_changes(coin_store: CoinStore, changes: List[CoinChanges]) -> None:
+    for change in changes:
+        await coin_store.new_block(
+            change.height, uint64(1000 + change.height), change.rewards, change.additions, change.removals
+        )
+
+
+async def all_coin_records(coin_store: CoinStore) -> Set[CoinRecord]:
+    return set(await coin_store.get_all_coins(include_spent_coins=True))
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("cache_size", [1, 10, 10000])
+async def test_unspent_cache_write_back(cache_size: int) -> None:
+    changes = make_coin_changes(30)
+    async with DBConnection(2) as ref_wrapper, DBConnection(2) as db_wrapper:
+        ref_store = await CoinStore.create(ref_wrapper)
+        await apply_coin_changes(ref_store, changes[:20])
+
+        coin_store = await CoinStore.create(db_wrapper, unspent_cache_size=cache_size)
+        async with coin_store.write_back():
+            await apply_coin_changes(coin_store, changes[:20])
+            # lookups by coin ID are served from the pending state
+            for change in changes[:20]:
+                for coin in change.additions:
+                    assert await coin_store.get_coin_record(coin.name()) == await ref_store.get_coin_record(coin.name())
+                names = [coin.name() for coin in change.rewards + change.additions]
+                assert set(await coin_store.get_coin_records(names)) == set(await ref_store.get_coin_records(names))
+        async with coin_store.write_back():
+            await apply_coin_changes(coin_store, changes[20:])
+        await apply_coin_changes(ref_store, changes[20:])
+
+        assert coin_store.unspent_cache is not None
+        assert coin_store.unspent_cache.pending_count() == 0
+        assert await all_coin_records(coin_store) == await all_coin_records(ref_store)
+        assert await coin_store.num_unspent() == await ref_store.num_unspent()
+
+
+@pytest.mark.anyio
+async def test_unspent_cache_flush_for_query() -> None:
+    changes = make_coin_changes(10)
+    async with DBConnection(2) as db_wrapper:
+        coin_store = await CoinStore.create(db_wrapper, unspent_cache_size=10000)
+        async with coin_store.write_back():
+            await apply_coin_changes(coin_store, changes)
+            assert coin_store.unspent_cache is not None
+            assert coin_store.unspent_cache.pending_count() > 0
+            # queries the cache can't answer see the pending changes too
+            records = await coin_store.get_coins_added_at_height(uint32(5))
+            assert {r.coin for r in records} == set(changes[4].rewards + changes[4].additions)
+            assert coin_store.unspent_cache.pending_count() == 0
+
+
+@pytest.mark.anyio
+async def test_unspent_cache_not_visible_to_other_tasks() -> None:
+    changes = make_coin_changes(5)
+    async with PathDBConnection(2) as db_wrapper:
+        coin_store = await CoinStore.create(db_wrapper, unspent_cache_size=10000)
+        name = changes[0].rewards[0].name()
+        async with coin_store.write_back():
+            await apply_coin_changes(coin_store, changes)
+            assert await coin_store.get_coin_record(name) is not None
+            assert await asyncio.create_task(coin_store.get_coin_record(name)) is None
+        assert await asyncio.create_task(coin_store.get_coin_record(name)) is not None
+
+
+@pytest.mark.anyio
+async def test_unspent_cache_failed_transaction() -> None:
+    changes = make_coin_changes(20)
+    async with DBConnection(2) as ref_wrapper, DBConnection(2) as db_wrapper:
+        ref_store = await CoinStore.create(ref_wrapper)
+        await apply_coin_changes(ref_store, changes[:10])
+
+        coin_store = await CoinStore.create(db_wrapper, unspent_cache_size=5)
+        async with coin_store.write_back():
+            await apply_coin_changes(coin_store, changes[:10])
+            # a block failing to be added rolls back its changes, both in the
+            # DB and in the unspent cache
+            with pytest.raises(RuntimeError, match="failed block"):
+                with coin_store.unspent_cache_transaction():
+                    async with db_wrapper.writer():
+                        await apply_coin_changes(coin_store, changes[10:])
+                        raise RuntimeError("failed block")
+            for coin in changes[10].additions:
+                assert await coin_store.get_coin_record(coin.name()) is None
+            for name in changes[10].removals[:2]:
+                record = await coin_store.get_coin_record(name)
+                assert record is not None
+                assert not record.spent
+
+        assert await all_coin_records(coin_store) == await all_coin_records(ref_store)
+
+        # double spends are rejected
+        with pytest.raises(ValueError, match="Invalid operation to set spent"):
+            async with coin_store.write_back():
+                await apply_coin_changes(coin_store, changes[10:12])
+                await coin_store.new_block(uint32(12), uint64(0), changes[11].rewards, [], changes[11].removals[:1])
+        assert await all_coin_records(coin_store) == await all_coin_records(ref_store)
+
+
+@pytest.mark.anyio
+async def test_unspent_cache_rollback() -> None:
+    changes = make_coin_changes(30)
+    async with DBConnection(2) as ref_wrapper, DBConnection(2) as db_wrapper:
+        ref_store = await CoinStore.create(ref_wrapper)
+        await apply_coin_changes(ref_store, changes)
+        ref_changes = await ref_store.rollback_to_block(15)
+
+        coin_store = await CoinStore.create(db_wrapper, unspent_cache_size=10000)
+        async with coin_store.write_back():
+            await apply_coin_changes(coin_store, changes)
+            rolled_back = await coin_store.rollback_to_block(15)
+            assert set(rolled_back) == set(ref_changes)
+            # apply the same blocks again, on top of the fork point
+            await apply_coin_changes(coin_store, changes[15:])
+        await ref_store.rollback_to_block(15)
+        await apply_coin_changes(ref_store, changes[15:])
+
+        assert await all_coin_records(coin_store) == await all_coin_records(ref_store)
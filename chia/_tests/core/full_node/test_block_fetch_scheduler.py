@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, cast
+
+import pytest
+
+from chia.full_node.block_fetch_scheduler import BlockFetchScheduler
+from chia.server.ws_connection import WSChiaConnection
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.full_block import FullBlock
+
+
+@dataclass(frozen=True)
+class FakeBlock:
+    height: int
+
+
+@dataclass
+class FakePeer:
+    peer_node_id: bytes32
+    # seconds to respond to a request, per block
+    delay_per_block: float
+    fail: bool = False
+    closed: bool = False
+    requests: List[Tuple[int, int]] = field(default_factory=list)
+
+
+class FakeNetwork:
+    def __init__(self, peers: List[FakePeer]) -> None:
+        self.peers = peers
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # requests starting at these heights don't complete until the event is set
+        self.gates: Dict[int, asyncio.Event] = {}
+        # the number of requests waiting for a gate
+        self.blocked = 0
+
+    def get_peers(self) -> List[WSChiaConnection]:
+        return [cast(WSChiaConnection, peer) for peer in self.peers]
+
+    async def request_blocks(self, conn: WSChiaConnection, start: int, end: int) -> Optional[List[FullBlock]]:
+        peer = cast(FakePeer, conn)
+        peer.requests.append((start, end))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(peer.delay_per_block * (end - start + 1))
+            gate = self.gates.get(start)
+            if gate is not None:
+                self.blocked += 1
+                try:
+                    await gate.wait()
+                finally:
+                    self.blocked -= 1
+        finally:
+            self.in_flight -= 1
+        if peer.fail:
+            return None
+        return [cast(FullBlock, FakeBlock(height)) for height in range(start, end + 1)]
+
+
+async def fetch_all(scheduler: BlockFetchScheduler) -> List[Tuple[bytes32, List[int]]]:
+    ret: List[Tuple[bytes32, List[int]]] = []
+    async for peer, blocks in scheduler.batches():
+        ret.append((peer.peer_node_id, [b.height for b in blocks]))
+    return ret
+
+
+def make_scheduler(
+    network: FakeNetwork, start: int, end: int, *, target_request_time: float = 0.1
+) -> BlockFetchScheduler:
+    return BlockFetchScheduler(
+        start,
+        end,
+        network.get_peers,
+        network.request_blocks,
+        max_batch_size=32,
+        max_in_flight=8,
+        target_request_time=target_request_time,
+        poll_interval=0.01,
+    )
+
+
+@pytest.mark.anyio
+async def test_fetch_in_order_from_all_peers(seeded_random: random.Random) -> None:
+    peers = [FakePeer(bytes32.random(seeded_random), seeded_random.uniform(0.0001, 0.001)) for _ in range(5)]
+    network = FakeNetwork(peers)
+    scheduler = make_scheduler(network, 10, 1000)
+    batches = await fetch_all(scheduler)
+
+    heights = [h for _, batch in batches for h in batch]
+    assert heights == list(range(10, 1001))
+    assert all(len(batch) <= 32 for _, batch in batches)
+    # the work is spread across all peers, in parallel
+    assert all(len(peer.requests) > 0 for peer in peers)
+    assert network.max_in_flight > 1
+    assert network.in_flight == 0
+    for peer in peers:
+        stats = scheduler.peer_stats[peer.peer_node_id]
+        assert stats.requests == len(peer.requests)
+        assert stats.failures == 0
+        assert stats.latency is not None
+        assert stats.blocks_per_second is not None
+
+
+@pytest.mark.anyio
+async def test_batch_size_adapts(seeded_random: random.Random) -> None:
+    fast = FakePeer(bytes32.random(seeded_random), 0.0001)
+    slow = FakePeer(bytes32.random(seeded_random), 0.002)
+    network = FakeNetwork([fast, slow])
+    scheduler = make_scheduler(network, 0, 600, target_request_time=0.02)
+    batches = await fetch_all(scheduler)
+    assert [h for _, batch in batches for h in batch] == list(range(601))
+
+    # the slow peer can deliver about 10 blocks in the target time
+    assert scheduler.peer_stats[slow.peer_node_id].batch_size < 32
+    assert scheduler.peer_stats[fast.peer_node_id].batch_size == 32
+    assert len(fast.requests) > len(slow.requests)
+
+
+@pytest.mark.anyio
+async def test_failing_peer(seeded_random: random.Random) -> None:
+    good = FakePeer(bytes32.random(seeded_random), 0.0001)
+    bad = FakePeer(bytes32.random(seeded_random), 0.0001, fail=True)
+    network = FakeNetwork([bad, good])
+    scheduler = make_scheduler(network, 0, 200)
+    batches = await fetch_all(scheduler)
+
+    assert [h for _, batch in batches for h in batch] == list(range(201))
+    assert all(peer_id == good.peer_node_id for peer_id, _ in batches)
+    assert scheduler.peer_stats[bad.peer_node_id].failures > 0
+
+
+@pytest.mark.anyio
+async def test_all_peers_fail(seeded_random: random.Random) -> None:
+    peers = [FakePeer(bytes32.random(seeded_random), 0.0001, fail=True) for _ in range(3)]
+    network = FakeNetwork(peers)
+    batches = await fetch_all(make_scheduler(network, 0, 200))
+    assert batches == []
+    assert network.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_no_peers() -> None:
+    network = FakeNetwork([])
+    assert await fetch_all(make_scheduler(network, 0, 200)) == []
+
+
+@pytest.mark.anyio
+async def test_straggler_is_reissued(seeded_random: random.Random) -> None:
+    fast = FakePeer(bytes32.random(seeded_random), 0.0001)
+    # this peer would take 32 seconds to deliver its first batch
+    slow = FakePeer(bytes32.random(seeded_random), 1)
+    network = FakeNetwork([slow, fast])
+    scheduler = make_scheduler(network, 0, 300)
+    start = time.monotonic()
+    batches = await fetch_all(scheduler)
+
+    assert time.monotonic() - start < 10
+    assert [h for _, batch in batches for h in batch] == list(range(301))
+    # the range first requested from the slow peer was delivered by the fast one
+    assert slow.requests[0] in fast.requests
+    assert all(peer_id == fast.peer_node_id for peer_id, _ in batches)
+    assert scheduler.peer_stats[slow.peer_node_id].stragglers > 0
+    # the cancelled request is not left behind
+    await asyncio.sleep(0)
+    assert network.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_straggler_and_reissue_complete_together(seeded_random: random.Random) -> None:
+    first = FakePeer(bytes32.random(seeded_random), 0.0001)
+    second = FakePeer(bytes32.random(seeded_random), 0.0001)
+    network = FakeNetwork([first, second])
+    gate = asyncio.Event()
+    network.gates[0] = gate
+    scheduler = make_scheduler(network, 0, 300)
+
+    async def release() -> None:
+        # hold the first range until it's been re-issued, then let both
+        # requests for it complete at once
+        while network.blocked < 2:
+            await asyncio.sleep(0.001)
+        gate.set()
+
+    release_task = asyncio.create_task(release())
+    batches = await asyncio.wait_for(fetch_all(scheduler), timeout=10)
+    await release_task
+
+    assert [h for _, batch in batches for h in batch] == list(range(301))
+    assert first.requests[0] in second.requests
+    await asyncio.sleep(0)
+    assert network.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_peers_change(seeded_random: random.Random) -> None:
+    first = FakePeer(bytes32.random(seeded_random), 0.0001)
+    second = FakePeer(bytes32.random(seeded_random), 0.0001)
+    network = FakeNetwork([first])
+    scheduler = make_scheduler(network, 0, 500)
+
+    peers_seen: Dict[bytes32, int] = {}
+    async for peer, blocks in scheduler.batches():
+        peers_seen[peer.peer_node_id] = peers_seen.get(peer.peer_node_id, 0) + 1
+        if blocks[-1].height > 100:
+            first.closed = True
+            network.peers = [first, second]
+
+    assert set(peers_seen) == {first.peer_node_id, second.peer_node_id}
@@ -8,7 +8,7 @@ from typing import Optional
 import pytest
 
 from chia._tests.util.db_connection import DBConnection
-from chia.full_node.block_height_map import BlockHeightMap, SesCache
+from chia.full_node.block_height_map import GROWTH_HEIGHTS, BlockHeightMap, SesCache
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
 from chia.util.db_wrapper import DBWrapper2
@@ -301,6 +301,42 @@ class TestBlockHeightMap:
 
             assert height_map.get_hash(uint32(10)) == gen_block_hash(100)
 
+    @pytest.mark.anyio
+    async def test_update_in_place(self, tmp_dir: Path, db_version: int) -> None:
+        # the height-to-hash file is memory mapped, new hashes are written to
+        # it without flushing
+        async with DBConnection(db_version) as db_wrapper:
+            await setup_db(db_wrapper)
+            await setup_chain(db_wrapper, 10)
+
+            height_map = await BlockHeightMap.create(tmp_dir, db_wrapper)
+            assert os.path.getsize(tmp_dir / "height-to-hash") == 11 * 32
+
+            height_map.update_height(uint32(11), gen_block_hash(100), None)
+            height_map.update_height(uint32(12), gen_block_hash(101), None)
+            # the file grows by more than one height at a time
+            assert os.path.getsize(tmp_dir / "height-to-hash") == (11 + GROWTH_HEIGHTS) * 32
+            with open(tmp_dir / "height-to-hash", "rb") as f:
+                heights = f.read()
+            assert heights[11 * 32 : 12 * 32] == gen_block_hash(100)
+            assert heights[12 * 32 : 13 * 32] == gen_block_hash(101)
+
+            height_map.rollback(8)
+            assert not height_map.contains_height(uint32(9))
+            with pytest.raises(AssertionError) as _:
+                height_map.get_hash(uint32(9))
+            height_map.update_height(uint32(9), gen_block_hash(200), None)
+            assert height_map.get_hash(uint32(9)) == gen_block_hash(200)
+            assert not height_map.contains_height(uint32(10))
+            with open(tmp_dir / "height-to-hash", "rb") as f:
+                assert f.read()[9 * 32 : 10 * 32] == gen_block_hash(200)
+
+            height_map.close()
+            with pytest.raises(AssertionError):
+                height_map.get_hash(uint32(9))
+            # closing twice is fine
+            height_map.close()
+
     @pytest.mark.anyio
     async def test_update_ses(self, tmp_dir: Path, db_version: int) -> None:
         async with DBConnection(db_version) as db_wrapper:
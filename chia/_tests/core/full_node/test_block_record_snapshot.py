@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from chia._tests.blockchain.blockchain_test_utils import _validate_and_add_block
+from chia._tests.util.db_connection import DBConnection
+from chia.consensus.blockchain import AddBlockResult, Blockchain
+from chia.consensus.constants import ConsensusConstants
+from chia.full_node.block_record_snapshot import (
+    load_block_record_snapshot,
+    serialize_block_record_snapshot,
+    write_block_record_snapshot_sync,
+)
+from chia.full_node.block_store import BlockStore
+from chia.full_node.coin_store import CoinStore
+from chia.simulator.block_tools import BlockTools
+from chia.types.full_block import FullBlock
+from chia.util.db_wrapper import DBWrapper2
+
+
+async def create_blockchain(db_wrapper: DBWrapper2, constants: ConsensusConstants, blockchain_dir: Path) -> Blockchain:
+    coin_store = await CoinStore.create(db_wrapper)
+    block_store = await BlockStore.create(db_wrapper)
+    return await Blockchain.create(coin_store, block_store, constants, blockchain_dir, 2, single_threaded=True)
+
+
+def check_block_records(bc: Blockchain, blocks: List[FullBlock]) -> None:
+    peak = bc.get_peak()
+    assert peak is not None
+    assert peak.header_hash == blocks[-1].header_hash
+    for block in blocks:
+        assert bc.contains_block(block.header_hash)
+        assert bc.block_record(block.header_hash).height == block.height
+
+
+def snapshot_loaded(caplog: pytest.LogCaptureFixture) -> bool:
+    return any("from snapshot" in record.message for record in caplog.records)
+
+
+@pytest.mark.limit_consensus_modes(reason="save time")
+@pytest.mark.anyio
+async def test_restart_from_snapshot(
+    tmp_dir: Path,
+    blockchain_constants: ConsensusConstants,
+    default_400_blocks: List[FullBlock],
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    caplog.set_level(logging.INFO)
+    blocks = default_400_blocks[:250]
+    snapshot_path = tmp_dir / "block-records"
+    async with DBConnection(2) as db_wrapper:
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        for block in blocks[:200]:
+            await _validate_and_add_block(bc, block)
+        bc.shut_down()
+
+        snapshot = load_block_record_snapshot(snapshot_path)
+        assert snapshot is not None
+        assert snapshot.peak_hash == blocks[199].header_hash
+        assert snapshot.peak_height == 199
+        assert len(snapshot.block_records) == 200
+
+        caplog.clear()
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        assert snapshot_loaded(caplog)
+        check_block_records(bc, blocks[:200])
+
+        # these blocks are not in the snapshot, since the node is not shut
+        # down cleanly. They are loaded from the database
+        for block in blocks[200:]:
+            await _validate_and_add_block(bc, block)
+        caplog.clear()
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        assert snapshot_loaded(caplog)
+        check_block_records(bc, blocks)
+        bc.shut_down()
+
+
+@pytest.mark.limit_consensus_modes(reason="save time")
+@pytest.mark.anyio
+async def test_orphan_below_snapshot(
+    tmp_dir: Path,
+    bt: BlockTools,
+    blockchain_constants: ConsensusConstants,
+    default_400_blocks: List[FullBlock],
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    caplog.set_level(logging.INFO)
+    blocks = default_400_blocks[:200]
+    snapshot_path = tmp_dir / "block-records"
+    async with DBConnection(2) as db_wrapper:
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        for block in blocks:
+            await _validate_and_add_block(bc, block)
+        bc.shut_down()
+
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        orphan = bt.get_consecutive_blocks(1, blocks[:150], seed=b"orphan")[-1]
+        await _validate_and_add_block(bc, orphan, expected_result=AddBlockResult.ADDED_AS_ORPHAN)
+        # the snapshot doesn't have the orphan, and it isn't loaded from the
+        # database either, since it's below the snapshot's peak
+        assert not snapshot_path.exists()
+
+        # the node is not shut down cleanly
+        caplog.clear()
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        assert not snapshot_loaded(caplog)
+        check_block_records(bc, blocks)
+        assert bc.contains_block(orphan.header_hash)
+        bc.shut_down()
+
+
+@pytest.mark.limit_consensus_modes(reason="save time")
+@pytest.mark.anyio
+async def test_invalid_snapshot(
+    tmp_dir: Path,
+    blockchain_constants: ConsensusConstants,
+    default_400_blocks: List[FullBlock],
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    caplog.set_level(logging.INFO)
+    blocks = default_400_blocks[:100]
+    snapshot_path = tmp_dir / "block-records"
+    async with DBConnection(2) as db_wrapper:
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        for block in blocks:
+            await _validate_and_add_block(bc, block)
+        bc.shut_down()
+
+        snapshot = load_block_record_snapshot(snapshot_path)
+        assert snapshot is not None
+        data = snapshot_path.read_bytes()
+
+        # corrupt the last record
+        snapshot_path.write_bytes(data[:-1] + bytes([data[-1] ^ 1]))
+        assert load_block_record_snapshot(snapshot_path) is None
+        # truncated
+        snapshot_path.write_bytes(data[:-10])
+        assert load_block_record_snapshot(snapshot_path) is None
+        # unknown version
+        snapshot_path.write_bytes(data[:8] + b"\x00\x00\x00\x02" + data[12:])
+        assert load_block_record_snapshot(snapshot_path) is None
+        # a peak that's not in the blockchain
+        write_block_record_snapshot_sync(
+            snapshot_path,
+            serialize_block_record_snapshot(
+                default_400_blocks[200].header_hash, default_400_blocks[200].height, snapshot.block_records
+            ),
+        )
+        assert load_block_record_snapshot(snapshot_path) is not None
+
+        caplog.clear()
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        assert not snapshot_loaded(caplog)
+        check_block_records(bc, blocks)
+        bc.pool.shutdown(wait=True)
+
+        # missing
+        snapshot_path.unlink()
+        bc = await create_blockchain(db_wrapper, blockchain_constants, tmp_dir)
+        check_block_records(bc, blocks)
+        bc.shut_down()
+        assert load_block_record_snapshot(snapshot_path) is not None
@@ -20,13 +20,15 @@ from chia._tests.core.full_node.stores.test_coin_store import get_future_reward_
 from chia._tests.core.make_block_generator import make_spend_bundle
 from chia._tests.core.node_height import node_height_at_least
 from chia._tests.util.misc import wallet_height_at_least
-from chia._tests.util.setup_nodes import SimulatorsAndWalletsServices
+from chia._tests.util.setup_nodes import SimulatorsAndWalletsServices, setup_simulators_and_wallets
 from chia._tests.util.time_out_assert import time_out_assert, time_out_assert_custom_interval, time_out_messages
 from chia.consensus.block_body_validation import ForkInfo
+from chia.consensus.constants import ConsensusConstants
 from chia.consensus.pot_iterations import is_overflow_block
 from chia.full_node.bundle_tools import detect_potential_template_generator
 from chia.full_node.full_node import WalletUpdate
 from chia.full_node.full_node_api import FullNodeAPI
+from chia.full_node.mempool import MempoolRemoveReason
 from chia.full_node.signage_point import SignagePoint
 from chia.full_node.sync_store import Peak
 from chia.protocols import full_node_protocol
@@ -59,6 +61,7 @@ from chia.types.full_block import FullBlock
 from chia.types.mempool_inclusion_status import MempoolInclusionStatus
 from chia.types.peer_info import PeerInfo, TimestampedPeerInfo
 from chia.types.spend_bundle import SpendBundle, estimate_fees
+from chia.types.transaction_queue_entry import TransactionQueueEntry
 from chia.types.unfinished_block import UnfinishedBlock
 from chia.util.errors import ConsensusError, Err
 from chia.util.hash import std_hash
@@ -1209,6 +1212,21 @@ class TestFullNodeProtocol:
         assert fetched_blocks[-1].transactions_generator is not None
         assert std_hash(fetched_blocks[-1]) == std_hash(blocks_t[-1])
 
+        # the same request again is served from the cache
+        cache_stats = full_node_1.full_node.block_store.respond_blocks_cache.stats
+        hits = cache_stats.hits
+        res2 = await full_node_1.request_blocks(fnp.RequestBlocks(uint32(peak_height - 5), uint32(peak_height), True))
+        assert res2.data == res.data
+        assert cache_stats.hits == hits + 1
+
+        # after a rollback, the range is built again
+        await full_node_1.full_node.block_store.rollback(peak_height - 1)
+        assert cache_stats.entries == 1
+        await full_node_1.full_node.block_store.set_in_chain([(blocks_t[-1].header_hash,)])
+        res2 = await full_node_1.request_blocks(fnp.RequestBlocks(uint32(peak_height - 5), uint32(peak_height), True))
+        assert res2.data == res.data
+        assert cache_stats.hits == hits + 1
+
     @pytest.mark.anyio
     @pytest.mark.parametrize("peer_version", ["0.0.35", "0.0.36"])
     @pytest.mark.parametrize("requesting", [0, 1, 2])
@@ -1247,9 +1265,9 @@ class TestFullNodeProtocol:
         await full_node_1.full_node.add_block(blocks[-2])
         await full_node_1.full_node.add_unfinished_block(unf, None)
 
-        msg = peer.outgoing_queue.get_nowait()
+        msg = peer.outgoing_queue.get_nowait().message
         assert msg.type == ProtocolMessageTypes.new_peak.value
-        msg = peer.outgoing_queue.get_nowait()
+        msg = peer.outgoing_queue.get_nowait().message
         if peer_version == "0.0.35":
             assert msg.type == ProtocolMessageTypes.new_unfinished_block.value
             assert msg.data == bytes(fnp.NewUnfinishedBlock(unf.partial_hash))
@@ -2455,3 +2473,97 @@ async def test_long_reorg_nodes(
 
     print(f"reorg1 timing: {reorg1_timing:0.2f}s")
     print(f"reorg2 timing: {reorg2_timing:0.2f}s")
+
+
+@pytest.mark.anyio
+async def test_batched_transaction_validation(blockchain_constants: ConsensusConstants) -> None:
+    async with setup_simulators_and_wallets(
+        1,
+        0,
+        blockchain_constants,
+        config_overrides={
+            "full_node.tx_validation_batch_size": 4,
+            "full_node.tx_validation_batch_wait_ms": 100,
+            "full_node.shared_bls_cache_size": 1000,
+        },
+    ) as new:
+        full_node = new.simulators[0].peer_api.full_node
+        bt = new.bt
+        wallet_a = bt.get_pool_wallet_tool()
+        ph = wallet_a.get_new_puzzlehash()
+        blocks = bt.get_consecutive_blocks(
+            5, guarantee_transaction_block=True, farmer_reward_puzzle_hash=ph, pool_reward_puzzle_hash=ph
+        )
+        for block in blocks:
+            await full_node.add_block(block)
+
+        coins = [coin for block in blocks for coin in block.get_included_reward_coins() if coin.puzzle_hash == ph]
+        assert len(coins) >= 6
+        spend_bundles = [wallet_a.generate_signed_transaction(uint64(100), ph, coin) for coin in coins]
+        # one with an invalid signature
+        spend_bundles[-1] = SpendBundle(spend_bundles[-1].coin_spends, G2Element())
+
+        entries = [TransactionQueueEntry(sb, None, sb.name(), None, True) for sb in spend_bundles]
+        for entry in entries:
+            await full_node.transaction_queue.put(entry, peer_id=None)
+        results = [await entry.done.wait() for entry in entries]
+
+        assert results[:-1] == [(MempoolInclusionStatus.SUCCESS, None)] * (len(entries) - 1)
+        assert results[-1] == (MempoolInclusionStatus.FAILED, Err.BAD_AGGREGATE_SIGNATURE)
+        for sb in spend_bundles[:-1]:
+            assert full_node.mempool_manager.get_spendbundle(sb.name()) is not None
+        assert full_node.mempool_manager.get_spendbundle(spend_bundles[-1].name()) is None
+
+        # the validation workers added the pairings to the shared cache, and
+        # the block validation workers find them there
+        shared_cache = full_node.shared_pairing_cache
+        assert shared_cache is not None
+        assert shared_cache.stats().inserts >= len(spend_bundles) - 1
+        hits = shared_cache.stats().hits
+        block = bt.get_consecutive_blocks(
+            1,
+            block_list_input=blocks,
+            guarantee_transaction_block=True,
+            transaction_data=SpendBundle.aggregate(spend_bundles[:-1]),
+        )[-1]
+        [pre_validation_result] = await full_node.blockchain.pre_validate_blocks_multiprocessing(
+            [block], {}, validate_signatures=True
+        )
+        assert pre_validation_result.error is None
+        assert pre_validation_result.validated_signature
+        assert shared_cache.stats().hits > hits
+
+
+@pytest.mark.anyio
+async def test_persist_mempool(blockchain_constants: ConsensusConstants) -> None:
+    async with setup_simulators_and_wallets(
+        1, 0, blockchain_constants, config_overrides={"full_node.persist_mempool": True}
+    ) as new:
+        full_node = new.simulators[0].peer_api.full_node
+        bt = new.bt
+        wallet_a = bt.get_pool_wallet_tool()
+        ph = wallet_a.get_new_puzzlehash()
+        blocks = bt.get_consecutive_blocks(
+            3, guarantee_transaction_block=True, farmer_reward_puzzle_hash=ph, pool_reward_puzzle_hash=ph
+        )
+        for block in blocks:
+            await full_node.add_block(block)
+
+        coins = [coin for block in blocks for coin in block.get_included_reward_coins() if coin.puzzle_hash == ph]
+        spend_bundles = [wallet_a.generate_signed_transaction(uint64(100), ph, coin) for coin in coins[:2]]
+        for sb in spend_bundles:
+            assert await full_node.add_transaction(sb, sb.name()) == (MempoolInclusionStatus.SUCCESS, None)
+
+        await full_node._save_mempool_snapshot()
+        assert full_node.mempool_snapshot_path.exists()
+
+        # start over with an empty mempool
+        full_node.mempool_manager.mempool.remove_from_pool(
+            [sb.name() for sb in spend_bundles], MempoolRemoveReason.CONFLICT
+        )
+        assert full_node.mempool_manager.get_spendbundle(spend_bundles[0].name()) is None
+        await full_node._restore_mempool_snapshot()
+        for sb in spend_bundles:
+            assert full_node.mempool_manager.get_spendbundle(sb.name()) == sb
+        # the snapshot is only restored once
+        assert not full_node.mempool_snapshot_path.exists()
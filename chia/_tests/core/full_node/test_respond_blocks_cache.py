@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from chia.full_node.respond_blocks_cache import RespondBlocksCache
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+HASH_A = bytes32(b"a" * 32)
+HASH_B = bytes32(b"b" * 32)
+
+
+def test_get_put() -> None:
+    cache = RespondBlocksCache(1000)
+    assert cache.get((0, 10, False), HASH_A) is None
+    cache.put((0, 10, False), b"payload", HASH_A)
+    assert cache.get((0, 10, False), HASH_A) == b"payload"
+    # the transaction generators are part of the key
+    assert cache.get((0, 10, True), HASH_A) is None
+    assert cache.stats.to_json_dict() == {
+        "hits": 1,
+        "misses": 2,
+        "hit_rate": 1 / 3,
+        "evictions": 0,
+        "invalidations": 0,
+        "entries": 1,
+        "size": 7,
+    }
+
+
+def test_disabled() -> None:
+    cache = RespondBlocksCache(0)
+    cache.put((0, 10, False), b"payload", HASH_A)
+    assert cache.get((0, 10, False), HASH_A) is None
+    assert cache.stats.entries == 0
+
+
+def test_byte_budget() -> None:
+    cache = RespondBlocksCache(250)
+    cache.put((0, 10, False), b"0" * 100, HASH_A)
+    cache.put((11, 20, False), b"1" * 100, HASH_A)
+    # make (0, 10) the most recently used
+    assert cache.get((0, 10, False), HASH_A) is not None
+    cache.put((21, 30, False), b"2" * 100, HASH_A)
+    assert cache.stats.evictions == 1
+    assert cache.stats.size == 200
+    assert cache.get((11, 20, False), HASH_A) is None
+    assert cache.get((0, 10, False), HASH_A) is not None
+    assert cache.get((21, 30, False), HASH_A) is not None
+
+    # payloads larger than the cache are not stored
+    cache.put((31, 40, False), b"3" * 251, HASH_A)
+    assert cache.get((31, 40, False), HASH_A) is None
+    assert cache.stats.size == 200
+
+
+def test_reorg() -> None:
+    cache = RespondBlocksCache(1000)
+    cache.put((0, 10, False), b"0", HASH_A)
+    cache.put((11, 20, False), b"1", HASH_A)
+    cache.put((21, 30, True), b"2", HASH_A)
+    cache.rollback(20)
+    assert cache.stats.invalidations == 1
+    assert cache.get((11, 20, False), HASH_A) == b"1"
+    assert cache.get((21, 30, True), HASH_A) is None
+
+    # the block at the end of the range is not the one in the chain anymore
+    assert cache.get((0, 10, False), HASH_B) is None
+    assert cache.stats.invalidations == 2
+    assert cache.get((0, 10, False), HASH_A) is None
+
+
+def test_remove_height() -> None:
+    cache = RespondBlocksCache(1000)
+    cache.put((0, 10, False), b"0", HASH_A)
+    cache.put((10, 20, True), b"1", HASH_A)
+    cache.put((11, 20, False), b"2", HASH_A)
+    cache.remove_height(10)
+    assert cache.get((0, 10, False), HASH_A) is None
+    assert cache.get((10, 20, True), HASH_A) is None
+    assert cache.get((11, 20, False), HASH_A) == b"2"
+    assert cache.stats.size == 1
@@ -30,6 +30,7 @@ from chia.full_node.fee_estimation import EmptyMempoolInfo, MempoolInfo
 from chia.full_node.full_node_api import FullNodeAPI
 from chia.full_node.mempool import Mempool
 from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions, get_puzzle_and_solution_for_coin
+from chia.full_node.mempool_index import MEMPOOL_ENGINES
 from chia.full_node.mempool_manager import MEMPOOL_MIN_FEE_INCREASE
 from chia.full_node.pending_tx_cache import ConflictTxCache, PendingTxCache
 from chia.protocols import full_node_protocol, wallet_protocol
@@ -2697,6 +2698,7 @@ coins = make_test_coins()
 
 
 # This test makes sure we're properly sorting items by fee rate
+@pytest.mark.parametrize("engine", list(MEMPOOL_ENGINES))
 @pytest.mark.parametrize(
     "items,expected",
     [
@@ -2731,7 +2733,7 @@ coins = make_test_coins()
         ),
     ],
 )
-def test_items_by_feerate(items: List[MempoolItem], expected: List[Coin]) -> None:
+def test_items_by_feerate(items: List[MempoolItem], expected: List[Coin], engine: str) -> None:
     fee_estimator = create_bitcoin_fee_estimator(uint64(11000000000))
 
     mempool_info = MempoolInfo(
@@ -2739,7 +2741,7 @@ def test_items_by_feerate(items: List[MempoolItem], expected: List[Coin]) -> Non
         FeeRate(uint64(1000000)),
         CLVMCost(uint64(11000000000)),
     )
-    mempool = Mempool(mempool_info, fee_estimator)
+    mempool = Mempool(mempool_info, fee_estimator, engine)
     for i in items:
         mempool.add_to_pool(i)
 
@@ -2770,6 +2772,7 @@ def item_cost(cost: int, fee_rate: float) -> MempoolItem:
     return mk_item([coin], cost=cost, fee=int(cost * fee_rate))
 
 
+@pytest.mark.parametrize("engine", list(MEMPOOL_ENGINES))
 @pytest.mark.parametrize(
     "items,add,expected",
     [
@@ -2784,7 +2787,7 @@ def item_cost(cost: int, fee_rate: float) -> MempoolItem:
         ([75, 15, 9], 10, [10, 75, 15]),
     ],
 )
-def test_full_mempool(items: List[int], add: int, expected: List[int]) -> None:
+def test_full_mempool(items: List[int], add: int, expected: List[int], engine: str) -> None:
     fee_estimator = create_bitcoin_fee_estimator(uint64(11000000000))
 
     mempool_info = MempoolInfo(
@@ -2792,7 +2795,7 @@ def test_full_mempool(items: List[int], add: int, expected: List[int]) -> None:
         FeeRate(uint64(1000000)),
         CLVMCost(uint64(100)),
     )
-    mempool = Mempool(mempool_info, fee_estimator)
+    mempool = Mempool(mempool_info, fee_estimator, engine)
     invariant_check_mempool(mempool)
     fee_rate: float = 3.0
     for i in items:
@@ -2812,6 +2815,7 @@ def test_full_mempool(items: List[int], add: int, expected: List[int]) -> None:
         assert mi.cost == expected_cost
 
 
+@pytest.mark.parametrize("engine", list(MEMPOOL_ENGINES))
 @pytest.mark.parametrize("height", [True, False])
 @pytest.mark.parametrize(
     "items,expected,increase_fee",
@@ -2831,7 +2835,9 @@ def test_full_mempool(items: List[int], add: int, expected: List[int]) -> None:
         ([10, 11, 12, 13, 50], [10, 11, 12, 13], False),
     ],
 )
-def test_limit_expiring_transactions(height: bool, items: List[int], expected: List[int], increase_fee: bool) -> None:
+def test_limit_expiring_transactions(
+    height: bool, items: List[int], expected: List[int], increase_fee: bool, engine: str
+) -> None:
     fee_estimator = create_bitcoin_fee_estimator(uint64(11000000000))
 
     mempool_info = MempoolInfo(
@@ -2839,7 +2845,7 @@ def test_limit_expiring_transactions(height: bool, items: List[int], expected: L
         FeeRate(uint64(1000000)),
         CLVMCost(uint64(50)),
     )
-    mempool = Mempool(mempool_info, fee_estimator)
+    mempool = Mempool(mempool_info, fee_estimator, engine)
     mempool.new_tx_block(uint32(10), uint64(100000))
     invariant_check_mempool(mempool)
 
@@ -2887,6 +2893,7 @@ def test_limit_expiring_transactions(height: bool, items: List[int], expected: L
     invariant_check_mempool(mempool)
 
 
+@pytest.mark.parametrize("engine", list(MEMPOOL_ENGINES))
 @pytest.mark.parametrize(
     "items,coin_ids,expected",
     [
@@ -2910,14 +2917,16 @@ def test_limit_expiring_transactions(height: bool, items: List[int], expected: L
         ),
     ],
 )
-def test_get_items_by_coin_ids(items: List[MempoolItem], coin_ids: List[bytes32], expected: List[MempoolItem]) -> None:
+def test_get_items_by_coin_ids(
+    items: List[MempoolItem], coin_ids: List[bytes32], expected: List[MempoolItem], engine: str
+) -> None:
     fee_estimator = create_bitcoin_fee_estimator(uint64(11000000000))
     mempool_info = MempoolInfo(
         CLVMCost(uint64(11000000000 * 3)),
         FeeRate(uint64(1000000)),
         CLVMCost(uint64(11000000000)),
     )
-    mempool = Mempool(mempool_info, fee_estimator)
+    mempool = Mempool(mempool_info, fee_estimator, engine)
     for i in items:
         mempool.add_to_pool(i)
         invariant_check_mempool(mempool)
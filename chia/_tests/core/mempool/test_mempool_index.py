@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import random
+from typing import List, Optional
+
+import pytest
+
+from chia.full_node.mempool_index import (
+    MEMPOOL_ENGINES,
+    MempoolIndex,
+    MempoolIndexEntry,
+    NativeMempoolIndex,
+    SQLiteMempoolIndex,
+    create_mempool_index,
+)
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.ints import uint32, uint64
+
+
+def rand_entry(rng: random.Random) -> MempoolIndexEntry:
+    # pick costs and fees from a small set, to get plenty of items with the
+    # same fee per cost, exercising the tie-breaker
+    cost = rng.choice([1, 2, 5, 10, 100])
+    fee = rng.choice([0, 1, 10, 100, 1000])
+    assert_height: Optional[uint32] = None
+    assert_before_height: Optional[uint32] = None
+    assert_before_seconds: Optional[uint64] = None
+    if rng.random() < 0.2:
+        assert_height = uint32(rng.randint(0, 100))
+    if rng.random() < 0.3:
+        assert_before_height = uint32(rng.randint(0, 100))
+    if rng.random() < 0.3:
+        assert_before_seconds = uint64(rng.randint(0, 1000))
+    return MempoolIndexEntry(
+        bytes32.random(rng),
+        cost,
+        fee,
+        assert_height,
+        assert_before_height,
+        assert_before_seconds,
+        fee / cost,
+    )
+
+
+def check_parity(reference: MempoolIndex, index: MempoolIndex, coin_ids: List[bytes32], rng: random.Random) -> None:
+    assert index.size() == reference.size()
+    assert list(index.entries()) == list(reference.entries())
+    assert list(index.entries_by_feerate()) == list(reference.entries_by_feerate())
+    assert list(index.entries_by_feerate(ascending=True)) == list(reference.entries_by_feerate(ascending=True))
+
+    for entry in reference.entries():
+        assert index.get(entry.name) == entry
+    assert index.get(bytes32.random(rng)) is None
+
+    queried = rng.sample(coin_ids, min(len(coin_ids), 5))
+    assert set(index.entries_by_coin_ids(queried)) == set(reference.entries_by_coin_ids(queried))
+    for coin_id in queried:
+        assert set(index.entries_by_coin_ids([coin_id])) == set(reference.entries_by_coin_ids([coin_id]))
+
+    height = uint32(rng.randint(0, 100))
+    timestamp = uint64(rng.randint(0, 1000))
+    assert set(index.expired(height, timestamp)) == set(reference.expired(height, timestamp))
+    assert index.expiring_before(height, timestamp) == reference.expiring_before(height, timestamp)
+
+    total_cost = sum(entry.cost for entry in reference.entries())
+    for max_cost in [0, total_cost // 2, total_cost - 1, total_cost]:
+        assert set(index.exceeding_cost(max_cost)) == set(reference.exceeding_cost(max_cost))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_engine_parity(seed: int) -> None:
+    rng = random.Random(seed)
+    reference = SQLiteMempoolIndex()
+    index = NativeMempoolIndex()
+    coin_ids = [bytes32.random(rng) for _ in range(50)]
+    names: List[bytes32] = []
+
+    try:
+        for _ in range(30):
+            for _ in range(rng.randint(0, 20)):
+                entry = rand_entry(rng)
+                # items may spend the same coins, like conflicting transactions
+                # do (before one of them is evicted)
+                spent_coin_ids = rng.sample(coin_ids, rng.randint(0, 3))
+                reference.add(entry, spent_coin_ids)
+                index.add(entry, spent_coin_ids)
+                names.append(entry.name)
+
+            if len(names) > 0:
+                to_remove = rng.sample(names, rng.randint(0, min(len(names), 10)))
+                # removing items that aren't in the index is not an error
+                to_remove.append(bytes32.random(rng))
+                assert set(index.remove(to_remove)) == set(reference.remove(to_remove))
+                names = [name for name in names if name not in to_remove]
+
+            check_parity(reference, index, coin_ids, rng)
+    finally:
+        reference.close()
+        index.close()
+
+
+@pytest.mark.parametrize("engine", list(MEMPOOL_ENGINES))
+def test_remove_while_iterating(engine: str) -> None:
+    rng = random.Random(1337)
+    index = create_mempool_index(engine)
+    try:
+        for _ in range(10):
+            index.add(rand_entry(rng), [])
+        for entry in index.entries_by_feerate():
+            index.remove([entry.name])
+        assert index.size() == 0
+    finally:
+        index.close()
+
+
+def test_unknown_engine() -> None:
+    with pytest.raises(ValueError, match="unknown mempool engine"):
+        create_mempool_index("foobar")
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import dataclasses
 import logging
+from pathlib import Path
 from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Set, Tuple
 
 import pytest
@@ -14,7 +15,7 @@ from chia.consensus.constants import ConsensusConstants
 from chia.consensus.cost_calculator import NPCResult
 from chia.consensus.default_constants import DEFAULT_CONSTANTS
 from chia.full_node.bundle_tools import simple_solution_generator
-from chia.full_node.mempool import MAX_SKIPPED_ITEMS, PRIORITY_TX_THRESHOLD
+from chia.full_node.mempool import MAX_SKIPPED_ITEMS, PRIORITY_TX_THRESHOLD, Mempool, MempoolRemoveReason
 from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions, mempool_check_time_locks
 from chia.full_node.mempool_manager import (
     MEMPOOL_MIN_FEE_INCREASE,
@@ -25,6 +26,7 @@ from chia.full_node.mempool_manager import (
     optional_max,
     optional_min,
 )
+from chia.full_node.mempool_snapshot import load_mempool_snapshot, serialize_mempool_snapshot
 from chia.protocols import wallet_protocol
 from chia.protocols.protocol_message_types import ProtocolMessageTypes
 from chia.simulator.full_node_simulator import FullNodeSimulator
@@ -48,6 +50,7 @@ from chia.types.mempool_item import BundleCoinSpend, MempoolItem
 from chia.types.peer_info import PeerInfo
 from chia.types.spend_bundle import SpendBundle
 from chia.types.spend_bundle_conditions import Spend, SpendBundleConditions
+from chia.util.cached_bls import BLSCache
 from chia.util.errors import Err, ValidationError
 from chia.util.ints import uint8, uint32, uint64
 from chia.wallet.conditions import AssertCoinAnnouncement
@@ -538,6 +541,37 @@ async def test_minting_coin() -> None:
         await mempool_manager.pre_validate_spendbundle(sb, None, sb.name())
 
 
+@pytest.mark.anyio
+async def test_pre_validate_spendbundles() -> None:
+    mempool_manager = await instantiate_mempool_manager(zero_calls_get_coin_records)
+    sk = AugSchemeMPL.key_gen(b"8" * 32)
+    g1 = sk.get_g1()
+    sig = AugSchemeMPL.sign(sk, IDENTITY_PUZZLE_HASH, g1)
+    agg_sig_condition = [ConditionOpcode.AGG_SIG_UNSAFE, bytes(g1), IDENTITY_PUZZLE_HASH]
+    # these two share the pairing of their signature
+    sb1 = spend_bundle_from_conditions([agg_sig_condition], TEST_COIN, sig)
+    sb2 = spend_bundle_from_conditions([agg_sig_condition], TEST_COIN2, sig)
+    sb3 = spend_bundle_from_conditions([agg_sig_condition], TEST_COIN3)
+    sb4 = spend_bundle_from_conditions([[ConditionOpcode.CREATE_COIN, IDENTITY_PUZZLE_HASH, -1]])
+    sb5 = SpendBundle([], G2Element())
+    sb6 = spend_bundle_from_conditions([[ConditionOpcode.CREATE_COIN, IDENTITY_PUZZLE_HASH, 1]])
+    bundles = [sb1, sb2, sb3, sb4, sb5, sb6]
+
+    bls_cache = BLSCache(100)
+    results = await mempool_manager.pre_validate_spendbundles(
+        [(sb, None if i % 2 == 0 else bytes(sb), sb.name()) for i, sb in enumerate(bundles)], bls_cache
+    )
+    assert len(results) == len(bundles)
+    errors = [result.code if isinstance(result, ValidationError) else None for result in results]
+    assert errors == [None, None, Err.BAD_AGGREGATE_SIGNATURE, Err.COIN_AMOUNT_NEGATIVE, Err.INVALID_SPEND_BUNDLE, None]
+    # the results match validating the spend bundles one at a time
+    for sb, result in zip(bundles, results):
+        if isinstance(result, NPCResult):
+            assert result == await mempool_manager.pre_validate_spendbundle(sb, None, sb.name())
+    # only the pairing of the valid signature was added to the cache
+    assert len(bls_cache.items()) == 1
+
+
 @pytest.mark.anyio
 async def test_reserve_fee_condition() -> None:
     mempool_manager = await instantiate_mempool_manager(zero_calls_get_coin_records)
@@ -945,6 +979,51 @@ async def test_get_items_not_in_filter() -> None:
     assert result == [sb1]
 
 
+@pytest.mark.anyio
+async def test_get_filter() -> None:
+    mempool_manager = await instantiate_mempool_manager(get_coin_records_for_test_coins)
+    empty = mempool_manager.get_filter()
+    assert empty == bytes(PyBIP158([]).GetEncoded())
+    conditions = [[ConditionOpcode.CREATE_COIN, IDENTITY_PUZZLE_HASH, 1]]
+    _, sb1_name, _ = await generate_and_add_spendbundle(mempool_manager, conditions)
+    conditions2 = [[ConditionOpcode.CREATE_COIN, IDENTITY_PUZZLE_HASH, 2]]
+    _, sb2_name, _ = await generate_and_add_spendbundle(mempool_manager, conditions2, TEST_COIN2)
+
+    tx_filter = mempool_manager.get_filter()
+    assert tx_filter == bytes(PyBIP158([bytearray(sb1_name), bytearray(sb2_name)]).GetEncoded())
+    # the filter is only rebuilt when the mempool changes
+    assert mempool_manager.get_filter() is tx_filter
+
+    mempool_manager.mempool.remove_from_pool([sb1_name], MempoolRemoveReason.CONFLICT)
+    assert mempool_manager.get_filter() == bytes(PyBIP158([bytearray(sb2_name)]).GetEncoded())
+
+    # a replacement mempool starts over at generation 0. Once it's back at the
+    # generation of the cached filter, that filter must not be returned
+    old_pool = mempool_manager.mempool
+    mempool_manager.mempool = Mempool(old_pool.mempool_info, old_pool.fee_estimator, old_pool.engine)
+    names = []
+    for amount, coin in [(3, TEST_COIN), (4, TEST_COIN2), (5, TEST_COIN3)]:
+        _, name, _ = await generate_and_add_spendbundle(
+            mempool_manager, [[ConditionOpcode.CREATE_COIN, IDENTITY_PUZZLE_HASH, amount]], coin
+        )
+        names.append(name)
+    assert mempool_manager.mempool.generation == old_pool.generation
+    assert mempool_manager.get_filter() == bytes(PyBIP158([bytearray(name) for name in names]).GetEncoded())
+
+
+def test_seen_cache() -> None:
+    mempool_manager = MempoolManager(zero_calls_get_coin_records, DEFAULT_CONSTANTS)
+    mempool_manager.seen_cache_size = 3
+    names = [height_hash(i) for i in range(5)]
+    for name in names:
+        mempool_manager.add_and_maybe_pop_seen(name)
+    # the oldest ones are evicted first
+    assert [mempool_manager.seen(name) for name in names] == [False, False, True, True, True]
+    mempool_manager.remove_seen(names[3])
+    mempool_manager.remove_seen(names[0])
+    assert [mempool_manager.seen(name) for name in names] == [False, False, True, False, True]
+
+
 @pytest.mark.anyio
 async def test_total_mempool_fees() -> None:
     coin_records: Dict[bytes32, CoinRecord] = {}
@@ -1119,6 +1198,151 @@ async def test_create_bundle_from_mempool_on_max_cost(num_skipped_items: int, ca
         raise ValueError("num_skipped_items must be PRIORITY_TX_THRESHOLD or MAX_SKIPPED_ITEMS")  # pragma: no cover
 
 
+async def assert_block_candidate(mempool_manager: MempoolManager) -> Optional[Tuple[SpendBundle, List[Coin]]]:
+    """
+    Checks that the block candidate the mempool maintains is the same as
+    selecting the items from scratch
+    """
+
+    async def get_unspent_lineage_info_for_puzzle_hash(_: bytes32) -> Optional[UnspentLineageInfo]:
+        assert False  # pragma: no cover
+
+    assert mempool_manager.peak is not None
+    result = await mempool_manager.create_bundle_from_mempool(
+        mempool_manager.peak.header_hash, get_unspent_lineage_info_for_puzzle_hash
+    )
+    expected = await mempool_manager.mempool.create_bundle_from_mempool_items(
+        lambda _: True, get_unspent_lineage_info_for_puzzle_hash, mempool_manager.constants, mempool_manager.peak.height
+    )
+    assert result == expected
+    return result
+
+
+async def add_spendbundle_with_fee(mempool_manager: MempoolManager, coin: Coin, fee: int) -> SpendBundle:
+    conditions = [[ConditionOpcode.CREATE_COIN, IDENTITY_PUZZLE_HASH, coin.amount - fee]]
+    sb, _, result = await generate_and_add_spendbundle(mempool_manager, conditions, coin)
+    assert result[1] == MempoolInclusionStatus.SUCCESS
+    return sb
+
+
+@pytest.mark.anyio
+async def test_block_candidate_complete() -> None:
+    mempool_manager, coins = await setup_mempool_with_coins(coin_amounts=list(range(1_000_000, 1_000_005)))
+    assert await assert_block_candidate(mempool_manager) is None
+    candidate = mempool_manager.mempool._block_candidate
+    assert candidate is not None
+
+    # every item fits in the block, so they're all added to the candidate
+    bundles = [await add_spendbundle_with_fee(mempool_manager, coin, 1000 * (i + 1)) for i, coin in enumerate(coins)]
+    assert mempool_manager.mempool._block_candidate is candidate
+    assert candidate.complete
+    result = await assert_block_candidate(mempool_manager)
+    assert result is not None
+    # highest fee first
+    assert result[0] == SpendBundle.aggregate(list(reversed(bundles)))
+    assert candidate.fees == sum(1000 * (i + 1) for i in range(len(coins)))
+
+    mempool_manager.mempool.remove_from_pool([bundles[3].name()], MempoolRemoveReason.CONFLICT)
+    assert mempool_manager.mempool._block_candidate is candidate
+    assert await assert_block_candidate(mempool_manager) == (
+        SpendBundle.aggregate([bundles[4], bundles[2], bundles[1], bundles[0]]),
+        [a for i in (4, 2, 1, 0) for a in bundles[i].additions()],
+    )
+
+    # the candidate is kept when the peak changes
+    await mempool_manager.new_peak(create_test_block_record(height=uint32(TEST_HEIGHT + 1)), [coins[0].name()])
+    assert mempool_manager.mempool._block_candidate is candidate
+    assert await assert_block_candidate(mempool_manager) == (
+        SpendBundle.aggregate([bundles[4], bundles[2], bundles[1]]),
+        [a for i in (4, 2, 1) for a in bundles[i].additions()],
+    )
+
+
+@pytest.mark.anyio
+async def test_block_candidate_cutoff() -> None:
+    # blocks are filled up to 70% of the max cost, 12M, which is room for
+    # three items, after which the selection stops
+    mempool_manager, coins = await setup_mempool_with_coins(
+        coin_amounts=list(range(1_000_000_000, 1_000_000_007)),
+        max_block_clvm_cost=17_142_858,
+        max_tx_clvm_cost=uint64(12_000_000),
+    )
+    bundles = [await add_spendbundle_with_fee(mempool_manager, coins[i], 10_000_000 - i) for i in range(5)]
+    result = await assert_block_candidate(mempool_manager)
+    assert result is not None
+    assert result[0] == SpendBundle.aggregate(bundles[:3])
+    candidate = mempool_manager.mempool._block_candidate
+    assert candidate is not None
+    assert not candidate.complete
+    assert candidate.cutoff is not None
+
+    # changes below the cutoff don't affect the candidate
+    await add_spendbundle_with_fee(mempool_manager, coins[5], 1000)
+    mempool_manager.mempool.remove_from_pool([bundles[4].name()], MempoolRemoveReason.CONFLICT)
+    assert mempool_manager.mempool._block_candidate is candidate
+    assert await assert_block_candidate(mempool_manager) == result
+
+    # a new item above the cutoff is included, in place of the third one
+    high_fee = await add_spendbundle_with_fee(mempool_manager, coins[6], 20_000_000)
+    assert mempool_manager.mempool._block_candidate is None
+    result = await assert_block_candidate(mempool_manager)
+    assert result is not None
+    assert result[0] == SpendBundle.aggregate([high_fee, bundles[0], bundles[1]])
+
+    # removing an included item invalidates the candidate too
+    mempool_manager.mempool.remove_from_pool([bundles[0].name()], MempoolRemoveReason.CONFLICT)
+    assert mempool_manager.mempool._block_candidate is None
+    result = await assert_block_candidate(mempool_manager)
+    assert result is not None
+    assert result[0] == SpendBundle.aggregate([high_fee, bundles[1], bundles[2]])
+
+
+@pytest.mark.anyio
+async def test_mempool_snapshot(tmp_path: Path) -> None:
+    coins = [Coin(IDENTITY_PUZZLE_HASH, IDENTITY_PUZZLE_HASH, uint64(amount)) for amount in range(1_000_000, 1_000_003)]
+    coin_records = {coin.name(): CoinRecord(coin, uint32(0), uint32(0), False, uint64(0)) for coin in coins}
+
+    async def get_coin_records(coin_ids: Collection[bytes32]) -> List[CoinRecord]:
+        return [coin_records[coin_id] for coin_id in coin_ids if coin_id in coin_records]
+
+    mempool_manager = await instantiate_mempool_manager(get_coin_records)
+    bundles = [await add_spendbundle_with_fee(mempool_manager, coin, 1000 * (i + 1)) for i, coin in enumerate(coins)]
+    assert mempool_manager.peak is not None
+    snapshot_path = tmp_path / "mempool-snapshot"
+    snapshot_path.write_bytes(
+        serialize_mempool_snapshot(
+            mempool_manager.peak.header_hash, mempool_manager.peak.height, mempool_manager.snapshot_items()
+        )
+    )
+    snapshot = load_mempool_snapshot(snapshot_path)
+    assert snapshot is not None
+    assert snapshot.peak_hash == mempool_manager.peak.header_hash
+    assert sorted(item.spend_bundle.name() for item in snapshot.items) == sorted(sb.name() for sb in bundles)
+
+    # one of the coins was spent after the snapshot was taken
+    coin_records[coins[0].name()] = CoinRecord(coins[0], uint32(0), TEST_HEIGHT, False, uint64(0))
+    restored = await instantiate_mempool_manager(get_coin_records)
+    assert await restored.restore_snapshot(snapshot) == 2
+    assert restored.get_mempool_item(bundles[0].name()) is None
+    for sb in bundles[1:]:
+        item = restored.get_mempool_item(sb.name())
+        original = mempool_manager.get_mempool_item(sb.name())
+        assert item is not None and original is not None
+        assert item.fee == original.fee
+        assert item.npc_result == original.npc_result
+
+    data = snapshot_path.read_bytes()
+    # corrupt
+    snapshot_path.write_bytes(data[:-1] + bytes([data[-1] ^ 1]))
+    assert load_mempool_snapshot(snapshot_path) is None
+    # unknown version
+    snapshot_path.write_bytes(data[:8] + b"\x00\x00\x00\x02" + data[12:])
+    assert load_mempool_snapshot(snapshot_path) is None
+    # missing
+    snapshot_path.unlink()
+    assert load_mempool_snapshot(snapshot_path) is None
+
+
 @pytest.mark.parametrize(
     "opcode,arg,expect_eviction, expect_limit",
     [
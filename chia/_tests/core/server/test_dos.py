@@ -15,6 +15,7 @@ from chia.full_node.full_node_api import FullNodeAPI
 from chia.protocols import full_node_protocol
 from chia.protocols.protocol_message_types import ProtocolMessageTypes
 from chia.protocols.shared_protocol import Handshake
+from chia.server.message_compression import compress_message
 from chia.server.outbound_message import Message, make_msg
 from chia.server.rate_limits import RateLimiter
 from chia.server.server import ChiaServer
@@ -318,3 +319,38 @@ class TestDos:
             return "1.2.3.4" in server_2.banned_peers
 
         await time_out_assert(15, is_banned)
+
+    @pytest.mark.anyio
+    async def test_compressed_message_too_large(self, setup_two_nodes_fixture, self_hostname):
+        nodes, _, _ = setup_two_nodes_fixture
+        full_node_1, full_node_2 = nodes
+        server_1 = nodes[0].full_node.server
+        server_2 = nodes[1].full_node.server
+
+        await server_2.start_client(PeerInfo(self_hostname, server_1.get_port()), full_node_2.full_node.on_connect)
+
+        ws_con: WSChiaConnection = list(server_1.all_connections.values())[0]
+        ws_con_2: WSChiaConnection = list(server_2.all_connections.values())[0]
+
+        ws_con.peer_info = PeerInfo("1.2.3.4", ws_con.peer_info.port)
+        ws_con_2.peer_info = PeerInfo("1.2.3.4", ws_con_2.peer_info.port)
+
+        # a few KB on the wire, that decompress to far more than the size
+        # limit of the message type
+        new_message = make_msg(
+            ProtocolMessageTypes.request_mempool_transactions,
+            full_node_protocol.RequestMempoolTransactions(bytes([0] * 40 * 1024 * 1024)),
+        )
+        compressed = compress_message(new_message)
+        assert len(compressed.data) < 64 * 1024
+        await ws_con.ws.send_bytes(bytes(compressed))
+
+        def is_closed():
+            return ws_con.closed
+
+        await time_out_assert(15, is_closed)
+
+        def is_banned():
+            return "1.2.3.4" in server_2.banned_peers
+
+        await time_out_assert(15, is_banned)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Tuple
+
+import pytest
+import zstandard
+
+from chia._tests.connection_utils import connect_and_get_peer
+from chia._tests.util.time_out_assert import time_out_assert
+from chia.full_node.full_node_api import FullNodeAPI
+from chia.protocols import full_node_protocol
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.protocols.shared_protocol import Capability
+from chia.server.message_compression import compress_message, compressed_message_type, decompress_message
+from chia.server.outbound_message import Message, make_msg
+from chia.server.server import ChiaServer
+from chia.simulator.block_tools import BlockTools
+from chia.types.peer_info import PeerInfo
+from chia.util.ints import uint8, uint16, uint32
+
+
+def test_round_trip() -> None:
+    message = Message(uint8(ProtocolMessageTypes.respond_blocks.value), uint16(7), b"\x01\x02" * 10000)
+    compressed = compress_message(message)
+    assert compressed.type == ProtocolMessageTypes.compressed_message.value
+    assert compressed.id is None
+    assert len(compressed.data) < len(message.data)
+    assert decompress_message(compressed, 100_000) == message
+
+
+def test_compressed_message_type() -> None:
+    message = make_msg(ProtocolMessageTypes.request_mempool_transactions, b"\x00" * 10_000_000)
+    assert compressed_message_type(compress_message(message)) == ProtocolMessageTypes.request_mempool_transactions.value
+
+    with pytest.raises(ValueError, match="invalid compressed message"):
+        compressed_message_type(make_msg(ProtocolMessageTypes.compressed_message, b"garbage"))
+    empty = zstandard.ZstdCompressor().compress(b"")
+    with pytest.raises(ValueError, match="empty compressed message"):
+        compressed_message_type(make_msg(ProtocolMessageTypes.compressed_message, empty))
+
+
+def test_invalid() -> None:
+    message = make_msg(ProtocolMessageTypes.respond_blocks, b"\x00" * 10000)
+    # the claimed decompressed size is checked before decompressing
+    with pytest.raises(ValueError, match="invalid decompressed size"):
+        decompress_message(compress_message(message), 1000)
+
+    # frames without the decompressed size are not accepted
+    data = zstandard.ZstdCompressor(write_content_size=False).compress(bytes(message))
+    with pytest.raises(ValueError, match="invalid decompressed size"):
+        decompress_message(make_msg(ProtocolMessageTypes.compressed_message, data), 100_000)
+
+    with pytest.raises(ValueError, match="invalid compressed message"):
+        decompress_message(make_msg(ProtocolMessageTypes.compressed_message, b"garbage"), 100_000)
+
+    truncated = zstandard.ZstdCompressor().compress(bytes(message)[:-1])
+    with pytest.raises(ValueError, match="invalid compressed message"):
+        decompress_message(make_msg(ProtocolMessageTypes.compressed_message, truncated), 100_000)
+
+    nested = compress_message(compress_message(message))
+    with pytest.raises(ValueError, match="nested compressed message"):
+        decompress_message(nested, 100_000)
+
+
+@pytest.mark.anyio
+async def test_compressed_respond_blocks(
+    two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools], self_hostname: str
+) -> None:
+    full_node_1, _, server_1, server_2, bt = two_nodes
+    blocks = bt.get_consecutive_blocks(20)
+    for block in blocks:
+        await full_node_1.full_node.add_block(block)
+
+    peer = await connect_and_get_peer(server_2, server_1, self_hostname)
+    assert peer.compression_enabled()
+    assert peer.has_capability(Capability.MESSAGE_COMPRESSION)
+
+    response = await server_2.call_api_of_specific(
+        FullNodeAPI.request_blocks, full_node_protocol.RequestBlocks(uint32(0), uint32(19), False), server_1.node_id
+    )
+    assert isinstance(response, full_node_protocol.RespondBlocks)
+    assert response.blocks == blocks
+
+    # the metrics count the messages by their type, and their size on the wire
+    received = server_2.message_metrics.get(ProtocolMessageTypes.respond_blocks.value)
+    assert received.received == 1
+    assert 0 < received.received_bytes < len(bytes(response))
+    sent = server_1.message_metrics.get(ProtocolMessageTypes.respond_blocks.value)
+    assert sent.sent_bytes == received.received_bytes
+
+
+@pytest.mark.anyio
+async def test_compressible_stream_within_limits(
+    two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools], self_hostname: str
+) -> None:
+    _, _, server_1, server_2, bt = two_nodes
+    peer = await connect_and_get_peer(server_1, server_2, self_hostname)
+    remote = server_2.all_connections[server_1.node_id]
+    # the rate limits only apply to remote peers
+    peer.peer_info = PeerInfo("1.2.3.4", peer.peer_info.port)
+    remote.peer_info = PeerInfo("1.2.3.4", remote.peer_info.port)
+
+    # about 10 MiB of the same block over and over, which compresses very
+    # well. 30 of them are more than the inbound limit per minute
+    block = bt.get_consecutive_blocks(1)[0]
+    count = 10 * 1024 * 1024 // len(bytes(block)) + 1
+    message = make_msg(
+        ProtocolMessageTypes.respond_blocks, full_node_protocol.RespondBlocks(uint32(0), uint32(0), [block] * count)
+    )
+    assert len(compress_message(message).data) < len(message.data) // 10
+    for _ in range(30):
+        await peer.send_message(message)
+
+    def received() -> int:
+        return server_2.message_metrics.get(ProtocolMessageTypes.respond_blocks.value).received
+
+    def outbound_rate_limited() -> int:
+        return server_1.message_metrics.get(ProtocolMessageTypes.respond_blocks.value).outbound_rate_limited
+
+    # the sender holds back what exceeds its outbound limit, by the same
+    # (uncompressed) size the receiver counts, and it isn't disconnected
+    await time_out_assert(20, lambda: received() > 0 and outbound_rate_limited() > 0)
+    await asyncio.sleep(2)
+    assert server_2.message_metrics.get(ProtocolMessageTypes.respond_blocks.value).inbound_rate_limited == 0
+    assert not peer.closed
+    assert not remote.closed
+    assert "1.2.3.4" not in server_2.banned_peers
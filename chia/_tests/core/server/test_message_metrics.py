@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.message_metrics import LATENCY_BUCKETS, MessageMetrics, QueueDepths
+
+
+def test_counters() -> None:
+    metrics = MessageMetrics()
+    new_peak = ProtocolMessageTypes.new_peak.value
+    metrics.message_received(new_peak, 100)
+    metrics.message_received(new_peak, 50)
+    metrics.message_sent(new_peak, 10)
+    metrics.rate_limited(new_peak, inbound=True)
+    metrics.rate_limited(new_peak, inbound=False)
+    metrics.rate_limited(new_peak, inbound=False)
+    metrics.dropped(new_peak)
+
+    m = metrics.get(new_peak)
+    assert (m.received, m.received_bytes, m.sent, m.sent_bytes) == (2, 150, 1, 10)
+    assert (m.inbound_rate_limited, m.outbound_rate_limited, m.outbound_dropped) == (1, 2, 1)
+    # message types that haven't been seen are all zero
+    assert metrics.get(ProtocolMessageTypes.respond_block.value).received == 0
+
+    json_dict = metrics.to_json_dict()
+    assert list(json_dict.keys()) == ["new_peak"]
+    assert json_dict["new_peak"]["received_bytes"] == 150
+
+
+def test_handler_latency() -> None:
+    metrics = MessageMetrics()
+    request_block = ProtocolMessageTypes.request_block.value
+    for duration in (0.0005, LATENCY_BUCKETS[0], 0.002, 1000.0):
+        metrics.handler_done(request_block, duration)
+
+    m = metrics.get(request_block)
+    assert m.handler_calls == 4
+    assert m.handler_latency_buckets[0] == 2
+    assert m.handler_latency_buckets[1] == 1
+    assert m.handler_latency_buckets[-1] == 1
+    assert m.to_json_dict()["handler_latency_buckets"]["+Inf"] == 1
+
+
+def test_unknown_message_type() -> None:
+    metrics = MessageMetrics()
+    metrics.message_received(250, 1)
+    assert list(metrics.to_json_dict().keys()) == ["unknown_250"]
+
+
+def test_prometheus() -> None:
+    metrics = MessageMetrics()
+    request_block = ProtocolMessageTypes.request_block.value
+    metrics.message_received(request_block, 40)
+    metrics.handler_done(request_block, 0.02)
+    metrics.handler_done(request_block, 2.0)
+    queues = [QueueDepths("127.0.0.1", 8444, "ab" * 32, inbound=3, outbound=1, api_tasks=2)]
+    lines = metrics.to_prometheus("chia_full_node", queues).splitlines()
+
+    labels = 'service="chia_full_node",type="request_block"'
+    assert f"chia_messages_received_total{{{labels}}} 1" in lines
+    assert f"chia_message_bytes_received_total{{{labels}}} 40" in lines
+    assert f'chia_messages_rate_limited_total{{{labels},direction="inbound"}} 0' in lines
+    assert f"chia_messages_dropped_total{{{labels}}} 0" in lines
+    # the histogram buckets are cumulative
+    assert f'chia_message_handler_seconds_bucket{{{labels},le="0.01"}} 0' in lines
+    assert f'chia_message_handler_seconds_bucket{{{labels},le="0.05"}} 1' in lines
+    assert f'chia_message_handler_seconds_bucket{{{labels},le="1.0"}} 1' in lines
+    assert f'chia_message_handler_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f"chia_message_handler_seconds_count{{{labels}}} 2" in lines
+    peer_labels = f'service="chia_full_node",peer="127.0.0.1:8444",node_id="{"ab" * 32}"'
+    assert f'chia_peer_queue_depth{{{peer_labels},queue="inbound"}} 3' in lines
+    assert f'chia_peer_queue_depth{{{peer_labels},queue="api_tasks"}} 2' in lines
+    # every metric is declared exactly once
+    type_lines = [line for line in lines if line.startswith("# TYPE")]
+    assert len(type_lines) == len({line.split()[2] for line in type_lines}) == 8
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import time
+from typing import List, Tuple
+
+import pytest
+
+from chia._tests.connection_utils import connect_and_get_peer
+from chia._tests.util.time_out_assert import time_out_assert
+from chia.full_node.full_node_api import FullNodeAPI
+from chia.protocols import full_node_protocol
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server import ws_connection
+from chia.server.outbound_message import Message, NodeType, make_msg
+from chia.server.server import ChiaServer
+from chia.server.ws_connection import OutgoingMessage
+from chia.simulator.block_tools import BlockTools
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.ints import uint32, uint64
+
+
+def new_transaction(i: int) -> Message:
+    return make_msg(
+        ProtocolMessageTypes.new_transaction,
+        full_node_protocol.NewTransaction(bytes32(i.to_bytes(32, "big")), uint64(1), uint64(0)),
+    )
+
+
+def request_block(i: int) -> Message:
+    return make_msg(ProtocolMessageTypes.request_block, full_node_protocol.RequestBlock(uint32(i), False))
+
+
+@pytest.mark.anyio
+async def test_encoded_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: List[Message] = []
+
+    def compress(message: Message) -> Message:
+        calls.append(message)
+        return make_msg(ProtocolMessageTypes.compressed_message, b"\x00")
+
+    monkeypatch.setattr(ws_connection, "compress_message", compress)
+    item = OutgoingMessage(make_msg(ProtocolMessageTypes.respond_blocks, b"\x01" * 100))
+    assert item.encoded() is item.encoded()
+    assert item.encoded() == bytes(item.message)
+
+    first = await item.compressed()
+    assert first is not None
+    assert await item.compressed() is first
+    assert calls == [item.message]
+
+    # when compressing doesn't help, the message is sent as it is
+    monkeypatch.setattr(ws_connection, "compress_message", lambda message: message)
+    assert await OutgoingMessage(item.message).compressed() is None
+
+
+@pytest.mark.anyio
+async def test_broadcast_shares_messages(
+    two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools],
+    self_hostname: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, _, server_1, server_2, _ = two_nodes
+    peer = await connect_and_get_peer(server_1, server_2, self_hostname)
+
+    queued: List[OutgoingMessage] = []
+    queue_message = peer.queue_message
+
+    def record(item: OutgoingMessage) -> bool:
+        queued.append(item)
+        return queue_message(item)
+
+    monkeypatch.setattr(peer, "queue_message", record)
+    messages = [new_transaction(1), new_transaction(2)]
+    await server_1.send_to_all(messages, NodeType.FULL_NODE)
+    await server_1.send_to_all_if(messages, NodeType.FULL_NODE, lambda connection: False)
+    assert [item.message for item in queued] == messages
+
+    def received() -> int:
+        return server_2.message_metrics.get(ProtocolMessageTypes.new_transaction.value).received
+
+    await time_out_assert(10, received, 2)
+
+
+@pytest.mark.anyio
+async def test_batched_writes(
+    two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools], self_hostname: str
+) -> None:
+    _, _, server_1, server_2, _ = two_nodes
+    peer = await connect_and_get_peer(server_1, server_2, self_hostname)
+
+    # the outbound handler doesn't run in between, so it finds all of them in
+    # the queue (after whatever is left from the handshake)
+    queued = peer.outgoing_queue_bytes
+    count = ws_connection.OUTBOUND_BATCH_SIZE + 50
+    for i in range(count):
+        assert peer.queue_message(OutgoingMessage(new_transaction(i)))
+    assert peer.outgoing_queue_bytes == queued + count * len(new_transaction(0).data)
+
+    def received() -> int:
+        return server_2.message_metrics.get(ProtocolMessageTypes.new_transaction.value).received
+
+    await time_out_assert(10, received, count)
+    assert peer.outgoing_queue_bytes == 0
+
+
+@pytest.mark.anyio
+async def test_drop_announcements(
+    two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools],
+    self_hostname: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, _, server_1, server_2, _ = two_nodes
+    peer = await connect_and_get_peer(server_1, server_2, self_hostname)
+    size = len(new_transaction(0).data)
+    monkeypatch.setattr(ws_connection, "DROP_QUEUE_BYTES", peer.outgoing_queue_bytes + 3 * size)
+
+    assert all(peer.queue_message(OutgoingMessage(new_transaction(i))) for i in range(3))
+    # the queue is full, announcements are dropped, requests are still sent
+    assert not peer.queue_message(OutgoingMessage(new_transaction(3)))
+    assert peer.queue_message(OutgoingMessage(request_block(0)))
+    assert server_1.message_metrics.get(ProtocolMessageTypes.new_transaction.value).outbound_dropped == 1
+    assert server_1.message_metrics.get(ProtocolMessageTypes.request_block.value).outbound_dropped == 0
+
+    def received() -> int:
+        return server_2.message_metrics.get(ProtocolMessageTypes.new_transaction.value).received
+
+    await time_out_assert(10, received, 3)
+    # once the queue is sent, announcements are queued again
+    assert await peer.send_message(new_transaction(4))
+    await time_out_assert(10, received, 4)
+    assert not peer.closed
+
+
+@pytest.mark.anyio
+async def test_overflow_closes_connection(
+    two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools],
+    self_hostname: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, _, server_1, server_2, _ = two_nodes
+    peer = await connect_and_get_peer(server_1, server_2, self_hostname)
+    size = len(request_block(0).data)
+    monkeypatch.setattr(ws_connection, "MAX_QUEUE_BYTES", peer.outgoing_queue_bytes + 3 * size)
+
+    assert all(peer.queue_message(OutgoingMessage(request_block(i))) for i in range(3))
+    assert not peer.queue_message(OutgoingMessage(request_block(3)))
+    assert peer.outgoing_queue_overflow
+    # nothing is queued after the overflow, the order of messages is kept
+    assert not peer.queue_message(OutgoingMessage(request_block(4)))
+    assert server_1.message_metrics.get(ProtocolMessageTypes.request_block.value).outbound_dropped == 2
+    # a request that isn't queued doesn't wait for a response
+    start = time.monotonic()
+    assert await peer.send_request(request_block(5), timeout=30) is None
+    assert time.monotonic() - start < 10
+    assert peer.pending_requests == {}
+
+    await time_out_assert(10, lambda: peer.closed)
+    await time_out_assert(10, lambda: len(server_1.all_connections) == 0)
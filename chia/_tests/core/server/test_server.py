@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from dataclasses import dataclass
-from typing import Callable, Tuple, cast
+from typing import Callable, List, Tuple, cast
 
 import pytest
 from packaging.version import Version
@@ -20,7 +21,7 @@ from chia.server.outbound_message import NodeType, make_msg
 from chia.server.server import ChiaServer
 from chia.server.start_full_node import create_full_node_service
 from chia.server.start_wallet import create_wallet_service
-from chia.server.ws_connection import WSChiaConnection, error_response_version
+from chia.server.ws_connection import OutgoingMessage, WSChiaConnection, error_response_version
 from chia.simulator.block_tools import BlockTools
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.peer_info import PeerInfo
@@ -60,11 +61,11 @@ async def test_connection_string_conversion(
 ) -> None:
     _, _, server_1, server_2, _ = two_nodes_one_block
     peer = await connect_and_get_peer(server_1, server_2, self_hostname)
-    # 1000 is based on the current implementation (example below), should be reconsidered/adjusted if this test fails
-    # WSChiaConnection(local_type=<NodeType.FULL_NODE: 1>, local_port=50632, local_capabilities=[<Capability.BASE: 1>, <Capability.BLOCK_HEADERS: 2>, <Capability.RATE_LIMITS_V2: 3>], peer_host='127.0.0.1', peer_port=50640, peer_node_id=<bytes32: 566a318f0f656125b4fef0e85fbddcf9bc77f8003d35293c392479fc5d067f4d>, outbound_rate_limiter=<chia.server.rate_limits.RateLimiter object at 0x114a13f50>, inbound_rate_limiter=<chia.server.rate_limits.RateLimiter object at 0x114a13e90>, is_outbound=False, creation_time=1675271096.275591, bytes_read=68, bytes_written=162, last_message_time=1675271096.276271, peer_server_port=50636, active=False, closed=False, connection_type=<NodeType.FULL_NODE: 1>, request_nonce=32768, peer_capabilities=[<Capability.BASE: 1>, <Capability.BLOCK_HEADERS: 2>, <Capability.RATE_LIMITS_V2: 3>], version='', protocol_version='') # noqa
+    # 1100 is based on the current implementation (example below), should be reconsidered/adjusted if this test fails
+    # WSChiaConnection(local_type=<NodeType.FULL_NODE: 1>, local_port=50632, local_capabilities=[<Capability.BASE: 1>, <Capability.BLOCK_HEADERS: 2>, <Capability.RATE_LIMITS_V2: 3>, <Capability.MESSAGE_COMPRESSION: 6>], peer_host='127.0.0.1', peer_port=50640, peer_node_id=<bytes32: 566a318f0f656125b4fef0e85fbddcf9bc77f8003d35293c392479fc5d067f4d>, outbound_rate_limiter=<chia.server.rate_limits.RateLimiter object at 0x114a13f50>, inbound_rate_limiter=<chia.server.rate_limits.RateLimiter object at 0x114a13e90>, is_outbound=False, creation_time=1675271096.275591, bytes_read=68, bytes_written=162, last_message_time=1675271096.276271, peer_server_port=50636, active=False, closed=False, connection_type=<NodeType.FULL_NODE: 1>, request_nonce=32768, peer_capabilities=[<Capability.BASE: 1>, <Capability.BLOCK_HEADERS: 2>, <Capability.RATE_LIMITS_V2: 3>, <Capability.MESSAGE_COMPRESSION: 6>], version='', protocol_version='') # noqa
     converted = method(peer)
     print(converted)
-    assert len(converted) < 1000
+    assert len(converted) < 1100
 
 
 @pytest.mark.anyio
@@ -170,8 +171,8 @@ async def test_error_receive(
         return f"ApiError: {error} from {connection.peer_node_id}, {connection.peer_info}" in caplog.text
 
     with caplog.at_level(logging.WARNING):
-        await full_node_connection.outgoing_queue.put(message)
-        await wallet_connection.outgoing_queue.put(message)
+        assert await full_node_connection.send_message(message)
+        assert await wallet_connection.send_message(message)
         await time_out_assert(10, error_log_found, True, full_node_connection)
         await time_out_assert(10, error_log_found, True, wallet_connection)
 
@@ -191,6 +192,42 @@ async def test_call_api_of_specific(
     assert isinstance(message, RejectBlock)
 
 
+@pytest.mark.anyio
+async def test_cancelled_call_api(
+    two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools],
+    self_hostname: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, _, server_1, server_2, _ = two_nodes
+    peer = await connect_and_get_peer(server_1, server_2, self_hostname)
+    remote = server_2.all_connections[server_1.node_id]
+
+    # hold back the response, until the request has been cancelled
+    held: List[OutgoingMessage] = []
+    queue_message = remote.queue_message
+
+    def hold(item: OutgoingMessage) -> bool:
+        held.append(item)
+        return True
+
+    monkeypatch.setattr(remote, "queue_message", hold)
+    task = asyncio.create_task(peer.call_api(FullNodeAPI.request_block, RequestBlock(uint32(42), False)))
+    await time_out_assert(10, lambda: len(held) == 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert peer.pending_requests == {}
+
+    # the late response is not kept around
+    assert queue_message(held[0])
+
+    def received() -> int:
+        return server_1.message_metrics.get(ProtocolMessageTypes.reject_block.value).received
+
+    await time_out_assert(10, received, 1)
+    assert peer.request_results == {}
+
+
 @pytest.mark.anyio
 async def test_call_api_of_specific_for_missing_peer(
     two_nodes: Tuple[FullNodeAPI, FullNodeAPI, ChiaServer, ChiaServer, BlockTools]
@@ -7,7 +7,7 @@ from typing import List, Tuple
 import pytest
 
 from chia._tests.util.temp_file import TempFile
-from chia.cmds.db_upgrade_func import convert_v1_to_v2
+from chia.cmds.db_upgrade_func import convert_v1_to_v2, migrate_block_records
 from chia.consensus.blockchain import Blockchain
 from chia.consensus.multiprocess_validation import PreValidationResult
 from chia.full_node.block_store import BlockStore
@@ -15,6 +15,7 @@ from chia.full_node.coin_store import CoinStore
 from chia.full_node.hint_store import HintStore
 from chia.simulator.block_tools import test_constants
 from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.full_block import FullBlock
 from chia.util.db_wrapper import DBWrapper2
 from chia.util.ints import uint32, uint64
 
@@ -124,3 +125,64 @@ async def test_blocks(default_1000_blocks, with_hints: bool):
                     for c in coins:
                         n = c.coin.name()
                         assert await coin_store1.get_coin_record(n) == await coin_store2.get_coin_record(n)
+
+
+@pytest.mark.anyio
+async def test_migrate_block_records(default_1000_blocks: List[FullBlock], tmp_dir: Path) -> None:
+    blocks = default_1000_blocks[:300]
+
+    with TempFile() as db_file:
+        async with DBWrapper2.managed(database=db_file, reader_count=1, db_version=2) as db_wrapper:
+            async with db_wrapper.writer_maybe_transaction() as conn:
+                await conn.execute("CREATE TABLE database_version(version int)")
+                await conn.execute("INSERT INTO database_version VALUES (2)")
+            block_store = await BlockStore.create(db_wrapper)
+            coin_store = await CoinStore.create(db_wrapper)
+            assert block_store.split_block_records
+            bc = await Blockchain.create(coin_store, block_store, test_constants, tmp_dir, reserved_cores=0)
+            for block in blocks:
+                results = PreValidationResult(None, uint64(1), None, False, uint32(0))
+                result, err, _ = await bc.add_block(block, results, None)
+                assert err is None
+            bc.shut_down()
+            expected = await block_store.get_block_records_in_range(0, 299)
+            assert len(expected) == 300
+
+            # turn this into a database from before the block_records table
+            async with db_wrapper.writer_maybe_transaction() as conn:
+                await conn.executemany(
+                    "UPDATE full_blocks SET block_record=? WHERE header_hash=?",
+                    [(bytes(br), hh) for hh, br in expected.items()],
+                )
+                await conn.execute("DROP TABLE block_records")
+
+        async with DBWrapper2.managed(database=db_file, reader_count=1, db_version=2) as db_wrapper:
+            block_store = await BlockStore.create(db_wrapper)
+            assert not block_store.split_block_records
+            assert await block_store.get_block_records_in_range(0, 299) == expected
+
+            # a node still has the database open
+            with pytest.raises(RuntimeError, match="the database is in use"):
+                migrate_block_records(db_file)
+
+        migrate_block_records(db_file)
+        # migrating again is a no-op
+        migrate_block_records(db_file)
+
+        async with DBWrapper2.managed(database=db_file, reader_count=1, db_version=2) as db_wrapper:
+            block_store = await BlockStore.create(db_wrapper)
+            assert block_store.split_block_records
+            assert await block_store.get_block_records_in_range(0, 299) == expected
+            records, peak_hash = await block_store.get_block_records_close_to_peak(99)
+            assert peak_hash == blocks[-1].header_hash
+            assert records == {hh: br for hh, br in expected.items() if br.height >= 200}
+            hashes = [b.header_hash for b in blocks]
+            assert await block_store.get_block_records_by_hash(hashes) == [expected[hh] for hh in hashes]
+            for hh in hashes:
+                assert await block_store.get_block_record(hh) == expected[hh]
+
+            # the records aren't kept in both tables
+            async with db_wrapper.reader_no_transaction() as conn:
+                async with conn.execute("SELECT COUNT(*) FROM full_blocks WHERE block_record IS NOT NULL") as cursor:
+                    row = await cursor.fetchone()
+                    assert row is not None and row[0] == 0
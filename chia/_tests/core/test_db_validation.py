@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import random
 import sqlite3
+import tempfile
 from contextlib import closing
 from pathlib import Path
 from typing import List
@@ -9,10 +10,12 @@ from typing import List
 import pytest
 
 from chia._tests.util.temp_file import TempFile
+from chia.cmds.db_compress_func import compress_db
 from chia.cmds.db_validate_func import validate_v2
 from chia.consensus.blockchain import Blockchain
 from chia.consensus.default_constants import DEFAULT_CONSTANTS
 from chia.consensus.multiprocess_validation import PreValidationResult
+from chia.full_node.block_compression import frame_dictionary_id
 from chia.full_node.block_store import BlockStore
 from chia.full_node.coin_store import CoinStore
 from chia.simulator.block_tools import test_constants
@@ -138,12 +141,16 @@ async def make_db(db_file: Path, blocks: List[FullBlock]) -> None:
         block_store = await BlockStore.create(db_wrapper)
         coin_store = await CoinStore.create(db_wrapper)
 
-        bc = await Blockchain.create(coin_store, block_store, test_constants, Path("."), reserved_cores=0)
+        with tempfile.TemporaryDirectory() as blockchain_dir:
+            bc = await Blockchain.create(
+                coin_store, block_store, test_constants, Path(blockchain_dir), reserved_cores=0
+            )
 
-        for block in blocks:
-            results = PreValidationResult(None, uint64(1), None, False, uint32(0))
-            result, err, _ = await bc.add_block(block, results, None)
-            assert err is None
+            for block in blocks:
+                results = PreValidationResult(None, uint64(1), None, False, uint32(0))
+                result, err, _ = await bc.add_block(block, results, None)
+                assert err is None
+            bc.shut_down()
 
 
 @pytest.mark.anyio
@@ -156,3 +163,19 @@ async def test_db_validate_default_1000_blocks(default_1000_blocks: List[FullBlo
         with pytest.raises(RuntimeError) as execinfo:
             validate_v2(db_file, validate_blocks=True)
         assert "Blockchain has invalid genesis challenge" in str(execinfo.value)
+
+
+@pytest.mark.anyio
+async def test_db_validate_compressed(default_1000_blocks: List[FullBlock]) -> None:
+    with TempFile() as db_file:
+        await make_db(db_file, default_1000_blocks[:200])
+        await compress_db(db_file, retrain=False, num_samples=100, batch_size=50)
+
+        with closing(sqlite3.connect(db_file)) as conn:
+            for row in conn.execute("SELECT block FROM full_blocks"):
+                assert frame_dictionary_id(row[0]) == 1
+
+        # every block is decompressed and checked before the genesis challenge
+        with pytest.raises(RuntimeError) as execinfo:
+            validate_v2(db_file, validate_blocks=True)
+        assert "Blockchain has invalid genesis challenge" in str(execinfo.value)
@@ -1,6 +1,7 @@
 # flake8: noqa: F811, F401
 from __future__ import annotations
 
+import json
 from typing import List
 
 import pytest
@@ -14,10 +15,12 @@ from chia._tests.util.rpc import validate_get_routes
 from chia._tests.util.time_out_assert import time_out_assert
 from chia.consensus.block_record import BlockRecord
 from chia.consensus.pot_iterations import is_overflow_block
+from chia.full_node.full_node_api import FullNodeAPI
 from chia.full_node.signage_point import SignagePoint
 from chia.protocols import full_node_protocol
 from chia.rpc.full_node_rpc_api import get_average_block_time, get_nearest_transaction_block
 from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.rpc.rpc_client import ResponseFailureError
 from chia.server.outbound_message import NodeType
 from chia.simulator.block_tools import get_signage_point
 from chia.simulator.simulator_protocol import FarmNewBlockProtocol, ReorgProtocol
@@ -25,6 +28,7 @@ from chia.simulator.wallet_tools import WalletTool
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.program import Program
 from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
 from chia.types.coin_spend import compute_additions
 from chia.types.condition_opcodes import ConditionOpcode
 from chia.types.condition_with_args import ConditionWithArgs
@@ -32,7 +36,7 @@ from chia.types.full_block import FullBlock
 from chia.types.spend_bundle import SpendBundle
 from chia.types.unfinished_block import UnfinishedBlock
 from chia.util.hash import std_hash
-from chia.util.ints import uint8
+from chia.util.ints import uint8, uint32
 
 
 @pytest.mark.anyio
@@ -195,6 +199,9 @@ async def test1(two_nodes_sim_and_wallets_services, self_hostname, consensus_mod
         assert len(await client.get_coin_records_by_puzzle_hash(ph_receiver)) == 1
         assert len(list(filter(lambda cr: not cr.spent, (await client.get_coin_records_by_puzzle_hash(ph))))) == 3
         assert len(await client.get_coin_records_by_puzzle_hashes([ph_receiver, ph])) == 5
+        # repeated puzzle hashes, in different query batches
+        unused = [bytes32(i.to_bytes(32, "big")) for i in range(100)]
+        assert len(await client.get_coin_records_by_puzzle_hashes([ph_receiver, ph, *unused, ph])) == 5
         assert len(await client.get_coin_records_by_puzzle_hash(ph, False)) == 3
         assert len(await client.get_coin_records_by_puzzle_hash(ph, True)) == 4
 
@@ -663,6 +670,201 @@ async def test_get_blockchain_state(one_wallet_and_one_simulator_services, self_
         await client.await_closed()
 
 
+@pytest.mark.anyio
+async def test_get_sync_pipeline_stats(one_node, self_hostname):
+    [full_node_service], _, _ = one_node
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+        stats = await client.get_sync_pipeline_stats()
+        # the node hasn't done a long sync
+        assert stats["active"] is False
+        assert set(stats["stages"].keys()) == {"fetch", "pre_validate", "apply"}
+        for stage in stats["stages"].values():
+            assert stage["batches"] == 0
+            assert stage["blocks"] == 0
+            assert stage["blocks_per_second"] == 0
+        assert stats["peers"] == {}
+        assert stats["queue_sizes"] == {"fetched": 0, "validated": 0}
+    finally:
+        client.close()
+        await client.await_closed()
+
+
+@pytest.mark.anyio
+async def test_get_weight_proof_stats(one_node, self_hostname):
+    [full_node_service], _, _ = one_node
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+        stats = await client.get_weight_proof_stats()
+        # no peer has requested a weight proof
+        assert stats["proofs_created"] == 0
+        assert stats["cache_hits"] == 0
+        assert stats["average_latency"] == 0
+    finally:
+        client.close()
+        await client.await_closed()
+
+
+@pytest.mark.anyio
+async def test_get_respond_blocks_cache_stats(one_node, self_hostname):
+    [full_node_service], _, _ = one_node
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+        stats = await client.get_respond_blocks_cache_stats()
+        # no peer has requested any blocks
+        assert stats["hits"] == 0
+        assert stats["misses"] == 0
+        assert stats["hit_rate"] == 0
+        assert stats["size"] == 0
+    finally:
+        client.close()
+        await client.await_closed()
+
+
+@pytest.mark.anyio
+async def test_rpc_response_cache(one_node, self_hostname):
+    [full_node_service], _, bt = one_node
+    full_node_api = full_node_service._api
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+        blocks = bt.get_consecutive_blocks(40, guarantee_transaction_block=True)
+        for block in blocks:
+            await full_node_api.full_node.add_block(block)
+
+        # the old blocks are settled, they're served from the cache
+        record = await client.get_block_record_by_height(2)
+        assert await client.get_block_record_by_height(2) == record
+        assert await client.get_blocks(0, 5, exclude_reorged=True) == blocks[:5]
+        assert await client.get_blocks(0, 5, exclude_reorged=True) == blocks[:5]
+        stats = await client.get_rpc_response_cache_stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+
+        # orphans may still be added below the peak, so the blocks including
+        # them are only valid at the peak
+        assert await client.get_blocks(0, 5) == blocks[:5]
+        stats = await client.get_rpc_response_cache_stats()
+        assert (stats["hits"], stats["misses"]) == (2, 3)
+
+        # the response for the peak is only valid until the next block
+        assert (await client.get_block_record_by_height(39)).header_hash == blocks[-1].header_hash
+        assert (await client.get_block_record_by_height(39)).header_hash == blocks[-1].header_hash
+        stats = await client.get_rpc_response_cache_stats()
+        assert (stats["hits"], stats["misses"]) == (3, 4)
+
+        blocks = bt.get_consecutive_blocks(1, block_list_input=blocks, guarantee_transaction_block=True)
+        await full_node_api.full_node.add_block(blocks[-1])
+        assert (await client.get_block_record_by_height(39)).header_hash == blocks[-2].header_hash
+        assert await client.get_block_record_by_height(2) == record
+        stats = await client.get_rpc_response_cache_stats()
+        assert (stats["hits"], stats["misses"]) == (4, 5)
+
+        # streamed responses are not cached
+        assert [block async for block in client.iter_blocks(0, 5)] == blocks[:5]
+        stats = await client.get_rpc_response_cache_stats()
+        assert (stats["hits"], stats["misses"]) == (4, 5)
+    finally:
+        client.close()
+        await client.await_closed()
+
+
+@pytest.mark.anyio
+async def test_rpc_response_cache_unspent_coins_reorg(one_node, self_hostname):
+    [full_node_service], _, bt = one_node
+    full_node_api = full_node_service._api
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+        wallet = WalletTool(full_node_api.full_node.constants)
+        ph = wallet.get_new_puzzlehash()
+        ph_2 = wallet.get_new_puzzlehash()
+        blocks = bt.get_consecutive_blocks(
+            3, guarantee_transaction_block=True, farmer_reward_puzzle_hash=ph, pool_reward_puzzle_hash=ph
+        )
+        coin_to_spend = list(set(blocks[-1].get_included_reward_coins()))[0]
+        spend_bundle = wallet.generate_signed_transaction(coin_to_spend.amount, ph_2, coin_to_spend)
+        blocks = bt.get_consecutive_blocks(
+            1, block_list_input=blocks, guarantee_transaction_block=True, transaction_data=spend_bundle
+        )
+        # the only coin with ph_2 is created at this height, and spent in the
+        # next block
+        created_height = blocks[-1].height
+        coin = spend_bundle.additions()[0]
+        spend_bundle = wallet.generate_signed_transaction(coin.amount, ph, coin)
+        blocks = bt.get_consecutive_blocks(
+            1, block_list_input=blocks, guarantee_transaction_block=True, transaction_data=spend_bundle
+        )
+        blocks = bt.get_consecutive_blocks(40, block_list_input=blocks)
+        for block in blocks:
+            await full_node_api.full_node.add_block(block)
+
+        coin_records = await client.get_coin_records_by_puzzle_hash(
+            ph_2, include_spent_coins=False, end_height=created_height
+        )
+        assert coin_records == []
+
+        # reorg the spend out of the chain, above end_height
+        reorg_blocks = bt.get_consecutive_blocks(50, block_list_input=blocks[: created_height + 1], seed=b"reorg")
+        for block in reorg_blocks[created_height + 1 :]:
+            await full_node_api.full_node.add_block(block)
+        peak = full_node_api.full_node.blockchain.get_peak()
+        assert peak is not None and peak.header_hash == reorg_blocks[-1].header_hash
+
+        coin_records = await client.get_coin_records_by_puzzle_hash(
+            ph_2, include_spent_coins=False, end_height=created_height
+        )
+        assert [cr.coin for cr in coin_records] == [coin]
+    finally:
+        client.close()
+        await client.await_closed()
+
+
+@pytest.mark.anyio
+async def test_get_shared_pairing_cache_stats(one_node, self_hostname):
+    [full_node_service], _, _ = one_node
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+        # the shared cache is disabled by default
+        assert await client.get_shared_pairing_cache_stats() is None
+    finally:
+        client.close()
+        await client.await_closed()
+
+
 @pytest.mark.anyio
 async def test_coin_name_not_in_request(one_node, self_hostname):
     [full_node_service], _, _ = one_node
@@ -773,3 +975,142 @@ async def test_coin_name_found_in_mempool(one_node, self_hostname):
     finally:
         client.close()
         await client.await_closed()
+
+
+@pytest.mark.anyio
+async def test_get_mempool_block_candidate(one_node, self_hostname):
+    [full_node_service], _, bt = one_node
+    full_node_api = full_node_service._api
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+
+        # no peak yet
+        assert await client.get_mempool_block_candidate() is None
+
+        wallet = WalletTool(full_node_api.full_node.constants)
+        ph = wallet.get_new_puzzlehash()
+        blocks = bt.get_consecutive_blocks(
+            3, guarantee_transaction_block=True, farmer_reward_puzzle_hash=ph, pool_reward_puzzle_hash=ph
+        )
+        for block in blocks:
+            await full_node_api.full_node.add_block(block)
+
+        candidate = await client.get_mempool_block_candidate()
+        assert candidate is not None
+        assert candidate["item_ids"] == []
+        assert candidate["spend_bundle"] is None
+
+        coin_to_spend = list(set(blocks[-1].get_included_reward_coins()))[0]
+        spend_bundle = wallet.generate_signed_transaction(coin_to_spend.amount, ph, coin_to_spend)
+        await client.push_tx(spend_bundle)
+
+        candidate = await client.get_mempool_block_candidate()
+        assert candidate is not None
+        assert candidate["item_ids"] == [spend_bundle.name().hex()]
+        assert candidate["complete"]
+        assert SpendBundle.from_json_dict(candidate["spend_bundle"]) == spend_bundle
+        additions = [Coin.from_json_dict(coin) for coin in candidate["additions"]]
+        assert additions == spend_bundle.additions()
+    finally:
+        client.close()
+        await client.await_closed()
+
+
+@pytest.mark.limit_consensus_modes(reason="save time")
+@pytest.mark.anyio
+async def test_get_message_metrics(two_nodes_sim_and_wallets_services, self_hostname):
+    nodes, _, _ = two_nodes_sim_and_wallets_services
+    full_node_service_1, full_node_service_2 = nodes
+    server_1 = full_node_service_1._api.full_node.server
+    server_2 = full_node_service_2._api.full_node.server
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service_2.rpc_server.listen_port,
+            full_node_service_2.root_path,
+            full_node_service_2.config,
+        )
+        assert (await client.get_message_metrics())["queues"] == []
+
+        await connect_and_get_peer(server_1, server_2, self_hostname)
+        response = await server_1.call_api_of_specific(
+            FullNodeAPI.request_block, full_node_protocol.RequestBlock(uint32(42), False), server_2.node_id
+        )
+        assert isinstance(response, full_node_protocol.RejectBlock)
+
+        result = await client.get_message_metrics()
+        request_block = result["message_metrics"]["request_block"]
+        assert request_block["received"] == 1
+        assert request_block["received_bytes"] > 0
+        assert request_block["handler_calls"] == 1
+        assert sum(request_block["handler_latency_buckets"].values()) == 1
+        assert result["message_metrics"]["reject_block"]["sent"] == 1
+        assert [q["node_id"] for q in result["queues"]] == [server_1.node_id.hex()]
+
+        text = await client.get_prometheus_metrics()
+        assert "# TYPE chia_message_handler_seconds histogram" in text
+        assert 'chia_messages_received_total{service="chia_full_node",type="request_block"} 1' in text
+        assert 'chia_message_handler_seconds_count{service="chia_full_node",type="request_block"} 1' in text
+        assert f'node_id="{server_1.node_id.hex()}",queue="outbound"' in text
+    finally:
+        client.close()
+        await client.await_closed()
+
+
+@pytest.mark.anyio
+async def test_streamed_responses(one_node, self_hostname):
+    [full_node_service], _, bt = one_node
+    full_node_api = full_node_service._api
+
+    try:
+        client = await FullNodeRpcClient.create(
+            self_hostname,
+            full_node_service.rpc_server.listen_port,
+            full_node_service.root_path,
+            full_node_service.config,
+        )
+        blocks = bt.get_consecutive_blocks(5, guarantee_transaction_block=True)
+        for block in blocks:
+            await full_node_api.full_node.add_block(block)
+
+        streamed = [block async for block in client.iter_blocks(0, 5)]
+        assert streamed == await client.get_blocks(0, 5)
+        assert streamed == blocks
+        assert [block async for block in client.iter_blocks(3, 3)] == []
+
+        # the format can also be selected by the Accept header
+        async with client.session.post(
+            client.url + "get_block_records",
+            json={"start": 0, "end": 5},
+            headers={"Accept": "application/x-ndjson"},
+            ssl=client.ssl_context,
+        ) as response:
+            assert response.content_type == "application/x-ndjson"
+            lines = [json.loads(line) for line in (await response.text()).splitlines()]
+        assert lines[-1] == {"success": True}
+        assert lines[:-1] == [{"block_records": record} for record in await client.get_block_records(0, 5)]
+
+        # the lists are numbered in the order they appear in the response
+        header_hash = blocks[-1].header_hash
+        frames = [
+            frame
+            async for frame in client.fetch_stream("get_additions_and_removals", {"header_hash": header_hash.hex()})
+        ]
+        additions, removals = await client.get_additions_and_removals(header_hash)
+        assert [CoinRecord.from_bytes(payload) for index, payload in frames if index == 0] == additions
+        assert [CoinRecord.from_bytes(payload) for index, payload in frames if index == 1] == removals
+
+        with pytest.raises(ResponseFailureError, match="Unsupported stream format"):
+            await client.fetch("get_blocks", {"start": 0, "end": 5, "stream": "xml"})
+        with pytest.raises(ResponseFailureError, match="No end in request"):
+            [frame async for frame in client.fetch_stream("get_blocks", {"start": 0})]
+    finally:
+        client.close()
+        await client.await_closed()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Optional
+
+from chia.rpc.rpc_response_cache import RpcResponseCache
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.ints import uint32
+
+HASH_A = bytes32(b"a" * 32)
+HASH_B = bytes32(b"b" * 32)
+PEAK_A = bytes32(b"c" * 32)
+PEAK_B = bytes32(b"d" * 32)
+
+
+def chain(hashes: Dict[int, bytes32]) -> Callable[[uint32], Optional[bytes32]]:
+    return lambda height: hashes.get(height)
+
+
+def test_get_put() -> None:
+    cache = RpcResponseCache(1000)
+    height_to_hash = chain({10: HASH_A})
+    assert cache.get(("get_block_record_by_height", 10), PEAK_A, height_to_hash) is None
+    cache.put(("get_block_record_by_height", 10), {"block_record": {}}, 20, uint32(10), HASH_A, settled=True)
+    assert cache.get(("get_block_record_by_height", 10), PEAK_A, height_to_hash) == {"block_record": {}}
+    # the arguments are part of the key
+    assert cache.get(("get_block_record_by_height", 11), PEAK_A, height_to_hash) is None
+    assert cache.stats.to_json_dict() == {
+        "hits": 1,
+        "misses": 2,
+        "hit_rate": 1 / 3,
+        "evictions": 0,
+        "invalidations": 0,
+        "entries": 1,
+        "size": 20,
+    }
+
+
+def test_disabled() -> None:
+    cache = RpcResponseCache(0)
+    cache.put(("get_blocks", 0, 10), {"blocks": []}, 14, uint32(9), HASH_A, settled=True)
+    assert cache.get(("get_blocks", 0, 10), PEAK_A, chain({9: HASH_A})) is None
+    assert cache.stats.entries == 0
+
+
+def test_byte_budget() -> None:
+    cache = RpcResponseCache(250)
+    height_to_hash = chain({1: HASH_A, 2: HASH_A, 3: HASH_A})
+    cache.put(("a",), {}, 100, uint32(1), HASH_A, settled=True)
+    cache.put(("b",), {}, 100, uint32(2), HASH_A, settled=True)
+    # make "a" the most recently used
+    assert cache.get(("a",), PEAK_A, height_to_hash) is not None
+    cache.put(("c",), {}, 100, uint32(3), HASH_A, settled=True)
+    assert cache.stats.evictions == 1
+    assert cache.stats.size == 200
+    assert cache.get(("b",), PEAK_A, height_to_hash) is None
+    assert cache.get(("a",), PEAK_A, height_to_hash) is not None
+    assert cache.get(("c",), PEAK_A, height_to_hash) is not None
+
+    # responses larger than the cache are not stored
+    cache.put(("d",), {}, 251, uint32(3), HASH_A, settled=True)
+    assert cache.get(("d",), PEAK_A, height_to_hash) is None
+    assert cache.stats.size == 200
+
+
+def test_new_peak() -> None:
+    cache = RpcResponseCache(1000)
+    height_to_hash = chain({10: HASH_A})
+    cache.put(("settled",), {}, 1, uint32(10), HASH_A, settled=True)
+    cache.put(("tip",), {}, 1, uint32(100), PEAK_A, settled=False)
+    assert cache.get(("tip",), PEAK_A, height_to_hash) is not None
+
+    # the peak changed, but it hasn't been reported yet
+    assert cache.get(("tip",), PEAK_B, height_to_hash) is None
+    assert cache.stats.invalidations == 1
+
+    cache.put(("tip",), {}, 1, uint32(101), PEAK_B, settled=False)
+    cache.new_peak()
+    assert cache.stats.invalidations == 2
+    assert cache.get(("tip",), PEAK_B, height_to_hash) is None
+    assert cache.get(("settled",), PEAK_B, height_to_hash) is not None
+
+
+def test_reorg() -> None:
+    cache = RpcResponseCache(1000)
+    cache.put(("a",), {}, 1, uint32(10), HASH_A, settled=True)
+    cache.put(("b",), {}, 1, uint32(20), HASH_A, settled=True)
+    cache.put(("c",), {}, 1, uint32(30), HASH_A, settled=True)
+    cache.rollback(20)
+    assert cache.stats.invalidations == 1
+    assert cache.get(("b",), PEAK_A, chain({20: HASH_A})) is not None
+    assert cache.get(("c",), PEAK_A, chain({30: HASH_A})) is None
+
+    # the block the response depends on is not the one in the chain anymore
+    assert cache.get(("a",), PEAK_A, chain({10: HASH_B})) is None
+    assert cache.stats.invalidations == 2
+    assert cache.get(("a",), PEAK_A, chain({10: HASH_A})) is None
@@ -1,12 +1,23 @@
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass
-from typing import List
+from typing import Any, AsyncIterator, Dict, List
 
+import aiohttp
 import pytest
-
-from chia.rpc.util import marshal
-from chia.util.ints import uint32
+from aiohttp import web
+
+from chia.rpc.util import (
+    STREAM_FRAME_HEADER,
+    STREAM_TRAILER_INDEX,
+    StreamedList,
+    list_response,
+    marshal,
+    wrap_http_handler,
+)
+from chia.util.ints import uint16, uint32
+from chia.util.network import WebServer
 from chia.util.streamable import Streamable, streamable
 from chia.wallet.util.clvm_streamable import clvm_streamable
 
@@ -85,3 +96,44 @@ async def test_clvm_streamable_marshalling() -> None:
             "CHIP-0029": True,
         },
     ) == {"sub": "ff81ff80"}
+
+
+async def items_then_error() -> AsyncIterator[uint32]:
+    yield uint32(1)
+    yield uint32(2)
+    raise ValueError("something broke")
+
+
+@pytest.mark.anyio
+async def test_streamed_response_error(self_hostname: str) -> None:
+    async def endpoint(request: Dict[str, Any]) -> Dict[str, Any]:
+        return await list_response(request, {"values": StreamedList(items_then_error(), int, bytes)})
+
+    server = await WebServer.create(
+        hostname=self_hostname, port=uint16(0), routes=[web.post("/values", wrap_http_handler(endpoint))]
+    )
+    try:
+        async with aiohttp.ClientSession() as session:
+            # without streaming, the response fails as a whole
+            async with session.post(server.url("values"), json={}) as response:
+                res_json = await response.json()
+            assert not res_json["success"]
+            assert res_json["error"] == "something broke"
+
+            # when streamed, the items before the error are sent, and the error
+            # is in the trailer
+            async with session.post(server.url("values"), json={"stream": "ndjson"}) as response:
+                lines = [json.loads(line) for line in (await response.text()).splitlines()]
+            assert lines == [{"values": 1}, {"values": 2}, {"success": False, "error": "something broke"}]
+
+            async with session.post(server.url("values"), json={"stream": "binary"}) as response:
+                body = await response.read()
+            assert body[: 2 * (STREAM_FRAME_HEADER.size + 4)] == b"".join(
+                STREAM_FRAME_HEADER.pack(0, 4) + bytes(uint32(i)) for i in (1, 2)
+            )
+            index, length = STREAM_FRAME_HEADER.unpack_from(body, 2 * (STREAM_FRAME_HEADER.size + 4))
+            assert index == STREAM_TRAILER_INDEX
+            assert json.loads(body[-length:]) == {"success": False, "error": "something broke"}
+    finally:
+        server.close()
+        await server.await_closed()
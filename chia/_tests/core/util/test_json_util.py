@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from chia._tests.util import network_protocol_data
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.program import Program
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.util.ints import uint8, uint32, uint64, uint128
+from chia.util.json_util import EnhancedJSONEncoder, dict_to_json_str
+from chia.util.streamable import Streamable, streamable
+from chia.wallet.util.wallet_types import WalletType
+
+
+def reference_json(o: Any) -> str:
+    return json.dumps(o, cls=EnhancedJSONEncoder, sort_keys=True)
+
+
+@streamable
+@dataclass(frozen=True)
+class Inner(Streamable):
+    b: bytes32
+    a: Optional[uint8]
+    s: str
+
+
+@streamable
+@dataclass(frozen=True)
+class Outer(Streamable):
+    z: List[Inner]
+    y: Tuple[uint32, Optional[Inner], List[bool]]
+    x: Optional[List[Tuple[str, bytes]]]
+    w: Program
+    v: uint128
+    u: Coin
+
+
+@streamable
+@dataclass(frozen=True)
+class Empty(Streamable):
+    pass
+
+
+inner = Inner(bytes32(range(32)), uint8(7), 'quote " backslash \\ newline \n unicode é \U0001f331')
+outer = Outer(
+    [inner, Inner(bytes32(b"\xff" * 32), None, "")],
+    (uint32(1), None, [True, False]),
+    [("a", b"\x00\x01"), ("", b"")],
+    Program.to([1, 2, [3]]),
+    uint128(2**128 - 1),
+    Coin(bytes32(b"\x01" * 32), bytes32(b"\x02" * 32), uint64(10)),
+)
+coin_record = CoinRecord(outer.u, uint32(3), uint32(0), True, uint64(1234))
+
+
+@pytest.mark.parametrize(
+    "o",
+    [
+        {},
+        [],
+        {"success": True},
+        inner,
+        outer,
+        Empty(),
+        Outer([], (uint32(0), inner, []), None, Program.to(0), uint128(0), outer.u),
+        {"outer": outer, "inners": [inner, inner], "empty": [], "nested": {"inner": inner}},
+        {"records": [coin_record, None, 1, "mixed"], "tuple": (inner,), "wallet": WalletType.CAT},
+        {"deep": [[inner]], "bytes": b"\x00", "float": 0.5, "sorted": {"b": 1, "a": [2, 3]}},
+        [outer, {"inner": inner}],
+    ],
+)
+def test_same_as_json_dumps(o: Any) -> None:
+    assert dict_to_json_str(o) == reference_json(o)
+
+
+def test_protocol_messages() -> None:
+    count = 0
+    for value in vars(network_protocol_data).values():
+        if isinstance(value, Streamable):
+            assert dict_to_json_str(value) == reference_json(value)
+            assert dict_to_json_str({"message": value, "list": [value]}) == reference_json(
+                {"message": value, "list": [value]}
+            )
+            count += 1
+    assert count > 100
+
+
+def test_overridden_to_json_dict() -> None:
+    class Custom(Inner):
+        def to_json_dict(self) -> Dict[str, Any]:
+            return {"custom": True}
+
+    # like EnhancedJSONEncoder, an overridden to_json_dict() is used for the
+    # objects in the response, but not for the fields of other streamables
+    custom = Custom(inner.b, inner.a, inner.s)
+    assert (
+        dict_to_json_str({"item": custom, "items": [custom]})
+        == '{"item": {"custom": true}, "items": [{"custom": true}]}'
+    )
+    assert dict_to_json_str(custom) == reference_json(custom)
+
+
+def test_mixed_keys() -> None:
+    o: Dict[Any, Any] = {"a": inner, 1: 2}
+    with pytest.raises(TypeError):
+        reference_json(o)
+    with pytest.raises(TypeError):
+        dict_to_json_str(o)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import unittest
 
-from chia.util.lru_cache import LRUCache
+from chia.util.lru_cache import LRUCache, SizedLRUCache
 
 
 class TestLRUCache(unittest.TestCase):
@@ -54,3 +54,32 @@ class TestLRUCache(unittest.TestCase):
         assert len(cache.cache) == 5
         assert cache.get(b"0") is None
         assert cache.get(b"1") == 1
+
+    def test_sized_lru_cache(self):
+        cache = SizedLRUCache(100)
+
+        assert cache.get(b"0") is None
+        cache.put(b"0", 0, 40)
+        cache.put(b"1", 1, 40)
+        assert cache.size == 80
+        # replacing a value replaces its size
+        cache.put(b"1", 2, 30)
+        assert cache.size == 70
+        assert cache.get(b"1") == 2
+
+        # the least recently used values are evicted to make room
+        assert cache.get(b"0") == 0
+        cache.put(b"2", 2, 50)
+        assert cache.get(b"1") is None
+        assert cache.get(b"0") == 0
+        assert cache.get(b"2") == 2
+        assert cache.size == 90
+
+        # values larger than the cache are not cached
+        cache.put(b"3", 3, 101)
+        assert cache.get(b"3") is None
+        assert cache.size == 90
+
+        cache.remove(b"0")
+        assert cache.get(b"0") is None
+        assert cache.size == 50
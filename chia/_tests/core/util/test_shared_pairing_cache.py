@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+import pytest
+from chia_rs import AugSchemeMPL, G1Element, G2Element, GTElement
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.cached_bls import BLSCache, worker_bls_cache
+from chia.util.hash import std_hash
+from chia.util.shared_pairing_cache import SharedPairingCache
+
+
+@pytest.fixture(name="shared_cache")
+def shared_cache_fixture() -> Iterator[SharedPairingCache]:
+    cache = SharedPairingCache.create(1000)
+    yield cache
+    cache.close()
+    cache.unlink()
+
+
+def make_signatures(n: int) -> Tuple[List[G1Element], List[bytes], List[G2Element]]:
+    sks = [AugSchemeMPL.key_gen(bytes([i]) * 32) for i in range(n)]
+    pks = [sk.get_g1() for sk in sks]
+    msgs = [f"msg-{i}".encode() for i in range(n)]
+    sigs = [AugSchemeMPL.sign(sk, msg) for sk, msg in zip(sks, msgs)]
+    return pks, msgs, sigs
+
+
+def pairing(pk: G1Element, msg: bytes) -> Tuple[bytes32, GTElement]:
+    aug_msg = bytes(pk) + msg
+    return std_hash(aug_msg), AugSchemeMPL.g2_from_message(aug_msg).pair(pk)
+
+
+def test_get_put(shared_cache: SharedPairingCache) -> None:
+    pks, msgs, _ = make_signatures(3)
+    pairings = [pairing(pk, msg) for pk, msg in zip(pks, msgs)]
+    for key, value in pairings:
+        assert shared_cache.get(key) is None
+        shared_cache.put(key, value)
+    for key, value in pairings:
+        assert shared_cache.get(key) == value
+    # adding the same pairing again is a no-op
+    shared_cache.put(*pairings[0])
+
+    stats = shared_cache.stats()
+    assert stats.num_slots == 1000
+    assert stats.hits == 3
+    assert stats.misses == 3
+    assert stats.inserts == 3
+
+    other = SharedPairingCache.attach(shared_cache.name)
+    try:
+        assert other.get(pairings[0][0]) == pairings[0][1]
+    finally:
+        other.close()
+
+
+def test_full_table() -> None:
+    cache = SharedPairingCache.create(2)
+    try:
+        pks, msgs, _ = make_signatures(5)
+        pairings = [pairing(pk, msg) for pk, msg in zip(pks, msgs)]
+        for key, value in pairings:
+            cache.put(key, value)
+        # pairings were replaced, but whatever is found is correct
+        found = [cache.get(key) for key, _ in pairings]
+        assert sum(1 for value in found if value is not None) == 2
+        for (_, value), found_value in zip(pairings, found):
+            assert found_value is None or found_value == value
+    finally:
+        cache.close()
+        cache.unlink()
+
+
+def test_torn_slot(shared_cache: SharedPairingCache) -> None:
+    pks, msgs, _ = make_signatures(1)
+    key, value = pairing(pks[0], msgs[0])
+    shared_cache.put(key, value)
+    # simulate a concurrent write, modifying the pairing
+    buf = shared_cache._shm.buf
+    offset = shared_cache._slot_offset(key, 0)
+    buf[offset + 100] ^= 1
+    assert shared_cache.get(key) is None
+
+
+def test_bls_cache_with_shared(shared_cache: SharedPairingCache) -> None:
+    pks, msgs, sigs = make_signatures(4)
+    agg_sig = AugSchemeMPL.aggregate(sigs)
+    cache1 = BLSCache(100, shared_cache)
+    assert cache1.aggregate_verify(pks, msgs, agg_sig, True)
+    assert shared_cache.stats().inserts == 4
+
+    # another process' cache finds all pairings in the shared cache
+    cache2 = BLSCache(100, shared_cache)
+    assert cache2.aggregate_verify(pks, msgs, agg_sig)
+    assert shared_cache.stats().inserts == 4
+    assert len(cache2.items()) == 4
+
+
+def verify_in_worker(shared_name: str, pks: List[bytes], msgs: List[bytes], sig: bytes) -> bool:
+    return worker_bls_cache(shared_name).aggregate_verify(
+        [G1Element.from_bytes(pk) for pk in pks], msgs, G2Element.from_bytes(sig), True
+    )
+
+
+def test_shared_across_processes(shared_cache: SharedPairingCache) -> None:
+    pks, msgs, sigs = make_signatures(4)
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(verify_in_worker, shared_cache.name, [bytes(pk)], [msg], bytes(sig))
+            for pk, msg, sig in zip(pks, msgs, sigs)
+        ]
+        assert all(future.result() for future in futures)
+
+    # the pairings computed by the workers are available to this process
+    for pk, msg in zip(pks, msgs):
+        key, value = pairing(pk, msg)
+        assert shared_cache.get(key) == value
@@ -6,10 +6,11 @@ from typing import List
 import pytest
 
 from chia.full_node.bitcoin_fee_estimator import create_bitcoin_fee_estimator
+from chia.full_node.fee_estimate_store import FeeStore
 from chia.full_node.fee_estimation import FeeBlockInfo, MempoolItemInfo
 from chia.full_node.fee_estimator_constants import INFINITE_FEE_RATE, INITIAL_STEP
 from chia.full_node.fee_estimator_interface import FeeEstimatorInterface
-from chia.full_node.fee_tracker import get_bucket_index, init_buckets
+from chia.full_node.fee_tracker import FeeTracker, get_bucket_index, init_buckets
 from chia.types.fee_rate import FeeRateV2
 from chia.util.ints import uint32, uint64
 from chia.util.math import make_monotonically_decreasing
@@ -143,3 +144,29 @@ def test_monotonically_decrease() -> None:
     for i, o in zip(inputs, output):
         print(o, i)
         assert o == make_monotonically_decreasing(i)
+
+
+def test_backup_round_trip() -> None:
+    fee_store = FeeStore()
+    tracker = FeeTracker(fee_store)
+    for height in range(10, 60):
+        items = make_block(uint32(height), height % 4, uint64(5000000), uint64(height * 100000), height % 3 + 1)
+        for item in items:
+            tracker.add_tx(item)
+        tracker.process_block(uint32(height), items)
+    tracker.shutdown()
+    backup = fee_store.get_stored_fee_data()
+    assert backup is not None
+
+    restored = FeeTracker(fee_store)
+    assert restored.latest_seen_height == tracker.latest_seen_height
+    for stat, restored_stat in [
+        (tracker.short_horizon, restored.short_horizon),
+        (tracker.med_horizon, restored.med_horizon),
+        (tracker.long_horizon, restored.long_horizon),
+    ]:
+        assert restored_stat.confirmed_average == stat.confirmed_average
+        assert restored_stat.failed_average == stat.failed_average
+        assert restored_stat.tx_ct_avg == stat.tx_ct_avg
+        assert restored_stat.m_fee_rate_avg == stat.m_fee_rate_avg
+        assert restored_stat.create_backup() == stat.create_backup()
@@ -11,8 +11,8 @@ import pytest
 from chia._tests.util.full_sync import run_sync_test
 
 
-@pytest.mark.parametrize("keep_up", [True, False])
-def test_full_sync_test(keep_up: bool) -> None:
+@pytest.mark.parametrize("keep_up, unspent_coin_cache_size", [(True, 0), (False, 0), (False, 1000)])
+def test_full_sync_test(keep_up: bool, unspent_coin_cache_size: int) -> None:
     file_path = os.path.realpath(__file__)
     db_file = Path(file_path).parent / "test-blockchain-db.sqlite"
     asyncio.run(
@@ -26,5 +26,6 @@ def test_full_sync_test(keep_up: bool) -> None:
             db_sync="off",
             node_profiler=False,
             start_at_checkpoint=None,
+            unspent_coin_cache_size=unspent_coin_cache_size,
         )
     )
@@ -3,6 +3,7 @@ from __future__ import annotations
 import contextlib
 import os
 import pickle
+import tempfile
 from pathlib import Path
 from typing import AsyncIterator, List, Optional, Tuple
 
@@ -24,12 +25,15 @@ async def create_blockchain(
     async with DBWrapper2.managed(database=db_uri, uri=True, reader_count=1, db_version=db_version) as wrapper:
         coin_store = await CoinStore.create(wrapper)
         store = await BlockStore.create(wrapper)
-        bc1 = await Blockchain.create(coin_store, store, constants, Path("."), 2, single_threaded=True)
-        try:
-            assert bc1.get_peak() is None
-            yield bc1, wrapper
-        finally:
-            bc1.shut_down()
+        # the blockchain maps its height-to-hash file into memory, it must
+        # not be shared with other tests
+        with tempfile.TemporaryDirectory() as blockchain_dir:
+            bc1 = await Blockchain.create(coin_store, store, constants, Path(blockchain_dir), 2, single_threaded=True)
+            try:
+                assert bc1.get_peak() is None
+                yield bc1, wrapper
+            finally:
+                bc1.shut_down()
 
 
 def persistent_blocks(
@@ -10,12 +10,12 @@ from pathlib import Path
 from typing import Callable, Iterator, List, Optional, cast
 
 import aiosqlite
-import zstd
 
 from chia._tests.util.constants import test_constants as TEST_CONSTANTS
 from chia.cmds.init_funcs import chia_init
 from chia.consensus.constants import replace_str_to_bytes
 from chia.consensus.default_constants import DEFAULT_CONSTANTS
+from chia.full_node.block_compression import BlockCompressor
 from chia.full_node.full_node import FullNode
 from chia.server.outbound_message import Message, NodeType
 from chia.server.server import ChiaServer
@@ -93,6 +93,18 @@ class FakeServer:
         return False
 
 
+async def load_block_compressor(in_db: aiosqlite.Connection) -> BlockCompressor:
+    compressor = BlockCompressor()
+    try:
+        async with in_db.execute("SELECT id, dict FROM block_compression_dicts") as cursor:
+            async for dict_id, dict_data in cursor:
+                compressor.add_dictionary(dict_id, dict_data)
+    except aiosqlite.OperationalError:
+        # this database has never had its blocks compressed with a dictionary
+        pass
+    return compressor
+
+
 class FakePeer:
     def get_peer_logging(self) -> PeerInfo:
         return PeerInfo("0.0.0.0", uint16(0))
@@ -114,6 +126,7 @@ async def run_sync_test(
     db_sync: str,
     node_profiler: bool,
     start_at_checkpoint: Optional[str],
+    unspent_coin_cache_size: int = 0,
 ) -> None:
     logger = logging.getLogger()
     logger.setLevel(logging.WARNING)
@@ -145,6 +158,7 @@ async def run_sync_test(
             config["full_node"]["single_threaded"] = True
         config["full_node"]["db_sync"] = db_sync
         config["full_node"]["enable_profiler"] = node_profiler
+        config["full_node"]["unspent_coin_cache_size"] = unspent_coin_cache_size
         full_node = await FullNode.create(
             config["full_node"],
             root_path=root_path,
@@ -167,6 +181,7 @@ async def run_sync_test(
             prev_hash = None
             async with aiosqlite.connect(file) as in_db:
                 await in_db.execute("pragma query_only")
+                compressor = await load_block_compressor(in_db)
                 rows = await in_db.execute(
                     "SELECT header_hash, height, block FROM full_blocks "
                     "WHERE height >= ? AND in_main_chain=1 ORDER BY height",
@@ -183,7 +198,7 @@ async def run_sync_test(
                 async for r in rows:
                     batch_start_time = time.monotonic()
                     with enable_profiler(profile, height):
-                        block = FullBlock.from_bytes(zstd.decompress(r[2]))
+                        block = FullBlock.from_bytes(compressor.decompress(r[2]))
                         block_batch.append(block)
 
                         assert block.height == monotonic
@@ -493,19 +493,10 @@ def create_logger(file: TextIO = sys.stdout) -> logging.Logger:
 
 
 def invariant_check_mempool(mempool: Mempool) -> None:
-    with mempool._db_conn:
-        cursor = mempool._db_conn.execute("SELECT SUM(cost) FROM tx")
-        val = cursor.fetchone()[0]
-        if val is None:
-            val = 0
-    assert mempool._total_cost == val
-
-    with mempool._db_conn:
-        cursor = mempool._db_conn.execute("SELECT SUM(fee) FROM tx")
-        val = cursor.fetchone()[0]
-        if val is None:
-            val = 0
-    assert mempool._total_fee == val
+    entries = list(mempool._index.entries())
+    assert mempool._total_cost == sum(entry.cost for entry in entries)
+    assert mempool._total_fee == sum(entry.fee for entry in entries)
+    assert mempool._index.size() == len(entries) == len(mempool._items)
 
 
 async def wallet_height_at_least(wallet_node: WalletNode, h: uint32) -> bool:
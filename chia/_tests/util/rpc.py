@@ -17,6 +17,7 @@ async def validate_get_routes(client: RpcClient, api: RpcApiProtocol) -> None:
         "/stop_node",
         "/get_routes",
         "/healthz",
+        "/get_message_metrics",
     ]
     assert len(routes_api) > 0
     assert sorted(routes_client) == sorted(routes_api + routes_server)
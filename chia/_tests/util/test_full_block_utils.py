@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import itertools
 import random
 from typing import Generator, Iterator, List, Optional
 
@@ -23,7 +24,12 @@ from chia.types.blockchain_format.vdf import VDFInfo, VDFProof
 from chia.types.end_of_slot_bundle import EndOfSubSlotBundle
 from chia.types.full_block import FullBlock
 from chia.types.header_block import HeaderBlock
-from chia.util.full_block_utils import block_info_from_block, generator_from_block, header_block_from_block
+from chia.util.full_block_utils import (
+    FullBlockView,
+    block_info_from_block,
+    generator_from_block,
+    header_block_from_block,
+)
 from chia.util.generator_tools import get_block_header
 from chia.util.ints import uint8, uint32, uint64, uint128
 
@@ -269,3 +275,24 @@ async def test_header_block():
         hb: HeaderBlock = get_block_header(block, [], [])
         hb_bytes = header_block_from_block(memoryview(bytes(block)))
         assert HeaderBlock.from_bytes(hb_bytes) == hb
+
+
+def test_full_block_view() -> None:
+    # a sample of the combinations exercised by test_parser()
+    for block in itertools.islice(get_full_blocks(), 0, 100 * 101, 101):
+        view = FullBlockView(bytes(block))
+        assert view.header_hash == block.header_hash
+        assert view.height == block.height
+        assert view.weight == block.weight
+        assert view.prev_header_hash == block.prev_header_hash
+        assert view.foliage == block.foliage
+        assert view.is_transaction_block() == block.is_transaction_block()
+        assert view.foliage_transaction_block == block.foliage_transaction_block
+        assert view.transactions_info == block.transactions_info
+        assert view.transactions_generator == block.transactions_generator
+        assert view.transactions_generator_ref_list == block.transactions_generator_ref_list
+        assert bytes(view) == bytes(block)
+        assert view.without_generator() == bytes(block.replace(transactions_generator=None))
+
+        hb = get_block_header(block, [], [])
+        assert HeaderBlock.from_bytes(view.header_block()) == hb
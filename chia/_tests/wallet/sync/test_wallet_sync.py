@@ -102,6 +102,12 @@ async def test_request_block_headers(
     bh = res_block_headers.header_blocks
     assert len(bh) == 6
 
+    # the deprecated request_header_blocks returns the same header blocks
+    msg = await full_node_api.request_header_blocks(wallet_protocol.RequestHeaderBlocks(uint32(110), uint32(115)))
+    assert msg is not None
+    assert msg.type == ProtocolMessageTypes.respond_header_blocks.value
+    assert wallet_protocol.RespondHeaderBlocks.from_bytes(msg.data).header_blocks == bh
+
 
 # @pytest.mark.parametrize(
 #     "test_case",
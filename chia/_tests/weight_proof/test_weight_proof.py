@@ -14,6 +14,7 @@ from chia.simulator.block_tools import BlockTools
 from chia.types.blockchain_format.proof_of_space import calculate_prefix_bits, verify_and_get_quality_string
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
+from chia.types.blockchain_format.vdf import VDFProof
 from chia.types.full_block import FullBlock
 from chia.types.header_block import HeaderBlock
 from chia.util.block_cache import BlockCache
@@ -474,6 +475,87 @@ class TestWeightProof:
         assert valid
         assert fork_point != 0
 
+    @pytest.mark.anyio
+    async def test_weight_proof_incremental(
+        self, default_1000_blocks: List[FullBlock], blockchain_constants: ConsensusConstants
+    ) -> None:
+        blocks = default_1000_blocks
+        header_cache, height_to_hash, sub_blocks, summaries = await load_blocks_dont_validate(
+            blocks, blockchain_constants
+        )
+        block_cache = BlockCache(sub_blocks, header_cache, height_to_hash, summaries)
+        header_ranges: List[Tuple[int, int]] = []
+        get_header_blocks_in_range = block_cache.get_header_blocks_in_range
+
+        async def record_range(start: int, stop: int, tx_filter: bool = True) -> Dict[bytes32, HeaderBlock]:
+            header_ranges.append((start, stop))
+            # BlockCache returns all header blocks, unlike the blockchain
+            headers = await get_header_blocks_in_range(start, stop, tx_filter)
+            return {hh: hb for hh, hb in headers.items() if start <= hb.height <= stop}
+
+        block_cache.get_header_blocks_in_range = record_range  # type: ignore[method-assign]
+        wpf = WeightProofHandler(blockchain_constants, block_cache)
+        wpf_verify = WeightProofHandler(blockchain_constants, BlockCache(sub_blocks, header_cache, height_to_hash, {}))
+
+        wp = await wpf.get_proof_of_weight(blocks[-10].header_hash)
+        assert wp is not None
+        # the recent chain, followed by the blocks of the sampled sub epochs
+        assert header_ranges[0] == (wp.recent_chain_data[0].height, blocks[-10].height)
+
+        # only the new blocks of the recent chain are loaded. The sub epoch
+        # segments are cached
+        for block in blocks[-9:]:
+            header_ranges.clear()
+            wp = await wpf.get_proof_of_weight(block.header_hash)
+            assert wp is not None
+            assert header_ranges == [(block.height, block.height)]
+            assert wp.recent_chain_data[-1].header_hash == block.header_hash
+            valid, fork_point, _ = await wpf_verify.validate_weight_proof(wp)
+            assert valid
+            assert fork_point == 0
+            assert wp == await wpf._create_proof_of_weight(block.header_hash)
+
+        # recent proofs are cached
+        header_ranges.clear()
+        assert await wpf.get_proof_of_weight(blocks[-2].header_hash) is not None
+        assert header_ranges == []
+        assert wpf.stats.proofs_created == 10
+        assert wpf.stats.cache_hits == 1
+        assert wpf.stats.max_latency >= wpf.stats.last_latency > 0
+        assert wpf.stats.to_json_dict()["average_latency"] > 0
+
+    @pytest.mark.anyio
+    async def test_weight_proof_invalid_segment_vdf(
+        self, default_1000_blocks: List[FullBlock], blockchain_constants: ConsensusConstants
+    ) -> None:
+        blocks = default_1000_blocks
+        header_cache, height_to_hash, sub_blocks, summaries = await load_blocks_dont_validate(
+            blocks, blockchain_constants
+        )
+        wpf = WeightProofHandler(blockchain_constants, BlockCache(sub_blocks, header_cache, height_to_hash, summaries))
+        wp = await wpf.get_proof_of_weight(blocks[-1].header_hash)
+        assert wp is not None
+
+        wpf_verify = WeightProofHandler(
+            blockchain_constants, BlockCache(sub_blocks, header_cache, height_to_hash, {}), num_processes=2
+        )
+        valid, _, _ = await wpf_verify.validate_weight_proof(wp)
+        assert valid
+
+        # replace the infusion point proofs in all segments
+        bad_proof = VDFProof(uint8(0), b"\x00" * 100, False)
+        segments = [
+            segment.replace(
+                sub_slots=[
+                    ssd if ssd.cc_infusion_point is None else ssd.replace(cc_infusion_point=bad_proof)
+                    for ssd in segment.sub_slots
+                ]
+            )
+            for segment in wp.sub_epoch_segments
+        ]
+        valid, _, _ = await wpf_verify.validate_weight_proof(wp.replace(sub_epoch_segments=segments))
+        assert not valid
+
 
 @pytest.mark.parametrize("height,expected", [(0, 3), (5496000, 2), (10542000, 1), (15592000, 0), (20643000, 0)])
 def test_calculate_prefix_bits_clamp_zero(height: uint32, expected: int) -> None:
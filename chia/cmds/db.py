@@ -6,6 +6,7 @@ from typing import Optional
 import click
 
 from chia.cmds.db_backup_func import db_backup_func
+from chia.cmds.db_compress_func import db_compress_func
 from chia.cmds.db_upgrade_func import db_upgrade_func
 from chia.cmds.db_validate_func import db_validate_func
 
@@ -15,7 +16,7 @@ def db_cmd() -> None:
     pass
 
 
-@db_cmd.command("upgrade", help="upgrade a v1 database to v2")
+@db_cmd.command("upgrade", help="upgrade a v1 database to v2, or a v2 database (in place) to the latest layout")
 @click.option("--input", "in_db_path", default=None, type=click.Path(), help="specify input database file")
 @click.option("--output", "out_db_path", default=None, type=click.Path(), help="specify output database file")
 @click.option(
@@ -84,3 +85,36 @@ def db_backup_cmd(ctx: click.Context, db_backup_file: Optional[str], no_indexes:
         )
     except RuntimeError as e:
         print(f"FAILED: {e}")
+
+
+@db_cmd.command(
+    "compress",
+    help="compress blocks with a zstd dictionary trained from the blockchain. This can run while the node is running",
+)
+@click.option("--db", "in_db_path", default=None, type=click.Path(), help="Specifies which database file to compress")
+@click.option(
+    "--retrain",
+    default=False,
+    is_flag=True,
+    help="train a new dictionary, even if the database already has one",
+)
+@click.option(
+    "--samples", "num_samples", default=2000, type=int, show_default=True, help="number of blocks to train from"
+)
+@click.option(
+    "--batch-size", default=1000, type=int, show_default=True, help="number of blocks to recompress per transaction"
+)
+@click.pass_context
+def db_compress_cmd(
+    ctx: click.Context, in_db_path: Optional[str], retrain: bool, num_samples: int, batch_size: int
+) -> None:
+    try:
+        db_compress_func(
+            Path(ctx.obj["root_path"]),
+            None if in_db_path is None else Path(in_db_path),
+            retrain=retrain,
+            num_samples=num_samples,
+            batch_size=batch_size,
+        )
+    except (RuntimeError, ValueError) as e:
+        print(f"FAILED: {e}")
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from chia.util.config import load_config
+from chia.util.path import path_from_root
+
+
+def db_compress_func(
+    root_path: Path,
+    in_db_path: Optional[Path] = None,
+    *,
+    retrain: bool,
+    num_samples: int,
+    batch_size: int,
+) -> None:
+    if in_db_path is None:
+        config: Dict[str, Any] = load_config(root_path, "config.yaml")["full_node"]
+        selected_network: str = config["selected_network"]
+        db_pattern: str = config["database_path"]
+        db_path_replaced: str = db_pattern.replace("CHALLENGE", selected_network)
+        in_db_path = path_from_root(root_path, db_path_replaced)
+
+    asyncio.run(compress_db(in_db_path, retrain=retrain, num_samples=num_samples, batch_size=batch_size))
+
+    print(f"\n\nDatabase compression finished: {in_db_path}\n")
+
+
+async def compress_db(db_path: Path, *, retrain: bool, num_samples: int, batch_size: int) -> None:
+    from chia.full_node.block_store import BlockStore
+    from chia.util.db_version import lookup_db_version
+    from chia.util.db_wrapper import DBWrapper2
+
+    if not db_path.exists():
+        print(f"input file doesn't exist. {db_path}")
+        raise RuntimeError(f"can't find {db_path}")
+
+    print(f"opening file: {db_path}")
+    async with DBWrapper2.managed(database=db_path, reader_count=1, db_version=2) as db_wrapper:
+        async with db_wrapper.reader_no_transaction() as conn:
+            db_version = await lookup_db_version(conn)
+        if db_version != 2:
+            raise RuntimeError(f"Database has the wrong version ({db_version} expected 2)")
+
+        block_store = await BlockStore.create(db_wrapper, use_cache=False)
+
+        dict_id = block_store.compressor.current_dictionary_id
+        if retrain or dict_id == 0:
+            print(f"training compression dictionary from {num_samples} blocks")
+            dict_id = await block_store.train_compression_dictionary(num_samples)
+        print(f"compressing blocks with dictionary {dict_id}")
+
+        async for progress in block_store.recompress_blocks(batch_size):
+            if progress.bytes_before > 0:
+                ratio = progress.bytes_after / progress.bytes_before
+            else:
+                ratio = 1.0
+            print(
+                f"\r{progress.blocks_scanned:10d} blocks scanned, "
+                f"{progress.blocks_recompressed:10d} recompressed, "
+                f"{progress.bytes_before / 1000000:.1f} MB -> {progress.bytes_after / 1000000:.1f} MB ({ratio:.1%})",
+                end="",
+            )
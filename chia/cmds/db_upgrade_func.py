@@ -46,6 +46,14 @@ def db_upgrade_func(
         db_path_replaced = db_pattern.replace("CHALLENGE", selected_network)
         in_db_path = path_from_root(root_path, db_path_replaced)
 
+    if in_db_path.exists() and get_db_version(in_db_path) == 2:
+        # v2 databases are upgraded in place
+        try:
+            migrate_block_records(in_db_path)
+        except RuntimeError as e:
+            print(f"upgrade failed with error: {e}.")
+        return
+
     if out_db_path is None:
         db_path_replaced = db_pattern.replace("CHALLENGE", selected_network).replace("_v1_", "_v2_")
         out_db_path = path_from_root(root_path, db_path_replaced)
@@ -72,6 +80,7 @@ def db_upgrade_func(
 
     try:
         convert_v1_to_v2(in_db_path, out_db_path)
+        migrate_block_records(out_db_path)
 
         if update_config:
             print("updating config.yaml")
@@ -114,6 +123,98 @@ def db_upgrade_func(
     print(f"\n\nLEAVING PREVIOUS DB FILE UNTOUCHED {in_db_path}\n")
 
 
+def get_db_version(db_path: Path) -> int:
+    with closing(sqlite3.connect(db_path)) as conn:
+        try:
+            with closing(conn.execute("SELECT version FROM database_version LIMIT 1")) as cursor:
+                row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            return 1
+    if row is None:
+        return 1
+    version: int = row[0]
+    return version
+
+
+def migrate_block_records(db_path: Path) -> None:
+    """
+    Moves the block records of a v2 database out of the full_blocks table, into
+    the block_records table. The block_record column of full_blocks is left
+    in place, but cleared. The database is locked for the duration of the
+    migration, so it fails if a full node is using it.
+    """
+    from chia.consensus.block_record import BlockRecord
+    from chia.full_node.block_record_table import (
+        BLOCK_RECORD_NUM_COLUMNS,
+        BLOCK_RECORDS_HEIGHT_INDEX,
+        BLOCK_RECORDS_TABLE,
+        block_record_to_row,
+    )
+
+    BATCH_SIZE = 10_000
+
+    print(f"-- Opening file for upgrading: {db_path}")
+    with closing(sqlite3.connect(db_path)) as conn:
+        # a full node still using this database would keep writing its block
+        # records to the full_blocks table. Holding an exclusive lock fails if
+        # anyone else has the database open, and keeps it that way until we're
+        # done
+        conn.execute("PRAGMA locking_mode=exclusive")
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"the database is in use ({e}). Stop the full node before upgrading") from e
+        conn.commit()
+
+        with closing(
+            conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='block_records'")
+        ) as cursor:
+            if cursor.fetchone() is not None:
+                print("-- Block records are already migrated")
+                return
+
+        # the records are written to a separate table, which is renamed once
+        # it's complete. If the migration is interrupted, it starts over
+        conn.execute("DROP TABLE IF EXISTS block_records_migration")
+        conn.execute(BLOCK_RECORDS_TABLE.format(name="block_records_migration"))
+        conn.commit()
+
+        with closing(conn.execute("SELECT COUNT(*) FROM full_blocks")) as cursor:
+            row = cursor.fetchone()
+            total = 0 if row is None else row[0]
+
+        print("-- Migrating block records")
+        start_time = monotonic()
+        count = 0
+        last_rowid = 0
+        while True:
+            with closing(
+                conn.execute(
+                    "SELECT rowid, block_record FROM full_blocks WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, BATCH_SIZE),
+                )
+            ) as cursor:
+                rows = cursor.fetchall()
+            if len(rows) == 0:
+                break
+            conn.executemany(
+                f"INSERT OR IGNORE INTO block_records_migration VALUES({', '.join('?' * BLOCK_RECORD_NUM_COLUMNS)})",
+                [block_record_to_row(BlockRecord.from_bytes(row[1])) for row in rows],
+            )
+            conn.commit()
+            last_rowid = rows[-1][0]
+            count += len(rows)
+            print(f"\r{count:10d} {count * 100 / max(total, 1):.3f}%    ", end="")
+            sys.stdout.flush()
+
+        conn.execute("ALTER TABLE block_records_migration RENAME TO block_records")
+        conn.execute(BLOCK_RECORDS_HEIGHT_INDEX)
+        conn.execute("UPDATE full_blocks SET block_record=NULL")
+        conn.commit()
+        end_time = monotonic()
+        print(f"\r-- Migrating block records SUCCEEDED in {end_time - start_time:.2f} seconds")
+
+
 def convert_v1_to_v2(in_path: Path, out_path: Path) -> None:
     BATCH_SIZE = 300_000
     if not in_path.exists():
@@ -33,7 +33,8 @@ def validate_v2(in_path: Path, *, validate_blocks: bool) -> None:
     import sqlite3
     from contextlib import closing
 
-    import zstd
+    from chia.full_node.block_compression import BlockCompressor
+    from chia.full_node.block_record_table import BLOCK_RECORD_COLUMNS, block_record_from_row
 
     if not in_path.exists():
         print(f"input file doesn't exist. {in_path}")
@@ -83,13 +84,38 @@ def validate_v2(in_path: Path, *, validate_blocks: bool) -> None:
         num_orphans = 0
         height_to_hash = bytearray(peak_height * 32)
 
+        compressor = BlockCompressor()
+        if validate_blocks:
+            try:
+                with closing(in_db.execute("SELECT id, dict FROM block_compression_dicts")) as cursor:
+                    for dict_id, dict_data in cursor:
+                        compressor.add_dictionary(dict_id, dict_data)
+            except sqlite3.OperationalError:
+                # this database has never had its blocks compressed with a
+                # dictionary
+                pass
+
         with closing(
-            in_db.execute(
-                f"SELECT header_hash, prev_hash, height, in_main_chain"
-                f"{', block, block_record' if validate_blocks else ''} "
+            in_db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='block_records'")
+        ) as cursor:
+            split_block_records = cursor.fetchone() is not None
+
+        if not validate_blocks:
+            query = "SELECT header_hash, prev_hash, height, in_main_chain FROM full_blocks ORDER BY height DESC"
+        elif split_block_records:
+            block_record_columns = ", ".join(f"br.{column.strip()}" for column in BLOCK_RECORD_COLUMNS.split(","))
+            query = (
+                f"SELECT fb.header_hash, fb.prev_hash, fb.height, fb.in_main_chain, fb.block, {block_record_columns} "
+                "FROM full_blocks fb LEFT JOIN block_records br ON br.header_hash = fb.header_hash "
+                "ORDER BY fb.height DESC"
+            )
+        else:
+            query = (
+                "SELECT header_hash, prev_hash, height, in_main_chain, block, block_record "
                 "FROM full_blocks ORDER BY height DESC"
             )
-        ) as cursor:
+
+        with closing(in_db.execute(query)) as cursor:
             for row in cursor:
                 hh = row[0]
                 prev = row[1]
@@ -102,8 +128,13 @@ def validate_v2(in_path: Path, *, validate_blocks: bool) -> None:
                     continue
 
                 if validate_blocks:
-                    block = FullBlock.from_bytes(zstd.decompress(row[4]))
-                    block_record = BlockRecord.from_bytes(row[5])
+                    block = FullBlock.from_bytes(compressor.decompress(row[4]))
+                    if row[5] is None:
+                        raise RuntimeError(f"Block {hh.hex()} is missing its block record")
+                    if split_block_records:
+                        block_record = block_record_from_row(row[5:])
+                    else:
+                        block_record = BlockRecord.from_bytes(row[5])
                     actual_header_hash = block.header_hash
                     actual_prev_hash = block.prev_header_hash
                     if actual_header_hash != hh:
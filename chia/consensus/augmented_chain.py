@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from chia.consensus.block_record import BlockRecord
+from chia.consensus.blockchain_interface import BlockchainInterface
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
+from chia.types.full_block import FullBlock
+from chia.util.ints import uint32
+
+
+class AugmentedBlockchain(BlockchainInterface):
+    """
+    A view of the blockchain with additional blocks on top of the peak, that
+    have not been added to the underlying blockchain (yet). This allows
+    pre-validating blocks that build on blocks still in flight, e.g. while
+    the previous batch is being added to the blockchain during sync.
+
+    The additional blocks must form a chain extending the underlying main
+    chain. Block records added to this object (e.g. temporarily, during
+    pre-validation) are kept here as well, they never modify the underlying
+    blockchain.
+    """
+
+    _underlying: BlockchainInterface
+    _extra_blocks: Dict[bytes32, BlockRecord]
+    _height_to_hash: Dict[uint32, bytes32]
+    # the full blocks of the chain on top of the underlying blockchain, used
+    # to look up generators referenced by later blocks
+    full_blocks: Dict[bytes32, FullBlock]
+
+    def __init__(self, underlying: BlockchainInterface) -> None:
+        self._underlying = underlying
+        self._extra_blocks = {}
+        self._height_to_hash = {}
+        self.full_blocks = {}
+
+    def add_extra_block(self, block: FullBlock, block_record: BlockRecord) -> None:
+        self._extra_blocks[block_record.header_hash] = block_record
+        self._height_to_hash[block_record.height] = block_record.header_hash
+        self.full_blocks[block_record.header_hash] = block
+
+    def remove_extra_block(self, header_hash: bytes32) -> None:
+        block_record = self._extra_blocks.pop(header_hash, None)
+        self.full_blocks.pop(header_hash, None)
+        if block_record is not None and self._height_to_hash.get(block_record.height) == header_hash:
+            del self._height_to_hash[block_record.height]
+
+    def get_peak(self) -> Optional[BlockRecord]:
+        return self._underlying.get_peak()
+
+    def get_peak_height(self) -> Optional[uint32]:
+        return self._underlying.get_peak_height()
+
+    def block_record(self, header_hash: bytes32) -> BlockRecord:
+        ret = self._extra_blocks.get(header_hash)
+        if ret is not None:
+            return ret
+        return self._underlying.block_record(header_hash)
+
+    def height_to_block_record(self, height: uint32) -> BlockRecord:
+        header_hash = self.height_to_hash(height)
+        if header_hash is None:
+            raise ValueError(f"Height is not in blockchain: {height}")
+        return self.block_record(header_hash)
+
+    def height_to_hash(self, height: uint32) -> Optional[bytes32]:
+        ret = self._height_to_hash.get(height)
+        if ret is not None:
+            return ret
+        return self._underlying.height_to_hash(height)
+
+    def contains_height(self, height: uint32) -> bool:
+        return height in self._height_to_hash or self._underlying.contains_height(height)
+
+    def contains_block(self, header_hash: bytes32) -> bool:
+        return header_hash in self._extra_blocks or self._underlying.contains_block(header_hash)
+
+    async def contains_block_from_db(self, header_hash: bytes32) -> bool:
+        return header_hash in self._extra_blocks or await self._underlying.contains_block_from_db(header_hash)
+
+    def add_block_record(self, block_record: BlockRecord) -> None:
+        self._extra_blocks[block_record.header_hash] = block_record
+
+    def remove_block_record(self, header_hash: bytes32) -> None:
+        del self._extra_blocks[header_hash]
+
+    async def get_block_record_from_db(self, header_hash: bytes32) -> Optional[BlockRecord]:
+        ret = self._extra_blocks.get(header_hash)
+        if ret is not None:
+            return ret
+        return await self._underlying.get_block_record_from_db(header_hash)
+
+    def get_ses_heights(self) -> List[uint32]:
+        return self._underlying.get_ses_heights()
+
+    def get_ses(self, height: uint32) -> SubEpochSummary:
+        return self._underlying.get_ses(height)
@@ -11,8 +11,9 @@ from concurrent.futures.process import ProcessPoolExecutor
 from enum import Enum
 from multiprocessing.context import BaseContext
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
+from chia.consensus.augmented_chain import AugmentedBlockchain
 from chia.consensus.block_body_validation import ForkInfo, validate_block_body
 from chia.consensus.block_header_validation import validate_unfinished_header_block
 from chia.consensus.block_record import BlockRecord
@@ -28,6 +29,12 @@ from chia.consensus.multiprocess_validation import (
     pre_validate_blocks_multiprocessing,
 )
 from chia.full_node.block_height_map import BlockHeightMap
+from chia.full_node.block_record_snapshot import (
+    load_block_record_snapshot,
+    serialize_block_record_snapshot,
+    write_block_record_snapshot,
+    write_block_record_snapshot_sync,
+)
 from chia.full_node.block_store import BlockStore
 from chia.full_node.coin_store import CoinStore
 from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions
@@ -57,6 +64,10 @@ from chia.util.setproctitle import getproctitle, setproctitle
 
 log = logging.getLogger(__name__)
 
+# write the block record snapshot every this many new peaks (as well as on
+# shutdown)
+BLOCK_RECORD_SNAPSHOT_INTERVAL = 1000
+
 
 class AddBlockResult(Enum):
     """
@@ -108,12 +119,22 @@ class Blockchain(BlockchainInterface):
     block_store: BlockStore
     # Used to verify blocks in parallel
     pool: Executor
+    # the name of the SharedPairingCache the workers validate signatures with
+    shared_bls_cache_name: Optional[str]
     # Set holding seen compact proofs, in order to avoid duplicates.
     _seen_compact_proofs: Set[Tuple[VDFInfo, uint32]]
 
     # Whether blockchain is shut down or not
     _shut_down: bool
 
+    # the file the recent block records are saved to, to speed up startup
+    _block_record_snapshot_path: Path
+    # the number of new peaks since the snapshot was last written
+    _peaks_since_snapshot: int
+    # the peak height of the snapshot file, if there is one. Blocks added at or
+    # below this height are missing from the snapshot
+    _block_record_snapshot_height: Optional[uint32]
+
     # Lock to prevent simultaneous reads and writes
     priority_mutex: PriorityMutex[BlockchainMutexPriority]
     compact_proof_lock: asyncio.Lock
@@ -128,6 +149,7 @@ class Blockchain(BlockchainInterface):
         multiprocessing_context: Optional[BaseContext] = None,
         *,
         single_threaded: bool = False,
+        shared_bls_cache_name: Optional[str] = None,
     ) -> Blockchain:
         """
         Initializes a blockchain with the BlockRecords from disk, assuming they have all been
@@ -155,6 +177,7 @@ class Blockchain(BlockchainInterface):
         self.constants = consensus_constants
         self.coin_store = coin_store
         self.block_store = block_store
+        self.shared_bls_cache_name = shared_bls_cache_name
         self._shut_down = False
         await self._load_chain_from_store(blockchain_dir)
         self._seen_compact_proofs = set()
@@ -163,6 +186,13 @@ class Blockchain(BlockchainInterface):
     def shut_down(self) -> None:
         self._shut_down = True
         self.pool.shutdown(wait=True)
+        try:
+            snapshot = self._serialize_block_record_snapshot()
+            if snapshot is not None:
+                write_block_record_snapshot_sync(self._block_record_snapshot_path, snapshot)
+        except Exception as e:
+            log.error(f"failed to write block record snapshot: {e}")
+        self.__height_map.close()
 
     async def _load_chain_from_store(self, blockchain_dir: Path) -> None:
         """
@@ -171,7 +201,10 @@ class Blockchain(BlockchainInterface):
         self.__height_map = await BlockHeightMap.create(blockchain_dir, self.block_store.db_wrapper)
         self.__block_records = {}
         self.__heights_in_cache = {}
-        block_records, peak = await self.block_store.get_block_records_close_to_peak(self.constants.BLOCKS_CACHE_SIZE)
+        self._block_record_snapshot_path = blockchain_dir / "block-records"
+        self._peaks_since_snapshot = 0
+        self._block_record_snapshot_height = None
+        block_records, peak = await self._load_block_records_close_to_peak()
         for block in block_records.values():
             self.add_block_record(block)
 
@@ -185,6 +218,84 @@ class Blockchain(BlockchainInterface):
         assert self.__height_map.contains_height(self._peak_height)
         assert not self.__height_map.contains_height(uint32(self._peak_height + 1))
 
+    async def _load_block_records_close_to_peak(self) -> Tuple[Dict[bytes32, BlockRecord], Optional[bytes32]]:
+        """
+        Loads the block records within BLOCKS_CACHE_SIZE of the peak. They are
+        read from the snapshot file if its peak is in the main chain, then
+        only the blocks added after it are loaded from the database.
+        """
+        peak = await self.block_store.get_peak()
+        if peak is None:
+            return {}, None
+        peak_hash, peak_height = peak
+        min_height = peak_height - self.constants.BLOCKS_CACHE_SIZE
+
+        snapshot = load_block_record_snapshot(self._block_record_snapshot_path)
+        if snapshot is None:
+            return await self.block_store.get_block_records_close_to_peak(self.constants.BLOCKS_CACHE_SIZE)
+        self._block_record_snapshot_height = snapshot.peak_height
+        if (
+            snapshot.peak_height > peak_height
+            or self.__height_map.get_hash(snapshot.peak_height) != snapshot.peak_hash
+            or snapshot.peak_height < min_height
+        ):
+            log.info(f"block record snapshot at height {snapshot.peak_height} is not in the main chain, not using it")
+            return await self.block_store.get_block_records_close_to_peak(self.constants.BLOCKS_CACHE_SIZE)
+
+        block_records = {br.header_hash: br for br in snapshot.block_records if br.height >= min_height}
+        # the main chain in the snapshot must match the height-to-hash map
+        curr = block_records.get(snapshot.peak_hash)
+        while curr is not None and curr.height > min_height and curr.height > 0:
+            if self.__height_map.get_hash(curr.height) != curr.header_hash:
+                curr = None
+                break
+            curr = block_records.get(curr.prev_hash)
+        if curr is None:
+            log.info("block record snapshot does not match the blockchain, not using it")
+            return await self.block_store.get_block_records_close_to_peak(self.constants.BLOCKS_CACHE_SIZE)
+
+        from_snapshot = len(block_records)
+        if snapshot.peak_height < peak_height:
+            newer_records, _ = await self.block_store.get_block_records_close_to_peak(
+                peak_height - snapshot.peak_height - 1
+            )
+            block_records.update(newer_records)
+        log.info(
+            f"loaded {len(block_records)} block records, of which "
+            f"{from_snapshot} from snapshot at height {snapshot.peak_height}"
+        )
+        return block_records, peak_hash
+
+    def _serialize_block_record_snapshot(self) -> Optional[bytes]:
+        peak = self.get_peak()
+        if peak is None:
+            return None
+        min_height = peak.height - self.constants.BLOCKS_CACHE_SIZE
+        block_records = sorted(
+            (br for br in self.__block_records.values() if br.height >= min_height), key=lambda br: br.height
+        )
+        return serialize_block_record_snapshot(peak.header_hash, peak.height, block_records)
+
+    async def _maybe_write_block_record_snapshot(self) -> None:
+        self._peaks_since_snapshot += 1
+        if self._peaks_since_snapshot < BLOCK_RECORD_SNAPSHOT_INTERVAL:
+            return
+        self._peaks_since_snapshot = 0
+        peak = self.get_peak()
+        snapshot = self._serialize_block_record_snapshot()
+        if peak is not None and snapshot is not None:
+            await write_block_record_snapshot(self._block_record_snapshot_path, snapshot)
+            self._block_record_snapshot_height = peak.height
+
+    def _invalidate_block_record_snapshot(self, height: uint32) -> None:
+        # only the blocks above the snapshot's peak are loaded from the
+        # database, so a block added at or below it would be missing from the
+        # cache after a restart
+        if self._block_record_snapshot_height is None or height > self._block_record_snapshot_height:
+            return
+        self._block_record_snapshot_path.unlink(missing_ok=True)
+        self._block_record_snapshot_height = None
+
     def get_peak(self) -> Optional[BlockRecord]:
         """
         Return the peak of the blockchain
@@ -465,15 +576,17 @@ class Blockchain(BlockchainInterface):
         previous_peak_height = self._peak_height
 
         try:
-            # Always add the block to the database
-            async with self.block_store.db_wrapper.writer():
-                # Perform the DB operations to update the state, and rollback if something goes wrong
-                await self.block_store.add_full_block(header_hash, block, block_record)
-                records, state_change_summary = await self._reconsider_peak(block_record, genesis, fork_info)
-
-                # Then update the memory cache. It is important that this is not cancelled and does not throw
-                # This is done after all async/DB operations, so there is a decreased chance of failure.
-                self.add_block_record(block_record)
+            # Always add the block to the database. If the coin store caches
+            # changes, those are rolled back too, if something goes wrong
+            with self.coin_store.unspent_cache_transaction():
+                async with self.block_store.db_wrapper.writer():
+                    # Perform the DB operations to update the state, and rollback if something goes wrong
+                    await self.block_store.add_full_block(header_hash, block, block_record)
+                    records, state_change_summary = await self._reconsider_peak(block_record, genesis, fork_info)
+
+                    # Then update the memory cache. It is important that this is not cancelled and does not throw
+                    # This is done after all async/DB operations, so there is a decreased chance of failure.
+                    self.add_block_record(block_record)
 
             # there's a suspension point here, as we leave the async context
             # manager
@@ -509,7 +622,10 @@ class Blockchain(BlockchainInterface):
             raise
 
         # This is done outside the try-except in case it fails, since we do not want to revert anything if it does
+        self._invalidate_block_record_snapshot(block.height)
         await self.__height_map.maybe_flush()
+        if state_change_summary is not None:
+            await self._maybe_write_block_record_snapshot()
 
         if state_change_summary is not None:
             # new coin records added
@@ -801,18 +917,39 @@ class Blockchain(BlockchainInterface):
         wp_summaries: Optional[List[SubEpochSummary]] = None,
         *,
         validate_signatures: bool,
+        augmented_chain: Optional[AugmentedBlockchain] = None,
     ) -> List[PreValidationResult]:
+        """
+        If augmented_chain is specified, the blocks are validated on top of the
+        additional blocks in it, rather than on top of this blockchain.
+        """
+        block_records: BlockchainInterface = self
+        get_block_generator: Callable[[BlockInfo, Dict[bytes32, FullBlock]], Awaitable[Optional[BlockGenerator]]] = (
+            self.get_block_generator
+        )
+        if augmented_chain is not None:
+            block_records = augmented_chain
+            extra_blocks = augmented_chain.full_blocks
+
+            async def get_generator_with_extra_blocks(
+                block: BlockInfo, additional_blocks: Dict[bytes32, FullBlock]
+            ) -> Optional[BlockGenerator]:
+                return await self.get_block_generator(block, {**extra_blocks, **additional_blocks})
+
+            get_block_generator = get_generator_with_extra_blocks
+
         return await pre_validate_blocks_multiprocessing(
             self.constants,
-            self,
+            block_records,
             blocks,
             self.pool,
             True,
             npc_results,
-            self.get_block_generator,
+            get_block_generator,
             batch_size,
             wp_summaries,
             validate_signatures=validate_signatures,
+            shared_bls_cache_name=self.shared_bls_cache_name,
         )
 
     async def run_generator(self, unfinished_block: bytes, generator: BlockGenerator, height: uint32) -> NPCResult:
@@ -1071,26 +1208,19 @@ class Blockchain(BlockchainInterface):
         if len(ref_list) == 0:
             return BlockGenerator(block.transactions_generator, [], [])
 
-        result: List[SerializedProgram] = []
-        previous_br = await self.get_block_record_from_db(block.prev_header_hash)
-        if previous_br is not None and self.height_to_hash(previous_br.height) == block.prev_header_hash:
-            # We are not in a reorg, no need to look up alternate header hashes
-            # (we can get them from height_to_hash)
-            # in the v2 database, we can look up blocks by height directly
-            # (as long as we're in the main chain)
-            result = await self.block_store.get_generators_at(block.transactions_generator_ref_list)
-        else:
-            # First tries to find the blocks in additional_blocks
-            curr = block
-            additional_height_dict = {}
-            while curr.prev_header_hash in additional_blocks:
-                prev: FullBlock = additional_blocks[curr.prev_header_hash]
-                additional_height_dict[prev.height] = prev
-                curr = prev
-
+        # First tries to find the blocks in additional_blocks
+        curr = block
+        additional_height_dict: Dict[uint32, FullBlock] = {}
+        while curr.prev_header_hash in additional_blocks:
+            prev: FullBlock = additional_blocks[curr.prev_header_hash]
+            additional_height_dict[prev.height] = prev
+            curr = prev
+
+        reorg_chain: Dict[uint32, bytes32] = {}
+        prev_block_record = await self.get_block_record_from_db(curr.prev_header_hash)
+        if prev_block_record is None or self.height_to_hash(prev_block_record.height) != curr.prev_header_hash:
+            # We are in a reorg, we need to look up the alternate header hashes
             peak: Optional[BlockRecord] = self.get_peak()
-            prev_block_record = await self.get_block_record_from_db(curr.prev_header_hash)
-            reorg_chain: Dict[uint32, bytes32] = {}
             if prev_block_record is not None and peak is not None:
                 # Then we look up blocks up to fork point one at a time, backtracking
                 height_to_hash, _ = await lookup_fork_chain(
@@ -1101,19 +1231,28 @@ class Blockchain(BlockchainInterface):
                 )
                 reorg_chain.update(height_to_hash)
 
-            for ref_height in block.transactions_generator_ref_list:
-                if ref_height in additional_height_dict:
-                    ref_block = additional_height_dict[ref_height]
-                    if ref_block.transactions_generator is None:
-                        raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
-                    result.append(ref_block.transactions_generator)
-                elif ref_height in reorg_chain:
-                    gen = await self.block_store.get_generator(reorg_chain[ref_height])
-                    if gen is None:
-                        raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
-                    result.append(gen)
-                else:
-                    [gen] = await self.block_store.get_generators_at([ref_height])
-                    result.append(gen)
+        # the remaining blocks are in the main chain. In the v2 database, we can
+        # look up blocks by height directly. Note that the additional blocks
+        # may not have been committed to the database yet, so they must not be
+        # looked up here
+        main_chain_heights = [h for h in ref_list if h not in additional_height_dict and h not in reorg_chain]
+        main_chain_generators = dict(
+            zip(main_chain_heights, await self.block_store.get_generators_at(main_chain_heights))
+        )
+
+        result: List[SerializedProgram] = []
+        for ref_height in ref_list:
+            if ref_height in additional_height_dict:
+                ref_block = additional_height_dict[ref_height]
+                if ref_block.transactions_generator is None:
+                    raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
+                result.append(ref_block.transactions_generator)
+            elif ref_height in reorg_chain:
+                gen = await self.block_store.get_generator(reorg_chain[ref_height])
+                if gen is None:
+                    raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
+                result.append(gen)
+            else:
+                result.append(main_chain_generators[ref_height])
         assert len(result) == len(ref_list)
         return BlockGenerator(block.transactions_generator, result, [])
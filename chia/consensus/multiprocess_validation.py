@@ -29,6 +29,7 @@ from chia.types.full_block import FullBlock
 from chia.types.generator_types import BlockGenerator
 from chia.types.unfinished_block import UnfinishedBlock
 from chia.util.block_cache import BlockCache
+from chia.util.cached_bls import BLSCache, worker_bls_cache
 from chia.util.condition_tools import pkm_pairs
 from chia.util.errors import Err, ValidationError
 from chia.util.generator_tools import get_block_header, tx_removals_and_additions
@@ -58,7 +59,11 @@ def batch_pre_validate_blocks(
     expected_difficulty: List[uint64],
     expected_sub_slot_iters: List[uint64],
     validate_signatures: bool,
+    shared_bls_cache_name: Optional[str] = None,
 ) -> List[bytes]:
+    bls_cache: Optional[BLSCache] = None
+    if shared_bls_cache_name is not None:
+        bls_cache = worker_bls_cache(shared_bls_cache_name)
     blocks: Dict[bytes32, BlockRecord] = {}
     for k, v in blocks_pickled.items():
         blocks[bytes32(k)] = BlockRecord.from_bytes_unchecked(v)
@@ -126,9 +131,17 @@ def batch_pre_validate_blocks(
                     if npc_result is not None and block.transactions_info is not None:
                         assert npc_result.conds
                         pairs_pks, pairs_msgs = pkm_pairs(npc_result.conds, constants.AGG_SIG_ME_ADDITIONAL_DATA)
-                        if not AugSchemeMPL.aggregate_verify(
-                            pairs_pks, pairs_msgs, block.transactions_info.aggregated_signature
-                        ):
+                        if bls_cache is not None:
+                            # pairings of transactions that were validated
+                            # by the mempool are likely in the shared cache
+                            valid = bls_cache.aggregate_verify(
+                                pairs_pks, pairs_msgs, block.transactions_info.aggregated_signature
+                            )
+                        else:
+                            valid = AugSchemeMPL.aggregate_verify(
+                                pairs_pks, pairs_msgs, block.transactions_info.aggregated_signature
+                            )
+                        if not valid:
                             error_int = uint16(Err.BAD_AGGREGATE_SIGNATURE.value)
                         else:
                             successfully_validated_signatures = True
@@ -165,6 +178,7 @@ async def pre_validate_blocks_multiprocessing(
     wp_summaries: Optional[List[SubEpochSummary]] = None,
     *,
     validate_signatures: bool = True,
+    shared_bls_cache_name: Optional[str] = None,
 ) -> List[PreValidationResult]:
     """
     This method must be called under the blockchain lock
@@ -180,6 +194,8 @@ async def pre_validate_blocks_multiprocessing(
         blocks: list of full blocks to validate (must be connected to current chain)
         npc_results
         get_block_generator
+        shared_bls_cache_name: the name of a SharedPairingCache, for the
+            workers to validate signatures with
     """
     prev_b: Optional[BlockRecord] = None
     # Collects all the recent blocks (up to the previous sub-epoch)
@@ -354,6 +370,7 @@ async def pre_validate_blocks_multiprocessing(
                 [diff_ssis[j][0] for j in range(i, end_i)],
                 [diff_ssis[j][1] for j in range(i, end_i)],
                 validate_signatures,
+                shared_bls_cache_name,
             )
         )
     # Collect all results into one flat list
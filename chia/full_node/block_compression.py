@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import Dict, List, Optional
+
+import zstandard
+import zstd
+
+# the size of trained dictionaries. Larger dictionaries don't compress blocks
+# meaningfully better
+BLOCK_DICT_SIZE = 64 * 1024
+
+# the zstd compression level, this matches the default of zstd.compress()
+COMPRESSION_LEVEL = 3
+
+
+class UnknownDictionaryError(Exception):
+    def __init__(self, dict_id: int) -> None:
+        super().__init__(f"block is compressed with unknown dictionary {dict_id}")
+        self.dict_id = dict_id
+
+
+def frame_dictionary_id(blob: bytes) -> int:
+    """
+    Returns the ID of the dictionary the zstd frame was compressed with, or 0
+    if it was compressed without a dictionary. This serves as the per-row
+    marker of how a block in the full_blocks table is compressed.
+    """
+    return zstandard.get_frame_parameters(blob).dict_id
+
+
+def train_block_dictionary(samples: List[bytes], dict_id: int, dict_size: int = BLOCK_DICT_SIZE) -> bytes:
+    """
+    Trains a zstd dictionary from the serialized blocks in samples. The
+    dict_id is embedded in the dictionary and in every frame compressed with
+    it. It must be greater than 0.
+    """
+    assert dict_id > 0
+    return zstandard.train_dictionary(dict_size, samples, dict_id=dict_id, level=COMPRESSION_LEVEL).as_bytes()
+
+
+@dataclasses.dataclass
+class BlockCompressor:
+    """
+    Compresses and decompresses blocks stored in the full_blocks table. Blocks
+    are compressed with the most recent dictionary, if there is one. Any
+    block can be decompressed, as long as the dictionary it was compressed
+    with has been added.
+
+    zstandard compressor and decompressor objects are not thread safe, so
+    instances of this class must not be shared across threads.
+    """
+
+    _dictionaries: Dict[int, zstandard.ZstdCompressionDict] = dataclasses.field(default_factory=dict)
+    _decompressors: Dict[int, zstandard.ZstdDecompressor] = dataclasses.field(default_factory=dict)
+    _compressor: Optional[zstandard.ZstdCompressor] = None
+
+    @property
+    def current_dictionary_id(self) -> int:
+        """
+        The ID of the dictionary new blocks are compressed with, or 0 if
+        they're compressed without a dictionary.
+        """
+        return max(self._dictionaries.keys(), default=0)
+
+    def has_dictionary(self, dict_id: int) -> bool:
+        return dict_id in self._dictionaries
+
+    def add_dictionary(self, dict_id: int, dict_data: bytes) -> None:
+        dictionary = zstandard.ZstdCompressionDict(dict_data, dict_type=zstandard.DICT_TYPE_FULLDICT)
+        if dictionary.dict_id() != dict_id:
+            raise ValueError(f"dictionary {dict_id} has mismatching ID {dictionary.dict_id()}")
+        self._dictionaries[dict_id] = dictionary
+        self._decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        if dict_id == self.current_dictionary_id:
+            dictionary.precompute_compress(level=COMPRESSION_LEVEL)
+            self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dictionary)
+
+    def compress(self, block_bytes: bytes) -> bytes:
+        if self._compressor is None:
+            ret: bytes = zstd.compress(block_bytes)
+            return ret
+        return self._compressor.compress(block_bytes)
+
+    def decompress(self, blob: bytes) -> bytes:
+        dict_id = frame_dictionary_id(blob)
+        if dict_id == 0:
+            ret: bytes = zstd.decompress(blob)
+            return ret
+        decompressor = self._decompressors.get(dict_id)
+        if decompressor is None:
+            raise UnknownDictionaryError(dict_id)
+        return decompressor.decompress(blob)
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+import time
+from typing import Any, AsyncGenerator, Callable, Coroutine, Dict, List, Optional, Set, Tuple
+
+from chia.server.ws_connection import WSChiaConnection
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.full_block import FullBlock
+
+log = logging.getLogger(__name__)
+
+# the weight of a new measurement in the moving averages of peer performance
+EWMA_WEIGHT = 0.3
+
+RequestBlocksFunction = Callable[[WSChiaConnection, int, int], Coroutine[Any, Any, Optional[List[FullBlock]]]]
+
+
+@dataclasses.dataclass
+class PeerFetchStats:
+    # the number of blocks to request from this peer at a time
+    batch_size: int
+    # moving average of the time it takes the peer to respond to a request
+    latency: Optional[float] = None
+    # moving average of the rate the peer delivers blocks at
+    blocks_per_second: Optional[float] = None
+    requests: int = 0
+    failures: int = 0
+    # the number of requests that were re-issued to another peer because this
+    # peer was too slow
+    stragglers: int = 0
+
+    def record_response(self, num_blocks: int, elapsed: float) -> None:
+        self.requests += 1
+        self._update(num_blocks, elapsed)
+
+    def record_straggler(self, num_blocks: int, elapsed: float) -> None:
+        # the peer didn't deliver in time, so it's at most this fast
+        self.stragglers += 1
+        elapsed = max(elapsed, 0.001)
+        rate = num_blocks / elapsed
+        if self.latency is None or self.latency < elapsed:
+            self.latency = elapsed
+        if self.blocks_per_second is None or self.blocks_per_second > rate:
+            self.blocks_per_second = rate
+
+    def record_failure(self) -> None:
+        self.failures += 1
+
+    def _update(self, num_blocks: int, elapsed: float) -> None:
+        elapsed = max(elapsed, 0.001)
+        rate = num_blocks / elapsed
+        if self.latency is None or self.blocks_per_second is None:
+            self.latency = elapsed
+            self.blocks_per_second = rate
+        else:
+            self.latency += EWMA_WEIGHT * (elapsed - self.latency)
+            self.blocks_per_second += EWMA_WEIGHT * (rate - self.blocks_per_second)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return dataclasses.asdict(self)
+
+
+@dataclasses.dataclass
+class _BlockRange:
+    # inclusive, like RequestBlocks
+    start: int
+    end: int
+    # the requests in flight for this range, with the peer and time they were
+    # sent. There's more than one if the range was re-issued to another peer
+    requests: Dict[asyncio.Task[Optional[List[FullBlock]]], Tuple[WSChiaConnection, float]] = dataclasses.field(
+        default_factory=dict
+    )
+    # the peers that failed to deliver this range, so it's not requested from
+    # them again
+    failed_peers: Set[bytes32] = dataclasses.field(default_factory=set)
+    result: Optional[Tuple[WSChiaConnection, List[FullBlock]]] = None
+
+    def num_blocks(self) -> int:
+        return self.end - self.start + 1
+
+    def peer_ids(self) -> Set[bytes32]:
+        return {peer.peer_node_id for peer, _ in self.requests.values()}
+
+
+class BlockFetchScheduler:
+    """
+    Fetches a range of blocks from all peers that have them, with several
+    requests in flight at a time, and yields the batches of blocks in order.
+
+    Each peer has (at most) one request in flight. The number of blocks
+    requested from a peer adapts to how fast it has delivered blocks so far,
+    so a request takes about target_request_time. If the request for the
+    lowest range (that all subsequent batches wait for) is taking much longer
+    than the fastest peer would need, it's re-issued to the fastest idle peer,
+    and whichever response arrives first is used.
+    """
+
+    start_height: int
+    end_height: int
+    peer_stats: Dict[bytes32, PeerFetchStats]
+
+    def __init__(
+        self,
+        start_height: int,
+        end_height: int,
+        get_peers: Callable[[], List[WSChiaConnection]],
+        request_blocks: RequestBlocksFunction,
+        *,
+        max_batch_size: int,
+        max_in_flight: int,
+        min_batch_size: int = 1,
+        target_request_time: float = 5.0,
+        straggler_factor: float = 3.0,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.start_height = start_height
+        self.end_height = end_height
+        self._get_peers = get_peers
+        self._request_blocks = request_blocks
+        self._max_batch_size = max_batch_size
+        self._min_batch_size = min(min_batch_size, max_batch_size)
+        self._max_in_flight = max_in_flight
+        self._target_request_time = target_request_time
+        self._straggler_factor = straggler_factor
+        self._poll_interval = poll_interval
+        self.peer_stats = {}
+
+    def _stats(self, peer: WSChiaConnection) -> PeerFetchStats:
+        stats = self.peer_stats.get(peer.peer_node_id)
+        if stats is None:
+            stats = PeerFetchStats(self._max_batch_size)
+            self.peer_stats[peer.peer_node_id] = stats
+        return stats
+
+    def _speed(self, peer: WSChiaConnection) -> float:
+        # peers we haven't measured yet go first, to find out how fast they are
+        bps = self._stats(peer).blocks_per_second
+        return float("inf") if bps is None else bps
+
+    def _measured_speed(self, peer: WSChiaConnection) -> float:
+        bps = self._stats(peer).blocks_per_second
+        return 0.0 if bps is None else bps
+
+    def _update_batch_size(self, stats: PeerFetchStats) -> None:
+        if stats.blocks_per_second is None:
+            return
+        size = int(stats.blocks_per_second * self._target_request_time)
+        stats.batch_size = max(self._min_batch_size, min(self._max_batch_size, size))
+
+    def _straggling(self, block_range: _BlockRange, now: float) -> bool:
+        rates = [s.blocks_per_second for s in self.peer_stats.values() if s.blocks_per_second is not None]
+        if len(rates) == 0 or len(block_range.requests) == 0:
+            return False
+        expected = block_range.num_blocks() / max(rates)
+        sent = min(t for _, t in block_range.requests.values())
+        return now - sent > self._straggler_factor * expected
+
+    def _send(self, block_range: _BlockRange, peer: WSChiaConnection) -> None:
+        task = asyncio.create_task(self._request_blocks(peer, block_range.start, block_range.end))
+        block_range.requests[task] = (peer, time.monotonic())
+
+    def _on_done(self, block_range: _BlockRange, task: asyncio.Task[Optional[List[FullBlock]]]) -> None:
+        # the range may already have been settled by another request that
+        # completed in the same round, which also took this one out of requests
+        entry = block_range.requests.pop(task, None)
+        if entry is None or block_range.result is not None:
+            return
+        peer, sent = entry
+        elapsed = time.monotonic() - sent
+        stats = self._stats(peer)
+        blocks: Optional[List[FullBlock]] = None
+        if not task.cancelled():
+            exception = task.exception()
+            if exception is not None:
+                log.info(f"failed fetching blocks {block_range.start} to {block_range.end} from peer: {exception}")
+            else:
+                blocks = task.result()
+
+        if (
+            blocks is None
+            or len(blocks) != block_range.num_blocks()
+            or blocks[0].height != block_range.start
+            or blocks[-1].height != block_range.end
+        ):
+            stats.record_failure()
+            block_range.failed_peers.add(peer.peer_node_id)
+            return
+
+        stats.record_response(len(blocks), elapsed)
+        self._update_batch_size(stats)
+        block_range.result = (peer, blocks)
+        # any other request for this range lost the race
+        for other_task, (other_peer, other_sent) in block_range.requests.items():
+            other_task.cancel()
+            other_stats = self._stats(other_peer)
+            other_stats.record_straggler(block_range.num_blocks(), time.monotonic() - other_sent)
+            self._update_batch_size(other_stats)
+        block_range.requests.clear()
+
+    async def batches(self) -> AsyncGenerator[Tuple[WSChiaConnection, List[FullBlock]], None]:
+        # the ranges that have been requested but not yielded yet, by start height
+        ranges: Dict[int, _BlockRange] = {}
+        # the next height to request
+        next_height = self.start_height
+        # the next height to yield
+        next_yield = self.start_height
+        try:
+            while next_yield <= self.end_height:
+                head = ranges.get(next_yield)
+                if head is not None and head.result is not None:
+                    del ranges[next_yield]
+                    next_yield = head.end + 1
+                    yield head.result
+                    continue
+
+                peers = [p for p in self._get_peers() if not p.closed]
+                busy: Set[bytes32] = set()
+                for block_range in ranges.values():
+                    busy |= block_range.peer_ids()
+                idle = sorted((p for p in peers if p.peer_node_id not in busy), key=self._speed, reverse=True)
+
+                # ranges whose request failed are retried first, lowest first
+                for start in sorted(ranges.keys()):
+                    block_range = ranges[start]
+                    if block_range.result is not None or len(block_range.requests) > 0:
+                        continue
+                    candidates = [p for p in idle if p.peer_node_id not in block_range.failed_peers]
+                    if len(candidates) > 0:
+                        idle.remove(candidates[0])
+                        self._send(block_range, candidates[0])
+                    elif all(p.peer_node_id in block_range.failed_peers for p in peers):
+                        log.error(f"failed fetching {block_range.start} to {block_range.end} from peers")
+                        return
+
+                while len(idle) > 0 and next_height <= self.end_height and len(ranges) < self._max_in_flight:
+                    peer = idle.pop(0)
+                    end = min(self.end_height, next_height + self._stats(peer).batch_size - 1)
+                    block_range = _BlockRange(next_height, end)
+                    ranges[next_height] = block_range
+                    self._send(block_range, peer)
+                    next_height = end + 1
+
+                head = ranges.get(next_yield)
+                if head is not None and self._straggling(head, time.monotonic()):
+                    candidates = [p for p in idle if p.peer_node_id not in head.failed_peers]
+                    fastest = max(candidates, key=self._measured_speed, default=None)
+                    # only re-issue to a peer that's known to be faster than
+                    # the ones already working on it
+                    slowest = min(self._measured_speed(p) for p, _ in head.requests.values())
+                    if fastest is not None and self._measured_speed(fastest) > slowest:
+                        log.info(f"re-requesting straggling blocks {head.start} to {head.end} from another peer")
+                        self._send(head, fastest)
+
+                tasks = {task: block_range for block_range in ranges.values() for task in block_range.requests}
+                if len(tasks) == 0:
+                    log.error(f"failed fetching blocks from height {next_yield}, no peers to fetch from")
+                    return
+                done, _ = await asyncio.wait(
+                    tasks.keys(), timeout=self._poll_interval, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    self._on_done(tasks[task], task)
+        finally:
+            for block_range in ranges.values():
+                for task in block_range.requests:
+                    task.cancel()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import logging
+import mmap
+import os
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -16,6 +18,14 @@ from chia.util.streamable import Streamable, streamable
 
 log = logging.getLogger(__name__)
 
+# when the height-to-hash file needs to grow while adding blocks, grow it by at
+# least this many heights at a time, to not remap it for every block
+GROWTH_HEIGHTS = 4096
+
+# the dirty pages of the height-to-hash file are synced to disk, and the sub
+# epoch summaries file is written, every this many updated heights
+FLUSH_INTERVAL = 1000
+
 
 @streamable
 @dataclass(frozen=True)
@@ -32,8 +42,15 @@ class BlockHeightMap:
     # Defines the path from genesis to the peak, no orphan blocks
     # this buffer contains all block hashes that are part of the current peak
     # ordered by height. i.e. __height_to_hash[0..32] is the genesis hash
-    # __height_to_hash[32..64] is the hash for height 1 and so on
-    __height_to_hash: bytearray
+    # __height_to_hash[32..64] is the hash for height 1 and so on.
+    # It's a shared memory map of the height-to-hash file, so updates are
+    # written to the file in place, by the OS. The file (and the map) may be
+    # larger than the chain, only the first __height_count hashes are valid.
+    # It's None until the chain has any blocks
+    __height_to_hash: Optional[mmap.mmap]
+
+    # the number of heights in the map, i.e. the peak height + 1
+    __height_count: int
 
     # All sub-epoch summaries that have been included in the blockchain from the beginning until and including the peak
     # (height_included, SubEpochSummary). Note: ONLY for the blocks in the path to the peak
@@ -64,7 +81,8 @@ class BlockHeightMap:
 
         self.__counter = 0
         self.__first_dirty = 0
-        self.__height_to_hash = bytearray()
+        self.__height_to_hash = None
+        self.__height_count = 0
         self.__sub_epoch_summaries = {}
         self.__height_to_hash_filename = blockchain_dir / "height-to-hash"
         self.__ses_filename = blockchain_dir / "sub-epoch-summaries"
@@ -85,14 +103,6 @@ class BlockHeightMap:
                     log.info("blockchain database is missing blocks. Not loading height-to-hash or sub-epoch-summaries")
                     return self
 
-        try:
-            async with aiofiles.open(self.__height_to_hash_filename, "rb") as f:
-                self.__height_to_hash = bytearray(await f.read())
-        except Exception as e:
-            # it's OK if this file doesn't exist, we can rebuild it
-            log.info(f"Failed to load height-to-hash: {e}")
-            pass
-
         try:
             async with aiofiles.open(self.__ses_filename, "rb") as f:
                 self.__sub_epoch_summaries = {k: v for (k, v) in SesCache.from_bytes(await f.read()).content}
@@ -105,14 +115,11 @@ class BlockHeightMap:
         prev_hash: bytes32 = row[1]
         height = row[2]
 
-        # allocate memory for height to hash map
-        # this may also truncate it, if thie file on disk had an invalid size
-        new_size = (height + 1) * 32
-        size = len(self.__height_to_hash)
-        if size > new_size:
-            del self.__height_to_hash[new_size:]
-        else:
-            self.__height_to_hash += bytearray([0] * (new_size - size))
+        # map the height-to-hash file, extending it if it's too small. It's OK
+        # if it doesn't exist (or is invalid), we can rebuild it. Any hashes
+        # beyond the peak are ignored
+        self.__height_count = height + 1
+        self.__map_file(self.__height_count)
 
         self.__first_dirty = height + 1
 
@@ -123,8 +130,7 @@ class BlockHeightMap:
             self.__sub_epoch_summaries[height] = row[3]
 
         log.info(
-            f"Loaded sub-epoch-summaries: {len(self.__sub_epoch_summaries)} "
-            f"height-to-hash: {len(self.__height_to_hash)//32}"
+            f"Loaded sub-epoch-summaries: {len(self.__sub_epoch_summaries)} height-to-hash: {self.__height_count}"
         )
 
         # prepopulate the height -> hash mapping
@@ -136,39 +142,73 @@ class BlockHeightMap:
 
         return self
 
+    def __map_file(self, min_heights: int, growth: int = 0) -> None:
+        """
+        (re-)maps the height-to-hash file, making sure it holds at least
+        min_heights hashes. If the file needs to grow, it grows by at least
+        growth heights. The file is never truncated.
+        """
+        if self.__height_to_hash is not None:
+            if len(self.__height_to_hash) >= min_heights * 32:
+                return
+            # the file can't be resized while it's mapped (on Windows)
+            self.__height_to_hash.close()
+            self.__height_to_hash = None
+
+        os.makedirs(self.__height_to_hash_filename.parent, exist_ok=True)
+        fd = os.open(self.__height_to_hash_filename, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o600)
+        try:
+            size = os.fstat(fd).st_size
+            if size < min_heights * 32:
+                size = max(min_heights, size // 32 + growth) * 32
+                os.ftruncate(fd, size)
+            elif size % 32 != 0:
+                # an invalid size, the last (partial) hash is ignored
+                size -= size % 32
+            self.__height_to_hash = mmap.mmap(fd, size)
+        finally:
+            # the map keeps its own reference to the file
+            os.close(fd)
+
     def update_height(self, height: uint32, header_hash: bytes32, ses: Optional[SubEpochSummary]) -> None:
         # we're only updating the last hash. If we've reorged, we already rolled
         # back, making this the new peak
-        assert height * 32 <= len(self.__height_to_hash)
+        assert height <= self.__height_count
+        if height == self.__height_count:
+            self.__map_file(height + 1, GROWTH_HEIGHTS)
+            self.__height_count += 1
         self.__set_hash(height, header_hash)
         if ses is not None:
             self.__sub_epoch_summaries[height] = bytes(ses)
 
     async def maybe_flush(self) -> None:
-        if self.__counter < 1000:
+        if self.__counter < FLUSH_INTERVAL:
             return
 
-        assert (len(self.__height_to_hash) % 32) == 0
-        offset = self.__first_dirty * 32
-
         ses_buf = bytes(SesCache([(k, v) for (k, v) in self.__sub_epoch_summaries.items()]))
 
         self.__counter = 0
 
-        try:
-            async with aiofiles.open(self.__height_to_hash_filename, "r+b") as f:
-                map_buf = self.__height_to_hash[offset:].copy()
-                await f.seek(offset)
-                await f.write(map_buf)
-        except Exception:
-            # if the file doesn't exist, write the whole buffer
-            async with aiofiles.open(self.__height_to_hash_filename, "wb") as f:
-                map_buf = self.__height_to_hash.copy()
-                await f.write(map_buf)
-
-        self.__first_dirty = len(self.__height_to_hash) // 32
+        # the hashes are already written to the file (map). Make sure the
+        # dirty pages make it to disk. The offset must be page aligned
+        if self.__height_to_hash is not None and self.__first_dirty < self.__height_count:
+            offset = self.__first_dirty * 32
+            offset -= offset % mmap.ALLOCATIONGRANULARITY
+            self.__height_to_hash.flush(offset, self.__height_count * 32 - offset)
+
+        self.__first_dirty = self.__height_count
         await write_file_async(self.__ses_filename, ses_buf)
 
+    def close(self) -> None:
+        """
+        Writes the height-to-hash map to disk and unmaps the file. The map
+        can't be used after this.
+        """
+        if self.__height_to_hash is not None:
+            self.__height_to_hash.flush()
+            self.__height_to_hash.close()
+            self.__height_to_hash = None
+
     # load height-to-hash map entries from the DB starting at height back in
     # time until we hit a match in the existing map, at which point we can
     # assume all previous blocks have already been populated
@@ -229,18 +269,20 @@ class BlockHeightMap:
             log.info(f"Done validating at height {height}")
 
     def __set_hash(self, height: int, block_hash: bytes32) -> None:
+        assert self.__height_to_hash is not None
         idx = height * 32
         self.__height_to_hash[idx : idx + 32] = block_hash
         self.__counter += 1
         self.__first_dirty = min(self.__first_dirty, height)
 
     def get_hash(self, height: uint32) -> bytes32:
+        assert height < self.__height_count
+        assert self.__height_to_hash is not None
         idx = height * 32
-        assert idx + 32 <= len(self.__height_to_hash)
         return bytes32(self.__height_to_hash[idx : idx + 32])
 
     def contains_height(self, height: uint32) -> bool:
-        return height * 32 < len(self.__height_to_hash)
+        return height < self.__height_count
 
     def rollback(self, fork_height: int) -> None:
         # fork height may be -1, in which case all blocks are different and we
@@ -254,7 +296,9 @@ class BlockHeightMap:
         for height in heights_to_delete:
             del self.__sub_epoch_summaries[height]
 
-        del self.__height_to_hash[(fork_height + 1) * 32 :]
+        # the hashes above the fork are left in the file, but no longer part
+        # of the map
+        self.__height_count = min(self.__height_count, fork_height + 1)
         self.__first_dirty = min(self.__first_dirty, fork_height + 1)
 
         if len(heights_to_delete) > 0:
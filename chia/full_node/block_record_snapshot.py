@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from chia.consensus.block_record import BlockRecord
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.files import write_file_async
+from chia.util.ints import uint32
+from chia.util.snapshot_file import SNAPSHOT_HEADER, parse_snapshot_header, serialize_snapshot
+
+log = logging.getLogger(__name__)
+
+# the items of the snapshot file are the serialized block records
+SNAPSHOT_MAGIC = b"chia-brs"
+SNAPSHOT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class BlockRecordSnapshot:
+    # the peak of the blockchain when the snapshot was taken
+    peak_hash: bytes32
+    peak_height: uint32
+    block_records: List[BlockRecord]
+
+
+def serialize_block_record_snapshot(
+    peak_hash: bytes32, peak_height: uint32, block_records: Iterable[BlockRecord]
+) -> bytes:
+    return serialize_snapshot(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, peak_hash, peak_height, (bytes(br) for br in block_records)
+    )
+
+
+async def write_block_record_snapshot(path: Path, data: bytes) -> None:
+    await write_file_async(path, data)
+
+
+def write_block_record_snapshot_sync(path: Path, data: bytes) -> None:
+    # used on shutdown, where we can't await
+    os.makedirs(path.parent, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_block_record_snapshot(path: Path) -> Optional[BlockRecordSnapshot]:
+    """
+    Memory maps and parses the snapshot file. Returns None if it doesn't exist,
+    or fails the version or integrity check. It's up to the caller to validate
+    that the snapshot matches the blockchain.
+    """
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                # all views into the mmap must be released before it's closed
+                with memoryview(buf) as view:
+                    return _parse_snapshot(view)
+    except Exception as e:
+        # it's OK if this file doesn't exist, we can load the block records
+        # from the database
+        log.info(f"Failed to load block record snapshot: {e}")
+        return None
+
+
+def _parse_snapshot(buf: memoryview) -> Optional[BlockRecordSnapshot]:
+    header = parse_snapshot_header(buf, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, "block record")
+    if header is None:
+        return None
+    with buf[SNAPSHOT_HEADER.size :] as body:
+        block_records: List[BlockRecord] = []
+        offset = 0
+        for _ in range(header.count):
+            # the checksum already protects against corruption
+            with body[offset:] as record_buf:
+                br, advance = BlockRecord.parse_rust(record_buf, True)
+            block_records.append(br)
+            offset += advance
+        if offset != len(body):
+            log.info("block record snapshot has trailing bytes")
+            return None
+    return BlockRecordSnapshot(header.peak_hash, header.peak_height, block_records)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, List, Optional, Sequence, Tuple
+
+from chia.consensus.block_record import BlockRecord
+
+# The block_records table stores one BlockRecord per row, with every field in
+# its own column. Fixed-width fields are stored as integers or fixed-size
+# blobs, uint128 fields as 16 byte big-endian blobs. The list fields are stored
+# as the concatenation of their fixed-size items. Optional fields are NULL when
+# None.
+#
+# Rows are small, so reading a range of block records doesn't page through the
+# block blobs of the full_blocks table.
+BLOCK_RECORDS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS {name}("
+    "header_hash blob PRIMARY KEY,"
+    "prev_hash blob,"
+    "height bigint,"
+    "weight blob,"
+    "total_iters blob,"
+    "signage_point_index tinyint,"
+    "challenge_vdf_output blob,"
+    "infused_challenge_vdf_output blob,"
+    "reward_infusion_new_challenge blob,"
+    "challenge_block_info_hash blob,"
+    "sub_slot_iters bigint,"
+    "pool_puzzle_hash blob,"
+    "farmer_puzzle_hash blob,"
+    "required_iters bigint,"
+    "deficit tinyint,"
+    "flags tinyint,"
+    "prev_transaction_block_height bigint,"
+    "timestamp bigint,"
+    "prev_transaction_block_hash blob,"
+    "fees blob,"
+    "reward_claims_incorporated blob,"
+    "finished_challenge_slot_hashes blob,"
+    "finished_infused_challenge_slot_hashes blob,"
+    "finished_reward_slot_hashes blob,"
+    "sub_epoch_summary_included blob)"
+)
+
+BLOCK_RECORDS_HEIGHT_INDEX = "CREATE INDEX IF NOT EXISTS block_record_height ON block_records(height)"
+
+BLOCK_RECORD_COLUMNS = (
+    "header_hash, prev_hash, height, weight, total_iters, signage_point_index, challenge_vdf_output, "
+    "infused_challenge_vdf_output, reward_infusion_new_challenge, challenge_block_info_hash, sub_slot_iters, "
+    "pool_puzzle_hash, farmer_puzzle_hash, required_iters, deficit, flags, prev_transaction_block_height, "
+    "timestamp, prev_transaction_block_hash, fees, reward_claims_incorporated, finished_challenge_slot_hashes, "
+    "finished_infused_challenge_slot_hashes, finished_reward_slot_hashes, sub_epoch_summary_included"
+)
+BLOCK_RECORD_NUM_COLUMNS = len(BLOCK_RECORD_COLUMNS.split(","))
+
+# bits of the flags column. Only FLAG_OVERFLOW is a field of the BlockRecord,
+# the others are derived from other fields, and stored for convenience
+FLAG_OVERFLOW = 1
+FLAG_TRANSACTION_BLOCK = 2
+FLAG_FIRST_IN_SUB_SLOT = 4
+
+# parent_coin_info, puzzle_hash, amount
+COIN_SIZE = 32 + 32 + 8
+
+
+def _join_optional(items: Optional[Sequence[bytes]]) -> Optional[bytes]:
+    if items is None:
+        return None
+    return b"".join(items)
+
+
+def _optional_bytes(value: Optional[Any]) -> Optional[bytes]:
+    if value is None:
+        return None
+    return bytes(value)
+
+
+def block_record_to_row(block_record: BlockRecord) -> Tuple[Any, ...]:
+    flags = 0
+    if block_record.overflow:
+        flags |= FLAG_OVERFLOW
+    if block_record.is_transaction_block:
+        flags |= FLAG_TRANSACTION_BLOCK
+    if block_record.first_in_sub_slot:
+        flags |= FLAG_FIRST_IN_SUB_SLOT
+
+    reward_claims: Optional[List[bytes]] = None
+    if block_record.reward_claims_incorporated is not None:
+        reward_claims = [bytes(coin) for coin in block_record.reward_claims_incorporated]
+
+    return (
+        block_record.header_hash,
+        block_record.prev_hash,
+        block_record.height,
+        int(block_record.weight).to_bytes(16, "big"),
+        int(block_record.total_iters).to_bytes(16, "big"),
+        block_record.signage_point_index,
+        bytes(block_record.challenge_vdf_output),
+        _optional_bytes(block_record.infused_challenge_vdf_output),
+        block_record.reward_infusion_new_challenge,
+        block_record.challenge_block_info_hash,
+        block_record.sub_slot_iters,
+        block_record.pool_puzzle_hash,
+        block_record.farmer_puzzle_hash,
+        block_record.required_iters,
+        block_record.deficit,
+        flags,
+        block_record.prev_transaction_block_height,
+        block_record.timestamp,
+        block_record.prev_transaction_block_hash,
+        None if block_record.fees is None else int(block_record.fees).to_bytes(8, "big"),
+        _join_optional(reward_claims),
+        _join_optional(block_record.finished_challenge_slot_hashes),
+        _join_optional(block_record.finished_infused_challenge_slot_hashes),
+        _join_optional(block_record.finished_reward_slot_hashes),
+        _optional_bytes(block_record.sub_epoch_summary_included),
+    )
+
+
+def _stream_optional(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"\x00"
+    return b"\x01" + value
+
+
+def _stream_optional_list(value: Optional[bytes], item_size: int) -> bytes:
+    if value is None:
+        return b"\x00"
+    return b"\x01" + (len(value) // item_size).to_bytes(4, "big") + value
+
+
+def block_record_from_row(row: sqlite3.Row) -> BlockRecord:
+    """
+    Builds the BlockRecord from a row of BLOCK_RECORD_COLUMNS. The columns are
+    assembled into the streamable serialization of the BlockRecord, which is
+    then parsed in one go. This is a lot faster than constructing the fields
+    one by one.
+    """
+    return BlockRecord.from_bytes(
+        b"".join(
+            [
+                row[0],  # header_hash
+                row[1],  # prev_hash
+                row[2].to_bytes(4, "big"),  # height
+                row[3],  # weight
+                row[4],  # total_iters
+                row[5].to_bytes(1, "big"),  # signage_point_index
+                row[6],  # challenge_vdf_output
+                _stream_optional(row[7]),  # infused_challenge_vdf_output
+                row[8],  # reward_infusion_new_challenge
+                row[9],  # challenge_block_info_hash
+                row[10].to_bytes(8, "big"),  # sub_slot_iters
+                row[11],  # pool_puzzle_hash
+                row[12],  # farmer_puzzle_hash
+                row[13].to_bytes(8, "big"),  # required_iters
+                row[14].to_bytes(1, "big"),  # deficit
+                b"\x01" if row[15] & FLAG_OVERFLOW else b"\x00",  # overflow
+                row[16].to_bytes(4, "big"),  # prev_transaction_block_height
+                _stream_optional(None if row[17] is None else row[17].to_bytes(8, "big")),  # timestamp
+                _stream_optional(row[18]),  # prev_transaction_block_hash
+                _stream_optional(row[19]),  # fees
+                _stream_optional_list(row[20], COIN_SIZE),  # reward_claims_incorporated
+                _stream_optional_list(row[21], 32),  # finished_challenge_slot_hashes
+                _stream_optional_list(row[22], 32),  # finished_infused_challenge_slot_hashes
+                _stream_optional_list(row[23], 32),  # finished_reward_slot_hashes
+                _stream_optional(row[24]),  # sub_epoch_summary_included
+            ]
+        )
+    )
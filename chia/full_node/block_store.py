@@ -2,38 +2,50 @@ from __future__ import annotations
 
 import dataclasses
 import logging
+import random
 import sqlite3
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
 import typing_extensions
-import zstd
 
 from chia.consensus.block_record import BlockRecord
+from chia.full_node.block_compression import (
+    BLOCK_DICT_SIZE,
+    BlockCompressor,
+    UnknownDictionaryError,
+    frame_dictionary_id,
+    train_block_dictionary,
+)
+from chia.full_node.block_record_table import (
+    BLOCK_RECORD_COLUMNS,
+    BLOCK_RECORD_NUM_COLUMNS,
+    BLOCK_RECORDS_HEIGHT_INDEX,
+    BLOCK_RECORDS_TABLE,
+    block_record_from_row,
+    block_record_to_row,
+)
+from chia.full_node.respond_blocks_cache import RespondBlocksCache
 from chia.types.blockchain_format.serialized_program import SerializedProgram
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.full_block import FullBlock
 from chia.types.weight_proof import SubEpochChallengeSegment, SubEpochSegments
 from chia.util.db_wrapper import DBWrapper2, execute_fetchone
 from chia.util.errors import Err
-from chia.util.full_block_utils import GeneratorBlockInfo, block_info_from_block, generator_from_block
+from chia.util.full_block_utils import FullBlockView, GeneratorBlockInfo
 from chia.util.ints import uint32
 from chia.util.lru_cache import LRUCache
+from chia.util.misc import to_batches
 
 log = logging.getLogger(__name__)
 
 
-def decompress(block_bytes: bytes) -> FullBlock:
-    return FullBlock.from_bytes(zstd.decompress(block_bytes))
-
-
-def compress(block: FullBlock) -> bytes:
-    ret: bytes = zstd.compress(bytes(block))
-    return ret
-
-
-def decompress_blob(block_bytes: bytes) -> bytes:
-    ret: bytes = zstd.decompress(block_bytes)
-    return ret
+@dataclasses.dataclass(frozen=True)
+class RecompressProgress:
+    last_rowid: int
+    blocks_scanned: int
+    blocks_recompressed: int
+    bytes_before: int
+    bytes_after: int
 
 
 @typing_extensions.final
@@ -42,9 +54,18 @@ class BlockStore:
     block_cache: LRUCache[bytes32, FullBlock]
     db_wrapper: DBWrapper2
     ses_challenge_cache: LRUCache[bytes32, List[SubEpochChallengeSegment]]
+    compressor: BlockCompressor = dataclasses.field(default_factory=BlockCompressor)
+    # True when block records are stored in the block_records table. Databases
+    # created before that table existed keep them in the block_record column
+    # of full_blocks, until migrated by "chia db upgrade"
+    split_block_records: bool = True
+    # serialized RespondBlocks messages, served to syncing peers
+    respond_blocks_cache: RespondBlocksCache = dataclasses.field(default_factory=lambda: RespondBlocksCache(0))
 
     @classmethod
-    async def create(cls, db_wrapper: DBWrapper2, *, use_cache: bool = True) -> BlockStore:
+    async def create(
+        cls, db_wrapper: DBWrapper2, *, use_cache: bool = True, respond_blocks_cache_size: int = 0
+    ) -> BlockStore:
         if db_wrapper.db_version != 2:
             raise RuntimeError(f"BlockStore does not support database schema v{db_wrapper.db_version}")
 
@@ -52,14 +73,12 @@ class BlockStore:
             self = cls(LRUCache(1000), db_wrapper, LRUCache(50))
         else:
             self = cls(LRUCache(0), db_wrapper, LRUCache(0))
+        self.respond_blocks_cache = RespondBlocksCache(respond_blocks_cache_size)
 
         async with self.db_wrapper.writer_maybe_transaction() as conn:
             log.info("DB: Creating block store tables and indexes.")
-            # TODO: most data in block is duplicated in block_record. The only
-            # reason for this is that our parsing of a FullBlock is so slow,
-            # it's faster to store duplicate data to parse less when we just
-            # need the BlockRecord. Once we fix the parsing (and data structure)
-            # of FullBlock, this can use less space
+            # the block_record column is only used by databases that haven't
+            # been migrated to the block_records table. See below
             await conn.execute(
                 "CREATE TABLE IF NOT EXISTS full_blocks("
                 "header_hash blob PRIMARY KEY,"
@@ -100,9 +119,149 @@ class BlockStore:
                 "CREATE INDEX IF NOT EXISTS main_chain ON full_blocks(height, in_main_chain) WHERE in_main_chain=1"
             )
 
+            # zstd dictionaries used to compress blocks. The ID is also
+            # recorded in the header of every zstd frame compressed with the
+            # dictionary, so rows compressed with different dictionaries (or
+            # none) can coexist in the full_blocks table
+            await conn.execute("CREATE TABLE IF NOT EXISTS block_compression_dicts(id int PRIMARY KEY, dict blob)")
+
+            # Most data in the block is duplicated in its block record. The
+            # only reason for this is that our parsing of a FullBlock is so
+            # slow, it's faster to store duplicate data to parse less when we
+            # just need the BlockRecord. Block records are kept in their own
+            # table, so reading them doesn't page through the block blobs.
+            # Existing databases are migrated by "chia db upgrade"
+            async with conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='block_records'"
+            ) as cur:
+                has_block_records = await cur.fetchone() is not None
+            if not has_block_records:
+                async with conn.execute("SELECT 1 FROM full_blocks LIMIT 1") as cur:
+                    has_blocks = await cur.fetchone() is not None
+                if has_blocks:
+                    log.warning(
+                        "DB: block records are stored in the full_blocks table. "
+                        'Run "chia db upgrade" to move them to the faster block_records table'
+                    )
+                    self.split_block_records = False
+                else:
+                    await conn.execute(BLOCK_RECORDS_TABLE.format(name="block_records"))
+            if self.split_block_records:
+                log.info("DB: Creating index block_record_height")
+                await conn.execute(BLOCK_RECORDS_HEIGHT_INDEX)
+
+        await self._load_compression_dictionaries()
         return self
 
+    async def _load_compression_dictionaries(self) -> None:
+        async with self.db_wrapper.reader_no_transaction() as conn:
+            async with conn.execute("SELECT id, dict FROM block_compression_dicts") as cursor:
+                for row in await cursor.fetchall():
+                    if not self.compressor.has_dictionary(row[0]):
+                        self.compressor.add_dictionary(row[0], row[1])
+
+    def _compress(self, block: FullBlock) -> bytes:
+        return self.compressor.compress(bytes(block))
+
+    async def _decompress_blob(self, blob: bytes) -> bytes:
+        try:
+            return self.compressor.decompress(blob)
+        except UnknownDictionaryError:
+            # the dictionary may have been added after this store was
+            # created, by "chia db compress" running alongside the node
+            await self._load_compression_dictionaries()
+            return self.compressor.decompress(blob)
+
+    async def _decompress(self, blob: bytes) -> FullBlock:
+        return FullBlock.from_bytes(await self._decompress_blob(blob))
+
+    async def get_compression_samples(self, count: int) -> List[bytes]:
+        """
+        Returns up to count serialized blocks, picked at random from the main
+        chain. These are used to train compression dictionaries.
+        """
+        peak = await self.get_peak()
+        if peak is None:
+            return []
+        heights = random.sample(range(peak[1] + 1), min(count, peak[1] + 1))
+        samples: List[bytes] = []
+        async with self.db_wrapper.reader_no_transaction() as conn:
+            for batch in to_batches(heights, self.db_wrapper.host_parameter_limit):
+                async with conn.execute(
+                    "SELECT block FROM full_blocks "
+                    f'WHERE in_main_chain=1 AND height in ({"?," * (len(batch.entries) - 1)}?)',
+                    batch.entries,
+                ) as cursor:
+                    for row in await cursor.fetchall():
+                        samples.append(await self._decompress_blob(row[0]))
+        return samples
+
+    async def train_compression_dictionary(self, num_samples: int, dict_size: int = BLOCK_DICT_SIZE) -> int:
+        """
+        Trains a new compression dictionary from blocks in the main chain and
+        stores it in the database. Blocks added from now on are compressed
+        with it. Existing blocks are left as they are, see
+        recompress_blocks(). Returns the ID of the new dictionary.
+        """
+        samples = await self.get_compression_samples(num_samples)
+        if len(samples) == 0:
+            raise ValueError("there are no blocks to train a compression dictionary from")
+        await self._load_compression_dictionaries()
+        dict_id = self.compressor.current_dictionary_id + 1
+        dict_data = train_block_dictionary(samples, dict_id, dict_size)
+        async with self.db_wrapper.writer_maybe_transaction() as conn:
+            await conn.execute("INSERT INTO block_compression_dicts VALUES(?, ?)", (dict_id, dict_data))
+        self.compressor.add_dictionary(dict_id, dict_data)
+        return dict_id
+
+    async def recompress_blocks(self, batch_size: int, start_rowid: int = 0) -> AsyncIterator[RecompressProgress]:
+        """
+        Recompresses all blocks that aren't compressed with the current
+        dictionary. Each batch of blocks is updated in its own transaction, so
+        this can run while the full node is using the database. Progress is
+        reported after every batch, its last_rowid can be passed as
+        start_rowid to resume.
+        """
+        dict_id = self.compressor.current_dictionary_id
+        progress = RecompressProgress(start_rowid, 0, 0, 0, 0)
+        while True:
+            async with self.db_wrapper.reader_no_transaction() as conn:
+                async with conn.execute(
+                    "SELECT rowid, block FROM full_blocks WHERE rowid>? ORDER BY rowid LIMIT ?",
+                    (progress.last_rowid, batch_size),
+                ) as cursor:
+                    rows = list(await cursor.fetchall())
+            if len(rows) == 0:
+                return
+
+            updates: List[Tuple[bytes, int, bytes]] = []
+            bytes_before = 0
+            bytes_after = 0
+            for rowid, blob in rows:
+                if frame_dictionary_id(blob) == dict_id:
+                    continue
+                new_blob = self.compressor.compress(await self._decompress_blob(blob))
+                bytes_before += len(blob)
+                bytes_after += len(new_blob)
+                updates.append((new_blob, rowid, blob))
+
+            if len(updates) > 0:
+                async with self.db_wrapper.writer_maybe_transaction() as conn:
+                    # the block may have been replaced (by replace_proof())
+                    # since we read it, in which case we leave it alone
+                    await conn.executemany("UPDATE full_blocks SET block=? WHERE rowid=? AND block=?", updates)
+
+            progress = RecompressProgress(
+                rows[-1][0],
+                progress.blocks_scanned + len(rows),
+                progress.blocks_recompressed + len(updates),
+                progress.bytes_before + bytes_before,
+                progress.bytes_after + bytes_after,
+            )
+            yield progress
+
     async def rollback(self, height: int) -> None:
+        self.respond_blocks_cache.rollback(height)
         async with self.db_wrapper.writer_maybe_transaction() as conn:
             await conn.execute("UPDATE full_blocks SET in_main_chain=0 WHERE height>? AND in_main_chain=1", (height,))
 
@@ -117,9 +276,10 @@ class BlockStore:
     async def replace_proof(self, header_hash: bytes32, block: FullBlock) -> None:
         assert header_hash == block.header_hash
 
-        block_bytes: bytes = compress(block)
+        block_bytes: bytes = self._compress(block)
 
         self.block_cache.put(header_hash, block)
+        self.respond_blocks_cache.remove_height(block.height)
 
         async with self.db_wrapper.writer_maybe_transaction() as conn:
             await conn.execute(
@@ -157,10 +317,15 @@ class BlockStore:
                     ses,
                     int(block.is_fully_compactified()),
                     False,  # in_main_chain
-                    compress(block),
-                    bytes(block_record),
+                    self._compress(block),
+                    None if self.split_block_records else bytes(block_record),
                 ),
             )
+            if self.split_block_records:
+                await conn.execute(
+                    f"INSERT OR IGNORE INTO block_records VALUES({', '.join('?' * BLOCK_RECORD_NUM_COLUMNS)})",
+                    block_record_to_row(block_record),
+                )
 
     async def persist_sub_epoch_challenge_segments(
         self, ses_block_hash: bytes32, segments: List[SubEpochChallengeSegment]
@@ -208,7 +373,7 @@ class BlockStore:
             async with conn.execute("SELECT block from full_blocks WHERE header_hash=?", (header_hash,)) as cursor:
                 row = await cursor.fetchone()
         if row is not None:
-            block = decompress(row[0])
+            block = await self._decompress(row[0])
             self.block_cache.put(header_hash, block)
             return block
         return None
@@ -221,11 +386,20 @@ class BlockStore:
             async with conn.execute("SELECT block from full_blocks WHERE header_hash=?", (header_hash,)) as cursor:
                 row = await cursor.fetchone()
         if row is not None:
-            ret: bytes = zstd.decompress(row[0])
+            ret: bytes = await self._decompress_blob(row[0])
             return ret
 
         return None
 
+    async def get_full_block_view(self, header_hash: bytes32) -> Optional[FullBlockView]:
+        """
+        Returns a lazy view of the serialized block, without parsing it.
+        """
+        block_bytes = await self.get_full_block_bytes(header_hash)
+        if block_bytes is None:
+            return None
+        return FullBlockView(block_bytes)
+
     async def get_full_blocks_at(self, heights: List[uint32]) -> List[FullBlock]:
         if len(heights) == 0:
             return []
@@ -235,7 +409,7 @@ class BlockStore:
             async with conn.execute(formatted_str, heights) as cursor:
                 ret: List[FullBlock] = []
                 for row in await cursor.fetchall():
-                    ret.append(decompress(row[0]))
+                    ret.append(await self._decompress(row[0]))
                 return ret
 
     async def get_block_info(self, header_hash: bytes32) -> Optional[GeneratorBlockInfo]:
@@ -250,14 +424,14 @@ class BlockStore:
             row = await execute_fetchone(conn, formatted_str, (header_hash,))
             if row is None:
                 return None
-            block_bytes = zstd.decompress(row[0])
+            block_bytes = await self._decompress_blob(row[0])
 
             try:
-                return block_info_from_block(block_bytes)
+                return FullBlockView(block_bytes).block_info()
             except Exception as e:
                 log.exception(f"cheap parser failed for block at height {row[1]}: {e}")
                 # this is defensive, on the off-chance that
-                # block_info_from_block() fails, fall back to the reliable
+                # the FullBlockView fails, fall back to the reliable
                 # definition of parsing a block
                 b = FullBlock.from_bytes(block_bytes)
                 return GeneratorBlockInfo(
@@ -274,14 +448,14 @@ class BlockStore:
             row = await execute_fetchone(conn, formatted_str, (header_hash,))
             if row is None:
                 return None
-            block_bytes = zstd.decompress(row[0])
+            block_bytes = await self._decompress_blob(row[0])
 
             try:
-                return generator_from_block(block_bytes)
+                return FullBlockView(block_bytes).transactions_generator
             except Exception as e:
                 log.error(f"cheap parser failed for block at height {row[1]}: {e}")
                 # this is defensive, on the off-chance that
-                # generator_from_block() fails, fall back to the reliable
+                # the FullBlockView fails, fall back to the reliable
                 # definition of parsing a block
                 b = FullBlock.from_bytes(block_bytes)
                 return b.transactions_generator
@@ -298,14 +472,14 @@ class BlockStore:
         async with self.db_wrapper.reader_no_transaction() as conn:
             async with conn.execute(formatted_str, heights) as cursor:
                 async for row in cursor:
-                    block_bytes = zstd.decompress(row[0])
+                    block_bytes = await self._decompress_blob(row[0])
 
                     try:
-                        gen = generator_from_block(block_bytes)
+                        gen = FullBlockView(block_bytes).transactions_generator
                     except Exception as e:
                         log.error(f"cheap parser failed for block at height {row[1]}: {e}")
                         # this is defensive, on the off-chance that
-                        # generator_from_block() fails, fall back to the reliable
+                        # the FullBlockView fails, fall back to the reliable
                         # definition of parsing a block
                         b = FullBlock.from_bytes(block_bytes)
                         gen = b.transactions_generator
@@ -324,16 +498,10 @@ class BlockStore:
             return []
 
         all_blocks: Dict[bytes32, BlockRecord] = {}
-        async with self.db_wrapper.reader_no_transaction() as conn:
-            async with conn.execute(
-                "SELECT header_hash,block_record "
-                "FROM full_blocks "
-                f'WHERE header_hash in ({"?," * (len(header_hashes) - 1)}?)',
-                header_hashes,
-            ) as cursor:
-                for row in await cursor.fetchall():
-                    block_rec = BlockRecord.from_bytes(row[1])
-                    all_blocks[block_rec.header_hash] = block_rec
+        for block_rec in await self._select_block_records(
+            f'header_hash in ({"?," * (len(header_hashes) - 1)}?)', header_hashes
+        ):
+            all_blocks[block_rec.header_hash] = block_rec
 
         ret: List[BlockRecord] = []
         for hh in header_hashes:
@@ -379,7 +547,7 @@ class BlockStore:
             async with conn.execute(formatted_str, header_hashes) as cursor:
                 for row in await cursor.fetchall():
                     header_hash = bytes32(row[0])
-                    all_blocks[header_hash] = decompress_blob(row[1])
+                    all_blocks[header_hash] = await self._decompress_blob(row[1])
 
         ret: List[bytes] = []
         for hh in header_hashes:
@@ -407,7 +575,7 @@ class BlockStore:
             async with conn.execute(formatted_str, header_hashes) as cursor:
                 for row in await cursor.fetchall():
                     header_hash = bytes32(row[0])
-                    full_block: FullBlock = decompress(row[1])
+                    full_block: FullBlock = await self._decompress(row[1])
                     all_blocks[header_hash] = full_block
                     self.block_cache.put(header_hash, full_block)
         ret: List[FullBlock] = []
@@ -417,18 +585,22 @@ class BlockStore:
             ret.append(all_blocks[hh])
         return ret
 
-    async def get_block_record(self, header_hash: bytes32) -> Optional[BlockRecord]:
+    async def _select_block_records(self, where: str, parameters: Sequence[object]) -> List[BlockRecord]:
         async with self.db_wrapper.reader_no_transaction() as conn:
-            async with conn.execute(
-                "SELECT block_record " "FROM full_blocks " "WHERE header_hash=?",
-                (header_hash,),
-            ) as cursor:
-                row = await cursor.fetchone()
-        if row is None:
-            return None
-        block_record = BlockRecord.from_bytes(row[0])
+            if self.split_block_records:
+                async with conn.execute(
+                    f"SELECT {BLOCK_RECORD_COLUMNS} FROM block_records WHERE {where}", parameters
+                ) as cursor:
+                    return [block_record_from_row(row) for row in await cursor.fetchall()]
+            else:
+                async with conn.execute(f"SELECT block_record FROM full_blocks WHERE {where}", parameters) as cursor:
+                    return [BlockRecord.from_bytes(row[0]) for row in await cursor.fetchall()]
 
-        return block_record
+    async def get_block_record(self, header_hash: bytes32) -> Optional[BlockRecord]:
+        block_records = await self._select_block_records("header_hash=?", (header_hash,))
+        if len(block_records) == 0:
+            return None
+        return block_records[0]
 
     async def get_block_records_in_range(
         self,
@@ -441,15 +613,8 @@ class BlockStore:
         """
 
         ret: Dict[bytes32, BlockRecord] = {}
-        async with self.db_wrapper.reader_no_transaction() as conn:
-            async with conn.execute(
-                "SELECT header_hash,block_record " "FROM full_blocks " "WHERE height >= ? AND height <= ?",
-                (start, stop),
-            ) as cursor:
-                for row in await cursor.fetchall():
-                    header_hash = bytes32(row[0])
-                    block_record = BlockRecord.from_bytes(row[1])
-                    ret[header_hash] = block_record
+        for block_record in await self._select_block_records("height >= ? AND height <= ?", (start, stop)):
+            ret[block_record.header_hash] = block_record
 
         return ret
 
@@ -466,13 +631,13 @@ class BlockStore:
         assert self.db_wrapper.db_version == 2
         async with self.db_wrapper.reader_no_transaction() as conn:
             async with conn.execute(
-                "SELECT block FROM full_blocks WHERE height >= ? AND height <= ? and in_main_chain=1",
+                "SELECT block FROM full_blocks WHERE height >= ? AND height <= ? and in_main_chain=1 ORDER BY height",
                 (start, stop),
             ) as cursor:
                 rows: List[sqlite3.Row] = list(await cursor.fetchall())
                 if len(rows) != (stop - start) + 1:
                     raise ValueError(f"Some blocks in range {start}-{stop} were not found.")
-                return [decompress_blob(row[0]) for row in rows]
+                return [await self._decompress_blob(row[0]) for row in rows]
 
     async def get_peak(self) -> Optional[Tuple[bytes32, uint32]]:
         async with self.db_wrapper.reader_no_transaction() as conn:
@@ -500,14 +665,8 @@ class BlockStore:
             return {}, None
 
         ret: Dict[bytes32, BlockRecord] = {}
-        async with self.db_wrapper.reader_no_transaction() as conn:
-            async with conn.execute(
-                "SELECT header_hash, block_record " "FROM full_blocks " "WHERE height >= ?",
-                (peak[1] - blocks_n,),
-            ) as cursor:
-                for row in await cursor.fetchall():
-                    header_hash = bytes32(row[0])
-                    ret[header_hash] = BlockRecord.from_bytes(row[1])
+        for block_record in await self._select_block_records("height >= ?", (peak[1] - blocks_n,)):
+            ret[block_record.header_hash] = block_record
 
         return ret, peak[0]
 
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+from typing import Callable, Collection, Dict, Iterator, List, Optional, Tuple
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.util.ints import uint32
+from chia.util.lru_cache import LRUCache
+
+
+@dataclasses.dataclass
+class UnspentCoinCache:
+    """
+    A write-back cache in front of the coin_record table. Coins created and
+    spent by new blocks are kept in memory until they are flushed to the DB in
+    bulk, and coin records read from the DB are kept around (in an LRU) so
+    blocks spending them don't have to read them back again.
+
+    The pending state is only modified under the DB writer lock, inside a
+    transaction(). If the DB transaction fails, the pending state is restored to
+    what it was before the transaction began, via the undo log.
+    """
+
+    # the max number of pending coin records before they are flushed to the DB
+    capacity: int
+    # coin records as they are stored in the DB (i.e. without pending spends applied)
+    clean: LRUCache[bytes32, CoinRecord]
+    # coins created since the last flush. These may also have been spent since
+    pending_additions: Dict[bytes32, CoinRecord] = dataclasses.field(default_factory=dict)
+    # coins that are stored in the DB, and that have been spent since the last
+    # flush. Maps coin ID to the height it was spent at
+    pending_spends: Dict[bytes32, uint32] = dataclasses.field(default_factory=dict)
+    # functions restoring the pending state, in the order the changes were made
+    _undo_log: List[Callable[[], None]] = dataclasses.field(default_factory=list)
+    _depth: int = 0
+
+    @classmethod
+    def create(cls, capacity: int) -> UnspentCoinCache:
+        return cls(capacity, LRUCache(capacity))
+
+    def pending_count(self) -> int:
+        return len(self.pending_additions) + len(self.pending_spends)
+
+    def needs_flush(self) -> bool:
+        return self.pending_count() >= self.capacity
+
+    def get(self, name: bytes32) -> Optional[CoinRecord]:
+        """
+        Returns the current coin record, or None if it's not known to the cache.
+        None does not mean the coin doesn't exist, just that it needs to be
+        looked up in the DB (and passed through apply_pending()).
+        """
+        record = self.pending_additions.get(name)
+        if record is not None:
+            return record
+        record = self.clean.get(name)
+        if record is None:
+            return None
+        return self.apply_pending(record)
+
+    def apply_pending(self, record: CoinRecord) -> CoinRecord:
+        """
+        Takes a coin record as it's stored in the DB and applies any pending
+        spend to it.
+        """
+        spent_height = self.pending_spends.get(record.name)
+        if spent_height is None:
+            return record
+        return dataclasses.replace(record, spent_block_index=spent_height)
+
+    def put_clean(self, record: CoinRecord) -> None:
+        # only unspent coins are interesting to keep around, spent ones won't
+        # be spent again
+        if not record.spent:
+            self.clean.put(record.name, record)
+
+    def add_coin(self, record: CoinRecord) -> None:
+        name = record.name
+        pending = self.pending_additions
+        old_record = pending.get(name)
+        if old_record is None:
+            self._undo_log.append(lambda: pending.__delitem__(name))
+        else:
+            self._undo_log.append(lambda: pending.__setitem__(name, old_record))
+        pending[name] = record
+
+    def spend_coin(self, name: bytes32, height: uint32) -> Optional[bool]:
+        """
+        Marks the coin as spent at the specified height.
+        Returns True if it was spent, False if it could not be spent (because
+        it's already spent) and None if the coin is not known to the cache. In
+        the last case, the caller is expected to look the coin up in the DB, and
+        call spend_stored_coin().
+        """
+        record = self.pending_additions.get(name)
+        if record is not None:
+            if record.spent:
+                return False
+            self.add_coin(dataclasses.replace(record, spent_block_index=height))
+            return True
+        if name in self.pending_spends:
+            return False
+        record = self.clean.get(name)
+        if record is None:
+            return None
+        if record.spent:
+            return False
+        self.spend_stored_coin(name, height)
+        return True
+
+    def spend_stored_coin(self, name: bytes32, height: uint32) -> None:
+        pending = self.pending_spends
+        assert name not in pending
+        self._undo_log.append(lambda: pending.__delitem__(name))
+        pending[name] = height
+
+    def take_pending(self) -> Tuple[Dict[bytes32, CoinRecord], Dict[bytes32, uint32]]:
+        """
+        Hands over the pending additions and spends to be written to the DB, and
+        resets the pending state. The coins that remain unspent are added to the
+        clean cache, since that's how they will look in the DB.
+        """
+        additions = self.pending_additions
+        spends = self.pending_spends
+
+        def restore() -> None:
+            self.pending_additions = additions
+            self.pending_spends = spends
+
+        self._undo_log.append(restore)
+        self.pending_additions = {}
+        self.pending_spends = {}
+        self.forget(spends)
+        for record in additions.values():
+            self.put_clean(record)
+        return additions, spends
+
+    def forget(self, names: Collection[bytes32]) -> None:
+        """
+        Drops coins from the clean cache, e.g. because they were modified in the
+        DB directly.
+        """
+        for name in names:
+            with contextlib.suppress(KeyError):
+                self.clean.remove(name)
+
+    def clear_clean(self) -> None:
+        self.clean = LRUCache(self.capacity)
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Changes made to the pending state inside this context are rolled back if
+        an exception propagates out of it. This is meant to wrap a DB
+        transaction, so the cache stays consistent with the DB.
+        """
+        mark = len(self._undo_log)
+        self._depth += 1
+        try:
+            yield
+        except BaseException:
+            self._revert(mark)
+            raise
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self._undo_log.clear()
+
+    def _revert(self, mark: int) -> None:
+        while len(self._undo_log) > mark:
+            self._undo_log.pop()()
+        # the clean cache may now contain coins that were flushed and then rolled
+        # back in the DB. It's just a cache, so start over
+        self.clear_clean()
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import dataclasses
 import logging
 import sqlite3
 import time
-from typing import Any, Collection, Dict, List, Optional, Set, Tuple
+from typing import Any, AsyncIterator, Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+import aiosqlite
 import typing_extensions
 from aiosqlite import Cursor
 from clvm.casts import int_from_bytes
 
+from chia.full_node.coin_cache import UnspentCoinCache
 from chia.protocols.wallet_protocol import CoinState
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
@@ -22,6 +26,50 @@ from chia.util.misc import to_batches
 
 log = logging.getLogger(__name__)
 
+# when looking up more keys (puzzle hashes or coin IDs) than this, they're
+# inserted into a temporary table which the query joins against, rather than
+# passed as query parameters
+BULK_QUERY_THRESHOLD = 100
+
+# the coin columns, concatenated, are the serialized Coin. This makes building
+# CoinState objects cheap. See rows_to_coin_states()
+COIN_STATE_COLUMNS = "CAST(coin_parent||puzzle_hash||amount AS blob), spent_index, confirmed_index"
+
+
+def rows_to_coin_states(rows: Iterable[sqlite3.Row]) -> List[CoinState]:
+    """
+    Converts rows selecting COIN_STATE_COLUMNS into CoinState objects.
+    """
+    return [CoinState(Coin.from_bytes(row[0]), row[1] or None, row[2]) for row in rows]
+
+
+@contextlib.asynccontextmanager
+async def key_set(conn: aiosqlite.Connection, keys: Collection[bytes]) -> AsyncIterator[Tuple[str, Tuple[bytes, ...]]]:
+    """
+    Yields an SQL expression for the set of keys, to be used on the right-hand
+    side of IN, and the query parameters it needs. Large sets are loaded into a
+    temporary table, which is emptied when the context exits.
+    """
+    if len(keys) <= BULK_QUERY_THRESHOLD:
+        yield f'({"?," * (len(keys) - 1)}?)', tuple(keys)
+        return
+
+    # inserting into the table in a single transaction is a lot faster. It
+    # also means all queries see the same snapshot of the database
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        await conn.execute("BEGIN DEFERRED")
+    try:
+        await conn.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_query_keys(key blob PRIMARY KEY) WITHOUT ROWID")
+        await conn.executemany("INSERT OR IGNORE INTO temp.bulk_query_keys VALUES(?)", [(k,) for k in keys])
+        yield "(SELECT key FROM temp.bulk_query_keys)", ()
+    finally:
+        if in_transaction:
+            await conn.execute("DELETE FROM temp.bulk_query_keys")
+        else:
+            # this drops the table too
+            await conn.rollback()
+
 
 @typing_extensions.final
 @dataclasses.dataclass
@@ -32,12 +80,17 @@ class CoinStore:
 
     db_wrapper: DBWrapper2
     coins_added_at_height_cache: LRUCache[uint32, List[CoinRecord]]
+    # optional write-back cache, only used inside a write_back() context
+    unspent_cache: Optional[UnspentCoinCache] = None
+    # the task that owns the current write_back() context, if any
+    _write_back_task: Optional[asyncio.Task[object]] = None
 
     @classmethod
-    async def create(cls, db_wrapper: DBWrapper2) -> CoinStore:
+    async def create(cls, db_wrapper: DBWrapper2, *, unspent_cache_size: int = 0) -> CoinStore:
         if db_wrapper.db_version != 2:
             raise RuntimeError(f"CoinStore does not support database schema v{db_wrapper.db_version}")
-        self = CoinStore(db_wrapper, LRUCache(100))
+        unspent_cache = UnspentCoinCache.create(unspent_cache_size) if unspent_cache_size > 0 else None
+        self = CoinStore(db_wrapper, LRUCache(100), unspent_cache)
 
         async with self.db_wrapper.writer_maybe_transaction() as conn:
             log.info("DB: Creating coin store tables and indexes.")
@@ -70,7 +123,80 @@ class CoinStore:
 
         return self
 
+    @contextlib.asynccontextmanager
+    async def write_back(self) -> AsyncIterator[None]:
+        """
+        Opens a DB transaction in which coins created and spent by new blocks
+        are kept in the unspent cache, rather than written to the DB one block at
+        a time. They are flushed in bulk whenever the cache fills up, and before
+        the transaction commits, so the DB is never left without them. Only the
+        task entering this context uses the cache, other tasks keep reading the
+        committed state from the DB.
+        If the unspent cache is disabled, this does nothing.
+        """
+        if self.unspent_cache is None:
+            yield
+            return
+
+        assert self._write_back_task is None
+        with self.unspent_cache.transaction():
+            async with self.db_wrapper.writer():
+                self._write_back_task = asyncio.current_task()
+                try:
+                    yield
+                    await self.flush_unspent_cache()
+                finally:
+                    self._write_back_task = None
+
+    @contextlib.contextmanager
+    def unspent_cache_transaction(self) -> Iterator[None]:
+        """
+        Wraps a DB transaction that may modify the coin set. If the transaction
+        fails, the unspent cache is rolled back along with it.
+        """
+        if self.unspent_cache is None:
+            yield
+            return
+        with self.unspent_cache.transaction():
+            yield
+
+    def _active_cache(self) -> Optional[UnspentCoinCache]:
+        if self._write_back_task is None or self._write_back_task is not asyncio.current_task():
+            return None
+        return self.unspent_cache
+
+    async def flush_unspent_cache(self) -> None:
+        """
+        Writes the coins created and spent since the last flush to the DB. This
+        is also called before any query the unspent cache can't answer (i.e.
+        anything other than lookups by coin ID), so the DB is up-to-date for it.
+        """
+        cache = self._active_cache()
+        if cache is None or cache.pending_count() == 0:
+            return
+
+        start = time.monotonic()
+        with cache.transaction():
+            async with self.db_wrapper.writer_maybe_transaction() as conn:
+                additions, spends = cache.take_pending()
+                await self._add_coin_records(list(additions.values()))
+                if len(spends) > 0:
+                    cursor = await conn.executemany(
+                        "UPDATE coin_record INDEXED BY sqlite_autoindex_coin_record_1 "
+                        "SET spent_index=? WHERE spent_index=0 AND coin_name=?",
+                        [(height, name) for name, height in spends.items()],
+                    )
+                    if cursor.rowcount != len(spends):
+                        raise ValueError(
+                            f"Invalid operation to set spent, total updates {cursor.rowcount} expected {len(spends)}"
+                        )
+        log.debug(
+            f"flushed {len(additions)} additions and {len(spends)} removals to the coin store "
+            f"in {time.monotonic() - start:0.2f}s"
+        )
+
     async def num_unspent(self) -> int:
+        await self.flush_unspent_cache()
         async with self.db_wrapper.reader_no_transaction() as conn:
             async with conn.execute("SELECT COUNT(*) FROM coin_record WHERE spent_index=0") as cursor:
                 row = await cursor.fetchone()
@@ -121,8 +247,12 @@ class CoinStore:
             )
             additions.append(reward_coin_r)
 
-        await self._add_coin_records(additions)
-        await self._set_spent(tx_removals, height)
+        cache = self._active_cache()
+        if cache is None:
+            await self._add_coin_records(additions)
+            await self._set_spent(tx_removals, height)
+        else:
+            await self._cache_new_block(cache, additions, tx_removals, height)
 
         end = time.monotonic()
         log.log(
@@ -134,8 +264,44 @@ class CoinStore:
 
         return additions
 
+    async def _cache_new_block(
+        self, cache: UnspentCoinCache, additions: List[CoinRecord], removals: List[bytes32], height: uint32
+    ) -> None:
+        assert len(removals) == 0 or height > 0
+
+        with cache.transaction():
+            for record in additions:
+                cache.add_coin(record)
+
+            rows_updated = 0
+            unknown: List[bytes32] = []
+            for name in removals:
+                spent = cache.spend_coin(name, height)
+                if spent is None:
+                    unknown.append(name)
+                elif spent:
+                    rows_updated += 1
+
+            for record in await self._get_coin_records_from_db(unknown):
+                cache.put_clean(record)
+                if not record.spent and cache.spend_coin(record.name, height):
+                    rows_updated += 1
+
+            if rows_updated != len(removals):
+                raise ValueError(
+                    f"Invalid operation to set spent, total updates {rows_updated} expected {len(removals)}"
+                )
+
+            if cache.needs_flush():
+                await self.flush_unspent_cache()
+
     # Checks DB and DiffStores for CoinRecord with coin_name and returns it
     async def get_coin_record(self, coin_name: bytes32) -> Optional[CoinRecord]:
+        cache = self._active_cache()
+        if cache is not None:
+            cached = cache.get(coin_name)
+            if cached is not None:
+                return cached
         async with self.db_wrapper.reader_no_transaction() as conn:
             async with conn.execute(
                 "SELECT confirmed_index, spent_index, coinbase, puzzle_hash, "
@@ -145,10 +311,32 @@ class CoinStore:
                 row = await cursor.fetchone()
                 if row is not None:
                     coin = self.row_to_coin(row)
-                    return CoinRecord(coin, row[0], row[1], row[2], row[6])
+                    record = CoinRecord(coin, row[0], row[1], row[2], row[6])
+                    if cache is not None:
+                        cache.put_clean(record)
+                        record = cache.apply_pending(record)
+                    return record
         return None
 
     async def get_coin_records(self, names: Collection[bytes32]) -> List[CoinRecord]:
+        cache = self._active_cache()
+        if cache is None:
+            return await self._get_coin_records_from_db(names)
+
+        coins: List[CoinRecord] = []
+        missing: List[bytes32] = []
+        for name in names:
+            cached = cache.get(name)
+            if cached is None:
+                missing.append(name)
+            else:
+                coins.append(cached)
+        for record in await self._get_coin_records_from_db(missing):
+            cache.put_clean(record)
+            coins.append(cache.apply_pending(record))
+        return coins
+
+    async def _get_coin_records_from_db(self, names: Collection[bytes32]) -> List[CoinRecord]:
         if len(names) == 0:
             return []
 
@@ -176,6 +364,7 @@ class CoinStore:
         return coins
 
     async def get_coins_added_at_height(self, height: uint32) -> List[CoinRecord]:
+        await self.flush_unspent_cache()
         coins_added: Optional[List[CoinRecord]] = self.coins_added_at_height_cache.get(height)
         if coins_added is not None:
             return coins_added
@@ -195,6 +384,7 @@ class CoinStore:
                 return coins
 
     async def get_coins_removed_at_height(self, height: uint32) -> List[CoinRecord]:
+        await self.flush_unspent_cache()
         # Special case to avoid querying all unspent coins (spent_index=0)
         if height == 0:
             return []
@@ -213,6 +403,7 @@ class CoinStore:
                 return coins
 
     async def get_all_coins(self, include_spent_coins: bool) -> List[CoinRecord]:
+        await self.flush_unspent_cache()
         # WARNING: this should only be used for testing or in a simulation,
         # running it on a synced testnet or mainnet node will most likely result in an OOM error.
         coins = set()
@@ -237,6 +428,7 @@ class CoinStore:
         start_height: uint32 = uint32(0),
         end_height: uint32 = uint32((2**32) - 1),
     ) -> List[CoinRecord]:
+        await self.flush_unspent_cache()
         coins = set()
 
         async with self.db_wrapper.reader_no_transaction() as conn:
@@ -259,6 +451,7 @@ class CoinStore:
         start_height: uint32 = uint32(0),
         end_height: uint32 = uint32((2**32) - 1),
     ) -> List[CoinRecord]:
+        await self.flush_unspent_cache()
         if len(puzzle_hashes) == 0:
             return []
 
@@ -287,6 +480,7 @@ class CoinStore:
         start_height: uint32 = uint32(0),
         end_height: uint32 = uint32((2**32) - 1),
     ) -> List[CoinRecord]:
+        await self.flush_unspent_cache()
         if len(names) == 0:
             return []
 
@@ -310,13 +504,6 @@ class CoinStore:
     def row_to_coin(self, row: sqlite3.Row) -> Coin:
         return Coin(bytes32(row[4]), bytes32(row[3]), uint64.from_bytes(row[5]))
 
-    def row_to_coin_state(self, row: sqlite3.Row) -> CoinState:
-        coin = self.row_to_coin(row)
-        spent_h = None
-        if row[1] != 0:
-            spent_h = row[1]
-        return CoinState(coin, spent_h, row[0])
-
     async def get_coin_states_by_puzzle_hashes(
         self,
         include_spent_coins: bool,
@@ -325,30 +512,21 @@ class CoinStore:
         *,
         max_items: int = 50000,
     ) -> Set[CoinState]:
+        await self.flush_unspent_cache()
         if len(puzzle_hashes) == 0:
             return set()
 
-        coins: Set[CoinState] = set()
         async with self.db_wrapper.reader_no_transaction() as conn:
-            for batch in to_batches(puzzle_hashes, SQLITE_MAX_VARIABLE_NUMBER):
-                puzzle_hashes_db: Tuple[Any, ...] = tuple(batch.entries)
+            async with key_set(conn, puzzle_hashes) as (keys_sql, keys_params):
                 async with conn.execute(
-                    f"SELECT confirmed_index, spent_index, coinbase, puzzle_hash, "
-                    f"coin_parent, amount, timestamp FROM coin_record INDEXED BY coin_puzzle_hash "
-                    f'WHERE puzzle_hash in ({"?," * (len(batch.entries) - 1)}?) '
-                    f"AND (confirmed_index>=? OR spent_index>=?)"
-                    f"{'' if include_spent_coins else 'AND spent_index=0'}"
-                    " LIMIT ?",
-                    puzzle_hashes_db + (min_height, min_height, max_items - len(coins)),
+                    f"SELECT {COIN_STATE_COLUMNS} FROM coin_record INDEXED BY coin_puzzle_hash "
+                    f"WHERE puzzle_hash IN {keys_sql} "
+                    f"AND (confirmed_index>=? OR spent_index>=?) "
+                    f"{'' if include_spent_coins else 'AND spent_index=0 '}"
+                    "LIMIT ?",
+                    keys_params + (min_height, min_height, max_items),
                 ) as cursor:
-                    row: sqlite3.Row
-                    for row in await cursor.fetchall():
-                        coins.add(self.row_to_coin_state(row))
-
-                if len(coins) >= max_items:
-                    break
-
-        return coins
+                    return set(rows_to_coin_states(await cursor.fetchall()))
 
     async def get_coin_records_by_parent_ids(
         self,
@@ -357,6 +535,7 @@ class CoinStore:
         start_height: uint32 = uint32(0),
         end_height: uint32 = uint32((2**32) - 1),
     ) -> List[CoinRecord]:
+        await self.flush_unspent_cache()
         if len(parent_ids) == 0:
             return []
 
@@ -386,32 +565,25 @@ class CoinStore:
         max_height: uint32 = uint32.MAXIMUM,
         max_items: int = 50000,
     ) -> List[CoinState]:
+        await self.flush_unspent_cache()
         if len(coin_ids) == 0:
             return []
 
-        coins: List[CoinState] = []
-        async with self.db_wrapper.reader_no_transaction() as conn:
-            for batch in to_batches(coin_ids, SQLITE_MAX_VARIABLE_NUMBER):
-                coin_ids_db: Tuple[Any, ...] = tuple(batch.entries)
-
-                max_height_sql = ""
-                if max_height != uint32.MAXIMUM:
-                    max_height_sql = f"AND confirmed_index<={max_height} AND spent_index<={max_height}"
+        max_height_sql = ""
+        if max_height != uint32.MAXIMUM:
+            max_height_sql = f"AND confirmed_index<={max_height} AND spent_index<={max_height} "
 
+        async with self.db_wrapper.reader_no_transaction() as conn:
+            async with key_set(conn, coin_ids) as (keys_sql, keys_params):
                 async with conn.execute(
-                    f"SELECT confirmed_index, spent_index, coinbase, puzzle_hash, coin_parent, amount, timestamp "
-                    f'FROM coin_record WHERE coin_name in ({"?," * (len(batch.entries) - 1)}?) '
+                    f"SELECT {COIN_STATE_COLUMNS} FROM coin_record "
+                    f"WHERE coin_name IN {keys_sql} "
                     f"AND (confirmed_index>=? OR spent_index>=?) {max_height_sql}"
-                    f"{'' if include_spent_coins else 'AND spent_index=0'}"
-                    " LIMIT ?",
-                    coin_ids_db + (min_height, min_height, max_items - len(coins)),
+                    f"{'' if include_spent_coins else 'AND spent_index=0 '}"
+                    "LIMIT ?",
+                    keys_params + (min_height, min_height, max_items),
                 ) as cursor:
-                    for row in await cursor.fetchall():
-                        coins.append(self.row_to_coin_state(row))
-                if len(coins) >= max_items:
-                    break
-
-        return coins
+                    return rows_to_coin_states(await cursor.fetchall())
 
     MAX_PUZZLE_HASH_BATCH_SIZE = SQLITE_MAX_VARIABLE_NUMBER - 10
 
@@ -430,6 +602,7 @@ class CoinStore:
         Returns the coin states, as well as the next block height (or `None` if finished).
         You cannot exceed `CoinStore.MAX_PUZZLE_HASH_BATCH_SIZE` puzzle hashes in the query.
         """
+        await self.flush_unspent_cache()
 
         # This should be able to be changed later without breaking the protocol.
         # We have a small deduction for other variables to be added to the query.
@@ -438,76 +611,47 @@ class CoinStore:
         if len(puzzle_hashes) == 0:
             return [], None
 
-        # Coin states are keyed by coin id to filter out and prevent duplicates.
-        coin_states_dict: Dict[bytes32, CoinState] = dict()
-        coin_states: List[CoinState]
-
-        async with self.db_wrapper.reader() as conn:
-            puzzle_hashes_db = tuple(puzzle_hashes)
-            puzzle_hash_count = len(puzzle_hashes_db)
-
-            require_spent = "spent_index>0"
-            require_unspent = "spent_index=0"
-            amount_filter = "AND amount>=? " if min_amount > 0 else ""
-
-            if include_spent and include_unspent:
-                height_filter = ""
-            elif include_spent:
-                height_filter = f"AND {require_spent}"
-            elif include_unspent:
-                height_filter = f"AND {require_unspent}"
-            else:
-                # There are no coins which are both spent and unspent, so we're finished.
-                return [], None
+        require_spent = "spent_index>0"
+        require_unspent = "spent_index=0"
+        amount_filter = "AND amount>=? " if min_amount > 0 else ""
 
-            cursor = await conn.execute(
-                f"SELECT confirmed_index, spent_index, coinbase, puzzle_hash, "
-                f"coin_parent, amount, timestamp FROM coin_record INDEXED BY coin_puzzle_hash "
-                f'WHERE puzzle_hash in ({"?," * (puzzle_hash_count - 1)}?) '
-                f"AND (confirmed_index>=? OR spent_index>=?) "
-                f"{height_filter} {amount_filter}"
-                f"ORDER BY MAX(confirmed_index, spent_index) ASC "
-                f"LIMIT ?",
-                (
-                    puzzle_hashes_db
-                    + (min_height, min_height)
-                    + ((min_amount.to_bytes(8, "big"),) if min_amount > 0 else ())
-                    + (max_items + 1,)
-                ),
-            )
-
-            for row in await cursor.fetchall():
-                coin_state = self.row_to_coin_state(row)
-                coin_states_dict[coin_state.coin.name()] = coin_state
+        if include_spent and include_unspent:
+            height_filter = ""
+        elif include_spent:
+            height_filter = f"AND {require_spent}"
+        elif include_unspent:
+            height_filter = f"AND {require_unspent}"
+        else:
+            # There are no coins which are both spent and unspent, so we're finished.
+            return [], None
 
-            if include_hinted:
-                cursor = await conn.execute(
-                    f"SELECT confirmed_index, spent_index, coinbase, puzzle_hash, "
-                    f"coin_parent, amount, timestamp FROM coin_record INDEXED BY sqlite_autoindex_coin_record_1 "
-                    f"WHERE coin_name IN (SELECT coin_id FROM hints "
-                    f'WHERE hint IN ({"?," * (puzzle_hash_count - 1)}?)) '
+        async with self.db_wrapper.reader() as conn:
+            async with key_set(conn, puzzle_hashes) as (keys_sql, keys_params):
+                filter_params = (min_height, min_height) + ((min_amount.to_bytes(8, "big"),) if min_amount > 0 else ())
+                query = (
+                    f"SELECT {COIN_STATE_COLUMNS}, MAX(confirmed_index, spent_index) AS max_height "
+                    f"FROM coin_record INDEXED BY coin_puzzle_hash "
+                    f"WHERE puzzle_hash IN {keys_sql} "
                     f"AND (confirmed_index>=? OR spent_index>=?) "
                     f"{height_filter} {amount_filter}"
-                    f"ORDER BY MAX(confirmed_index, spent_index) ASC "
-                    f"LIMIT ?",
-                    (
-                        puzzle_hashes_db
-                        + (min_height, min_height)
-                        + ((min_amount.to_bytes(8, "big"),) if min_amount > 0 else ())
-                        + (max_items + 1,)
-                    ),
                 )
+                params = keys_params + filter_params
+                if include_hinted:
+                    # UNION removes the duplicates, of coins that are both
+                    # hinted and have a matching puzzle hash
+                    query += (
+                        f"UNION SELECT {COIN_STATE_COLUMNS}, MAX(confirmed_index, spent_index) AS max_height "
+                        f"FROM coin_record INDEXED BY sqlite_autoindex_coin_record_1 "
+                        f"WHERE coin_name IN (SELECT coin_id FROM hints WHERE hint IN {keys_sql}) "
+                        f"AND (confirmed_index>=? OR spent_index>=?) "
+                        f"{height_filter} {amount_filter}"
+                    )
+                    params += keys_params + filter_params
 
-                for row in await cursor.fetchall():
-                    coin_state = self.row_to_coin_state(row)
-                    coin_states_dict[coin_state.coin.name()] = coin_state
-
-            coin_states = list(coin_states_dict.values())
-
-            if include_hinted:
-                coin_states.sort(key=lambda cr: max(cr.created_height or uint32(0), cr.spent_height or uint32(0)))
-                while len(coin_states) > max_items + 1:
-                    coin_states.pop()
+                async with conn.execute(
+                    f"{query} ORDER BY max_height ASC LIMIT ?", params + (max_items + 1,)
+                ) as cursor:
+                    coin_states = rows_to_coin_states(await cursor.fetchall())
 
         # If there aren't too many coin states, we've finished syncing these hashes.
         # There is no next height to start from, so return `None`.
@@ -536,6 +680,9 @@ class CoinStore:
         Returns the list of coin records that have been modified
         """
 
+        # the rollback is performed in the DB, so the pending changes need to be there first
+        await self.flush_unspent_cache()
+
         coin_changes: Dict[bytes32, CoinRecord] = {}
         # Add coins that are confirmed in the reverted blocks to the list of updated coins.
         async with self.db_wrapper.writer_maybe_transaction() as conn:
@@ -566,6 +713,8 @@ class CoinStore:
 
             await conn.execute("UPDATE coin_record SET spent_index=0 WHERE spent_index>?", (block_index,))
         self.coins_added_at_height_cache = LRUCache(self.coins_added_at_height_cache.capacity)
+        if self.unspent_cache is not None:
+            self.unspent_cache.clear_clean()
         return list(coin_changes.values())
 
     # Store CoinRecord in DB
@@ -598,6 +747,9 @@ class CoinStore:
         if len(coin_names) == 0:
             return None
 
+        if self.unspent_cache is not None:
+            self.unspent_cache.forget(coin_names)
+
         async with self.db_wrapper.writer_maybe_transaction() as conn:
             rows_updated: int = 0
             for batch in to_batches(coin_names, SQLITE_MAX_VARIABLE_NUMBER):
@@ -617,6 +769,7 @@ class CoinStore:
 
     # Lookup the most recent unspent lineage that matches a puzzle hash
     async def get_unspent_lineage_info_for_puzzle_hash(self, puzzle_hash: bytes32) -> Optional[UnspentLineageInfo]:
+        await self.flush_unspent_cache()
         async with self.db_wrapper.reader_no_transaction() as conn:
             async with conn.execute(
                 "SELECT unspent.coin_name, "
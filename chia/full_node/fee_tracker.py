@@ -145,18 +145,19 @@ class FeeStat:  # TxConfirmStats
         self.m_fee_rate_avg[bucket_index] += fee_rate
 
     def update_moving_averages(self) -> None:
-        for j in range(0, len(self.buckets)):
-            for i in range(0, len(self.confirmed_average)):
-                self.confirmed_average[i][j] *= self.decay
-                self.failed_average[i][j] *= self.decay
-
-            self.tx_ct_avg[j] *= self.decay
-            self.m_fee_rate_avg[j] *= self.decay
+        # this runs for every block, so every row is updated in a single list
+        # comprehension rather than element by element
+        decay = self.decay
+        self.confirmed_average = [[v * decay for v in row] for row in self.confirmed_average]
+        self.failed_average = [[v * decay for v in row] for row in self.failed_average]
+        self.tx_ct_avg = [v * decay for v in self.tx_ct_avg]
+        self.m_fee_rate_avg = [v * decay for v in self.m_fee_rate_avg]
 
     def clear_current(self, block_height: uint32) -> None:
-        for i in range(0, len(self.buckets)):
-            self.old_unconfirmed_txs[i] += self.unconfirmed_txs[block_height % len(self.unconfirmed_txs)][i]
-            self.unconfirmed_txs[block_height % len(self.unconfirmed_txs)][i] = 0
+        block_index = block_height % len(self.unconfirmed_txs)
+        current = self.unconfirmed_txs[block_index]
+        self.old_unconfirmed_txs = [old + new for old, new in zip(self.old_unconfirmed_txs, current)]
+        self.unconfirmed_txs[block_index] = [0] * len(self.buckets)
 
     def new_mempool_tx(self, block_height: uint32, fee_rate: float) -> int:
         bucket_index: int = get_bucket_index(self.buckets, fee_rate)
@@ -270,30 +271,40 @@ class FeeStat:  # TxConfirmStats
             in_mempool=0.0,
             left_mempool=0.0,
         )
+        if period_target - 1 < 0 or period_target - 1 >= len(self.confirmed_average):
+            return EstimateResult(
+                requested_time=uint64(conf_target * SECONDS_PER_BLOCK),
+                pass_bucket=pass_bucket,
+                fail_bucket=fail_bucket,
+                median=-1.0,
+            )
+
+        confirmed_average = self.confirmed_average[period_target - 1]
+        failed_average = self.failed_average[period_target - 1]
+        ca_len = len(confirmed_average)
+        if max_bucket_index >= ca_len:
+            raise RuntimeError(f"bucket index ({max_bucket_index}) out of range (0, {ca_len})")
+
+        # the number of transactions in each bucket that have been in the
+        # mempool for at least conf_target blocks. The counts are integers, so
+        # summing them up front gives the same result as adding them to
+        # extra_num one by one
+        still_unconfirmed = [
+            self.unconfirmed_txs[(block_height - conf_ct) % bins] for conf_ct in range(conf_target, self.max_confirms)
+        ]
+        extra_per_bucket = [sum(counts) for counts in zip(*still_unconfirmed, self.old_unconfirmed_txs)]
+
         for bucket in range(max_bucket_index, -1, -1):
             if new_bucket_range:
                 cur_near_bucket = bucket
                 new_bucket_range = False
 
             cur_far_bucket = bucket
-            if period_target - 1 < 0 or period_target - 1 >= len(self.confirmed_average):
-                return EstimateResult(
-                    requested_time=uint64(conf_target * SECONDS_PER_BLOCK),
-                    pass_bucket=pass_bucket,
-                    fail_bucket=fail_bucket,
-                    median=-1.0,
-                )
-
-            ca_len = len(self.confirmed_average[period_target - 1])
-            if bucket < 0 or bucket >= ca_len:
-                raise RuntimeError(f"bucket index ({bucket}) out of range (0, {ca_len})")
-
-            n_conf += self.confirmed_average[period_target - 1][bucket]
+
+            n_conf += confirmed_average[bucket]
             total_num += self.tx_ct_avg[bucket]
-            fail_num += self.failed_average[period_target - 1][bucket]
-            for conf_ct in range(conf_target, self.max_confirms):
-                extra_num += self.unconfirmed_txs[(block_height - conf_ct) % bins][bucket]
-            extra_num += self.old_unconfirmed_txs[bucket]
+            fail_num += failed_average[bucket]
+            extra_num += extra_per_bucket[bucket]
 
             # If we have enough transaction data points in this range of buckets,
             # we can test for success
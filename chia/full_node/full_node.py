@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import collections
 import contextlib
 import dataclasses
 import logging
@@ -18,6 +19,7 @@ from typing import (
     Awaitable,
     Callable,
     ClassVar,
+    Deque,
     Dict,
     List,
     Optional,
@@ -32,6 +34,7 @@ from typing import (
 from chia_rs import AugSchemeMPL
 from packaging.version import Version
 
+from chia.consensus.augmented_chain import AugmentedBlockchain
 from chia.consensus.block_body_validation import ForkInfo
 from chia.consensus.block_creation import unfinished_block_to_full_block
 from chia.consensus.block_record import BlockRecord
@@ -40,9 +43,11 @@ from chia.consensus.blockchain_interface import BlockchainInterface
 from chia.consensus.constants import ConsensusConstants
 from chia.consensus.cost_calculator import NPCResult
 from chia.consensus.difficulty_adjustment import get_next_sub_slot_iters_and_difficulty
+from chia.consensus.full_block_to_block_record import block_to_block_record
 from chia.consensus.make_sub_epoch_summary import next_sub_epoch_summary
 from chia.consensus.multiprocess_validation import PreValidationResult
 from chia.consensus.pot_iterations import calculate_sp_iters
+from chia.full_node.block_fetch_scheduler import BlockFetchScheduler
 from chia.full_node.block_store import BlockStore
 from chia.full_node.bundle_tools import detect_potential_template_generator
 from chia.full_node.coin_store import CoinStore
@@ -52,8 +57,10 @@ from chia.full_node.hint_management import get_hints_and_subscription_coin_ids
 from chia.full_node.hint_store import HintStore
 from chia.full_node.mempool import MempoolRemoveInfo
 from chia.full_node.mempool_manager import MempoolManager, NewPeakItem
+from chia.full_node.mempool_snapshot import load_mempool_snapshot, serialize_mempool_snapshot
 from chia.full_node.signage_point import SignagePoint
 from chia.full_node.subscriptions import PeerSubscriptions, peers_for_spend_bundle
+from chia.full_node.sync_pipeline import PreValidatedBatch, SyncPipelineStats
 from chia.full_node.sync_store import Peak, SyncStore
 from chia.full_node.tx_processing_queue import TransactionQueue
 from chia.full_node.weight_proof import WeightProofHandler
@@ -94,12 +101,15 @@ from chia.util.db_synchronous import db_synchronous_on
 from chia.util.db_version import lookup_db_version, set_db_version_async
 from chia.util.db_wrapper import DBWrapper2, manage_connection
 from chia.util.errors import ConsensusError, Err, TimestampError, ValidationError
+from chia.util.files import write_file_async
 from chia.util.ints import uint8, uint32, uint64, uint128
 from chia.util.limited_semaphore import LimitedSemaphore
 from chia.util.log_exceptions import log_exceptions
+from chia.util.misc import available_logical_cores
 from chia.util.path import path_from_root
 from chia.util.profiler import enable_profiler, mem_profile_task, profile_task
 from chia.util.safe_cancel_task import cancel_task_safe
+from chia.util.shared_pairing_cache import SharedPairingCache
 
 
 # This is the result of calling peak_post_processing, which is then fed into peak_post_processing_2
@@ -171,6 +181,7 @@ class FullNode:
     bad_peak_cache: Dict[bytes32, uint32] = dataclasses.field(default_factory=dict)
     wallet_sync_task: Optional[asyncio.Task[None]] = None
     _bls_cache: BLSCache = dataclasses.field(default_factory=lambda: BLSCache(50000))
+    _shared_pairing_cache: Optional[SharedPairingCache] = None
 
     @property
     def server(self) -> ChiaServer:
@@ -259,15 +270,27 @@ class FullNode:
                                 # empty except it has the database_version table
                                 pass
 
-            self._block_store = await BlockStore.create(self.db_wrapper)
+            self._block_store = await BlockStore.create(
+                self.db_wrapper, respond_blocks_cache_size=self.config.get("respond_blocks_cache_size", 50_000_000)
+            )
             self._hint_store = await HintStore.create(self.db_wrapper)
-            self._coin_store = await CoinStore.create(self.db_wrapper)
+            self._coin_store = await CoinStore.create(
+                self.db_wrapper, unspent_cache_size=self.config.get("unspent_coin_cache_size", 0)
+            )
             self.log.info("Initializing blockchain from disk")
             start_time = time.monotonic()
             reserved_cores = self.config.get("reserved_cores", 0)
             single_threaded = self.config.get("single_threaded", False)
             multiprocessing_start_method = process_config_start_method(config=self.config, log=self.log)
             self.multiprocessing_context = multiprocessing.get_context(method=multiprocessing_start_method)
+            # pairings computed by the transaction and block validation workers
+            # are shared with each other, and with this process, through shared
+            # memory
+            shared_bls_cache_size = self.config.get("shared_bls_cache_size", 0)
+            if shared_bls_cache_size > 0 and not single_threaded:
+                self._shared_pairing_cache = SharedPairingCache.create(shared_bls_cache_size)
+                self._bls_cache = BLSCache(50000, self._shared_pairing_cache)
+            shared_bls_cache_name = None if self._shared_pairing_cache is None else self._shared_pairing_cache.name
             self._blockchain = await Blockchain.create(
                 coin_store=self.coin_store,
                 block_store=self.block_store,
@@ -276,6 +299,7 @@ class FullNode:
                 reserved_cores=reserved_cores,
                 multiprocessing_context=self.multiprocessing_context,
                 single_threaded=single_threaded,
+                shared_bls_cache_name=shared_bls_cache_name,
             )
 
             self._mempool_manager = MempoolManager(
@@ -283,6 +307,8 @@ class FullNode:
                 consensus_constants=self.constants,
                 multiprocessing_context=self.multiprocessing_context,
                 single_threaded=single_threaded,
+                mempool_engine=self.config.get("mempool_engine", "sqlite"),
+                shared_bls_cache_name=shared_bls_cache_name,
             )
 
             # Transactions go into this queue from the server, and get sent to respond_transaction
@@ -323,7 +349,9 @@ class FullNode:
                 )
                 async with self.blockchain.priority_mutex.acquire(priority=BlockchainMutexPriority.high):
                     pending_tx = await self.mempool_manager.new_peak(self.blockchain.get_tx_peak(), None)
-                assert len(pending_tx.items) == 0  # no pending transactions when starting up
+                    assert len(pending_tx.items) == 0  # no pending transactions when starting up
+                    if self.config.get("persist_mempool", False):
+                        await self._restore_mempool_snapshot()
 
                 full_peak: Optional[FullBlock] = await self.blockchain.get_full_peak()
                 assert full_peak is not None
@@ -362,7 +390,14 @@ class FullNode:
                     self.blockchain.shut_down()
                 # same for mempool_manager
                 if self._mempool_manager is not None:
+                    if self.config.get("persist_mempool", False):
+                        await self._save_mempool_snapshot()
                     self.mempool_manager.shut_down()
+                # the workers using it have exited now
+                if self._shared_pairing_cache is not None:
+                    self._bls_cache.shared = None
+                    self._shared_pairing_cache.close()
+                    self._shared_pairing_cache.unlink()
 
                 if self.full_node_peers is not None:
                     asyncio.create_task(self.full_node_peers.close())
@@ -386,6 +421,38 @@ class FullNode:
         assert self._block_store is not None
         return self._block_store
 
+    @property
+    def shared_pairing_cache(self) -> Optional[SharedPairingCache]:
+        return self._shared_pairing_cache
+
+    @property
+    def mempool_snapshot_path(self) -> Path:
+        return self.db_path.parent / "mempool-snapshot"
+
+    async def _restore_mempool_snapshot(self) -> None:
+        snapshot = load_mempool_snapshot(self.mempool_snapshot_path)
+        # a snapshot is only restored once. If the node doesn't shut down
+        # cleanly, the next start must not restore this stale mempool again
+        self.mempool_snapshot_path.unlink(missing_ok=True)
+        if snapshot is None:
+            return
+        start_time = time.monotonic()
+        added = await self.mempool_manager.restore_snapshot(snapshot)
+        self.log.info(
+            f"restored {added} of {len(snapshot.items)} mempool items from snapshot at height "
+            f"{snapshot.peak_height}, time taken: {time.monotonic() - start_time:0.2f}s"
+        )
+
+    async def _save_mempool_snapshot(self) -> None:
+        peak = self.mempool_manager.peak
+        if peak is None:
+            return
+        try:
+            data = serialize_mempool_snapshot(peak.header_hash, peak.height, self.mempool_manager.snapshot_items())
+            await write_file_async(self.mempool_snapshot_path, data)
+        except Exception as e:
+            self.log.error(f"failed to write mempool snapshot: {e}")
+
     @property
     def timelord_lock(self) -> asyncio.Lock:
         assert self._timelord_lock is not None
@@ -492,6 +559,11 @@ class FullNode:
             self.add_transaction_semaphore.release()
 
     async def _handle_transactions(self) -> None:
+        batch_size: int = self.config.get("tx_validation_batch_size", 1)
+        if batch_size > 1:
+            max_wait: float = self.config.get("tx_validation_batch_wait_ms", 10) / 1000
+            await self._handle_transaction_batches(batch_size, max_wait)
+            return
         while not self._shut_down:
             # We use a semaphore to make sure we don't send more than 200 concurrent calls of respond_transaction.
             # However, doing them one at a time would be slow, because they get sent to other processes.
@@ -499,11 +571,99 @@ class FullNode:
             item: TransactionQueueEntry = await self.transaction_queue.pop()
             asyncio.create_task(self._handle_one_transaction(item))
 
+    async def _handle_transaction_batches(self, batch_size: int, max_wait: float) -> None:
+        """
+        Takes transactions off the queue in batches of up to batch_size, and
+        pre-validates each batch together. Once the first transaction of a
+        batch has arrived, we wait at most max_wait seconds for the batch to
+        fill up.
+        """
+        # if waiting for a transaction timed out, it becomes the first one of
+        # the next batch
+        next_pop: Optional[asyncio.Task[TransactionQueueEntry]] = None
+        try:
+            while not self._shut_down:
+                batch: List[TransactionQueueEntry] = []
+                deadline: Optional[float] = None
+                while len(batch) < batch_size:
+                    if next_pop is None:
+                        # every transaction being handled holds the semaphore
+                        await self.add_transaction_semaphore.acquire()
+                        next_pop = asyncio.create_task(self.transaction_queue.pop())
+                    if deadline is None:
+                        batch.append(await next_pop)
+                        next_pop = None
+                        deadline = time.monotonic() + max_wait
+                        continue
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    done, _ = await asyncio.wait([next_pop], timeout=timeout)
+                    if len(done) == 0:
+                        break
+                    batch.append(next_pop.result())
+                    next_pop = None
+                asyncio.create_task(self._handle_transaction_batch(batch))
+        finally:
+            if next_pop is not None:
+                next_pop.cancel()
+
+    async def _handle_transaction_batch(self, entries: List[TransactionQueueEntry]) -> None:
+        try:
+            to_validate: List[TransactionQueueEntry] = []
+            for entry in entries:
+                result = await self._admit_transaction(entry.spend_name, entry.test)
+                if result is None:
+                    to_validate.append(entry)
+                else:
+                    entry.done.set(result)
+            if len(to_validate) == 0:
+                return
+
+            try:
+                cost_results = await self.mempool_manager.pre_validate_spendbundles(
+                    [(entry.transaction, entry.transaction_bytes, entry.spend_name) for entry in to_validate],
+                    self._bls_cache,
+                )
+            except Exception:
+                for entry in to_validate:
+                    self.mempool_manager.remove_seen(entry.spend_name)
+                raise
+
+            for entry, cost_result in zip(to_validate, cost_results):
+                if isinstance(cost_result, ValidationError):
+                    self.mempool_manager.remove_seen(entry.spend_name)
+                    entry.done.set((MempoolInclusionStatus.FAILED, cost_result.code))
+                    continue
+                try:
+                    entry.done.set(
+                        await self._add_pre_validated_transaction(
+                            entry.transaction, entry.spend_name, entry.peer, cost_result
+                        )
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    error_stack = traceback.format_exc()
+                    self.log.error(f"Error in _handle_transaction_batch, closing: {error_stack}")
+                    if entry.peer is not None:
+                        await entry.peer.close()
+        except asyncio.CancelledError:
+            error_stack = traceback.format_exc()
+            self.log.debug(f"Cancelling _handle_transaction_batch, closing: {error_stack}")
+        except Exception:
+            error_stack = traceback.format_exc()
+            self.log.error(f"Error in _handle_transaction_batch: {error_stack}")
+        finally:
+            for _ in entries:
+                self.add_transaction_semaphore.release()
+
     async def initialize_weight_proof(self) -> None:
         self.weight_proof_handler = WeightProofHandler(
             constants=self.constants,
             blockchain=self.blockchain,
             multiprocessing_context=self.multiprocessing_context,
+            num_processes=max(available_logical_cores() - self.config.get("reserved_cores", 0), 1),
         )
         peak = self.blockchain.get_peak()
         if peak is not None:
@@ -1052,7 +1212,7 @@ class FullNode:
         peak_hash: bytes32,
         summaries: List[SubEpochSummary],
     ) -> None:
-        buffer_size = 4
+        buffer_size = self.config.get("sync_pipeline_depth", 4)
         self.log.info(f"Start syncing from fork point at {fork_point_height} up to {target_peak_sb_height}")
         peers_with_peak: List[WSChiaConnection] = self.get_peers_with_peak(peak_hash)
         fork_point_height = await check_fork_next_block(
@@ -1060,6 +1220,20 @@ class FullNode:
         )
         batch_size = self.constants.MAX_BLOCK_COUNT_PER_REQUESTS
 
+        # the sync is a pipeline of three stages, connected by bounded queues:
+        # fetching block batches from peers, pre-validating them on the
+        # process pool and adding them to the blockchain. Pre-validating a
+        # batch can start before the previous batch has been added, so the two
+        # overlap
+        batch_queue_input: asyncio.Queue[Optional[Tuple[WSChiaConnection, List[FullBlock]]]] = asyncio.Queue(
+            maxsize=buffer_size
+        )
+        batch_queue_validated: asyncio.Queue[Optional[PreValidatedBatch]] = asyncio.Queue(maxsize=buffer_size)
+        stats = SyncPipelineStats(
+            depth=buffer_size, active=True, fetched_queue=batch_queue_input, validated_queue=batch_queue_validated
+        )
+        self.sync_store.pipeline_stats = stats
+
         # normally "fork_point" or "fork_height" refers to the first common
         # block between the main chain and the fork. Here "fork_point_height"
         # seems to refer to the first diverging block
@@ -1067,112 +1241,246 @@ class FullNode:
         async def fetch_block_batches(
             batch_queue: asyncio.Queue[Optional[Tuple[WSChiaConnection, List[FullBlock]]]]
         ) -> None:
-            start_height, end_height = 0, 0
             new_peers_with_peak: List[WSChiaConnection] = peers_with_peak[:]
+
+            def get_peers() -> List[WSChiaConnection]:
+                nonlocal new_peers_with_peak
+                if self.sync_store.peers_changed.is_set():
+                    new_peers_with_peak = self.get_peers_with_peak(peak_hash)
+                    self.sync_store.peers_changed.clear()
+                return new_peers_with_peak
+
+            async def request_blocks(
+                peer: WSChiaConnection, start_height: int, end_height: int
+            ) -> Optional[List[FullBlock]]:
+                request = RequestBlocks(uint32(start_height), uint32(end_height), True)
+                response = await peer.call_api(FullNodeAPI.request_blocks, request, timeout=30)
+                if response is None:
+                    await peer.close()
+                elif isinstance(response, RespondBlocks):
+                    return response.blocks
+                return None
+
+            # block request ranges are *inclusive*
+            scheduler = BlockFetchScheduler(
+                fork_point_height,
+                target_peak_sb_height,
+                get_peers,
+                request_blocks,
+                max_batch_size=batch_size,
+                max_in_flight=self.config.get("sync_block_requests_in_flight", 8),
+            )
+            stats.fetch_peers = scheduler.peer_stats
+            batches = scheduler.batches()
+            cancelled = False
             try:
-                # block request ranges are *inclusive*, this requires some
-                # gymnastics of this range (+1 to make it exclusive, like normal
-                # ranges) and then -1 when forming the request message
-                for start_height in range(fork_point_height, target_peak_sb_height + 1, batch_size):
-                    end_height = min(target_peak_sb_height, start_height + batch_size - 1)
-                    request = RequestBlocks(uint32(start_height), uint32(end_height), True)
-                    fetched = False
-                    for peer in random.sample(new_peers_with_peak, len(new_peers_with_peak)):
-                        if peer.closed:
-                            continue
-                        response = await peer.call_api(FullNodeAPI.request_blocks, request, timeout=30)
-                        if response is None:
-                            await peer.close()
-                        elif isinstance(response, RespondBlocks):
-                            await batch_queue.put((peer, response.blocks))
-                            fetched = True
-                            break
-                    if fetched is False:
-                        self.log.error(f"failed fetching {start_height} to {end_height} from peers")
-                        return
-                    if self.sync_store.peers_changed.is_set():
-                        new_peers_with_peak = self.get_peers_with_peak(peak_hash)
-                        self.sync_store.peers_changed.clear()
+                while True:
+                    try:
+                        with stats.fetch.busy():
+                            fetched = await batches.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    stats.fetch.record_batch(len(fetched[1]))
+                    with stats.fetch.waiting_for_output():
+                        await batch_queue.put(fetched)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
             except Exception as e:
-                self.log.error(f"Exception fetching {start_height} to {end_height} from peer {e}")
+                self.log.error(f"Exception fetching blocks from peers {e}")
             finally:
-                # finished signal with None
-                await batch_queue.put(None)
-
-        async def validate_block_batches(
-            inner_batch_queue: asyncio.Queue[Optional[Tuple[WSChiaConnection, List[FullBlock]]]]
+                await batches.aclose()
+                # finished signal with None. When cancelled, the next stage is
+                # cancelled too, and waiting for room in the queue would hang
+                if not cancelled:
+                    await batch_queue.put(None)
+
+        async def pre_validate_block_batches(
+            inner_batch_queue: asyncio.Queue[Optional[Tuple[WSChiaConnection, List[FullBlock]]]],
+            output_queue: asyncio.Queue[Optional[PreValidatedBatch]],
         ) -> None:
+            # the batches passed on to the next stage, that haven't been added
+            # to the blockchain yet. Their blocks are added to augmented_chain,
+            # for the subsequent batches to be validated on top of
+            in_flight: Deque[PreValidatedBatch] = collections.deque()
+            augmented_chain = AugmentedBlockchain(self.blockchain)
+            # the block the in-flight blocks build on. Height -1 when they
+            # start with the genesis block
+            chain_base: Optional[Tuple[int, bytes32]] = None
+
+            def forget_applied_batches() -> None:
+                nonlocal augmented_chain, chain_base
+                while len(in_flight) > 0 and in_flight[0].applied.is_set():
+                    for block in in_flight.popleft().blocks_to_validate:
+                        augmented_chain.remove_extra_block(block.header_hash)
+                if len(in_flight) == 0:
+                    # start over, to not accumulate block records cached
+                    # during pre-validation
+                    augmented_chain = AugmentedBlockchain(self.blockchain)
+                    chain_base = None
+
+            cancelled = False
+            try:
+                while True:
+                    with stats.pre_validate.waiting_for_input():
+                        res: Optional[Tuple[WSChiaConnection, List[FullBlock]]] = await inner_batch_queue.get()
+                    if res is None:
+                        self.log.debug("done fetching blocks")
+                        return None
+                    peer, blocks = res
+
+                    forget_applied_batches()
+                    if (
+                        chain_base is not None
+                        and chain_base[0] >= 0
+                        and self.blockchain.height_to_hash(uint32(chain_base[0])) != chain_base[1]
+                    ):
+                        # the in-flight blocks don't extend the main chain
+                        # (yet), i.e. we're syncing a fork. Looking up
+                        # ancestors by height would find the wrong blocks, so
+                        # we can't validate on top of them. Wait for them to
+                        # be added instead
+                        with stats.pre_validate.waiting_for_output():
+                            await in_flight[-1].applied.wait()
+                        forget_applied_batches()
+
+                    with stats.pre_validate.busy():
+                        # the blocks in flight are not in the blockchain, so
+                        # this can't skip any of them
+                        blocks_to_validate: List[FullBlock] = []
+                        for i, block in enumerate(blocks):
+                            if not await self.blockchain.contains_block_from_db(block.header_hash):
+                                blocks_to_validate = blocks[i:]
+                                break
+
+                        pre_validation_results: List[PreValidationResult] = []
+                        if len(blocks_to_validate) > 0:
+                            # when nothing is in flight, the next stage is idle.
+                            # Validating against the blockchain itself populates
+                            # its block record cache, as needed by the next stage
+                            pre_validation_results = await self.prevalidate_blocks(
+                                blocks_to_validate,
+                                summaries,
+                                augmented_chain if len(in_flight) > 0 else None,
+                            )
+
+                        if all(pvr.error is None for pvr in pre_validation_results):
+                            for block, pvr in zip(blocks_to_validate, pre_validation_results):
+                                assert pvr.required_iters is not None
+                                block_record = block_to_block_record(
+                                    self.constants, augmented_chain, pvr.required_iters, block, None
+                                )
+                                if chain_base is None:
+                                    chain_base = (block.height - 1, block.prev_header_hash)
+                                augmented_chain.add_extra_block(block, block_record)
+
+                    batch = PreValidatedBatch(peer, blocks, blocks_to_validate, pre_validation_results)
+                    in_flight.append(batch)
+                    stats.pre_validate.record_batch(len(blocks_to_validate))
+                    with stats.pre_validate.waiting_for_output():
+                        await output_queue.put(batch)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            finally:
+                # finished signal with None. When cancelled, the next stage is
+                # cancelled too, and waiting for room in the queue would hang
+                if not cancelled:
+                    await output_queue.put(None)
+
+        async def add_block_batches(inner_batch_queue: asyncio.Queue[Optional[PreValidatedBatch]]) -> None:
             fork_info: Optional[ForkInfo] = None
 
             while True:
-                res: Optional[Tuple[WSChiaConnection, List[FullBlock]]] = await inner_batch_queue.get()
-                if res is None:
-                    self.log.debug("done fetching blocks")
+                with stats.apply.waiting_for_input():
+                    batch: Optional[PreValidatedBatch] = await inner_batch_queue.get()
+                if batch is None:
+                    self.log.debug("done validating blocks")
                     return None
-                peer, blocks = res
-                start_height = blocks[0].height
-                end_height = blocks[-1].height
-
-                # in case we're validating a reorg fork (i.e. not extending the
-                # main chain), we need to record the coin set from that fork in
-                # fork_info. Otherwise validation is very expensive, especially
-                # for deep reorgs
-                peak: Optional[BlockRecord]
-                if fork_info is None:
-                    peak = self.blockchain.get_peak()
-                    extending_main_chain: bool = peak is None or (
-                        peak.header_hash == blocks[0].prev_header_hash or peak.header_hash == blocks[0].header_hash
-                    )
-                    # if we're simply extending the main chain, it's important
-                    # *not* to pass in a ForkInfo object, as it can potentially
-                    # accrue a large state (with no value, since we can validate
-                    # against the CoinStore)
-                    if not extending_main_chain:
-                        if fork_point_height == 0:
-                            fork_info = ForkInfo(-1, -1, self.constants.GENESIS_CHALLENGE)
-                        else:
-                            fork_hash = self.blockchain.height_to_hash(uint32(fork_point_height - 1))
-                            assert fork_hash is not None
-                            fork_info = ForkInfo(fork_point_height - 1, fork_point_height - 1, fork_hash)
-
-                success, state_change_summary, err = await self.add_block_batch(
-                    blocks,
+                try:
+                    with stats.apply.busy():
+                        fork_info = await apply_block_batch(batch, fork_info)
+                finally:
+                    batch.applied.set()
+                stats.apply.record_batch(len(batch.blocks_to_validate))
+
+        async def apply_block_batch(batch: PreValidatedBatch, fork_info: Optional[ForkInfo]) -> Optional[ForkInfo]:
+            peer, blocks = batch.peer, batch.blocks
+            start_height = blocks[0].height
+            end_height = blocks[-1].height
+
+            # in case we're validating a reorg fork (i.e. not extending the
+            # main chain), we need to record the coin set from that fork in
+            # fork_info. Otherwise validation is very expensive, especially
+            # for deep reorgs
+            peak: Optional[BlockRecord]
+            if fork_info is None:
+                peak = self.blockchain.get_peak()
+                extending_main_chain: bool = peak is None or (
+                    peak.header_hash == blocks[0].prev_header_hash or peak.header_hash == blocks[0].header_hash
+                )
+                # if we're simply extending the main chain, it's important
+                # *not* to pass in a ForkInfo object, as it can potentially
+                # accrue a large state (with no value, since we can validate
+                # against the CoinStore)
+                if not extending_main_chain:
+                    if fork_point_height == 0:
+                        fork_info = ForkInfo(-1, -1, self.constants.GENESIS_CHALLENGE)
+                    else:
+                        fork_hash = self.blockchain.height_to_hash(uint32(fork_point_height - 1))
+                        assert fork_hash is not None
+                        fork_info = ForkInfo(fork_point_height - 1, fork_point_height - 1, fork_hash)
+
+            num_known = len(blocks) - len(batch.blocks_to_validate)
+            if fork_info is not None and num_known > 0:
+                await self.skip_blocks(blocks[:num_known], fork_info)
+
+            state_change_summary: Optional[StateChangeSummary] = None
+            if len(batch.blocks_to_validate) > 0:
+                success, state_change_summary, err = await self.add_prevalidated_blocks(
+                    batch.blocks_to_validate,
+                    batch.pre_validation_results,
                     peer.get_peer_logging(),
                     fork_info,
-                    summaries,
                 )
                 if success is False:
                     await peer.close(600)
                     raise ValueError(f"Failed to validate block batch {start_height} to {end_height}")
-                self.log.info(f"Added blocks {start_height} to {end_height}")
-                peak = self.blockchain.get_peak()
-                if state_change_summary is not None:
-                    assert peak is not None
-                    # Hints must be added to the DB. The other post-processing tasks are not required when syncing
-                    hints_to_add, _ = get_hints_and_subscription_coin_ids(
-                        state_change_summary,
-                        self.subscriptions.has_coin_subscription,
-                        self.subscriptions.has_puzzle_subscription,
-                    )
-                    await self.hint_store.add_hints(hints_to_add)
-                # Note that end_height is not necessarily the peak at this
-                # point. In case of a re-org, it may even be significantly
-                # higher than _peak_height, and still not be the peak.
-                # clean_block_record() will not necessarily honor this cut-off
-                # height, in that case.
-                self.blockchain.clean_block_record(end_height - self.constants.BLOCKS_CACHE_SIZE)
+            self.log.info(f"Added blocks {start_height} to {end_height}")
+            peak = self.blockchain.get_peak()
+            if state_change_summary is not None:
+                assert peak is not None
+                # Hints must be added to the DB. The other post-processing tasks are not required when syncing
+                hints_to_add, _ = get_hints_and_subscription_coin_ids(
+                    state_change_summary,
+                    self.subscriptions.has_coin_subscription,
+                    self.subscriptions.has_puzzle_subscription,
+                )
+                await self.hint_store.add_hints(hints_to_add)
+            # Note that end_height is not necessarily the peak at this
+            # point. In case of a re-org, it may even be significantly
+            # higher than _peak_height, and still not be the peak.
+            # clean_block_record() will not necessarily honor this cut-off
+            # height, in that case.
+            self.blockchain.clean_block_record(end_height - self.constants.BLOCKS_CACHE_SIZE)
+            return fork_info
 
-        batch_queue_input: asyncio.Queue[Optional[Tuple[WSChiaConnection, List[FullBlock]]]] = asyncio.Queue(
-            maxsize=buffer_size
-        )
         fetch_task = asyncio.Task(fetch_block_batches(batch_queue_input))
-        validate_task = asyncio.Task(validate_block_batches(batch_queue_input))
+        pre_validate_task = asyncio.Task(pre_validate_block_batches(batch_queue_input, batch_queue_validated))
+        add_task = asyncio.Task(add_block_batches(batch_queue_validated))
         try:
             with log_exceptions(log=self.log, message="sync from fork point failed"):
-                await asyncio.gather(fetch_task, validate_task)
+                await asyncio.gather(fetch_task, pre_validate_task, add_task)
         except Exception:
-            assert validate_task.done()
-            fetch_task.cancel()  # no need to cancel validate_task, if we end up here validate_task is already done
+            # no need to cancel the tasks that are already done
+            fetch_task.cancel()
+            pre_validate_task.cancel()
+            add_task.cancel()
+            await asyncio.gather(fetch_task, pre_validate_task, add_task, return_exceptions=True)
+        finally:
+            stats.active = False
+            stats.fetched_queue = None
+            stats.validated_queue = None
 
     def get_peers_with_peak(self, peak_hash: bytes32) -> List[WSChiaConnection]:
         peer_ids: Set[bytes32] = self.sync_store.get_peers_that_have_peak([peak_hash])
@@ -1238,16 +1546,26 @@ class FullNode:
         # Precondition: All blocks must be contiguous blocks, index i+1 must be the parent of index i
         # Returns a bool for success, as well as a StateChangeSummary if the peak was advanced
 
+        blocks_to_validate = await self.skip_blocks(all_blocks, fork_info)
+        if len(blocks_to_validate) == 0:
+            return True, None, None
+
+        pre_validation_results = await self.prevalidate_blocks(blocks_to_validate, wp_summaries)
+        return await self.add_prevalidated_blocks(blocks_to_validate, pre_validation_results, peer_info, fork_info)
+
+    async def skip_blocks(self, all_blocks: List[FullBlock], fork_info: Optional[ForkInfo]) -> List[FullBlock]:
+        """
+        Returns the tail of all_blocks that is not in the blockchain yet. The
+        blocks we already have are used to update fork_info, if there is one.
+        """
         block_dict: Dict[bytes32, FullBlock] = {}
         for block in all_blocks:
             block_dict[block.header_hash] = block
 
-        blocks_to_validate: List[FullBlock] = []
         for i, block in enumerate(all_blocks):
             header_hash = block.header_hash
             if not await self.blockchain.contains_block_from_db(header_hash):
-                blocks_to_validate = all_blocks[i:]
-                break
+                return all_blocks[i:]
 
             if fork_info is None:
                 continue
@@ -1271,15 +1589,23 @@ class FullNode:
                 # removals in fork_info.
                 await self.blockchain.advance_fork_info(block, fork_info, block_dict)
                 await self.blockchain.run_single_block(block, fork_info, block_dict)
+        return []
 
-        if len(blocks_to_validate) == 0:
-            return True, None, None
-
+    async def prevalidate_blocks(
+        self,
+        blocks_to_validate: List[FullBlock],
+        wp_summaries: Optional[List[SubEpochSummary]] = None,
+        augmented_chain: Optional[AugmentedBlockchain] = None,
+    ) -> List[PreValidationResult]:
         # Validates signatures in multiprocessing since they take a while, and we don't have cached transactions
         # for these blocks (unlike during normal operation where we validate one at a time)
         pre_validate_start = time.monotonic()
         pre_validation_results: List[PreValidationResult] = await self.blockchain.pre_validate_blocks_multiprocessing(
-            blocks_to_validate, {}, wp_summaries=wp_summaries, validate_signatures=True
+            blocks_to_validate,
+            {},
+            wp_summaries=wp_summaries,
+            validate_signatures=True,
+            augmented_chain=augmented_chain,
         )
         pre_validate_end = time.monotonic()
         pre_validate_time = pre_validate_end - pre_validate_start
@@ -1290,6 +1616,16 @@ class FullNode:
             f"CLVM: {sum([pvr.timing/1000.0 for pvr in pre_validation_results]):0.2f}s "
             f"({len(blocks_to_validate)} blocks, start height: {blocks_to_validate[0].height})",
         )
+        return pre_validation_results
+
+    async def add_prevalidated_blocks(
+        self,
+        blocks_to_validate: List[FullBlock],
+        pre_validation_results: List[PreValidationResult],
+        peer_info: PeerInfo,
+        fork_info: Optional[ForkInfo],
+    ) -> Tuple[bool, Optional[StateChangeSummary], Optional[Err]]:
+        add_start = time.monotonic()
         for i, block in enumerate(blocks_to_validate):
             if pre_validation_results[i].error is not None:
                 self.log.error(f"Invalid block from peer: {peer_info} {Err(pre_validation_results[i].error)}")
@@ -1297,6 +1633,32 @@ class FullNode:
 
         agg_state_change_summary: Optional[StateChangeSummary] = None
 
+        # if enabled, the coin store keeps the coin set changes of the whole batch
+        # in memory and writes them to the DB in bulk, when the batch is done
+        async with self.coin_store.write_back():
+            success, agg_state_change_summary, error = await self._add_pre_validated_blocks(
+                blocks_to_validate, pre_validation_results, peer_info, fork_info
+            )
+        if not success:
+            return False, agg_state_change_summary, error
+
+        if agg_state_change_summary is not None:
+            self._state_changed("new_peak")
+            self.log.debug(
+                f"Total time for adding {len(blocks_to_validate)} blocks: {time.monotonic() - add_start}, "
+                f"advanced: True"
+            )
+        return True, agg_state_change_summary, None
+
+    async def _add_pre_validated_blocks(
+        self,
+        blocks_to_validate: List[FullBlock],
+        pre_validation_results: List[PreValidationResult],
+        peer_info: PeerInfo,
+        fork_info: Optional[ForkInfo],
+    ) -> Tuple[bool, Optional[StateChangeSummary], Optional[Err]]:
+        agg_state_change_summary: Optional[StateChangeSummary] = None
+
         for i, block in enumerate(blocks_to_validate):
             assert pre_validation_results[i].required_iters is not None
             state_change_summary: Optional[StateChangeSummary]
@@ -1336,12 +1698,6 @@ class FullNode:
             if block_record.sub_epoch_summary_included is not None:
                 if self.weight_proof_handler is not None:
                     await self.weight_proof_handler.create_prev_sub_epoch_segments()
-        if agg_state_change_summary is not None:
-            self._state_changed("new_peak")
-            self.log.debug(
-                f"Total time for {len(blocks_to_validate)} blocks: {time.monotonic() - pre_validate_start}, "
-                f"advanced: True"
-            )
         return True, agg_state_change_summary, None
 
     async def _finish_sync(self) -> None:
@@ -2322,6 +2678,28 @@ class FullNode:
         test: bool = False,
         tx_bytes: Optional[bytes] = None,
     ) -> Tuple[MempoolInclusionStatus, Optional[Err]]:
+        result = await self._admit_transaction(spend_name, test)
+        if result is not None:
+            return result
+        try:
+            cost_result = await self.mempool_manager.pre_validate_spendbundle(
+                transaction, tx_bytes, spend_name, self._bls_cache
+            )
+        except ValidationError as e:
+            self.mempool_manager.remove_seen(spend_name)
+            return MempoolInclusionStatus.FAILED, e.code
+        except Exception:
+            self.mempool_manager.remove_seen(spend_name)
+            raise
+        return await self._add_pre_validated_transaction(transaction, spend_name, peer, cost_result)
+
+    async def _admit_transaction(
+        self, spend_name: bytes32, test: bool
+    ) -> Optional[Tuple[MempoolInclusionStatus, Optional[Err]]]:
+        """
+        Returns the outcome of adding the transaction, if there's no need to
+        validate it. Otherwise it's marked as seen, and None is returned.
+        """
         if self.sync_store.get_sync_mode():
             return MempoolInclusionStatus.FAILED, Err.NO_TRANSACTIONS_WHILE_SYNCING
         if not test and not (await self.synced()):
@@ -2337,51 +2715,48 @@ class FullNode:
         # Ignore if syncing or if we have not yet received a block
         # the mempool must have a peak to validate transactions
         if self.sync_store.get_sync_mode() or self.mempool_manager.peak is None:
-            status = MempoolInclusionStatus.FAILED
-            error: Optional[Err] = Err.NO_TRANSACTIONS_WHILE_SYNCING
             self.mempool_manager.remove_seen(spend_name)
-        else:
-            try:
-                cost_result = await self.mempool_manager.pre_validate_spendbundle(
-                    transaction, tx_bytes, spend_name, self._bls_cache
-                )
-            except ValidationError as e:
-                self.mempool_manager.remove_seen(spend_name)
-                return MempoolInclusionStatus.FAILED, e.code
-            except Exception:
+            return MempoolInclusionStatus.FAILED, Err.NO_TRANSACTIONS_WHILE_SYNCING
+        return None
+
+    async def _add_pre_validated_transaction(
+        self,
+        transaction: SpendBundle,
+        spend_name: bytes32,
+        peer: Optional[WSChiaConnection],
+        cost_result: NPCResult,
+    ) -> Tuple[MempoolInclusionStatus, Optional[Err]]:
+        async with self.blockchain.priority_mutex.acquire(priority=BlockchainMutexPriority.low):
+            if self.mempool_manager.get_spendbundle(spend_name) is not None:
                 self.mempool_manager.remove_seen(spend_name)
-                raise
-            async with self.blockchain.priority_mutex.acquire(priority=BlockchainMutexPriority.low):
-                if self.mempool_manager.get_spendbundle(spend_name) is not None:
-                    self.mempool_manager.remove_seen(spend_name)
-                    return MempoolInclusionStatus.SUCCESS, None
-                if self.mempool_manager.peak is None:
-                    return MempoolInclusionStatus.FAILED, Err.MEMPOOL_NOT_INITIALIZED
-                info = await self.mempool_manager.add_spend_bundle(
-                    transaction, cost_result, spend_name, self.mempool_manager.peak.height
-                )
-                status = info.status
-                error = info.error
-            if status == MempoolInclusionStatus.SUCCESS:
-                self.log.debug(
-                    f"Added transaction to mempool: {spend_name} mempool size: "
-                    f"{self.mempool_manager.mempool.total_mempool_cost()} normalized "
-                    f"{self.mempool_manager.mempool.total_mempool_cost() / 5000000}"
-                )
+                return MempoolInclusionStatus.SUCCESS, None
+            if self.mempool_manager.peak is None:
+                return MempoolInclusionStatus.FAILED, Err.MEMPOOL_NOT_INITIALIZED
+            info = await self.mempool_manager.add_spend_bundle(
+                transaction, cost_result, spend_name, self.mempool_manager.peak.height
+            )
+            status = info.status
+            error = info.error
+        if status == MempoolInclusionStatus.SUCCESS:
+            self.log.debug(
+                f"Added transaction to mempool: {spend_name} mempool size: "
+                f"{self.mempool_manager.mempool.total_mempool_cost()} normalized "
+                f"{self.mempool_manager.mempool.total_mempool_cost() / 5000000}"
+            )
 
-                # Only broadcast successful transactions, not pending ones. Otherwise it's a DOS
-                # vector.
-                mempool_item = self.mempool_manager.get_mempool_item(spend_name)
-                assert mempool_item is not None
-                await self.broadcast_removed_tx(info.removals)
-                await self.broadcast_added_tx(mempool_item, current_peer=peer)
+            # Only broadcast successful transactions, not pending ones. Otherwise it's a DOS
+            # vector.
+            mempool_item = self.mempool_manager.get_mempool_item(spend_name)
+            assert mempool_item is not None
+            await self.broadcast_removed_tx(info.removals)
+            await self.broadcast_added_tx(mempool_item, current_peer=peer)
 
-                if self.simulator_transaction_callback is not None:  # callback
-                    await self.simulator_transaction_callback(spend_name)  # pylint: disable=E1102
+            if self.simulator_transaction_callback is not None:  # callback
+                await self.simulator_transaction_callback(spend_name)  # pylint: disable=E1102
 
-            else:
-                self.mempool_manager.remove_seen(spend_name)
-                self.log.debug(f"Wasn't able to add transaction with id {spend_name}, status {status} error: {error}")
+        else:
+            self.mempool_manager.remove_seen(spend_name)
+            self.log.debug(f"Wasn't able to add transaction with id {spend_name}, status {status} error: {error}")
         return status, error
 
     async def broadcast_added_tx(
@@ -7,7 +7,7 @@ import time
 import traceback
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, cast
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, Union, cast
 
 import anyio
 from chia_rs import AugSchemeMPL, G1Element, G2Element, MerkleSet
@@ -63,7 +63,7 @@ from chia.types.transaction_queue_entry import TransactionQueueEntry
 from chia.types.unfinished_block import UnfinishedBlock
 from chia.util.api_decorators import api_request
 from chia.util.db_wrapper import SQLITE_MAX_VARIABLE_NUMBER
-from chia.util.full_block_utils import header_block_from_block
+from chia.util.full_block_utils import FullBlockView, header_block_from_block
 from chia.util.generator_tools import get_block_header, tx_removals_and_additions
 from chia.util.hash import std_hash
 from chia.util.ints import uint8, uint32, uint64, uint128
@@ -157,9 +157,12 @@ class FullNodeAPI:
         if not (await self.full_node.synced()):
             return None
 
-        # Ignore if already seen
+        # Ignore if already seen, or already in the mempool (the seen cache is
+        # cleared on reorgs)
         if self.full_node.mempool_manager.seen(transaction.transaction_id):
             return None
+        if self.full_node.mempool_manager.get_spendbundle(transaction.transaction_id) is not None:
+            return None
 
         if self.full_node.mempool_manager.is_fee_enough(transaction.fees, transaction.cost):
             # If there's current pending request just add this peer to the set of peers that have this tx
@@ -349,49 +352,47 @@ class FullNodeAPI:
                 msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
                 return msg
 
-        if not request.include_transaction_block:
-            blocks: List[FullBlock] = []
-            for i in range(request.start_height, request.end_height + 1):
-                header_hash_i: Optional[bytes32] = self.full_node.blockchain.height_to_hash(uint32(i))
-                if header_hash_i is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    return make_msg(ProtocolMessageTypes.reject_blocks, reject)
-
-                block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(header_hash_i)
-                if block is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    return make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                block = block.replace(transactions_generator=None)
-                blocks.append(block)
-            msg = make_msg(
-                ProtocolMessageTypes.respond_blocks,
-                full_node_protocol.RespondBlocks(request.start_height, request.end_height, blocks),
-            )
-        else:
-            blocks_bytes: List[bytes] = []
-            for i in range(request.start_height, request.end_height + 1):
-                header_hash_i = self.full_node.blockchain.height_to_hash(uint32(i))
-                if header_hash_i is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    return make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                block_bytes: Optional[bytes] = await self.full_node.block_store.get_full_block_bytes(header_hash_i)
-                if block_bytes is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                    return msg
-
-                blocks_bytes.append(block_bytes)
-
-            respond_blocks_manually_streamed: bytes = (
-                uint32(request.start_height).stream_to_bytes()
-                + uint32(request.end_height).stream_to_bytes()
-                + uint32(len(blocks_bytes)).stream_to_bytes()
-            )
-            for block_bytes in blocks_bytes:
-                respond_blocks_manually_streamed += block_bytes
-            msg = make_msg(ProtocolMessageTypes.respond_blocks, respond_blocks_manually_streamed)
+        # responses are cached, since syncing peers tend to ask for the same
+        # ranges. The entry is only valid if the block at end_height is still
+        # the same
+        block_store = self.full_node.block_store
+        cache_key = (int(request.start_height), int(request.end_height), bool(request.include_transaction_block))
+        end_header_hash: Optional[bytes32] = self.full_node.blockchain.height_to_hash(request.end_height)
+        cached = block_store.respond_blocks_cache.get(cache_key, end_header_hash)
+        if cached is not None:
+            return make_msg(ProtocolMessageTypes.respond_blocks, cached)
 
-        return msg
+        try:
+            block_views = [
+                FullBlockView(block_bytes)
+                for block_bytes in await block_store.get_block_bytes_in_range(request.start_height, request.end_height)
+            ]
+        except ValueError:
+            reject = RejectBlocks(request.start_height, request.end_height)
+            msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
+            return msg
+
+        blocks_bytes: List[Union[bytes, memoryview]] = []
+        for block_view in block_views:
+            if request.include_transaction_block:
+                blocks_bytes.append(block_view.data)
+            else:
+                blocks_bytes.append(block_view.without_generator())
+
+        # we're building the RespondBlocks manually to avoid the cost of
+        # parsing and re-serializing the blocks
+        respond_blocks_manually_streamed: bytes = (
+            uint32(request.start_height).stream_to_bytes()
+            + uint32(request.end_height).stream_to_bytes()
+            + uint32(len(blocks_bytes)).stream_to_bytes()
+        )
+        respond_blocks_manually_streamed += b"".join(blocks_bytes)
+
+        # if the chain changed while we were reading the blocks, they may be
+        # from a different fork than end_header_hash. Don't cache those
+        if end_header_hash is not None and block_views[-1].header_hash == end_header_hash:
+            block_store.respond_blocks_cache.put(cache_key, respond_blocks_manually_streamed, end_header_hash)
+        return make_msg(ProtocolMessageTypes.respond_blocks, respond_blocks_manually_streamed)
 
     @api_request()
     async def reject_block(self, request: full_node_protocol.RejectBlock) -> None:
@@ -1484,24 +1485,26 @@ class FullNodeAPI:
                 return msg
             header_hashes.append(header_hash)
 
-        blocks: List[FullBlock] = await self.full_node.block_store.get_blocks_by_hash(header_hashes)
-        header_blocks = []
-        for block in blocks:
-            added_coins_records_coroutine = self.full_node.coin_store.get_coins_added_at_height(block.height)
-            removed_coins_records_coroutine = self.full_node.coin_store.get_coins_removed_at_height(block.height)
+        blocks_bytes: List[bytes] = await self.full_node.block_store.get_block_bytes_by_hash(header_hashes)
+        header_blocks_bytes: List[bytes] = []
+        for block_bytes in blocks_bytes:
+            block_view = FullBlockView(block_bytes)
+            added_coins_records_coroutine = self.full_node.coin_store.get_coins_added_at_height(block_view.height)
+            removed_coins_records_coroutine = self.full_node.coin_store.get_coins_removed_at_height(block_view.height)
             added_coins_records, removed_coins_records = await asyncio.gather(
                 added_coins_records_coroutine, removed_coins_records_coroutine
             )
             added_coins = [record.coin for record in added_coins_records if not record.coinbase]
             removal_names = [record.coin.name() for record in removed_coins_records]
-            header_block = get_block_header(block, added_coins, removal_names)
-            header_blocks.append(header_block)
+            header_blocks_bytes.append(block_view.header_block(True, added_coins, removal_names))
 
-        msg = make_msg(
-            ProtocolMessageTypes.respond_header_blocks,
-            wallet_protocol.RespondHeaderBlocks(request.start_height, request.end_height, header_blocks),
+        respond_header_blocks_manually_streamed: bytes = (
+            uint32(request.start_height).stream_to_bytes()
+            + uint32(request.end_height).stream_to_bytes()
+            + uint32(len(header_blocks_bytes)).stream_to_bytes()
         )
-        return msg
+        respond_header_blocks_manually_streamed += b"".join(header_blocks_bytes)
+        return make_msg(ProtocolMessageTypes.respond_header_blocks, respond_header_blocks_manually_streamed)
 
     @api_request(bytes_required=True, execute_task=True)
     async def respond_compact_proof_of_time(
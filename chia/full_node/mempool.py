@@ -1,18 +1,19 @@
 from __future__ import annotations
 
 import logging
-import sqlite3
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 from chia_rs import AugSchemeMPL, Coin, G2Element
+from sortedcontainers import SortedList
 
 from chia.consensus.constants import ConsensusConstants
 from chia.consensus.default_constants import DEFAULT_CONSTANTS
 from chia.full_node.fee_estimation import FeeMempoolInfo, MempoolInfo, MempoolItemInfo
 from chia.full_node.fee_estimator_interface import FeeEstimatorInterface
+from chia.full_node.mempool_index import MempoolIndex, MempoolIndexEntry, create_mempool_index
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.clvm_cost import CLVMCost
 from chia.types.coin_spend import CoinSpend
@@ -20,10 +21,8 @@ from chia.types.eligible_coin_spends import EligibleCoinSpends, UnspentLineageIn
 from chia.types.internal_mempool_item import InternalMempoolItem
 from chia.types.mempool_item import MempoolItem
 from chia.types.spend_bundle import SpendBundle
-from chia.util.db_wrapper import SQLITE_MAX_VARIABLE_NUMBER
 from chia.util.errors import Err
 from chia.util.ints import uint32, uint64
-from chia.util.misc import to_batches
 
 log = logging.getLogger(__name__)
 
@@ -66,8 +65,119 @@ class MempoolRemoveReason(Enum):
     EXPIRED = 4
 
 
+@dataclass(frozen=True)
+class BlockCandidateItem:
+    name: bytes32
+    fee: int
+    # the cost of the item in the block, after deduplication
+    cost: int
+    # the coins spent by the item, whether deduplicated or not
+    coin_ids: List[bytes32]
+    coin_spends: List[CoinSpend]
+    additions: List[Coin]
+    signature: G2Element
+
+
+@dataclass
+class BlockCandidate:
+    """
+    The mempool items to include in the next block, i.e. the result of
+    create_bundle_from_mempool_items() including all items. The mempool keeps
+    it up to date as items are added and removed, as long as it can tell the
+    result of selecting the items again would be the same.
+
+    If the selection went through all items, included every one of them as
+    is (no spends were deduplicated and none are eligible for fast forward),
+    the candidate is complete. New items are added to a complete candidate as
+    long as they fit and don't spend any coin it already spends. Removing items
+    keeps it complete.
+
+    Otherwise, if the selection stopped before looking at every item, adding
+    or removing items with a lower fee per cost than where it stopped (cutoff)
+    doesn't change the candidate. Any other change invalidates it.
+    """
+
+    items: Dict[bytes32, BlockCandidateItem] = field(default_factory=dict)
+    # the sort keys of the included items, (-fee per cost, sequence number,
+    # name), in the order they are included in the block
+    order: SortedList = field(default_factory=SortedList)
+    spent_coin_ids: Set[bytes32] = field(default_factory=set)
+    cost: int = 0
+    fees: int = 0
+    complete: bool = True
+    # the fee per cost of the last item the selection looked at, if it
+    # stopped before looking at every item
+    cutoff: Optional[float] = None
+    _keys: Dict[bytes32, Tuple[float, int, bytes32]] = field(default_factory=dict)
+    _seq: int = 0
+    _aggregated_signature: Optional[G2Element] = G2Element()
+    _bundle: Optional[Tuple[SpendBundle, List[Coin]]] = None
+
+    def add(self, item: BlockCandidateItem, fee_per_cost: float) -> None:
+        self.items[item.name] = item
+        # ties in fee per cost are ordered by when the items were added to the
+        # mempool, just like MempoolIndex.entries_by_feerate()
+        key = (-fee_per_cost, self._seq, item.name)
+        self.order.add(key)
+        self._keys[item.name] = key
+        self._seq += 1
+        self.spent_coin_ids.update(item.coin_ids)
+        self.cost += item.cost
+        self.fees += item.fee
+        if self._aggregated_signature is not None:
+            self._aggregated_signature = AugSchemeMPL.aggregate([self._aggregated_signature, item.signature])
+        self._bundle = None
+
+    def remove(self, name: bytes32) -> None:
+        item = self.items.pop(name)
+        self.order.remove(self._keys.pop(name))
+        self.spent_coin_ids.difference_update(item.coin_ids)
+        self.cost -= item.cost
+        self.fees -= item.fee
+        # signatures can't be subtracted from the aggregate, it's recomputed
+        # when needed
+        self._aggregated_signature = None
+        self._bundle = None
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        bundle = self.bundle()
+        return {
+            "item_ids": [name.hex() for _, _, name in self.order],
+            "cost": self.cost,
+            "fees": self.fees,
+            "complete": self.complete,
+            "spend_bundle": None if bundle is None else bundle[0].to_json_dict(),
+            "additions": [] if bundle is None else [coin.to_json_dict() for coin in bundle[1]],
+        }
+
+    @property
+    def aggregated_signature(self) -> G2Element:
+        if self._aggregated_signature is None:
+            self._aggregated_signature = AugSchemeMPL.aggregate([item.signature for item in self.items.values()])
+        return self._aggregated_signature
+
+    def bundle(self) -> Optional[Tuple[SpendBundle, List[Coin]]]:
+        """
+        The spend bundle of the block and its additions, or None if there are
+        no items to include.
+        """
+        if len(self.items) == 0:
+            return None
+        if self._bundle is None:
+            coin_spends: List[CoinSpend] = []
+            additions: List[Coin] = []
+            for _, _, name in self.order:
+                item = self.items[name]
+                coin_spends.extend(item.coin_spends)
+                additions.extend(item.additions)
+            self._bundle = (SpendBundle(coin_spends, self.aggregated_signature), additions)
+        return self._bundle
+
+
 class Mempool:
-    _db_conn: sqlite3.Connection
+    # the name of the engine backing _index, see MEMPOOL_ENGINES
+    engine: str
+    _index: MempoolIndex
     # it's expensive to serialize and deserialize G2Element, so we keep those in
     # this separate dictionary
     _items: Dict[bytes32, InternalMempoolItem]
@@ -79,75 +189,41 @@ class Mempool:
     _total_fee: int
     _total_cost: int
 
-    def __init__(self, mempool_info: MempoolInfo, fee_estimator: FeeEstimatorInterface):
-        self._db_conn = sqlite3.connect(":memory:")
+    # the items to include in the next block, if it's known. See BlockCandidate
+    _block_candidate: Optional[BlockCandidate]
+
+    # incremented whenever items are added or removed
+    generation: int
+
+    def __init__(self, mempool_info: MempoolInfo, fee_estimator: FeeEstimatorInterface, engine: str = "sqlite"):
+        self.engine = engine
+        self._index = create_mempool_index(engine)
         self._items = {}
         self._block_height = uint32(0)
         self._timestamp = uint64(0)
         self._total_fee = 0
         self._total_cost = 0
-
-        with self._db_conn:
-            # name means SpendBundle hash
-            # assert_height may be NIL
-            # the seq field indicates the order of items being added to the
-            # mempool. It's used as a tie-breaker for items with the same fee
-            # rate
-            # TODO: In the future, for the "fee_per_cost" field, opt for
-            # "GENERATED ALWAYS AS (CAST(fee AS REAL) / cost) VIRTUAL"
-            self._db_conn.execute(
-                """CREATE TABLE tx(
-                name BLOB,
-                cost INT NOT NULL,
-                fee INT NOT NULL,
-                assert_height INT,
-                assert_before_height INT,
-                assert_before_seconds INT,
-                fee_per_cost REAL,
-                seq INTEGER PRIMARY KEY AUTOINCREMENT)
-                """
-            )
-            self._db_conn.execute("CREATE INDEX name_idx ON tx(name)")
-            self._db_conn.execute("CREATE INDEX feerate ON tx(fee_per_cost)")
-            self._db_conn.execute(
-                "CREATE INDEX assert_before ON tx(assert_before_height, assert_before_seconds) "
-                "WHERE assert_before_height IS NOT NULL OR assert_before_seconds IS NOT NULL"
-            )
-
-            # This table maps coin IDs to spend bundles hashes
-            self._db_conn.execute(
-                """CREATE TABLE spends(
-                coin_id BLOB NOT NULL,
-                tx BLOB NOT NULL,
-                UNIQUE(coin_id, tx))
-                """
-            )
-            self._db_conn.execute("CREATE INDEX spend_by_coin ON spends(coin_id)")
-            self._db_conn.execute("CREATE INDEX spend_by_bundle ON spends(tx)")
+        self._block_candidate = BlockCandidate()
+        self.generation = 0
 
         self.mempool_info: MempoolInfo = mempool_info
         self.fee_estimator: FeeEstimatorInterface = fee_estimator
 
     def __del__(self) -> None:
-        self._db_conn.close()
+        self._index.close()
 
-    def _row_to_item(self, row: sqlite3.Row) -> MempoolItem:
-        name = bytes32(row[0])
-        fee = int(row[2])
-        assert_height = row[3]
-        assert_before_height = row[4]
-        assert_before_seconds = row[5]
-        item = self._items[name]
+    def _entry_to_item(self, entry: MempoolIndexEntry) -> MempoolItem:
+        item = self._items[entry.name]
 
         return MempoolItem(
             item.spend_bundle,
-            uint64(fee),
+            uint64(entry.fee),
             item.npc_result,
-            name,
+            entry.name,
             uint32(item.height_added_to_mempool),
-            assert_height,
-            assert_before_height,
-            assert_before_seconds,
+            entry.assert_height,
+            entry.assert_before_height,
+            entry.assert_before_seconds,
             bundle_coin_spends=item.bundle_coin_spends,
         )
 
@@ -158,15 +234,11 @@ class Mempool:
         return CLVMCost(uint64(self._total_cost))
 
     def all_items(self) -> Iterator[MempoolItem]:
-        with self._db_conn:
-            cursor = self._db_conn.execute("SELECT * FROM tx")
-            for row in cursor:
-                yield self._row_to_item(row)
+        for entry in self._index.entries():
+            yield self._entry_to_item(entry)
 
     def all_item_ids(self) -> List[bytes32]:
-        with self._db_conn:
-            cursor = self._db_conn.execute("SELECT name FROM tx")
-            return [bytes32(row[0]) for row in cursor]
+        return [entry.name for entry in self._index.entries()]
 
     def items_with_coin_ids(self, coin_ids: Set[bytes32]) -> List[bytes32]:
         """
@@ -228,43 +300,21 @@ class Mempool:
     # TODO: move "process_mempool_items()" into this class in order to do this a
     # bit more efficiently
     def items_by_feerate(self) -> Iterator[MempoolItem]:
-        with self._db_conn:
-            cursor = self._db_conn.execute("SELECT * FROM tx ORDER BY fee_per_cost DESC, seq ASC")
-            for row in cursor:
-                yield self._row_to_item(row)
+        for entry in self._index.entries_by_feerate():
+            yield self._entry_to_item(entry)
 
     def size(self) -> int:
-        with self._db_conn:
-            cursor = self._db_conn.execute("SELECT Count(name) FROM tx")
-            val = cursor.fetchone()
-            return 0 if val is None else int(val[0])
+        return self._index.size()
 
     def get_item_by_id(self, item_id: bytes32) -> Optional[MempoolItem]:
-        with self._db_conn:
-            cursor = self._db_conn.execute("SELECT * FROM tx WHERE name=?", (item_id,))
-            row = cursor.fetchone()
-            return None if row is None else self._row_to_item(row)
+        entry = self._index.get(item_id)
+        return None if entry is None else self._entry_to_item(entry)
 
-    # TODO: we need a bulk lookup function like this too
     def get_items_by_coin_id(self, spent_coin_id: bytes32) -> List[MempoolItem]:
-        with self._db_conn:
-            cursor = self._db_conn.execute(
-                "SELECT * FROM tx WHERE name in (SELECT tx FROM spends WHERE coin_id=?)",
-                (spent_coin_id,),
-            )
-            return [self._row_to_item(row) for row in cursor]
+        return self.get_items_by_coin_ids([spent_coin_id])
 
     def get_items_by_coin_ids(self, spent_coin_ids: List[bytes32]) -> List[MempoolItem]:
-        items: List[MempoolItem] = []
-        for batch in to_batches(spent_coin_ids, SQLITE_MAX_VARIABLE_NUMBER):
-            args = ",".join(["?"] * len(batch.entries))
-            with self._db_conn:
-                cursor = self._db_conn.execute(
-                    f"SELECT * FROM tx WHERE name IN (SELECT tx FROM spends WHERE coin_id IN ({args}))",
-                    tuple(batch.entries),
-                )
-                items.extend(self._row_to_item(row) for row in cursor)
-        return items
+        return [self._entry_to_item(entry) for entry in self._index.entries_by_coin_ids(spent_coin_ids)]
 
     def get_min_fee_rate(self, cost: int) -> Optional[float]:
         """
@@ -278,21 +328,16 @@ class Mempool:
         current_cost = self._total_cost
 
         # Iterates through all spends in increasing fee per cost
-        with self._db_conn:
-            cursor = self._db_conn.execute("SELECT cost,fee_per_cost FROM tx ORDER BY fee_per_cost ASC, seq DESC")
+        for entry in self._index.entries_by_feerate(ascending=True):
+            current_cost -= entry.cost
+            # Removing one at a time, until our transaction of size cost fits
+            if current_cost + cost <= self.mempool_info.max_size_in_cost:
+                return entry.fee_per_cost
 
-            item_cost: int
-            fee_per_cost: float
-            for item_cost, fee_per_cost in cursor:
-                current_cost -= item_cost
-                # Removing one at a time, until our transaction of size cost fits
-                if current_cost + cost <= self.mempool_info.max_size_in_cost:
-                    return fee_per_cost
-
-            log.info(
-                f"Transaction with cost {cost} does not fit in mempool of max cost {self.mempool_info.max_size_in_cost}"
-            )
-            return None
+        log.info(
+            f"Transaction with cost {cost} does not fit in mempool of max cost {self.mempool_info.max_size_in_cost}"
+        )
+        return None
 
     def new_tx_block(self, block_height: uint32, timestamp: uint64) -> MempoolRemoveInfo:
         """
@@ -300,12 +345,7 @@ class Mempool:
         timestamp. (we don't know about which coins were spent in this new block
         here, so those are handled separately)
         """
-        with self._db_conn:
-            cursor = self._db_conn.execute(
-                "SELECT name FROM tx WHERE assert_before_seconds <= ? OR assert_before_height <= ?",
-                (timestamp, block_height),
-            )
-            to_remove = [bytes32(row[0]) for row in cursor]
+        to_remove = self._index.expired(block_height, timestamp)
 
         self._block_height = block_height
         self._timestamp = timestamp
@@ -320,37 +360,20 @@ class Mempool:
             return MempoolRemoveInfo([], reason)
 
         removed_items: List[MempoolItemInfo] = []
-        if reason != MempoolRemoveReason.BLOCK_INCLUSION:
-            for batch in to_batches(items, SQLITE_MAX_VARIABLE_NUMBER):
-                args = ",".join(["?"] * len(batch.entries))
-                with self._db_conn:
-                    cursor = self._db_conn.execute(
-                        f"SELECT name, cost, fee FROM tx WHERE name in ({args})", batch.entries
-                    )
-                    for row in cursor:
-                        name = bytes32(row[0])
-                        internal_item = self._items[name]
-                        item = MempoolItemInfo(int(row[1]), int(row[2]), internal_item.height_added_to_mempool)
-                        removed_items.append(item)
+        removed_entries = self._index.remove(items)
+        self.generation += 1
+        for entry in removed_entries:
+            self._total_cost -= entry.cost
+            self._total_fee -= entry.fee
+            self._block_candidate_removed(entry)
+            if reason != MempoolRemoveReason.BLOCK_INCLUSION:
+                internal_item = self._items[entry.name]
+                removed_items.append(MempoolItemInfo(entry.cost, entry.fee, internal_item.height_added_to_mempool))
+        assert self._total_cost >= 0
+        assert self._total_fee >= 0
 
         removed_internal_items = [self._items.pop(name) for name in items]
 
-        for batch in to_batches(items, SQLITE_MAX_VARIABLE_NUMBER):
-            args = ",".join(["?"] * len(batch.entries))
-            with self._db_conn:
-                cursor = self._db_conn.execute(
-                    f"SELECT SUM(cost), SUM(fee) FROM tx WHERE name in ({args})", batch.entries
-                )
-                cost_to_remove, fee_to_remove = cursor.fetchone()
-
-                self._db_conn.execute(f"DELETE FROM tx WHERE name in ({args})", batch.entries)
-                self._db_conn.execute(f"DELETE FROM spends WHERE tx in ({args})", batch.entries)
-
-            self._total_cost -= cost_to_remove
-            self._total_fee -= fee_to_remove
-            assert self._total_cost >= 0
-            assert self._total_fee >= 0
-
         if reason != MempoolRemoveReason.BLOCK_INCLUSION:
             info = FeeMempoolInfo(
                 self.mempool_info, self.total_mempool_cost(), self.total_mempool_fees(), datetime.now()
@@ -371,95 +394,138 @@ class Mempool:
 
         removals: List[MempoolRemoveInfo] = []
 
-        with self._db_conn:
-            # we have certain limits on transactions that will expire soon
-            # (in the next 15 minutes)
-            block_cutoff = self._block_height + 48
-            time_cutoff = self._timestamp + 900
-            if (item.assert_before_height is not None and item.assert_before_height < block_cutoff) or (
-                item.assert_before_seconds is not None and item.assert_before_seconds < time_cutoff
-            ):
-                # this lists only transactions that expire soon, in order of
-                # lowest fee rate along with the cumulative cost of such
-                # transactions counting from highest to lowest fee rate
-                cursor = self._db_conn.execute(
-                    """
-                    SELECT name,
-                        fee_per_cost,
-                        SUM(cost) OVER (ORDER BY fee_per_cost DESC, seq ASC) AS cumulative_cost
-                    FROM tx
-                    WHERE assert_before_seconds IS NOT NULL AND assert_before_seconds < ?
-                        OR assert_before_height IS NOT NULL AND assert_before_height < ?
-                    ORDER BY cumulative_cost DESC
-                    """,
-                    (time_cutoff, block_cutoff),
-                )
-                to_remove: List[bytes32] = []
-                for row in cursor:
-                    name, fee_per_cost, cumulative_cost = row
-
-                    # there's space for us, stop pruning
-                    if cumulative_cost + item.cost <= self.mempool_info.max_block_clvm_cost:
-                        break
-
-                    # we can't evict any more transactions, abort (and don't
-                    # evict what we put aside in "to_remove" list)
-                    if fee_per_cost > item.fee_per_cost:
-                        return MempoolAddInfo([], Err.INVALID_FEE_LOW_FEE)
-                    to_remove.append(name)
-
-                removals.append(self.remove_from_pool(to_remove, MempoolRemoveReason.EXPIRED))
-
-                # if we don't find any entries, it's OK to add this entry
-
-            if self._total_cost + item.cost > self.mempool_info.max_size_in_cost:
-                # pick the items with the lowest fee per cost to remove
-                cursor = self._db_conn.execute(
-                    """SELECT name FROM tx
-                    WHERE name NOT IN (
-                        SELECT name FROM (
-                            SELECT name,
-                            SUM(cost) OVER (ORDER BY fee_per_cost DESC, seq ASC) AS total_cost
-                            FROM tx) AS tx_with_cost
-                        WHERE total_cost <= ?)
-                    """,
-                    (self.mempool_info.max_size_in_cost - item.cost,),
-                )
-                to_remove = [bytes32(row[0]) for row in cursor]
-
-                removals.append(self.remove_from_pool(to_remove, MempoolRemoveReason.POOL_FULL))
-
-            # TODO: In the future, for the "fee_per_cost" field, opt for
-            # "GENERATED ALWAYS AS (CAST(fee AS REAL) / cost) VIRTUAL"
-            self._db_conn.execute(
-                "INSERT INTO "
-                "tx(name,cost,fee,assert_height,assert_before_height,assert_before_seconds,fee_per_cost) "
-                "VALUES(?, ?, ?, ?, ?, ?, ?)",
-                (
-                    item.name,
-                    item.cost,
-                    item.fee,
-                    item.assert_height,
-                    item.assert_before_height,
-                    item.assert_before_seconds,
-                    item.fee / item.cost,
-                ),
-            )
+        # we have certain limits on transactions that will expire soon
+        # (in the next 15 minutes)
+        block_cutoff = self._block_height + 48
+        time_cutoff = self._timestamp + 900
+        if (item.assert_before_height is not None and item.assert_before_height < block_cutoff) or (
+            item.assert_before_seconds is not None and item.assert_before_seconds < time_cutoff
+        ):
+            # this lists only transactions that expire soon, in order of
+            # lowest fee rate along with the cumulative cost of such
+            # transactions counting from highest to lowest fee rate
+            to_remove: List[bytes32] = []
+            for entry, cumulative_cost in self._index.expiring_before(block_cutoff, time_cutoff):
+                # there's space for us, stop pruning
+                if cumulative_cost + item.cost <= self.mempool_info.max_block_clvm_cost:
+                    break
 
-            all_coin_spends = [(s.coin_id, item.name) for s in item.npc_result.conds.spends]
-            self._db_conn.executemany("INSERT INTO spends VALUES(?, ?)", all_coin_spends)
+                # we can't evict any more transactions, abort (and don't
+                # evict what we put aside in "to_remove" list)
+                if entry.fee_per_cost > item.fee_per_cost:
+                    return MempoolAddInfo([], Err.INVALID_FEE_LOW_FEE)
+                to_remove.append(entry.name)
+
+            removals.append(self.remove_from_pool(to_remove, MempoolRemoveReason.EXPIRED))
+
+            # if we don't find any entries, it's OK to add this entry
+
+        if self._total_cost + item.cost > self.mempool_info.max_size_in_cost:
+            # pick the items with the lowest fee per cost to remove
+            to_remove = self._index.exceeding_cost(self.mempool_info.max_size_in_cost - item.cost)
+            removals.append(self.remove_from_pool(to_remove, MempoolRemoveReason.POOL_FULL))
+
+        self._index.add(
+            MempoolIndexEntry(
+                item.name,
+                item.cost,
+                item.fee,
+                item.assert_height,
+                item.assert_before_height,
+                item.assert_before_seconds,
+                item.fee / item.cost,
+            ),
+            [bytes32(s.coin_id) for s in item.npc_result.conds.spends],
+        )
 
-            self._items[item.name] = InternalMempoolItem(
-                item.spend_bundle, item.npc_result, item.height_added_to_mempool, item.bundle_coin_spends
-            )
+        self._items[item.name] = InternalMempoolItem(
+            item.spend_bundle, item.npc_result, item.height_added_to_mempool, item.bundle_coin_spends
+        )
 
-            self._total_cost += item.cost
-            self._total_fee += item.fee
+        self._total_cost += item.cost
+        self._total_fee += item.fee
+        self._block_candidate_added(item)
+        self.generation += 1
 
         info = FeeMempoolInfo(self.mempool_info, self.total_mempool_cost(), self.total_mempool_fees(), datetime.now())
         self.fee_estimator.add_mempool_item(info, MempoolItemInfo(item.cost, item.fee, item.height_added_to_mempool))
         return MempoolAddInfo(removals, None)
 
+    def _block_candidate_added(self, item: MempoolItem) -> None:
+        candidate = self._block_candidate
+        if candidate is None:
+            return
+        fee_per_cost = item.fee / item.cost
+        if candidate.complete:
+            new_cost = candidate.cost + item.cost
+            # spends of the same coin would be deduplicated
+            included_as_is = not any(
+                spend_data.eligible_for_fast_forward or coin_id in candidate.spent_coin_ids
+                for coin_id, spend_data in item.bundle_coin_spends.items()
+            )
+            # if the block would be close enough to full for the selection to
+            # stop early, we can't tell which items it would include
+            if (
+                included_as_is
+                and self.mempool_info.max_block_clvm_cost - new_cost >= MIN_COST_THRESHOLD
+                and candidate.fees + item.fee <= DEFAULT_CONSTANTS.MAX_COIN_AMOUNT
+            ):
+                additions: List[Coin] = []
+                for spend_data in item.bundle_coin_spends.values():
+                    additions.extend(spend_data.additions)
+                candidate.add(
+                    BlockCandidateItem(
+                        item.name,
+                        item.fee,
+                        item.cost,
+                        list(item.bundle_coin_spends.keys()),
+                        [spend_data.coin_spend for spend_data in item.bundle_coin_spends.values()],
+                        additions,
+                        item.spend_bundle.aggregated_signature,
+                    ),
+                    fee_per_cost,
+                )
+                return
+        elif candidate.cutoff is not None and fee_per_cost <= candidate.cutoff:
+            # the new item sorts after the last item the selection looked at
+            return
+        self._block_candidate = None
+
+    def _block_candidate_removed(self, entry: MempoolIndexEntry) -> None:
+        candidate = self._block_candidate
+        if candidate is None:
+            return
+        if candidate.complete:
+            candidate.remove(entry.name)
+        elif candidate.cutoff is None or entry.fee_per_cost >= candidate.cutoff:
+            self._block_candidate = None
+
+    def peak_changed(self) -> None:
+        """
+        Fast forwarded singleton spends depend on the coin set, so they're no
+        longer valid once the peak changes. A complete block candidate doesn't
+        have any, and stays valid.
+        """
+        if self._block_candidate is not None and not self._block_candidate.complete:
+            self._block_candidate = None
+
+    async def get_block_candidate(
+        self,
+        get_unspent_lineage_info_for_puzzle_hash: Callable[[bytes32], Awaitable[Optional[UnspentLineageInfo]]],
+        constants: ConsensusConstants,
+        height: uint32,
+    ) -> BlockCandidate:
+        """
+        The items to include in the next block, with every item eligible. This
+        is only computed if the candidate has been invalidated since the last
+        call.
+        """
+        if self._block_candidate is None:
+            self._block_candidate = await self._select_block_items(
+                None, get_unspent_lineage_info_for_puzzle_hash, constants, height
+            )
+        return self._block_candidate
+
     def at_full_capacity(self, cost: int) -> bool:
         """
         Checks whether the mempool is at full capacity and cannot accept a transaction with size cost.
@@ -474,10 +540,19 @@ class Mempool:
         constants: ConsensusConstants,
         height: uint32,
     ) -> Optional[Tuple[SpendBundle, List[Coin]]]:
-        cost_sum = 0  # Checks that total cost does not exceed block maximum
-        fee_sum = 0  # Checks that total fees don't exceed 64 bits
-        processed_spend_bundles = 0
-        additions: List[Coin] = []
+        candidate = await self._select_block_items(
+            item_inclusion_filter, get_unspent_lineage_info_for_puzzle_hash, constants, height
+        )
+        return candidate.bundle()
+
+    async def _select_block_items(
+        self,
+        item_inclusion_filter: Optional[Callable[[bytes32], bool]],
+        get_unspent_lineage_info_for_puzzle_hash: Callable[[bytes32], Awaitable[Optional[UnspentLineageInfo]]],
+        constants: ConsensusConstants,
+        height: uint32,
+    ) -> BlockCandidate:
+        candidate = BlockCandidate()
         # This contains:
         # 1. A map of coin ID to a coin spend solution and its isolated cost
         #   We reconstruct it for every bundle we create from mempool items because we
@@ -487,21 +562,21 @@ class Mempool:
         #   recent unspent singleton data, to allow chaining fast forward
         #   singleton spends
         eligible_coin_spends = EligibleCoinSpends()
-        coin_spends: List[CoinSpend] = []
-        sigs: List[G2Element] = []
         log.info(f"Starting to make block, max cost: {self.mempool_info.max_block_clvm_cost}")
-        with self._db_conn:
-            cursor = self._db_conn.execute("SELECT name, fee FROM tx ORDER BY fee_per_cost DESC, seq ASC")
         skipped_items = 0
-        for row in cursor:
-            name = bytes32(row[0])
-            fee = int(row[1])
+        # whether every item was included as is, see BlockCandidate
+        complete = item_inclusion_filter is None
+        for entry in self._index.entries_by_feerate():
+            name = entry.name
+            fee = entry.fee
             item = self._items[name]
-            if not item_inclusion_filter(name):
+            if item_inclusion_filter is not None and not item_inclusion_filter(name):
                 continue
             try:
                 assert item.npc_result.conds is not None
                 cost = item.npc_result.conds.cost
+                if any(spend_data.eligible_for_fast_forward for spend_data in item.bundle_coin_spends.values()):
+                    complete = False
                 if skipped_items >= PRIORITY_TX_THRESHOLD:
                     # If we've encountered `PRIORITY_TX_THRESHOLD` number of
                     # transactions that don't fit in the remaining block size,
@@ -527,15 +602,20 @@ class Mempool:
                         bundle_coin_spends=item.bundle_coin_spends, max_cost=cost
                     )
                 item_cost = cost - cost_saving
+                if cost_saving > 0:
+                    complete = False
                 log.info(
-                    "Cumulative cost: %d, fee per cost: %0.4f, item cost: %d", cost_sum, fee / item_cost, item_cost
+                    "Cumulative cost: %d, fee per cost: %0.4f, item cost: %d",
+                    candidate.cost,
+                    fee / item_cost,
+                    item_cost,
                 )
-                new_fee_sum = fee_sum + fee
-                if new_fee_sum > DEFAULT_CONSTANTS.MAX_COIN_AMOUNT:
+                if candidate.fees + fee > DEFAULT_CONSTANTS.MAX_COIN_AMOUNT:
                     # Such a fee is very unlikely to happen but we're defensively
                     # accounting for it
+                    candidate.cutoff = entry.fee_per_cost  # pragma: no cover
                     break  # pragma: no cover
-                new_cost_sum = cost_sum + item_cost
+                new_cost_sum = candidate.cost + item_cost
                 if new_cost_sum > self.mempool_info.max_block_clvm_cost:
                     # Let's skip this item
                     log.info(
@@ -547,28 +627,35 @@ class Mempool:
                     if skipped_items < MAX_SKIPPED_ITEMS:
                         continue
                     # Let's stop taking more items if we skipped `MAX_SKIPPED_ITEMS`
+                    candidate.cutoff = entry.fee_per_cost
                     break
-                coin_spends.extend(unique_coin_spends)
-                additions.extend(unique_additions)
-                sigs.append(item.spend_bundle.aggregated_signature)
-                cost_sum = new_cost_sum
-                fee_sum = new_fee_sum
-                processed_spend_bundles += 1
+                candidate.add(
+                    BlockCandidateItem(
+                        name,
+                        fee,
+                        item_cost,
+                        list(item.bundle_coin_spends.keys()),
+                        unique_coin_spends,
+                        unique_additions,
+                        item.spend_bundle.aggregated_signature,
+                    ),
+                    entry.fee_per_cost,
+                )
                 # Let's stop taking more items if we don't have enough cost left
                 # for at least `MIN_COST_THRESHOLD` because that would mean we're
                 # getting very close to the limit anyway and *probably* won't
                 # find transactions small enough to fit at this point
-                if self.mempool_info.max_block_clvm_cost - cost_sum < MIN_COST_THRESHOLD:
+                if self.mempool_info.max_block_clvm_cost - candidate.cost < MIN_COST_THRESHOLD:
+                    candidate.cutoff = entry.fee_per_cost
                     break
             except Exception as e:
                 log.debug(f"Exception while checking a mempool item for deduplication: {e}")
+                complete = False
                 continue
-        if processed_spend_bundles == 0:
-            return None
-        log.info(
-            f"Cumulative cost of block (real cost should be less) {cost_sum}. Proportion "
-            f"full: {cost_sum / self.mempool_info.max_block_clvm_cost}"
-        )
-        aggregated_signature = AugSchemeMPL.aggregate(sigs)
-        agg = SpendBundle(coin_spends, aggregated_signature)
-        return agg, additions
+        candidate.complete = complete and skipped_items == 0 and candidate.cutoff is None
+        if len(candidate.items) > 0:
+            log.info(
+                f"Cumulative cost of block (real cost should be less) {candidate.cost}. Proportion "
+                f"full: {candidate.cost / self.mempool_info.max_block_clvm_cost}"
+            )
+        return candidate
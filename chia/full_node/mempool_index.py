@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+from typing_extensions import Protocol
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.db_wrapper import SQLITE_MAX_VARIABLE_NUMBER
+from chia.util.ints import uint32, uint64
+from chia.util.misc import to_batches
+
+
+@dataclass(frozen=True)
+class MempoolIndexEntry:
+    # the SpendBundle hash
+    name: bytes32
+    cost: int
+    fee: int
+    assert_height: Optional[uint32]
+    assert_before_height: Optional[uint32]
+    assert_before_seconds: Optional[uint64]
+    fee_per_cost: float
+
+
+class MempoolIndex(Protocol):
+    """
+    Keeps track of the items in the mempool, and answers the queries the
+    Mempool needs to order, expire and evict them.
+    Items are ordered by fee per cost (highest first), with the order they were
+    added in as the tie-breaker.
+    """
+
+    def close(self) -> None:
+        pass
+
+    def add(self, entry: MempoolIndexEntry, spent_coin_ids: List[bytes32]) -> None:
+        pass
+
+    def remove(self, names: List[bytes32]) -> List[MempoolIndexEntry]:
+        """Removes the specified items, and returns the entries that were removed"""
+        pass
+
+    def size(self) -> int:
+        pass
+
+    def get(self, name: bytes32) -> Optional[MempoolIndexEntry]:
+        pass
+
+    def entries(self) -> Iterator[MempoolIndexEntry]:
+        """All entries, in the order they were added"""
+        pass
+
+    def entries_by_feerate(self, *, ascending: bool = False) -> Iterator[MempoolIndexEntry]:
+        """
+        All entries, highest fee per cost first. If ascending is set, the order
+        is reversed (lowest fee per cost first and the most recent item first,
+        among items with the same fee per cost).
+        """
+        pass
+
+    def entries_by_coin_ids(self, spent_coin_ids: List[bytes32]) -> List[MempoolIndexEntry]:
+        """The entries spending any of the specified coins"""
+        pass
+
+    def expired(self, block_height: uint32, timestamp: uint64) -> List[bytes32]:
+        """The items that can't be included in a block at this height and timestamp"""
+        pass
+
+    def expiring_before(self, block_height: int, timestamp: int) -> List[Tuple[MempoolIndexEntry, int]]:
+        """
+        The entries of items that expire before the specified height or
+        timestamp, along with the cumulative cost of such items, counting from
+        the highest to the lowest fee per cost. Ordered by decreasing
+        cumulative cost (i.e. lowest fee per cost first).
+        """
+        pass
+
+    def exceeding_cost(self, max_cost: int) -> List[bytes32]:
+        """
+        The items that are left out when picking items by fee per cost (highest
+        first), as long as their cumulative cost doesn't exceed max_cost.
+        """
+        pass
+
+
+class SQLiteMempoolIndex:
+    _db_conn: sqlite3.Connection
+
+    def __init__(self) -> None:
+        self._db_conn = sqlite3.connect(":memory:")
+
+        with self._db_conn:
+            # name means SpendBundle hash
+            # assert_height may be NIL
+            # the seq field indicates the order of items being added to the
+            # mempool. It's used as a tie-breaker for items with the same fee
+            # rate
+            # TODO: In the future, for the "fee_per_cost" field, opt for
+            # "GENERATED ALWAYS AS (CAST(fee AS REAL) / cost) VIRTUAL"
+            self._db_conn.execute(
+                """CREATE TABLE tx(
+                name BLOB,
+                cost INT NOT NULL,
+                fee INT NOT NULL,
+                assert_height INT,
+                assert_before_height INT,
+                assert_before_seconds INT,
+                fee_per_cost REAL,
+                seq INTEGER PRIMARY KEY AUTOINCREMENT)
+                """
+            )
+            self._db_conn.execute("CREATE INDEX name_idx ON tx(name)")
+            self._db_conn.execute("CREATE INDEX feerate ON tx(fee_per_cost)")
+            self._db_conn.execute(
+                "CREATE INDEX assert_before ON tx(assert_before_height, assert_before_seconds) "
+                "WHERE assert_before_height IS NOT NULL OR assert_before_seconds IS NOT NULL"
+            )
+
+            # This table maps coin IDs to spend bundles hashes
+            self._db_conn.execute(
+                """CREATE TABLE spends(
+                coin_id BLOB NOT NULL,
+                tx BLOB NOT NULL,
+                UNIQUE(coin_id, tx))
+                """
+            )
+            self._db_conn.execute("CREATE INDEX spend_by_coin ON spends(coin_id)")
+            self._db_conn.execute("CREATE INDEX spend_by_bundle ON spends(tx)")
+
+    def close(self) -> None:
+        self._db_conn.close()
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> MempoolIndexEntry:
+        return MempoolIndexEntry(bytes32(row[0]), int(row[1]), int(row[2]), row[3], row[4], row[5], row[6])
+
+    def add(self, entry: MempoolIndexEntry, spent_coin_ids: List[bytes32]) -> None:
+        with self._db_conn:
+            self._db_conn.execute(
+                "INSERT INTO "
+                "tx(name,cost,fee,assert_height,assert_before_height,assert_before_seconds,fee_per_cost) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.name,
+                    entry.cost,
+                    entry.fee,
+                    entry.assert_height,
+                    entry.assert_before_height,
+                    entry.assert_before_seconds,
+                    entry.fee_per_cost,
+                ),
+            )
+            self._db_conn.executemany(
+                "INSERT INTO spends VALUES(?, ?)", [(coin_id, entry.name) for coin_id in spent_coin_ids]
+            )
+
+    def remove(self, names: List[bytes32]) -> List[MempoolIndexEntry]:
+        removed: List[MempoolIndexEntry] = []
+        for batch in to_batches(names, SQLITE_MAX_VARIABLE_NUMBER):
+            args = ",".join(["?"] * len(batch.entries))
+            with self._db_conn:
+                cursor = self._db_conn.execute(f"SELECT * FROM tx WHERE name in ({args})", batch.entries)
+                removed.extend(self._row_to_entry(row) for row in cursor)
+                self._db_conn.execute(f"DELETE FROM tx WHERE name in ({args})", batch.entries)
+                self._db_conn.execute(f"DELETE FROM spends WHERE tx in ({args})", batch.entries)
+        return removed
+
+    def size(self) -> int:
+        with self._db_conn:
+            cursor = self._db_conn.execute("SELECT Count(name) FROM tx")
+            val = cursor.fetchone()
+            return 0 if val is None else int(val[0])
+
+    def get(self, name: bytes32) -> Optional[MempoolIndexEntry]:
+        with self._db_conn:
+            cursor = self._db_conn.execute("SELECT * FROM tx WHERE name=?", (name,))
+            row = cursor.fetchone()
+            return None if row is None else self._row_to_entry(row)
+
+    def entries(self) -> Iterator[MempoolIndexEntry]:
+        with self._db_conn:
+            cursor = self._db_conn.execute("SELECT * FROM tx")
+            for row in cursor:
+                yield self._row_to_entry(row)
+
+    def entries_by_feerate(self, *, ascending: bool = False) -> Iterator[MempoolIndexEntry]:
+        order = "fee_per_cost ASC, seq DESC" if ascending else "fee_per_cost DESC, seq ASC"
+        with self._db_conn:
+            cursor = self._db_conn.execute(f"SELECT * FROM tx ORDER BY {order}")
+            for row in cursor:
+                yield self._row_to_entry(row)
+
+    def entries_by_coin_ids(self, spent_coin_ids: List[bytes32]) -> List[MempoolIndexEntry]:
+        entries: List[MempoolIndexEntry] = []
+        for batch in to_batches(spent_coin_ids, SQLITE_MAX_VARIABLE_NUMBER):
+            args = ",".join(["?"] * len(batch.entries))
+            with self._db_conn:
+                cursor = self._db_conn.execute(
+                    f"SELECT * FROM tx WHERE name IN (SELECT tx FROM spends WHERE coin_id IN ({args}))",
+                    tuple(batch.entries),
+                )
+                entries.extend(self._row_to_entry(row) for row in cursor)
+        return entries
+
+    def expired(self, block_height: uint32, timestamp: uint64) -> List[bytes32]:
+        with self._db_conn:
+            cursor = self._db_conn.execute(
+                "SELECT name FROM tx WHERE assert_before_seconds <= ? OR assert_before_height <= ?",
+                (timestamp, block_height),
+            )
+            return [bytes32(row[0]) for row in cursor]
+
+    def expiring_before(self, block_height: int, timestamp: int) -> List[Tuple[MempoolIndexEntry, int]]:
+        with self._db_conn:
+            cursor = self._db_conn.execute(
+                """
+                SELECT *,
+                    SUM(cost) OVER (ORDER BY fee_per_cost DESC, seq ASC) AS cumulative_cost
+                FROM tx
+                WHERE assert_before_seconds IS NOT NULL AND assert_before_seconds < ?
+                    OR assert_before_height IS NOT NULL AND assert_before_height < ?
+                ORDER BY cumulative_cost DESC
+                """,
+                (timestamp, block_height),
+            )
+            return [(self._row_to_entry(row), int(row[8])) for row in cursor]
+
+    def exceeding_cost(self, max_cost: int) -> List[bytes32]:
+        with self._db_conn:
+            cursor = self._db_conn.execute(
+                """SELECT name FROM tx
+                WHERE name NOT IN (
+                    SELECT name FROM (
+                        SELECT name,
+                        SUM(cost) OVER (ORDER BY fee_per_cost DESC, seq ASC) AS total_cost
+                        FROM tx) AS tx_with_cost
+                    WHERE total_cost <= ?)
+                """,
+                (max_cost,),
+            )
+            return [bytes32(row[0]) for row in cursor]
+
+
+class NativeMempoolIndex:
+    """
+    A MempoolIndex backed by Python data structures, to avoid the overhead of
+    going through SQL for every operation.
+    """
+
+    # the next sequence number, indicating the order items were added in
+    _seq: int
+    # maps SpendBundle hash to the entry and its sequence number. Dicts preserve
+    # insertion order, which is the order items were added in
+    _entries: Dict[bytes32, Tuple[MempoolIndexEntry, int]]
+    # (-fee_per_cost, seq, name), i.e. highest fee per cost first
+    _by_feerate: SortedList
+    # maps coin ID to the SpendBundle hashes of the items spending it
+    _by_coin_id: Dict[bytes32, Set[bytes32]]
+    # (assert_before_height, seq, name) for items with an assert_before_height
+    _by_before_height: SortedList
+    # (assert_before_seconds, seq, name) for items with an assert_before_seconds
+    _by_before_seconds: SortedList
+    # the coins spent by each item, to clean up _by_coin_id when it's removed
+    _spent_coin_ids: Dict[bytes32, List[bytes32]]
+
+    def __init__(self) -> None:
+        self._seq = 0
+        self._entries = {}
+        self._by_feerate = SortedList()
+        self._by_coin_id = {}
+        self._by_before_height = SortedList()
+        self._by_before_seconds = SortedList()
+        self._spent_coin_ids = {}
+
+    def close(self) -> None:
+        pass
+
+    def add(self, entry: MempoolIndexEntry, spent_coin_ids: List[bytes32]) -> None:
+        name = entry.name
+        assert name not in self._entries
+        seq = self._seq
+        self._seq += 1
+        self._entries[name] = (entry, seq)
+        self._by_feerate.add((-entry.fee_per_cost, seq, name))
+        if entry.assert_before_height is not None:
+            self._by_before_height.add((entry.assert_before_height, seq, name))
+        if entry.assert_before_seconds is not None:
+            self._by_before_seconds.add((entry.assert_before_seconds, seq, name))
+        for coin_id in spent_coin_ids:
+            self._by_coin_id.setdefault(coin_id, set()).add(name)
+        self._spent_coin_ids[name] = spent_coin_ids
+
+    def remove(self, names: List[bytes32]) -> List[MempoolIndexEntry]:
+        removed: List[MempoolIndexEntry] = []
+        for name in names:
+            value = self._entries.pop(name, None)
+            if value is None:
+                continue
+            entry, seq = value
+            removed.append(entry)
+            self._by_feerate.remove((-entry.fee_per_cost, seq, name))
+            if entry.assert_before_height is not None:
+                self._by_before_height.remove((entry.assert_before_height, seq, name))
+            if entry.assert_before_seconds is not None:
+                self._by_before_seconds.remove((entry.assert_before_seconds, seq, name))
+            for coin_id in self._spent_coin_ids.pop(name):
+                spenders = self._by_coin_id[coin_id]
+                spenders.discard(name)
+                if len(spenders) == 0:
+                    del self._by_coin_id[coin_id]
+        return removed
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def get(self, name: bytes32) -> Optional[MempoolIndexEntry]:
+        value = self._entries.get(name)
+        return None if value is None else value[0]
+
+    def entries(self) -> Iterator[MempoolIndexEntry]:
+        # take a snapshot, the mempool may be modified while we iterate
+        for entry, _ in list(self._entries.values()):
+            yield entry
+
+    def entries_by_feerate(self, *, ascending: bool = False) -> Iterator[MempoolIndexEntry]:
+        keys = list(reversed(self._by_feerate) if ascending else self._by_feerate)
+        for _, _, name in keys:
+            value = self._entries.get(name)
+            if value is not None:
+                yield value[0]
+
+    def entries_by_coin_ids(self, spent_coin_ids: List[bytes32]) -> List[MempoolIndexEntry]:
+        names: Set[bytes32] = set()
+        for coin_id in spent_coin_ids:
+            names.update(self._by_coin_id.get(coin_id, ()))
+        return [self._entries[name][0] for name in names]
+
+    def expired(self, block_height: uint32, timestamp: uint64) -> List[bytes32]:
+        names: Dict[bytes32, None] = {}
+        for _, _, name in self._by_before_height.irange(maximum=(block_height + 1,), inclusive=(True, False)):
+            names[name] = None
+        for _, _, name in self._by_before_seconds.irange(maximum=(timestamp + 1,), inclusive=(True, False)):
+            names[name] = None
+        return list(names.keys())
+
+    def expiring_before(self, block_height: int, timestamp: int) -> List[Tuple[MempoolIndexEntry, int]]:
+        keys: Set[Tuple[float, int, bytes32]] = set()
+        for _, seq, name in self._by_before_height.irange(maximum=(block_height,), inclusive=(True, False)):
+            keys.add((-self._entries[name][0].fee_per_cost, seq, name))
+        for _, seq, name in self._by_before_seconds.irange(maximum=(timestamp,), inclusive=(True, False)):
+            keys.add((-self._entries[name][0].fee_per_cost, seq, name))
+
+        ret: List[Tuple[MempoolIndexEntry, int]] = []
+        cumulative_cost = 0
+        for _, _, name in sorted(keys):
+            entry = self._entries[name][0]
+            cumulative_cost += entry.cost
+            ret.append((entry, cumulative_cost))
+        ret.reverse()
+        return ret
+
+    def exceeding_cost(self, max_cost: int) -> List[bytes32]:
+        total_cost = 0
+        for idx, (_, _, name) in enumerate(self._by_feerate):
+            total_cost += self._entries[name][0].cost
+            if total_cost > max_cost:
+                # costs are positive, so all subsequent items exceed the
+                # limit as well
+                return [key[2] for key in self._by_feerate.islice(idx)]
+        return []
+
+
+MEMPOOL_ENGINES: Dict[str, Callable[[], MempoolIndex]] = {
+    "sqlite": SQLiteMempoolIndex,
+    "native": NativeMempoolIndex,
+}
+
+
+def create_mempool_index(engine: str) -> MempoolIndex:
+    index_type = MEMPOOL_ENGINES.get(engine)
+    if index_type is None:
+        raise ValueError(f"unknown mempool engine: {engine!r}, expected one of: {', '.join(MEMPOOL_ENGINES)}")
+    return index_type()
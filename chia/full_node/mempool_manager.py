@@ -3,11 +3,12 @@ from __future__ import annotations
 import asyncio
 import logging
 import time
+from collections import OrderedDict
 from concurrent.futures import Executor
 from concurrent.futures.process import ProcessPoolExecutor
 from dataclasses import dataclass
 from multiprocessing.context import BaseContext
-from typing import Awaitable, Callable, Collection, Dict, List, Optional, Set, Tuple, TypeVar
+from typing import Awaitable, Callable, Collection, Dict, List, Optional, Set, Tuple, TypeVar, Union
 
 from chia_rs import ELIGIBLE_FOR_DEDUP, ELIGIBLE_FOR_FF, G1Element, supports_fast_forward
 from chiabip158 import PyBIP158
@@ -19,8 +20,19 @@ from chia.full_node.bitcoin_fee_estimator import create_bitcoin_fee_estimator
 from chia.full_node.bundle_tools import simple_solution_generator
 from chia.full_node.fee_estimation import FeeBlockInfo, MempoolInfo, MempoolItemInfo
 from chia.full_node.fee_estimator_interface import FeeEstimatorInterface
-from chia.full_node.mempool import MEMPOOL_ITEM_FEE_LIMIT, Mempool, MempoolRemoveInfo, MempoolRemoveReason
-from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions, mempool_check_time_locks
+from chia.full_node.mempool import (
+    MEMPOOL_ITEM_FEE_LIMIT,
+    BlockCandidate,
+    Mempool,
+    MempoolRemoveInfo,
+    MempoolRemoveReason,
+)
+from chia.full_node.mempool_check_conditions import (
+    get_flags_for_height_and_constants,
+    get_name_puzzle_conditions,
+    mempool_check_time_locks,
+)
+from chia.full_node.mempool_snapshot import MempoolSnapshot, MempoolSnapshotItem
 from chia.full_node.pending_tx_cache import ConflictTxCache, PendingTxCache
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
@@ -32,7 +44,7 @@ from chia.types.mempool_inclusion_status import MempoolInclusionStatus
 from chia.types.mempool_item import BundleCoinSpend, MempoolItem
 from chia.types.spend_bundle import SpendBundle
 from chia.types.spend_bundle_conditions import SpendBundleConditions
-from chia.util.cached_bls import BLSCache
+from chia.util.cached_bls import BLSCache, worker_bls_cache
 from chia.util.condition_tools import pkm_pairs
 from chia.util.db_wrapper import SQLITE_INT_MAX
 from chia.util.errors import Err, ValidationError
@@ -50,14 +62,52 @@ MEMPOOL_MIN_FEE_INCREASE = uint64(10000000)
 # TODO: once the 1.8.0 soft-fork has activated, we don't really need to pass
 # the constants through here
 def validate_clvm_and_signature(
-    spend_bundle_bytes: bytes, max_cost: int, constants: ConsensusConstants, height: uint32
+    spend_bundle_bytes: bytes,
+    max_cost: int,
+    constants: ConsensusConstants,
+    height: uint32,
+    shared_bls_cache_name: Optional[str] = None,
 ) -> Tuple[Optional[Err], bytes, List[Tuple[bytes32, bytes]], float]:
     """
     Validates CLVM and aggregate signature for a spendbundle. This is meant to be called under a ProcessPoolExecutor
     in order to validate the heavy parts of a transaction in a different thread. Returns an optional error,
-    the NPCResult and a cache of the new pairings validated (if not error)
+    the NPCResult and a cache of the new pairings validated (if not error). If shared_bls_cache_name is specified,
+    pairings are looked up in, and added to, that shared cache instead, and no pairings are returned.
     """
-
+    if shared_bls_cache_name is not None:
+        cache = worker_bls_cache(shared_bls_cache_name)
+        return _validate_clvm_and_signature(spend_bundle_bytes, max_cost, constants, height, cache, False)
+    return _validate_clvm_and_signature(spend_bundle_bytes, max_cost, constants, height, BLSCache(10000), True)
+
+
+def validate_clvm_and_signature_batch(
+    spend_bundles: List[bytes],
+    max_cost: int,
+    constants: ConsensusConstants,
+    height: uint32,
+    shared_bls_cache_name: Optional[str] = None,
+) -> List[Tuple[Optional[Err], bytes, List[Tuple[bytes32, bytes]], float]]:
+    """
+    Like validate_clvm_and_signature(), but for a batch of spendbundles, in a
+    single job. The pairings computed for one spendbundle are reused by the
+    others in the batch.
+    """
+    return_pairings = shared_bls_cache_name is None
+    cache = BLSCache(10000) if shared_bls_cache_name is None else worker_bls_cache(shared_bls_cache_name)
+    return [
+        _validate_clvm_and_signature(spend_bundle_bytes, max_cost, constants, height, cache, return_pairings)
+        for spend_bundle_bytes in spend_bundles
+    ]
+
+
+def _validate_clvm_and_signature(
+    spend_bundle_bytes: bytes,
+    max_cost: int,
+    constants: ConsensusConstants,
+    height: uint32,
+    cache: BLSCache,
+    return_pairings: bool,
+) -> Tuple[Optional[Err], bytes, List[Tuple[bytes32, bytes]], float]:
     start_time = time.monotonic()
     additional_data = constants.AGG_SIG_ME_ADDITIONAL_DATA
 
@@ -78,10 +128,9 @@ def validate_clvm_and_signature(
         pks, msgs = pkm_pairs(result.conds, additional_data)
 
         # Verify aggregated signature
-        cache = BLSCache(10000)
         if not cache.aggregate_verify(pks, msgs, bundle.aggregated_signature, True):
             return Err.BAD_AGGREGATE_SIGNATURE, b"", [], time.monotonic() - start_time
-        new_cache_entries: List[Tuple[bytes32, bytes]] = cache.items()
+        new_cache_entries: List[Tuple[bytes32, bytes]] = cache.items_for(pks, msgs) if return_pairings else []
     except ValidationError as e:
         return e.code, b"", [], time.monotonic() - start_time
     except Exception:
@@ -170,7 +219,8 @@ class NewPeakItem:
 class MempoolManager:
     pool: Executor
     constants: ConsensusConstants
-    seen_bundle_hashes: Dict[bytes32, bytes32]
+    # in insertion order, so the oldest is evicted first
+    seen_bundle_hashes: OrderedDict[bytes32, bytes32]
     get_coin_records: Callable[[Collection[bytes32]], Awaitable[List[CoinRecord]]]
     nonzero_fee_minimum_fpc: int
     mempool_max_total_cost: int
@@ -182,8 +232,15 @@ class MempoolManager:
     peak: Optional[BlockRecordProtocol]
     mempool: Mempool
     _worker_queue_size: int
+    _num_workers: int
     max_block_clvm_cost: uint64
     max_tx_clvm_cost: uint64
+    mempool_engine: str
+    shared_bls_cache_name: Optional[str]
+    # the encoded filter of the mempool items, and the mempool (and its
+    # generation) it was built for. The mempool may be replaced by a new one,
+    # whose generation starts over
+    _filter_cache: Optional[Tuple[Mempool, int, bytes]]
 
     def __init__(
         self,
@@ -193,11 +250,17 @@ class MempoolManager:
         *,
         single_threaded: bool = False,
         max_tx_clvm_cost: Optional[uint64] = None,
+        mempool_engine: str = "sqlite",
+        shared_bls_cache_name: Optional[str] = None,
     ):
         self.constants: ConsensusConstants = consensus_constants
+        self.mempool_engine = mempool_engine
+        # the name of the SharedPairingCache the workers use, if any
+        self.shared_bls_cache_name = shared_bls_cache_name
 
         # Keep track of seen spend_bundles
-        self.seen_bundle_hashes: Dict[bytes32, bytes32] = {}
+        self.seen_bundle_hashes = OrderedDict()
+        self._filter_cache = None
 
         self.get_coin_records = get_coin_records
 
@@ -219,10 +282,12 @@ class MempoolManager:
         self.seen_cache_size = 10000
         self._worker_queue_size = 0
         if single_threaded:
+            self._num_workers = 1
             self.pool = InlineExecutor()
         else:
+            self._num_workers = 2
             self.pool = ProcessPoolExecutor(
-                max_workers=2,
+                max_workers=self._num_workers,
                 mp_context=multiprocessing_context,
                 initializer=setproctitle,
                 initargs=(f"{getproctitle()}_mempool_worker",),
@@ -236,7 +301,7 @@ class MempoolManager:
             FeeRate(uint64(self.nonzero_fee_minimum_fpc)),
             CLVMCost(uint64(self.max_block_clvm_cost)),
         )
-        self.mempool: Mempool = Mempool(mempool_info, self.fee_estimator)
+        self.mempool: Mempool = Mempool(mempool_info, self.fee_estimator, self.mempool_engine)
 
     def shut_down(self) -> None:
         self.pool.shutdown(wait=True)
@@ -255,25 +320,43 @@ class MempoolManager:
         if self.peak is None or self.peak.header_hash != last_tb_header_hash:
             return None
         if item_inclusion_filter is None:
-
-            def always(bundle_name: bytes32) -> bool:
-                return True
-
-            item_inclusion_filter = always
+            candidate = await self.mempool.get_block_candidate(
+                get_unspent_lineage_info_for_puzzle_hash, self.constants, self.peak.height
+            )
+            return candidate.bundle()
         return await self.mempool.create_bundle_from_mempool_items(
             item_inclusion_filter, get_unspent_lineage_info_for_puzzle_hash, self.constants, self.peak.height
         )
 
-    def get_filter(self) -> bytes:
-        all_transactions: Set[bytes32] = set()
-        byte_array_list = []
-        for key in self.mempool.all_item_ids():
-            if key not in all_transactions:
-                all_transactions.add(key)
-                byte_array_list.append(bytearray(key))
+    async def get_block_candidate(
+        self,
+        get_unspent_lineage_info_for_puzzle_hash: Callable[[bytes32], Awaitable[Optional[UnspentLineageInfo]]],
+    ) -> Optional[BlockCandidate]:
+        """
+        The mempool items that would be included in a block on top of the
+        current peak, or None if there is no peak yet.
+        """
+        if self.peak is None:
+            return None
+        return await self.mempool.get_block_candidate(
+            get_unspent_lineage_info_for_puzzle_hash, self.constants, self.peak.height
+        )
 
-        tx_filter: PyBIP158 = PyBIP158(byte_array_list)
-        return bytes(tx_filter.GetEncoded())
+    def get_filter(self) -> bytes:
+        """
+        The encoded BIP158 filter of the IDs of the mempool items. It's only
+        rebuilt when the mempool has changed since the last call.
+        """
+        if (
+            self._filter_cache is not None
+            and self._filter_cache[0] is self.mempool
+            and self._filter_cache[1] == self.mempool.generation
+        ):
+            return self._filter_cache[2]
+        tx_filter: PyBIP158 = PyBIP158([bytearray(key) for key in self.mempool.all_item_ids()])
+        encoded = bytes(tx_filter.GetEncoded())
+        self._filter_cache = (self.mempool, self.mempool.generation, encoded)
+        return encoded
 
     def is_fee_enough(self, fees: uint64, cost: uint64) -> bool:
         """
@@ -293,16 +376,14 @@ class MempoolManager:
     def add_and_maybe_pop_seen(self, spend_name: bytes32) -> None:
         self.seen_bundle_hashes[spend_name] = spend_name
         while len(self.seen_bundle_hashes) > self.seen_cache_size:
-            first_in = list(self.seen_bundle_hashes.keys())[0]
-            self.seen_bundle_hashes.pop(first_in)
+            self.seen_bundle_hashes.popitem(last=False)
 
     def seen(self, bundle_hash: bytes32) -> bool:
         """Return true if we saw this spendbundle recently"""
         return bundle_hash in self.seen_bundle_hashes
 
     def remove_seen(self, bundle_hash: bytes32) -> None:
-        if bundle_hash in self.seen_bundle_hashes:
-            self.seen_bundle_hashes.pop(bundle_hash)
+        self.seen_bundle_hashes.pop(bundle_hash, None)
 
     async def pre_validate_spendbundle(
         self,
@@ -332,6 +413,7 @@ class MempoolManager:
                 self.max_tx_clvm_cost,
                 self.constants,
                 self.peak.height,
+                self.shared_bls_cache_name,
             )
         finally:
             self._worker_queue_size -= 1
@@ -349,6 +431,74 @@ class MempoolManager:
         )
         return ret
 
+    async def pre_validate_spendbundles(
+        self,
+        new_spends: List[Tuple[SpendBundle, Optional[bytes], bytes32]],
+        bls_cache: Optional[BLSCache] = None,
+    ) -> List[Union[NPCResult, ValidationError]]:
+        """
+        Like pre_validate_spendbundle(), but for a batch of (spend bundle,
+        serialized spend bundle, spend name). The batch is split into one job
+        per worker, rather than one job per spend bundle, and the spend bundles
+        in a job share pairings. Returns the NPCResult, or the ValidationError,
+        of each spend bundle, in the same order.
+        """
+        assert self.peak is not None
+
+        results: List[Optional[Union[NPCResult, ValidationError]]] = [None] * len(new_spends)
+        to_validate: List[Tuple[int, bytes]] = []
+        for i, (new_spend, new_spend_bytes, _) in enumerate(new_spends):
+            if new_spend.coin_spends == []:
+                results[i] = ValidationError(Err.INVALID_SPEND_BUNDLE, "Empty SpendBundle")
+            else:
+                to_validate.append((i, bytes(new_spend) if new_spend_bytes is None else new_spend_bytes))
+
+        # spread the spend bundles evenly across the workers
+        num_jobs = min(self._num_workers, len(to_validate))
+        jobs = [to_validate[j::num_jobs] for j in range(num_jobs)]
+
+        start_time = time.monotonic()
+        self._worker_queue_size += len(to_validate)
+        try:
+            loop = asyncio.get_running_loop()
+            job_results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self.pool,
+                        validate_clvm_and_signature_batch,
+                        [spend_bytes for _, spend_bytes in job],
+                        self.max_tx_clvm_cost,
+                        self.constants,
+                        self.peak.height,
+                        self.shared_bls_cache_name,
+                    )
+                    for job in jobs
+                )
+            )
+        finally:
+            self._worker_queue_size -= len(to_validate)
+
+        for job, job_result in zip(jobs, job_results):
+            for (i, _), (err, cached_result_bytes, new_cache_entries, _) in zip(job, job_result):
+                if err is not None:
+                    results[i] = ValidationError(err)
+                    continue
+                if bls_cache is not None:
+                    bls_cache.update(new_cache_entries)
+                results[i] = NPCResult.from_bytes(cached_result_bytes)
+
+        duration = time.monotonic() - start_time
+        log.log(
+            logging.DEBUG if duration < 2 else logging.WARNING,
+            f"pre_validate_spendbundles took {duration:0.4f} seconds "
+            f"for {len(to_validate)} spend bundles in {num_jobs} jobs (queue-size: {self._worker_queue_size})",
+        )
+        ret: List[Union[NPCResult, ValidationError]] = []
+        for result in results:
+            assert result is not None
+            ret.append(result)
+        return ret
+
     async def add_spend_bundle(
         self,
         new_spend: SpendBundle,
@@ -675,6 +825,44 @@ class MempoolManager:
 
         return item
 
+    def snapshot_items(self) -> List[MempoolSnapshotItem]:
+        """
+        The items in the mempool, to be saved on shutdown and restored with
+        restore_snapshot() on startup.
+        """
+        return [
+            MempoolSnapshotItem(item.spend_bundle, item.npc_result, item.fee, item.cost, item.height_added_to_mempool)
+            for item in self.mempool.all_items()
+        ]
+
+    async def restore_snapshot(self, snapshot: MempoolSnapshot) -> int:
+        """
+        Adds the items of a mempool snapshot, taken before a restart, back to
+        the mempool. Their CLVM isn't run again, and their signatures aren't
+        validated again, this was done when they were first added. They are
+        validated against the current coin set though, which drops the items
+        spending coins that have been spent since the snapshot was taken.
+        Returns the number of items added.
+        The mempool should be locked during this call (blockchain lock).
+        """
+        if self.peak is None:
+            return 0
+        # the conditions of the items depend on which forks are active
+        if get_flags_for_height_and_constants(
+            snapshot.peak_height, self.constants
+        ) != get_flags_for_height_and_constants(self.peak.height, self.constants):
+            log.info(f"discarding mempool snapshot from before a fork, at height {snapshot.peak_height}")
+            return 0
+        added = 0
+        # if the mempool is smaller now, keep the items with the highest fee rate
+        for item in sorted(snapshot.items, key=lambda i: i.fee / i.cost, reverse=True):
+            info = await self.add_spend_bundle(
+                item.spend_bundle, item.npc_result, item.spend_bundle.name(), item.height_added_to_mempool
+            )
+            if info.status == MempoolInclusionStatus.SUCCESS:
+                added += 1
+        return added
+
     async def new_peak(
         self, new_peak: Optional[BlockRecordProtocol], spent_coins: Optional[List[bytes32]]
     ) -> NewPeakInfo:
@@ -702,6 +890,7 @@ class MempoolManager:
 
         use_optimization: bool = self.peak is not None and new_peak.prev_transaction_block_hash == self.peak.header_hash
         self.peak = new_peak
+        self.mempool.peak_changed()
 
         if use_optimization and spent_coins is not None:
             # We don't reinitialize a mempool, just kick removed items
@@ -727,8 +916,9 @@ class MempoolManager:
                 f"coins: {'not set' if spent_coins is None else 'set'}"
             )
             old_pool = self.mempool
-            self.mempool = Mempool(old_pool.mempool_info, old_pool.fee_estimator)
-            self.seen_bundle_hashes = {}
+            self.mempool = Mempool(old_pool.mempool_info, old_pool.fee_estimator, old_pool.engine)
+            self.seen_bundle_hashes = OrderedDict()
+            self._filter_cache = None
 
             # in order to make this a bit quicker, we look-up all the spends in
             # a single query, rather than one at a time.
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import io
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from chia.consensus.cost_calculator import NPCResult
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.spend_bundle import SpendBundle
+from chia.util.ints import uint32, uint64
+from chia.util.snapshot_file import SNAPSHOT_HEADER, parse_snapshot_header, serialize_snapshot
+from chia.util.streamable import Streamable, streamable
+
+log = logging.getLogger(__name__)
+
+# the items of the snapshot file are the serialized MempoolSnapshotItems
+SNAPSHOT_MAGIC = b"chia-mps"
+SNAPSHOT_VERSION = 1
+
+
+@streamable
+@dataclass(frozen=True)
+class MempoolSnapshotItem(Streamable):
+    spend_bundle: SpendBundle
+    # the result of running the spend bundle when it was added to the mempool
+    npc_result: NPCResult
+    fee: uint64
+    cost: uint64
+    height_added_to_mempool: uint32
+
+
+@dataclass(frozen=True)
+class MempoolSnapshot:
+    # the peak the mempool was based on when the snapshot was taken
+    peak_hash: bytes32
+    peak_height: uint32
+    items: List[MempoolSnapshotItem]
+
+
+def serialize_mempool_snapshot(peak_hash: bytes32, peak_height: uint32, items: Iterable[MempoolSnapshotItem]) -> bytes:
+    return serialize_snapshot(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, peak_hash, peak_height, (bytes(item) for item in items))
+
+
+def load_mempool_snapshot(path: Path) -> Optional[MempoolSnapshot]:
+    """
+    Reads and parses the snapshot file. Returns None if it doesn't exist, or
+    fails the version or integrity check. It's up to the caller to validate
+    the items against the current state of the blockchain.
+    """
+    try:
+        with memoryview(path.read_bytes()) as buf:
+            return _parse_snapshot(buf)
+    except Exception as e:
+        # it's OK if this file doesn't exist, the mempool is just empty
+        log.info(f"Failed to load mempool snapshot: {e}")
+        return None
+
+
+def _parse_snapshot(buf: memoryview) -> Optional[MempoolSnapshot]:
+    header = parse_snapshot_header(buf, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, "mempool")
+    if header is None:
+        return None
+    with buf[SNAPSHOT_HEADER.size :] as body:
+        f = io.BytesIO(body)
+        items = [MempoolSnapshotItem.parse(f) for _ in range(header.count)]
+        if f.tell() != len(body):
+            log.info("mempool snapshot has trailing bytes")
+            return None
+    return MempoolSnapshot(header.peak_hash, header.peak_height, items)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import dataclasses
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+# start_height, end_height, include_transaction_block
+RespondBlocksKey = Tuple[int, int, bool]
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedRespondBlocks:
+    # the serialized RespondBlocks message
+    payload: bytes
+    # the header hash of the block at end_height. If the chain has been
+    # reorged since the payload was built, this no longer matches
+    end_header_hash: bytes32
+
+
+@dataclasses.dataclass
+class RespondBlocksCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # entries dropped to stay within the byte budget
+    evictions: int = 0
+    # entries dropped because of a reorg, or because a block changed
+    invalidations: int = 0
+    entries: int = 0
+    size: int = 0
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": self.entries,
+            "size": self.size,
+        }
+
+
+class RespondBlocksCache:
+    """
+    An LRU cache of serialized RespondBlocks messages, keyed by the requested
+    range and whether transaction generators are included. Syncing peers tend
+    to request the same ranges, and this saves building the same response over
+    and over. The cache holds at most max_size bytes of payload. A max_size of
+    0 disables it.
+
+    Entries for ranges above a reorg are dropped by rollback(). Since a lookup
+    may race with a reorg being committed, entries also remember the header
+    hash of their last block, and a hit is only valid if it still matches the
+    chain.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.stats = RespondBlocksCacheStats()
+        self._entries: OrderedDict[RespondBlocksKey, CachedRespondBlocks] = OrderedDict()
+
+    def get(self, key: RespondBlocksKey, end_header_hash: Optional[bytes32]) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.end_header_hash != end_header_hash:
+            self._remove(key)
+            self.stats.invalidations += 1
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry.payload
+
+    def put(self, key: RespondBlocksKey, payload: bytes, end_header_hash: bytes32) -> None:
+        if len(payload) > self.max_size:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedRespondBlocks(payload, end_header_hash)
+        self.stats.size += len(payload)
+        while self.stats.size > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+        self.stats.entries = len(self._entries)
+
+    def rollback(self, height: int) -> None:
+        """
+        Drops all entries that include blocks above height.
+        """
+        for key in [k for k in self._entries if k[1] > height]:
+            self._remove(key)
+            self.stats.invalidations += 1
+
+    def remove_height(self, height: int) -> None:
+        """
+        Drops all entries that include the block at height, e.g. when its proofs
+        have been replaced.
+        """
+        for key in [k for k in self._entries if k[0] <= height <= k[1]]:
+            self._remove(key)
+            self.stats.invalidations += 1
+
+    def _remove(self, key: RespondBlocksKey) -> None:
+        entry = self._entries.pop(key)
+        self.stats.size -= len(entry.payload)
+        self.stats.entries = len(self._entries)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from chia.consensus.multiprocess_validation import PreValidationResult
+from chia.full_node.block_fetch_scheduler import PeerFetchStats
+from chia.server.ws_connection import WSChiaConnection
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.full_block import FullBlock
+
+
+@dataclass
+class SyncStageStats:
+    """
+    Counters for one stage of the long sync pipeline. Comparing the time each
+    stage spends busy with the time it spends waiting for its input (starved)
+    or for the next stage to accept its output (backpressure) shows which
+    stage is the bottleneck.
+    """
+
+    batches: int = 0
+    blocks: int = 0
+    # seconds spent doing work
+    busy_time: float = 0.0
+    # seconds spent waiting for the previous stage
+    input_wait_time: float = 0.0
+    # seconds spent waiting for the next stage to make room
+    output_wait_time: float = 0.0
+
+    @contextlib.contextmanager
+    def _timer(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            setattr(self, name, getattr(self, name) + time.monotonic() - start)
+
+    def busy(self) -> contextlib.AbstractContextManager[None]:
+        return self._timer("busy_time")
+
+    def waiting_for_input(self) -> contextlib.AbstractContextManager[None]:
+        return self._timer("input_wait_time")
+
+    def waiting_for_output(self) -> contextlib.AbstractContextManager[None]:
+        return self._timer("output_wait_time")
+
+    def record_batch(self, num_blocks: int) -> None:
+        self.batches += 1
+        self.blocks += num_blocks
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "blocks": self.blocks,
+            "busy_time": self.busy_time,
+            "input_wait_time": self.input_wait_time,
+            "output_wait_time": self.output_wait_time,
+            "blocks_per_second": self.blocks / self.busy_time if self.busy_time > 0 else 0.0,
+        }
+
+
+@dataclass
+class SyncPipelineStats:
+    # the max number of batches buffered between two stages
+    depth: int = 0
+    active: bool = False
+    # fetching block batches from peers (including parsing the responses)
+    fetch: SyncStageStats = field(default_factory=SyncStageStats)
+    # pre-validating blocks on the process pool
+    pre_validate: SyncStageStats = field(default_factory=SyncStageStats)
+    # adding the pre-validated blocks to the coin store and block store
+    apply: SyncStageStats = field(default_factory=SyncStageStats)
+    # how fast each peer has been delivering blocks, by peer node id
+    fetch_peers: Dict[bytes32, PeerFetchStats] = field(default_factory=dict)
+    # the queues between the stages, to report their current sizes
+    fetched_queue: Optional[asyncio.Queue[Any]] = None
+    validated_queue: Optional[asyncio.Queue[Any]] = None
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "active": self.active,
+            "stages": {
+                "fetch": self.fetch.to_json_dict(),
+                "pre_validate": self.pre_validate.to_json_dict(),
+                "apply": self.apply.to_json_dict(),
+            },
+            "peers": {peer_id.hex(): peer.to_json_dict() for peer_id, peer in self.fetch_peers.items()},
+            "queue_sizes": {
+                "fetched": 0 if self.fetched_queue is None else self.fetched_queue.qsize(),
+                "validated": 0 if self.validated_queue is None else self.validated_queue.qsize(),
+            },
+        }
+
+
+@dataclass
+class PreValidatedBatch:
+    peer: WSChiaConnection
+    blocks: List[FullBlock]
+    # the tail of blocks that are not in the blockchain yet, and were
+    # pre-validated. The blocks before these are already in the blockchain
+    blocks_to_validate: List[FullBlock]
+    pre_validation_results: List[PreValidationResult]
+    # set once the apply stage is done with this batch, successfully or not
+    applied: asyncio.Event = field(default_factory=asyncio.Event)
@@ -9,6 +9,7 @@ from typing import Dict, List, Optional, OrderedDict, Set
 
 import typing_extensions
 
+from chia.full_node.sync_pipeline import SyncPipelineStats
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.util.ints import uint32, uint128
 
@@ -41,6 +42,8 @@ class SyncStore:
     _backtrack_syncing: collections.defaultdict[bytes32, int] = field(
         default_factory=lambda: collections.defaultdict(int),
     )
+    # counters of the most recent long sync pipeline
+    pipeline_stats: SyncPipelineStats = field(default_factory=SyncPipelineStats)
 
     def set_sync_mode(self, sync_mode: bool) -> None:
         self.sync_mode = sync_mode
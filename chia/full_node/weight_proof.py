@@ -6,9 +6,11 @@ import math
 import pathlib
 import random
 import tempfile
+import time
 from concurrent.futures.process import ProcessPoolExecutor
+from dataclasses import dataclass
 from multiprocessing.context import BaseContext
-from typing import IO, Dict, List, Optional, Tuple
+from typing import IO, Any, Dict, List, Optional, Set, Tuple
 
 from chia.consensus.block_header_validation import validate_finished_header_block
 from chia.consensus.block_record import BlockRecord
@@ -42,34 +44,120 @@ from chia.types.weight_proof import (
 from chia.util.block_cache import BlockCache
 from chia.util.hash import std_hash
 from chia.util.ints import uint8, uint32, uint64, uint128
-from chia.util.misc import to_batches
+from chia.util.lru_cache import SizedLRUCache
+from chia.util.misc import available_logical_cores, to_batches
 from chia.util.setproctitle import getproctitle, setproctitle
 
 log = logging.getLogger(__name__)
 
+# the number of VDFs validated by each task submitted to the process pool
+VDF_BATCH_SIZE = 4
+
+# set once in each worker process by _init_worker(), rather than being sent
+# along with every task
+_worker_constants: Optional[ConsensusConstants] = None
+
 
 def _create_shutdown_file() -> IO[bytes]:
     return tempfile.NamedTemporaryFile(prefix="chia_full_node_weight_proof_handler_executor_shutdown_trigger")
 
 
+def _create_abort_file() -> IO[bytes]:
+    return tempfile.NamedTemporaryFile(prefix="chia_weight_proof_validation_abort_trigger")
+
+
+def _init_worker(process_title: str, constants: ConsensusConstants) -> None:
+    global _worker_constants
+    setproctitle(process_title)
+    _worker_constants = constants
+
+
+def create_weight_proof_executor(
+    constants: ConsensusConstants,
+    num_processes: int,
+    multiprocessing_context: Optional[BaseContext],
+    process_title: str,
+) -> ProcessPoolExecutor:
+    """
+    Creates the process pool for validate_weight_proof_inner(). The constants
+    are passed to each worker once, when it starts.
+    """
+    return ProcessPoolExecutor(
+        max_workers=num_processes,
+        mp_context=multiprocessing_context,
+        initializer=_init_worker,
+        initargs=(process_title, constants),
+    )
+
+
+def _stop_requested(*file_paths: Optional[pathlib.Path]) -> bool:
+    # workers keep going for as long as these files exist. They're removed
+    # on shutdown, or when another part of the weight proof failed validation
+    return any(path is not None and not path.is_file() for path in file_paths)
+
+
+@dataclass
+class WeightProofStats:
+    # proofs created, and proofs served from the cache
+    proofs_created: int = 0
+    cache_hits: int = 0
+    # seconds spent creating proofs
+    total_latency: float = 0.0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+    # header blocks of the recent chain loaded from the blockchain, rather
+    # than reused from previous proofs
+    recent_headers_loaded: int = 0
+
+    def record_created(self, latency: float) -> None:
+        self.proofs_created += 1
+        self.total_latency += latency
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "proofs_created": self.proofs_created,
+            "cache_hits": self.cache_hits,
+            "total_latency": self.total_latency,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+            "average_latency": self.total_latency / self.proofs_created if self.proofs_created > 0 else 0.0,
+            "recent_headers_loaded": self.recent_headers_loaded,
+        }
+
+
 class WeightProofHandler:
     LAMBDA_L = 100
     C = 0.5
     MAX_SAMPLES = 20
+    # the serialized size of the proofs to keep, for the most recently
+    # requested tips. A mainnet proof is several MB, so this holds the proofs
+    # for the last few tips
+    PROOF_CACHE_SIZE = 64 * 1024 * 1024
+    # the serialized size of the challenge segments to keep in memory, by sub
+    # epoch. The most recent sub epochs are the most likely to be sampled
+    SEGMENT_CACHE_SIZE = 64 * 1024 * 1024
 
     def __init__(
         self,
         constants: ConsensusConstants,
         blockchain: BlockchainInterface,
         multiprocessing_context: Optional[BaseContext] = None,
+        num_processes: Optional[int] = None,
     ):
-        self.tip: Optional[bytes32] = None
-        self.proof: Optional[WeightProof] = None
         self.constants = constants
         self.blockchain = blockchain
         self.lock = asyncio.Lock()
-        self._num_processes = 4
+        self._num_processes = available_logical_cores() if num_processes is None else num_processes
         self.multiprocessing_context = multiprocessing_context
+        self.stats = WeightProofStats()
+        self._proofs: SizedLRUCache[bytes32, WeightProof] = SizedLRUCache(self.PROOF_CACHE_SIZE)
+        self._segments: SizedLRUCache[bytes32, List[SubEpochChallengeSegment]] = SizedLRUCache(self.SEGMENT_CACHE_SIZE)
+        # the header blocks of the recent chain, by header hash. These are
+        # reused between proofs, only new blocks need to be loaded
+        self._recent_headers: Dict[bytes32, HeaderBlock] = {}
+        self._recent_tip_height = 0
 
     async def get_proof_of_weight(self, tip: bytes32) -> Optional[WeightProof]:
         tip_rec = self.blockchain.try_block_record(tip)
@@ -82,14 +170,18 @@ class WeightProofHandler:
             return None
 
         async with self.lock:
-            if self.proof is not None:
-                if self.proof.recent_chain_data[-1].header_hash == tip:
-                    return self.proof
+            wp = self._proofs.get(tip)
+            if wp is not None:
+                self.stats.cache_hits += 1
+                return wp
+            start = time.monotonic()
             wp = await self._create_proof_of_weight(tip)
             if wp is None:
                 return None
-            self.proof = wp
-            self.tip = tip
+            latency = time.monotonic() - start
+            self.stats.record_created(latency)
+            log.info(f"created weight proof for {tip} height {tip_rec.height} in {latency:0.2f} seconds")
+            self._proofs.put(tip, wp, len(bytes(wp)))
             return wp
 
     def get_sub_epoch_data(self, tip_height: uint32, summary_heights: List[uint32]) -> List[SubEpochData]:
@@ -150,15 +242,20 @@ class WeightProofHandler:
 
             if _sample_sub_epoch(prev_ses_block.weight, ses_block.weight, weight_to_check):
                 sample_n += 1
-                segments = await self.blockchain.get_sub_epoch_challenge_segments(ses_block.header_hash)
+                segments = self._segments.get(ses_block.header_hash)
                 if segments is None:
-                    segments = await self.__create_sub_epoch_segments(ses_block, prev_ses_block, uint32(sub_epoch_n))
+                    segments = await self.blockchain.get_sub_epoch_challenge_segments(ses_block.header_hash)
                     if segments is None:
-                        log.error(
-                            f"failed while building segments for sub epoch {sub_epoch_n}, ses height {ses_height} "
+                        segments = await self.__create_sub_epoch_segments(
+                            ses_block, prev_ses_block, uint32(sub_epoch_n)
                         )
-                        return None
-                    await self.blockchain.persist_sub_epoch_challenge_segments(ses_block.header_hash, segments)
+                        if segments is None:
+                            log.error(
+                                f"failed while building segments for sub epoch {sub_epoch_n}, ses height {ses_height} "
+                            )
+                            return None
+                        await self.blockchain.persist_sub_epoch_challenge_segments(ses_block.header_hash, segments)
+                    self._segments.put(ses_block.header_hash, segments, _segments_size(segments))
                 sub_epoch_segments.extend(segments)
             prev_ses_block = ses_block
         log.debug(f"sub_epochs: {len(sub_epoch_data)}")
@@ -178,7 +275,11 @@ class WeightProofHandler:
         return seed
 
     async def _get_recent_chain(self, tip_height: uint32) -> Optional[List[HeaderBlock]]:
-        recent_chain: List[HeaderBlock] = []
+        """
+        Returns the header blocks from the block before the second to last sub
+        epoch summary, up to the tip. Header blocks loaded for previous proofs
+        are reused, so normally only the blocks added since are loaded.
+        """
         ses_heights = self.blockchain.get_ses_heights()
         min_height = 0
         count_ses = 0
@@ -189,32 +290,40 @@ class WeightProofHandler:
                 min_height = ses_height - 1
                 break
         log.debug(f"start {min_height} end {tip_height}")
-        headers = await self.blockchain.get_header_blocks_in_range(min_height, tip_height, tx_filter=False)
-        blocks = await self.blockchain.get_block_records_in_range(min_height, tip_height)
-        ses_count = 0
-        curr_height = tip_height
-        blocks_n = 0
-        while ses_count < 2:
-            if curr_height == 0:
-                break
-            # add to needed reward chain recent blocks
-            header_hash = self.blockchain.height_to_hash(curr_height)
+
+        header_hashes: List[bytes32] = []
+        for height in range(min_height, tip_height + 1):
+            header_hash = self.blockchain.height_to_hash(uint32(height))
             assert header_hash is not None
-            header_block = headers[header_hash]
-            block_rec = blocks[header_block.header_hash]
+            header_hashes.append(header_hash)
+
+        # load everything from the first block we don't have
+        for idx, header_hash in enumerate(header_hashes):
+            if header_hash not in self._recent_headers:
+                headers = await self.blockchain.get_header_blocks_in_range(
+                    min_height + idx, tip_height, tx_filter=False
+                )
+                self._recent_headers.update(headers)
+                self.stats.recent_headers_loaded += len(headers)
+                break
+
+        recent_chain: List[HeaderBlock] = []
+        for header_hash in header_hashes:
+            header_block = self._recent_headers.get(header_hash)
             if header_block is None:
                 log.error("creating recent chain failed")
                 return None
-            recent_chain.insert(0, header_block)
-            if block_rec.sub_epoch_summary_included:
-                ses_count += 1
-            curr_height = uint32(curr_height - 1)
-            blocks_n += 1
-
-        header_hash = self.blockchain.height_to_hash(curr_height)
-        assert header_hash is not None
-        header_block = headers[header_hash]
-        recent_chain.insert(0, header_block)
+            recent_chain.append(header_block)
+
+        # as the chain grows, forget blocks that are no longer part of the
+        # recent chain
+        if tip_height >= self._recent_tip_height:
+            self._recent_tip_height = tip_height
+            self._recent_headers = {
+                header_hash: header_block
+                for header_hash, header_block in self._recent_headers.items()
+                if header_block.height >= min_height
+            }
 
         log.info(
             f"recent chain, "
@@ -235,6 +344,9 @@ class WeightProofHandler:
         segments = await self.__create_sub_epoch_segments(ses_sub_block, prev_ses_sub_block, uint32(count))
         assert segments is not None
         await self.blockchain.persist_sub_epoch_challenge_segments(ses_sub_block.header_hash, segments)
+        # the newest sub epochs are the most likely to be sampled
+        if self._segments.get(ses_sub_block.header_hash) is None:
+            self._segments.put(ses_sub_block.header_hash, segments, _segments_size(segments))
         log.debug("sub_epoch_segments done")
         return None
 
@@ -579,8 +691,13 @@ class WeightProofHandler:
             log.error("failed weight proof sub epoch sample validation")
             return False, uint32(0)
 
-        if _validate_sub_epoch_segments(self.constants, rng, wp_segment_bytes, summary_bytes, peak_height) is None:
+        vdfs = _validate_sub_epoch_segments(self.constants, rng, wp_segment_bytes, summary_bytes, peak_height)
+        if vdfs is None:
             return False, uint32(0)
+        for vdf_proof, classgroup, vdf_info in vdfs:
+            if not validate_vdf(vdf_proof, self.constants, classgroup, vdf_info):
+                log.error("failed weight proof sub epoch segment vdf validation")
+                return False, uint32(0)
         log.info("validate weight proof recent blocks")
         success, _ = validate_recent_blocks(self.constants, wp_recent_chain_bytes, summary_bytes)
         if not success:
@@ -604,11 +721,11 @@ class WeightProofHandler:
         fork_point, ses_fork_idx = self.get_fork_point(summaries)
         # timing reference: 1 second
         # TODO: Consider implementing an async polling closer for the executor.
-        with ProcessPoolExecutor(
-            max_workers=self._num_processes,
-            mp_context=self.multiprocessing_context,
-            initializer=setproctitle,
-            initargs=(f"{getproctitle()}_weight_proof_worker",),
+        with create_weight_proof_executor(
+            self.constants,
+            self._num_processes,
+            self.multiprocessing_context,
+            f"{getproctitle()}_weight_proof_worker",
         ) as executor:
             # The shutdown file manager must be inside of the executor manager so that
             # we request the workers close prior to waiting for them to close.
@@ -672,6 +789,10 @@ def _get_weights_for_sampling(
     return weight_to_check
 
 
+def _segments_size(segments: List[SubEpochChallengeSegment]) -> int:
+    return sum(len(bytes(segment)) for segment in segments)
+
+
 def _sample_sub_epoch(
     start_of_epoch_weight: uint128,
     end_of_epoch_weight: uint128,
@@ -917,30 +1038,45 @@ def _validate_summaries_weight(
     return curr.reward_chain_block.weight == sub_epoch_data_weight
 
 
-def _validate_sub_epoch_segments(
+@dataclass(frozen=True)
+class SampledSegment:
+    """
+    A segment picked for full validation, along with the parameters of its sub
+    epoch that _validate_segment() needs.
+    """
+
+    segment: SubEpochChallengeSegment
+    curr_ssi: uint64
+    prev_ssi: uint64
+    curr_difficulty: uint64
+    # the summary of the previous sub epoch, for the first segment of a sub epoch
+    ses: Optional[SubEpochSummary]
+    first_segment_in_se: bool
+
+
+def _sample_sub_epoch_segments(
     constants: ConsensusConstants,
     rng: random.Random,
-    weight_proof_bytes: bytes,
-    summaries_bytes: List[bytes],
-    height: uint32,
+    challenge_segments: List[SubEpochChallengeSegment],
+    summaries: List[SubEpochSummary],
     validate_from: int = 0,
-) -> Optional[List[Tuple[VDFProof, ClassgroupElement, VDFInfo]]]:
-    summaries = summaries_from_bytes(summaries_bytes)
-    sub_epoch_segments: SubEpochSegments = SubEpochSegments.from_bytes(weight_proof_bytes)
+) -> Optional[List[SampledSegment]]:
+    """
+    Checks that the segments of each sub epoch lead to its summary, and picks
+    one segment of each sub epoch to validate. Only the picked segments need
+    their proofs of space and VDFs validated, which can be done in parallel.
+    """
     rc_sub_slot_hash = constants.GENESIS_CHALLENGE
-    total_blocks, total_ip_iters = 0, 0
-    total_slot_iters, total_slots = 0, 0
-    total_ip_iters = 0
-    prev_ses: Optional[SubEpochSummary] = None
-    segments_by_sub_epoch = map_segments_by_sub_epoch(sub_epoch_segments.challenge_segments)
+    segments_by_sub_epoch = map_segments_by_sub_epoch(challenge_segments)
     curr_ssi = constants.SUB_SLOT_ITERS_STARTING
-    vdfs_to_validate = []
+    sampled: List[SampledSegment] = []
     for sub_epoch_n, segments in segments_by_sub_epoch.items():
         prev_ssi = curr_ssi
         curr_difficulty, curr_ssi = _get_curr_diff_ssi(constants, sub_epoch_n, summaries)
         log.debug(f"validate sub epoch {sub_epoch_n}")
         # recreate RewardChainSubSlot for next ses rc_hash
         sampled_seg_index = rng.choice(range(len(segments)))
+        prev_ses: Optional[SubEpochSummary] = None
         if sub_epoch_n > 0:
             rc_sub_slot = __get_rc_sub_slot(constants, segments[0], summaries, curr_ssi)
             prev_ses = summaries[sub_epoch_n - 1]
@@ -953,30 +1089,76 @@ def _validate_sub_epoch_segments(
         if sub_epoch_n < validate_from:
             continue
 
-        for idx, segment in enumerate(segments):
-            valid_segment, ip_iters, slot_iters, slots, vdf_list = _validate_segment(
-                constants,
-                segment,
+        sampled.append(
+            SampledSegment(
+                segments[sampled_seg_index],
                 curr_ssi,
                 prev_ssi,
                 curr_difficulty,
-                prev_ses,
-                idx == 0,
-                sampled_seg_index == idx,
-                height,
+                prev_ses if sampled_seg_index == 0 else None,
+                sampled_seg_index == 0,
             )
-            vdfs_to_validate.extend(vdf_list)
-            if not valid_segment:
-                log.error(f"failed to validate sub_epoch {segment.sub_epoch_n} segment {idx} slots")
-                return None
-            prev_ses = None
-            total_blocks += 1
-            total_slot_iters += slot_iters
-            total_slots += slots
-            total_ip_iters += ip_iters
+        )
+    return sampled
+
+
+def _validate_sub_epoch_segments(
+    constants: ConsensusConstants,
+    rng: random.Random,
+    weight_proof_bytes: bytes,
+    summaries_bytes: List[bytes],
+    height: uint32,
+    validate_from: int = 0,
+) -> Optional[List[Tuple[VDFProof, ClassgroupElement, VDFInfo]]]:
+    summaries = summaries_from_bytes(summaries_bytes)
+    sub_epoch_segments: SubEpochSegments = SubEpochSegments.from_bytes(weight_proof_bytes)
+    sampled = _sample_sub_epoch_segments(
+        constants, rng, sub_epoch_segments.challenge_segments, summaries, validate_from
+    )
+    if sampled is None:
+        return None
+    vdfs_to_validate = []
+    for s in sampled:
+        valid_segment, _, _, _, vdf_list = _validate_segment(
+            constants, s.segment, s.curr_ssi, s.prev_ssi, s.curr_difficulty, s.ses, s.first_segment_in_se, True, height
+        )
+        if not valid_segment:
+            log.error(f"failed to validate sub_epoch {s.segment.sub_epoch_n} segment slots")
+            return None
+        vdfs_to_validate.extend(vdf_list)
     return vdfs_to_validate
 
 
+def _validate_sampled_segment(
+    segment_bytes: bytes,
+    curr_ssi: uint64,
+    prev_ssi: uint64,
+    curr_difficulty: uint64,
+    ses_bytes: Optional[bytes],
+    first_segment_in_se: bool,
+    height: uint32,
+    shutdown_file_path: Optional[pathlib.Path] = None,
+    abort_file_path: Optional[pathlib.Path] = None,
+) -> Optional[List[Tuple[bytes, bytes, bytes]]]:
+    """
+    Runs in a worker process. Validates a segment picked by
+    _sample_sub_epoch_segments() and returns the VDFs that still need to be
+    validated, or None if it's invalid.
+    """
+    assert _worker_constants is not None
+    if _stop_requested(shutdown_file_path, abort_file_path):
+        return None
+    segment = SubEpochChallengeSegment.from_bytes(segment_bytes)
+    ses = None if ses_bytes is None else SubEpochSummary.from_bytes(ses_bytes)
+    valid_segment, _, _, _, vdf_list = _validate_segment(
+        _worker_constants, segment, curr_ssi, prev_ssi, curr_difficulty, ses, first_segment_in_se, True, height
+    )
+    if not valid_segment:
+        log.error(f"failed to validate sub_epoch {segment.sub_epoch_n} segment slots")
+        return None
+    return [(bytes(vdf_proof), bytes(classgroup), bytes(vdf_info)) for vdf_proof, classgroup, vdf_info in vdf_list]
+
+
 def _validate_segment(
     constants: ConsensusConstants,
     segment: SubEpochChallengeSegment,
@@ -1079,9 +1261,7 @@ def _validate_sub_slot_data(
         if (not prev_ssd.is_end_of_slot()) and (not sub_slot_data.cc_slot_end.normalized_to_identity):
             assert prev_ssd.cc_ip_vdf_info
             input = prev_ssd.cc_ip_vdf_info.output
-        if not validate_vdf(sub_slot_data.cc_slot_end, constants, input, sub_slot_data.cc_slot_end_info):
-            log.error(f"failed cc slot end validation  {sub_slot_data.cc_slot_end_info}")
-            return False, []
+        to_validate.append((sub_slot_data.cc_slot_end, input, sub_slot_data.cc_slot_end_info))
     else:
         # find end of slot
         idx = sub_slot_idx
@@ -1200,6 +1380,7 @@ def validate_recent_blocks(
     recent_chain_bytes: bytes,
     summaries_bytes: List[bytes],
     shutdown_file_path: Optional[pathlib.Path] = None,
+    abort_file_path: Optional[pathlib.Path] = None,
 ) -> Tuple[bool, List[bytes]]:
     recent_chain: RecentChainData = RecentChainData.from_bytes(recent_chain_bytes)
     summaries = summaries_from_bytes(summaries_bytes)
@@ -1283,8 +1464,8 @@ def validate_recent_blocks(
             ses_blocks += 1
         prev_block_record = block_record
 
-        if shutdown_file_path is not None and not shutdown_file_path.is_file():
-            log.info(f"cancelling block {block.header_hash} validation, shutdown requested")
+        if _stop_requested(shutdown_file_path, abort_file_path):
+            log.info(f"cancelling block {block.header_hash} validation, shutdown or abort requested")
             return False, []
 
     if len(summaries) > 2 and prev_challenge is None:
@@ -1626,19 +1807,21 @@ def map_segments_by_sub_epoch(
 
 
 def _validate_vdf_batch(
-    constants: ConsensusConstants,
     vdf_list: List[Tuple[bytes, bytes, bytes]],
     shutdown_file_path: Optional[pathlib.Path] = None,
+    abort_file_path: Optional[pathlib.Path] = None,
 ) -> bool:
+    # runs in a worker process
+    assert _worker_constants is not None
     for vdf_proof_bytes, class_group_bytes, info in vdf_list:
+        if _stop_requested(shutdown_file_path, abort_file_path):
+            log.info("cancelling VDF validation, shutdown or abort requested")
+            return False
+
         vdf = VDFProof.from_bytes(vdf_proof_bytes)
         class_group = ClassgroupElement.create(class_group_bytes)
         vdf_info = VDFInfo.from_bytes(info)
-        if not validate_vdf(vdf, constants, class_group, vdf_info):
-            return False
-
-        if shutdown_file_path is not None and not shutdown_file_path.is_file():
-            log.info("cancelling VDF validation, shutdown requested")
+        if not validate_vdf(vdf, _worker_constants, class_group, vdf_info):
             return False
 
     return True
@@ -1655,6 +1838,11 @@ async def validate_weight_proof_inner(
     skip_segment_validation: bool,
     validate_from: int,
 ) -> Tuple[bool, List[BlockRecord]]:
+    """
+    Validates the recent chain, the sampled sub epoch segments and their VDFs
+    in parallel, on an executor created by create_weight_proof_executor(). As
+    soon as any part fails, the remaining work is cancelled.
+    """
     assert len(weight_proof.sub_epochs) > 0
     if len(weight_proof.sub_epochs) == 0:
         return False, []
@@ -1668,52 +1856,81 @@ async def validate_weight_proof_inner(
         return False, []
 
     loop = asyncio.get_running_loop()
-    summary_bytes, wp_segment_bytes, wp_recent_chain_bytes = vars_to_bytes(summaries, weight_proof)
-    recent_blocks_validation_task = loop.run_in_executor(
-        executor,
-        validate_recent_blocks,
-        constants,
-        wp_recent_chain_bytes,
-        summary_bytes,
-        pathlib.Path(shutdown_file_name),
-    )
-
-    if not skip_segment_validation:
-        vdfs_to_validate = _validate_sub_epoch_segments(
-            constants, rng, wp_segment_bytes, summary_bytes, peak_height, validate_from
-        )
-        await asyncio.sleep(0)  # break up otherwise multi-second sync code
-
-        if vdfs_to_validate is None:
-            return False, []
-
-        vdf_tasks = []
-        for batch in to_batches(vdfs_to_validate, num_processes):
-            byte_chunks = []
-            for vdf_proof, classgroup, vdf_info in batch.entries:
-                byte_chunks.append((bytes(vdf_proof), bytes(classgroup), bytes(vdf_info)))
-            vdf_task = asyncio.get_running_loop().run_in_executor(
+    shutdown_file_path = pathlib.Path(shutdown_file_name)
+    summary_bytes = [bytes(summary) for summary in summaries]
+    wp_recent_chain_bytes = bytes(RecentChainData(weight_proof.recent_chain_data))
+    pending: Set[asyncio.Future[Any]] = set()
+    segment_tasks: Set[asyncio.Future[Any]] = set()
+    records_bytes: Optional[List[bytes]] = None
+
+    # removing this file tells the workers to stop, once we're done
+    with _create_abort_file() as abort_file:
+        abort_file_path = pathlib.Path(abort_file.name)
+        try:
+            recent_blocks_task = loop.run_in_executor(
                 executor,
-                _validate_vdf_batch,
+                validate_recent_blocks,
                 constants,
-                byte_chunks,
-                pathlib.Path(shutdown_file_name),
+                wp_recent_chain_bytes,
+                summary_bytes,
+                shutdown_file_path,
+                abort_file_path,
             )
-            vdf_tasks.append(vdf_task)
-            # give other stuff a turn
-            await asyncio.sleep(0)
-
-        for vdf_task in asyncio.as_completed(fs=vdf_tasks):
-            validated = await vdf_task
-            if not validated:
-                return False, []
-
-    valid_recent_blocks, records_bytes = await recent_blocks_validation_task
-
-    if not valid_recent_blocks or records_bytes is None:
-        log.error("failed validating weight proof recent blocks")
-        # Verify the data
-        return False, []
+            pending.add(recent_blocks_task)
 
+            if not skip_segment_validation:
+                sampled = _sample_sub_epoch_segments(
+                    constants, rng, weight_proof.sub_epoch_segments, summaries, validate_from
+                )
+                if sampled is None:
+                    return False, []
+                for s in sampled:
+                    segment_task = loop.run_in_executor(
+                        executor,
+                        _validate_sampled_segment,
+                        bytes(s.segment),
+                        s.curr_ssi,
+                        s.prev_ssi,
+                        s.curr_difficulty,
+                        None if s.ses is None else bytes(s.ses),
+                        s.first_segment_in_se,
+                        peak_height,
+                        shutdown_file_path,
+                        abort_file_path,
+                    )
+                    segment_tasks.add(segment_task)
+                pending |= segment_tasks
+
+            while len(pending) > 0:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is recent_blocks_task:
+                        valid_recent_blocks, records_bytes = task.result()
+                        if not valid_recent_blocks:
+                            log.error("failed validating weight proof recent blocks")
+                            return False, []
+                    elif task in segment_tasks:
+                        vdfs = task.result()
+                        if vdfs is None:
+                            log.error("failed validating weight proof sub epoch segment")
+                            return False, []
+                        # the VDFs of this segment can be validated while
+                        # other segments are still being validated
+                        for batch in to_batches(vdfs, VDF_BATCH_SIZE):
+                            pending.add(
+                                loop.run_in_executor(
+                                    executor, _validate_vdf_batch, batch.entries, shutdown_file_path, abort_file_path
+                                )
+                            )
+                    elif not task.result():
+                        log.error("failed validating weight proof sub epoch segment vdfs")
+                        return False, []
+        finally:
+            # tasks that haven't started yet are cancelled, the ones that are
+            # running stop when the abort file is removed
+            for task in pending:
+                task.cancel()
+
+    assert records_bytes is not None
     records = [BlockRecord.from_bytes(b) for b in records_bytes]
     return True, records
@@ -136,4 +136,7 @@ class ProtocolMessageTypes(Enum):
     request_cost_info = 106
     respond_cost_info = 107
 
+    # a message compressed with zstd, see Capability.MESSAGE_COMPRESSION
+    compressed_message = 108
+
     error = 255
@@ -44,6 +44,10 @@ class Capability(IntEnum):
     # This is between a full node and receiving wallet
     MEMPOOL_UPDATES = 5
 
+    # Large messages may be sent zstd compressed, wrapped in a compressed_message.
+    # Only used if both peers support it
+    MESSAGE_COMPRESSION = 6
+
 
 # These are the default capabilities used in all outgoing handshakes.
 # "1" means the capability is supported and enabled.
@@ -51,6 +55,7 @@ _capabilities: List[Tuple[uint16, str]] = [
     (uint16(Capability.BASE.value), "1"),
     (uint16(Capability.BLOCK_HEADERS.value), "1"),
     (uint16(Capability.RATE_LIMITS_V2.value), "1"),
+    (uint16(Capability.MESSAGE_COMPRESSION.value), "1"),
 ]
 _mempool_updates = [
     (uint16(Capability.MEMPOOL_UPDATES.value), "1"),
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from chia.consensus.block_record import BlockRecord
 from chia.consensus.blockchain import Blockchain, BlockchainMutexPriority
@@ -14,7 +14,9 @@ from chia.full_node.mempool_check_conditions import (
     get_spends_for_block,
     get_spends_for_block_with_conditions,
 )
+from chia.rpc.rpc_response_cache import SETTLED_DEPTH, RpcResponseCache, RpcResponseKey
 from chia.rpc.rpc_server import Endpoint, EndpointResult
+from chia.rpc.util import StreamedList, iterate, list_response, stream_format
 from chia.server.outbound_message import NodeType
 from chia.types.blockchain_format.proof_of_space import calculate_prefix_bits
 from chia.types.blockchain_format.sized_bytes import bytes32
@@ -28,16 +30,26 @@ from chia.types.spend_bundle import SpendBundle
 from chia.types.unfinished_header_block import UnfinishedHeaderBlock
 from chia.util.byte_types import hexstr_to_bytes
 from chia.util.ints import uint32, uint64, uint128
+from chia.util.json_util import dict_to_json_str
 from chia.util.log_exceptions import log_exceptions
 from chia.util.math import make_monotonically_decreasing
+from chia.util.streamable import recurse_jsonify
 from chia.util.ws_message import WsRpcMessage, create_payload_dict
 
+# the number of blocks (and puzzle hashes) looked up in the database at a time,
+# by the endpoints that can stream their response
+STREAM_BATCH_SIZE = 100
+
 
 def coin_record_dict_backwards_compat(coin_record: Dict[str, Any]) -> Dict[str, bool]:
     coin_record["spent"] = coin_record["spent_block_index"] > 0
     return coin_record
 
 
+def coin_record_to_json(coin_record: CoinRecord) -> Dict[str, Any]:
+    return coin_record_dict_backwards_compat(coin_record.to_json_dict())
+
+
 async def get_nearest_transaction_block(blockchain: Blockchain, block: BlockRecord) -> BlockRecord:
     if block.is_transaction_block:
         return block
@@ -86,6 +98,7 @@ class FullNodeRpcApi:
         self.service = service
         self.service_name = "chia_full_node"
         self.cached_blockchain_state: Optional[Dict[str, Any]] = None
+        self.response_cache = RpcResponseCache(service.config.get("rpc_response_cache_size", 50_000_000))
 
     def get_routes(self) -> Dict[str, Endpoint]:
         return {
@@ -94,6 +107,11 @@ class FullNodeRpcApi:
             "/get_block": self.get_block,
             "/get_blocks": self.get_blocks,
             "/get_block_count_metrics": self.get_block_count_metrics,
+            "/get_sync_pipeline_stats": self.get_sync_pipeline_stats,
+            "/get_weight_proof_stats": self.get_weight_proof_stats,
+            "/get_respond_blocks_cache_stats": self.get_respond_blocks_cache_stats,
+            "/get_shared_pairing_cache_stats": self.get_shared_pairing_cache_stats,
+            "/get_rpc_response_cache_stats": self.get_rpc_response_cache_stats,
             "/get_block_record_by_height": self.get_block_record_by_height,
             "/get_block_record": self.get_block_record,
             "/get_block_records": self.get_block_records,
@@ -121,6 +139,7 @@ class FullNodeRpcApi:
             "/get_all_mempool_items": self.get_all_mempool_items,
             "/get_mempool_item_by_tx_id": self.get_mempool_item_by_tx_id,
             "/get_mempool_items_by_coin_name": self.get_mempool_items_by_coin_name,
+            "/get_mempool_block_candidate": self.get_mempool_block_candidate,
             # Fee estimation
             "/get_fee_estimate": self.get_fee_estimate,
         }
@@ -129,6 +148,12 @@ class FullNodeRpcApi:
         if change_data is None:
             change_data = {}
 
+        if change == "new_peak":
+            self.response_cache.new_peak()
+        if change == "block" and change_data.get("fork_height") is not None:
+            if change_data["fork_height"] < change_data["height"] - 1:
+                self.response_cache.rollback(change_data["fork_height"])
+
         payloads = []
         if change == "new_peak" or change == "sync_mode":
             data = await self.get_blockchain_state({})
@@ -158,6 +183,46 @@ class FullNodeRpcApi:
 
         return payloads
 
+    async def _cached_response(
+        self,
+        request: Dict[str, Any],
+        key: RpcResponseKey,
+        build: Callable[[], Awaitable[Tuple[EndpointResult, Optional[int]]]],
+    ) -> EndpointResult:
+        """
+        Returns the response from the response cache, or builds it and adds it
+        to the cache. build() returns the response, and the height of the
+        highest block it depends on, or None if it may change with any new peak.
+        Streamed responses aren't cached.
+        """
+        blockchain = self.service.blockchain
+        peak = blockchain.get_peak()
+        if self.response_cache.max_size == 0 or peak is None or stream_format(request) is not None:
+            response, _ = await build()
+            return response
+
+        cached = self.response_cache.get(key, peak.header_hash, blockchain.height_to_hash)
+        if cached is not None:
+            # the handler wrapper adds "success" to the response, it mustn't
+            # modify the cached one
+            return dict(cached)
+
+        response, height = await build()
+        new_peak = blockchain.get_peak()
+        if new_peak is None or new_peak.header_hash != peak.header_hash:
+            # the chain changed while the response was built, it may be a mix
+            # of the old and the new state
+            return response
+        response_json: Dict[str, Any] = recurse_jsonify(response)
+        size = len(dict_to_json_str(response_json))
+        if height is not None and height + SETTLED_DEPTH <= peak.height:
+            header_hash = blockchain.height_to_hash(uint32(height))
+            assert header_hash is not None
+            self.response_cache.put(key, response_json, size, uint32(height), header_hash, settled=True)
+        else:
+            self.response_cache.put(key, response_json, size, peak.height, peak.header_hash, settled=False)
+        return response
+
     # this function is just here for backwards-compatibility. It will probably
     # be removed in the future
     async def get_initial_freeze_period(self, _: Dict[str, Any]) -> EndpointResult:
@@ -403,21 +468,32 @@ class FullNodeRpcApi:
 
         start = int(request["start"])
         end = int(request["end"])
-        block_range = []
-        for a in range(start, end):
-            block_range.append(uint32(a))
-        blocks: List[FullBlock] = await self.service.block_store.get_full_blocks_at(block_range)
-        json_blocks = []
-        for block in blocks:
-            hh: bytes32 = block.header_hash
-            if exclude_reorged and self.service.blockchain.height_to_hash(block.height) != hh:
-                # Don't include forked (reorged) blocks
-                continue
-            json = block.to_json_dict()
+        peak_height = self.service.blockchain.get_peak_height()
+
+        async def blocks() -> AsyncIterator[FullBlock]:
+            for batch_start in range(start, end, STREAM_BATCH_SIZE):
+                block_range = [uint32(a) for a in range(batch_start, min(batch_start + STREAM_BATCH_SIZE, end))]
+                for block in await self.service.block_store.get_full_blocks_at(block_range):
+                    if exclude_reorged and self.service.blockchain.height_to_hash(block.height) != block.header_hash:
+                        # Don't include forked (reorged) blocks
+                        continue
+                    yield block
+
+        def block_to_json(block: FullBlock) -> Dict[str, Any]:
+            json: Dict[str, Any] = block.to_json_dict()
             if not exclude_hh:
-                json["header_hash"] = hh.hex()
-            json_blocks.append(json)
-        return {"blocks": json_blocks}
+                json["header_hash"] = block.header_hash.hex()
+            return json
+
+        async def build() -> Tuple[EndpointResult, Optional[int]]:
+            response = await list_response(request, {"blocks": StreamedList(blocks(), block_to_json, bytes)})
+            if peak_height is None or end - 1 > peak_height or not exclude_reorged:
+                # blocks may still be added in this range. Orphans may be added
+                # at any height, so the response only settles without them
+                return response, None
+            return response, max(start, end - 1)
+
+        return await self._cached_response(request, ("get_blocks", start, end, exclude_hh, exclude_reorged), build)
 
     async def get_block_count_metrics(self, _: Dict[str, Any]) -> EndpointResult:
         compact_blocks = 0
@@ -439,6 +515,44 @@ class FullNodeRpcApi:
             }
         }
 
+    async def get_sync_pipeline_stats(self, _: Dict[str, Any]) -> EndpointResult:
+        """
+        Returns the counters of each stage of the most recent (or current) long
+        sync: fetching, pre-validating and adding blocks.
+        """
+        return {"sync_pipeline": self.service.sync_store.pipeline_stats.to_json_dict()}
+
+    async def get_weight_proof_stats(self, _: Dict[str, Any]) -> EndpointResult:
+        """
+        Returns how many weight proofs this node has created for its peers, and
+        how long it took to create them.
+        """
+        if self.service.weight_proof_handler is None:
+            raise ValueError("Weight proof handler is not initialized")
+        return {"weight_proof": self.service.weight_proof_handler.stats.to_json_dict()}
+
+    async def get_respond_blocks_cache_stats(self, _: Dict[str, Any]) -> EndpointResult:
+        """
+        Returns the hit rate and size of the cache of blocks served to syncing
+        peers.
+        """
+        return {"respond_blocks_cache": self.service.block_store.respond_blocks_cache.stats.to_json_dict()}
+
+    async def get_shared_pairing_cache_stats(self, _: Dict[str, Any]) -> EndpointResult:
+        """
+        Returns the hit rate of the BLS pairing cache shared by the validation
+        worker processes, or None if it's disabled.
+        """
+        cache = self.service.shared_pairing_cache
+        return {"shared_pairing_cache": None if cache is None else cache.stats().to_json_dict()}
+
+    async def get_rpc_response_cache_stats(self, _: Dict[str, Any]) -> EndpointResult:
+        """
+        Returns the hit rate and size of the cache of responses to the block and
+        coin lookups.
+        """
+        return {"rpc_response_cache": self.response_cache.stats.to_json_dict()}
+
     async def get_block_records(self, request: Dict[str, Any]) -> EndpointResult:
         if "start" not in request:
             raise ValueError("No start in request")
@@ -447,27 +561,29 @@ class FullNodeRpcApi:
 
         start = int(request["start"])
         end = int(request["end"])
-        records = []
         peak_height = self.service.blockchain.get_peak_height()
         if peak_height is None:
             raise ValueError("Peak is None")
 
-        for a in range(start, end):
-            if peak_height < uint32(a):
-                self.service.log.warning("requested block is higher than known peak ")
-                break
-            header_hash: Optional[bytes32] = self.service.blockchain.height_to_hash(uint32(a))
-            if header_hash is None:
-                raise ValueError(f"Height not in blockchain: {a}")
-            record: Optional[BlockRecord] = self.service.blockchain.try_block_record(header_hash)
-            if record is None:
-                # Fetch from DB
-                record = await self.service.blockchain.block_store.get_block_record(header_hash)
-            if record is None:
-                raise ValueError(f"Block {header_hash.hex()} does not exist")
-
-            records.append(record)
-        return {"block_records": records}
+        async def records() -> AsyncIterator[BlockRecord]:
+            for a in range(start, end):
+                if peak_height < uint32(a):
+                    self.service.log.warning("requested block is higher than known peak ")
+                    break
+                header_hash: Optional[bytes32] = self.service.blockchain.height_to_hash(uint32(a))
+                if header_hash is None:
+                    raise ValueError(f"Height not in blockchain: {a}")
+                record: Optional[BlockRecord] = self.service.blockchain.try_block_record(header_hash)
+                if record is None:
+                    # Fetch from DB
+                    record = await self.service.blockchain.block_store.get_block_record(header_hash)
+                if record is None:
+                    raise ValueError(f"Block {header_hash.hex()} does not exist")
+                yield record
+
+        return await list_response(
+            request, {"block_records": StreamedList(records(), BlockRecord.to_json_dict, BlockRecord.__bytes__)}
+        )
 
     async def get_block_spends(self, request: Dict[str, Any]) -> EndpointResult:
         if "header_hash" not in request:
@@ -520,19 +636,23 @@ class FullNodeRpcApi:
             raise ValueError("No height in request")
         height = request["height"]
         header_height = uint32(int(height))
-        peak_height = self.service.blockchain.get_peak_height()
-        if peak_height is None or header_height > peak_height:
-            raise ValueError(f"Block height {height} not found in chain")
-        header_hash: Optional[bytes32] = self.service.blockchain.height_to_hash(header_height)
-        if header_hash is None:
-            raise ValueError(f"Block hash {height} not found in chain")
-        record: Optional[BlockRecord] = self.service.blockchain.try_block_record(header_hash)
-        if record is None:
-            # Fetch from DB
-            record = await self.service.blockchain.block_store.get_block_record(header_hash)
-        if record is None:
-            raise ValueError(f"Block {header_hash} does not exist")
-        return {"block_record": record}
+
+        async def build() -> Tuple[EndpointResult, Optional[int]]:
+            peak_height = self.service.blockchain.get_peak_height()
+            if peak_height is None or header_height > peak_height:
+                raise ValueError(f"Block height {height} not found in chain")
+            header_hash: Optional[bytes32] = self.service.blockchain.height_to_hash(header_height)
+            if header_hash is None:
+                raise ValueError(f"Block hash {height} not found in chain")
+            record: Optional[BlockRecord] = self.service.blockchain.try_block_record(header_hash)
+            if record is None:
+                # Fetch from DB
+                record = await self.service.blockchain.block_store.get_block_record(header_hash)
+            if record is None:
+                raise ValueError(f"Block {header_hash} does not exist")
+            return {"block_record": record}, header_height
+
+        return await self._cached_response(request, ("get_block_record_by_height", header_height), build)
 
     async def get_block_record(self, request: Dict[str, Any]) -> EndpointResult:
         if "header_hash" not in request:
@@ -623,9 +743,21 @@ class FullNodeRpcApi:
         if "include_spent_coins" in request:
             kwargs["include_spent_coins"] = request["include_spent_coins"]
 
-        coin_records = await self.service.blockchain.coin_store.get_coin_records_by_puzzle_hash(**kwargs)
-
-        return {"coin_records": [coin_record_dict_backwards_compat(cr.to_json_dict()) for cr in coin_records]}
+        async def build() -> Tuple[EndpointResult, Optional[int]]:
+            coin_records = await self.service.blockchain.coin_store.get_coin_records_by_puzzle_hash(**kwargs)
+            response = {"coin_records": [coin_record_to_json(cr) for cr in coin_records]}
+            end_height: Optional[int] = kwargs.get("end_height")
+            if end_height is None or any(cr.spent_block_index == 0 for cr in coin_records):
+                # coins may still be added, or spent
+                return response, None
+            if not kwargs["include_spent_coins"]:
+                # the spent coins aren't in the response, a reorg above
+                # end_height may undo their spend and add them back
+                return response, None
+            return response, max([end_height, *(cr.spent_block_index for cr in coin_records)])
+
+        key = ("get_coin_records_by_puzzle_hash", *sorted(kwargs.items()))
+        return await self._cached_response(request, key, build)
 
     async def get_coin_records_by_puzzle_hashes(self, request: Dict[str, Any]) -> EndpointResult:
         """
@@ -633,10 +765,10 @@ class FullNodeRpcApi:
         """
         if "puzzle_hashes" not in request:
             raise ValueError("Puzzle hashes not in request")
-        kwargs: Dict[str, Any] = {
-            "include_spent_coins": False,
-            "puzzle_hashes": [hexstr_to_bytes(ph) for ph in request["puzzle_hashes"]],
-        }
+        # the puzzle hashes are queried in batches, a repeated one mustn't
+        # return its coins twice
+        puzzle_hashes = list(dict.fromkeys(bytes32(hexstr_to_bytes(ph)) for ph in request["puzzle_hashes"]))
+        kwargs: Dict[str, Any] = {"include_spent_coins": False}
         if "start_height" in request:
             kwargs["start_height"] = uint32(request["start_height"])
         if "end_height" in request:
@@ -645,9 +777,17 @@ class FullNodeRpcApi:
         if "include_spent_coins" in request:
             kwargs["include_spent_coins"] = request["include_spent_coins"]
 
-        coin_records = await self.service.blockchain.coin_store.get_coin_records_by_puzzle_hashes(**kwargs)
+        async def coin_records() -> AsyncIterator[CoinRecord]:
+            for i in range(0, len(puzzle_hashes), STREAM_BATCH_SIZE):
+                batch = puzzle_hashes[i : i + STREAM_BATCH_SIZE]
+                for cr in await self.service.blockchain.coin_store.get_coin_records_by_puzzle_hashes(
+                    puzzle_hashes=batch, **kwargs
+                ):
+                    yield cr
 
-        return {"coin_records": [coin_record_dict_backwards_compat(cr.to_json_dict()) for cr in coin_records]}
+        return await list_response(
+            request, {"coin_records": StreamedList(coin_records(), coin_record_to_json, CoinRecord.__bytes__)}
+        )
 
     async def get_coin_record_by_name(self, request: Dict[str, Any]) -> EndpointResult:
         """
@@ -792,16 +932,27 @@ class FullNodeRpcApi:
         if block is None:
             raise ValueError(f"Block {header_hash.hex()} not found")
 
-        async with self.service.blockchain.priority_mutex.acquire(priority=BlockchainMutexPriority.low):
-            if self.service.blockchain.height_to_hash(block.height) != header_hash:
-                raise ValueError(f"Block at {header_hash.hex()} is no longer in the blockchain (it's in a fork)")
-            additions: List[CoinRecord] = await self.service.coin_store.get_coins_added_at_height(block.height)
-            removals: List[CoinRecord] = await self.service.coin_store.get_coins_removed_at_height(block.height)
+        async def build() -> Tuple[EndpointResult, Optional[int]]:
+            assert block is not None
+            async with self.service.blockchain.priority_mutex.acquire(priority=BlockchainMutexPriority.low):
+                if self.service.blockchain.height_to_hash(block.height) != header_hash:
+                    raise ValueError(f"Block at {header_hash.hex()} is no longer in the blockchain (it's in a fork)")
+                additions: List[CoinRecord] = await self.service.coin_store.get_coins_added_at_height(block.height)
+                removals: List[CoinRecord] = await self.service.coin_store.get_coins_removed_at_height(block.height)
 
-        return {
-            "additions": [coin_record_dict_backwards_compat(cr.to_json_dict()) for cr in additions],
-            "removals": [coin_record_dict_backwards_compat(cr.to_json_dict()) for cr in removals],
-        }
+            response = await list_response(
+                request,
+                {
+                    "additions": StreamedList(iterate(additions), coin_record_to_json, CoinRecord.__bytes__),
+                    "removals": StreamedList(iterate(removals), coin_record_to_json, CoinRecord.__bytes__),
+                },
+            )
+            if any(cr.spent_block_index == 0 for cr in additions):
+                # the coins may still be spent
+                return response, None
+            return response, max([block.height, *(cr.spent_block_index for cr in additions)])
+
+        return await self._cached_response(request, ("get_additions_and_removals", header_hash), build)
 
     async def get_aggsig_additional_data(self, _: Dict[str, Any]) -> EndpointResult:
         return {"additional_data": self.service.constants.AGG_SIG_ME_ADDITIONAL_DATA.hex()}
@@ -837,6 +988,19 @@ class FullNodeRpcApi:
 
         return {"mempool_items": [item.to_json_dict() for item in items]}
 
+    async def get_mempool_block_candidate(self, _: Dict[str, Any]) -> EndpointResult:
+        """
+        Returns the mempool items that would be included in a block farmed on
+        top of the current peak, along with the spend bundle of the block.
+        """
+        # the candidate is cached by the mempool. Items added or removed while
+        # it's being selected would be missing from it
+        async with self.service.blockchain.priority_mutex.acquire(priority=BlockchainMutexPriority.low):
+            candidate = await self.service.mempool_manager.get_block_candidate(
+                self.service.coin_store.get_unspent_lineage_info_for_puzzle_hash
+            )
+        return {"block_candidate": None if candidate is None else candidate.to_json_dict()}
+
     def _get_spendbundle_type_cost(self, name: str) -> uint64:
         """
         This is a stopgap until we modify the wallet RPCs to get exact costs for created SpendBundles
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple, cast
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, cast
 
 from chia.consensus.block_record import BlockRecord
 from chia.full_node.signage_point import SignagePoint
@@ -49,6 +49,15 @@ class FullNodeRpcClient(RpcClient):
         )
         return [FullBlock.from_json_dict(block) for block in response["blocks"]]
 
+    async def iter_blocks(self, start: int, end: int, exclude_reorged: bool = False) -> AsyncIterator[FullBlock]:
+        """
+        Like get_blocks(), but streams the blocks, so that ranges of any size
+        can be requested without holding them all in memory (on either side).
+        """
+        request = {"start": start, "end": end, "exclude_header_hash": True, "exclude_reorged": exclude_reorged}
+        async for _, payload in self.fetch_stream("get_blocks", request):
+            yield FullBlock.from_bytes(payload)
+
     async def get_block_record_by_height(self, height: int) -> Optional[BlockRecord]:
         try:
             response = await self.fetch("get_block_record_by_height", {"height": height})
@@ -202,6 +211,26 @@ class FullNodeRpcClient(RpcClient):
         # TODO: return block records
         return cast(List[Dict[str, Any]], response["block_records"])
 
+    async def get_sync_pipeline_stats(self) -> Dict[str, Any]:
+        response = await self.fetch("get_sync_pipeline_stats", {})
+        return cast(Dict[str, Any], response["sync_pipeline"])
+
+    async def get_weight_proof_stats(self) -> Dict[str, Any]:
+        response = await self.fetch("get_weight_proof_stats", {})
+        return cast(Dict[str, Any], response["weight_proof"])
+
+    async def get_respond_blocks_cache_stats(self) -> Dict[str, Any]:
+        response = await self.fetch("get_respond_blocks_cache_stats", {})
+        return cast(Dict[str, Any], response["respond_blocks_cache"])
+
+    async def get_shared_pairing_cache_stats(self) -> Optional[Dict[str, Any]]:
+        response = await self.fetch("get_shared_pairing_cache_stats", {})
+        return cast(Optional[Dict[str, Any]], response["shared_pairing_cache"])
+
+    async def get_rpc_response_cache_stats(self) -> Dict[str, Any]:
+        response = await self.fetch("get_rpc_response_cache_stats", {})
+        return cast(Dict[str, Any], response["rpc_response_cache"])
+
     async def get_block_spends(self, header_hash: bytes32) -> Optional[List[CoinSpend]]:
         try:
             response = await self.fetch("get_block_spends", {"header_hash": header_hash.hex()})
@@ -261,6 +290,10 @@ class FullNodeRpcClient(RpcClient):
         response = await self.fetch("get_mempool_items_by_coin_name", {"coin_name": coin_name.hex()})
         return response
 
+    async def get_mempool_block_candidate(self) -> Optional[Dict[str, Any]]:
+        response = await self.fetch("get_mempool_block_candidate", {})
+        return cast(Optional[Dict[str, Any]], response["block_candidate"])
+
     async def get_recent_signage_point_or_eos(
         self, sp_hash: Optional[bytes32], challenge_hash: Optional[bytes32]
     ) -> Optional[Any]:
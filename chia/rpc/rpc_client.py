@@ -6,10 +6,11 @@ from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from pathlib import Path
 from ssl import SSLContext
-from typing import Any, AsyncIterator, Dict, List, Optional, Type, TypeVar
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type, TypeVar
 
 import aiohttp
 
+from chia.rpc.util import STREAM_FRAME_HEADER, STREAM_TRAILER_INDEX
 from chia.server.outbound_message import NodeType
 from chia.server.server import ssl_context_for_client
 from chia.server.ssl_context import private_ssl_ca_paths
@@ -113,6 +114,33 @@ class RpcClient:
                 raise ResponseFailureError(res_json)
             return res_json
 
+    async def fetch_stream(self, path: str, request_json: Dict[str, Any]) -> AsyncIterator[Tuple[int, bytes]]:
+        """
+        Requests the response as a binary stream, and yields the items as they
+        arrive, as the index of the list they belong to and their serialized
+        bytes. Raises ResponseFailureError if the request fails, even part way
+        through the stream.
+        """
+        request_json = {**request_json, "stream": "binary"}
+        async with self.session.post(self.url + path, json=request_json, ssl=self.ssl_context) as response:
+            response.raise_for_status()
+            if response.content_type == "application/json":
+                # the request failed before the response started
+                res_json = await response.json()
+                if not res_json["success"]:
+                    raise ResponseFailureError(res_json)
+                raise ValueError(f"{path} does not support streaming")
+            while True:
+                header = await response.content.readexactly(STREAM_FRAME_HEADER.size)
+                index, length = STREAM_FRAME_HEADER.unpack(header)
+                payload = await response.content.readexactly(length)
+                if index == STREAM_TRAILER_INDEX:
+                    trailer = json.loads(payload)
+                    if not trailer["success"]:
+                        raise ResponseFailureError(trailer)
+                    return
+                yield index, payload
+
     async def get_connections(self, node_type: Optional[NodeType] = None) -> List[Dict]:
         request = {}
         if node_type is not None:
@@ -134,6 +162,14 @@ class RpcClient:
     async def healthz(self) -> Dict:
         return await self.fetch("healthz", {})
 
+    async def get_message_metrics(self) -> Dict[str, Any]:
+        return await self.fetch("get_message_metrics", {})
+
+    async def get_prometheus_metrics(self) -> str:
+        async with self.session.get(self.url + "metrics", ssl=self.ssl_context) as response:
+            response.raise_for_status()
+            return await response.text()
+
     def close(self) -> None:
         self.closing_task = asyncio.create_task(self.session.close())
 
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import dataclasses
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.ints import uint32
+
+# the name of the endpoint, followed by its (parsed) arguments
+RpcResponseKey = Tuple[Hashable, ...]
+
+# responses that only depend on blocks at least this far below the peak are
+# considered settled. They're kept across new peaks, until they're evicted or
+# the chain is reorged below them
+SETTLED_DEPTH = 32
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedRpcResponse:
+    # the JSON of the response
+    response: Dict[str, Any]
+    size: int
+    # the height of the highest block the response depends on, and its header
+    # hash. For responses that aren't settled, this is the peak the response
+    # was built at
+    height: uint32
+    header_hash: bytes32
+    settled: bool
+
+
+@dataclasses.dataclass
+class RpcResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # entries dropped to stay within the byte budget
+    evictions: int = 0
+    # entries dropped because of a new peak, or a reorg
+    invalidations: int = 0
+    entries: int = 0
+    size: int = 0
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": self.entries,
+            "size": self.size,
+        }
+
+
+class RpcResponseCache:
+    """
+    An LRU cache of full node RPC responses, keyed by the endpoint and its
+    arguments. Clients like block explorers keep asking for the same blocks
+    and coins, and this saves looking them up in the database and converting
+    them to JSON every time. The cache holds at most max_size bytes of
+    (encoded) responses. A max_size of 0 disables it.
+
+    Settled responses are valid as long as the block they depend on is still
+    in the main chain. All other responses are only valid at the peak they
+    were built at, and are dropped by new_peak(). Entries remember the header
+    hash they were built against, so a reorg that hasn't been reported through
+    rollback() yet is detected on lookup.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.stats = RpcResponseCacheStats()
+        self._entries: OrderedDict[RpcResponseKey, CachedRpcResponse] = OrderedDict()
+
+    def get(
+        self,
+        key: RpcResponseKey,
+        peak_hash: bytes32,
+        height_to_hash: Callable[[uint32], Optional[bytes32]],
+    ) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            current_hash = height_to_hash(entry.height) if entry.settled else peak_hash
+            if current_hash != entry.header_hash:
+                self._remove(key)
+                self.stats.invalidations += 1
+                entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry.response
+
+    def put(
+        self,
+        key: RpcResponseKey,
+        response: Dict[str, Any],
+        size: int,
+        height: uint32,
+        header_hash: bytes32,
+        settled: bool,
+    ) -> None:
+        if size > self.max_size:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedRpcResponse(response, size, height, header_hash, settled)
+        self.stats.size += size
+        while self.stats.size > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+        self.stats.entries = len(self._entries)
+
+    def new_peak(self) -> None:
+        """
+        Drops all entries that aren't settled, they're no longer valid.
+        """
+        for key in [k for k, entry in self._entries.items() if not entry.settled]:
+            self._remove(key)
+            self.stats.invalidations += 1
+
+    def rollback(self, fork_height: int) -> None:
+        """
+        Drops all entries that depend on blocks above fork_height.
+        """
+        for key in [k for k, entry in self._entries.items() if entry.height > fork_height]:
+            self._remove(key)
+            self.stats.invalidations += 1
+
+    def _remove(self, key: RpcResponseKey) -> None:
+        entry = self._entries.pop(key)
+        self.stats.size -= entry.size
+        self.stats.entries = len(self._entries)
@@ -174,7 +174,10 @@ class RpcServer(Generic[_T_RpcApiProtocol]):
             hostname=self_hostname,
             port=rpc_port,
             max_request_body_size=max_request_body_size,
-            routes=[web.post(route, wrap_http_handler(func)) for (route, func) in self._get_routes().items()],
+            routes=[
+                *(web.post(route, wrap_http_handler(func)) for (route, func) in self._get_routes().items()),
+                web.get("/metrics", self.prometheus_metrics),
+            ],
             ssl_context=self.ssl_context,
             prefer_ipv6=self.prefer_ipv6,
         )
@@ -242,6 +245,7 @@ class RpcServer(Generic[_T_RpcApiProtocol]):
             "/stop_node": self.stop_node,
             "/get_routes": self.get_routes,
             "/healthz": self.healthz,
+            "/get_message_metrics": self.get_message_metrics,
         }
 
     async def get_routes(self, request: Dict[str, Any]) -> EndpointResult:
@@ -301,6 +305,28 @@ class RpcServer(Generic[_T_RpcApiProtocol]):
             "success": True,
         }
 
+    async def get_message_metrics(self, request: Dict[str, Any]) -> EndpointResult:
+        """
+        The number of protocol messages (and bytes) sent and received, the
+        handler latencies and the rate limiter rejections, per message type.
+        And the depths of the message queues of every connection.
+        """
+        server = self.rpc_api.service.server
+        return {
+            "message_metrics": server.message_metrics.to_json_dict(),
+            "queues": [con.queue_depths().to_json_dict() for con in server.get_connections()],
+        }
+
+    async def prometheus_metrics(self, request: web.Request) -> web.Response:
+        """
+        The same as get_message_metrics, in the Prometheus text format.
+        """
+        server = self.rpc_api.service.server
+        text = server.message_metrics.to_prometheus(
+            self.service_name, [con.queue_depths() for con in server.get_connections()]
+        )
+        return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
     async def ws_api(self, message: WsRpcMessage) -> Optional[Dict[str, object]]:
         """
         This function gets called when new message is received via websocket.
@@ -313,6 +339,8 @@ class RpcServer(Generic[_T_RpcApiProtocol]):
         data: Dict[str, object] = {}
         if "data" in message:
             data = message["data"]
+        # responses can only be streamed over HTTP
+        data.pop("stream", None)
         if command == "ping":
             return pong()
 
@@ -2,8 +2,23 @@ from __future__ import annotations
 
 import dataclasses
 import logging
+import struct
 import traceback
-from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple, get_type_hints
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    get_type_hints,
+)
 
 import aiohttp
 from chia_rs import AugSchemeMPL
@@ -11,7 +26,7 @@ from chia_rs import AugSchemeMPL
 from chia.types.blockchain_format.coin import Coin
 from chia.types.coin_spend import CoinSpend
 from chia.types.spend_bundle import SpendBundle
-from chia.util.json_util import obj_to_response
+from chia.util.json_util import dict_to_json_str, obj_to_response
 from chia.util.streamable import Streamable
 from chia.wallet.conditions import Condition, ConditionValidTimes, conditions_from_json_dicts, parse_timelock_info
 from chia.wallet.trade_record import TradeRecord
@@ -27,6 +42,8 @@ from chia.wallet.util.tx_config import TXConfig, TXConfigLoader
 
 log = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
 # TODO: consolidate this with chia.rpc.rpc_server.Endpoint
 # Not all endpoints only take a dictionary so that definition is imperfect
 # This definition is weaker than that one however because the arguments can be anything
@@ -62,9 +79,120 @@ def marshal(func: MarshallableRpcEndpoint) -> RpcEndpoint:
     return rpc_endpoint
 
 
+# The formats a response can be streamed in, and the Accept header values that
+# select them (as an alternative to the "stream" request parameter)
+STREAM_FORMATS: Dict[str, str] = {"ndjson": "application/x-ndjson", "binary": "application/octet-stream"}
+# a binary stream is a sequence of frames, each one is a header followed by
+# the payload. The header is the index of the list the item belongs to, and
+# the length of the payload
+STREAM_FRAME_HEADER = struct.Struct("!BI")
+# the index of the last frame, whose payload is the JSON of the rest of the
+# response, including "success" (and "error", if the response failed part way)
+STREAM_TRAILER_INDEX = 0xFF
+# the streamed response is written in chunks of (at least) this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class StreamedList(Generic[_T]):
+    """
+    A list in an endpoint's response that's sent to the client as its items
+    are produced, rather than being built up in memory first. Endpoints only
+    return these if the request asked for a streamed response, see
+    list_response().
+
+    In the "ndjson" format, each item is a line with a JSON object, mapping the
+    name of the list to the item's JSON. In the "binary" format, each item is
+    a frame with the item's serialized bytes, and the index of its list (in
+    the order the lists appear in the response). Either way, the last line
+    or frame is the JSON of the rest of the response.
+    """
+
+    items: AsyncIterator[_T]
+    to_json: Callable[[_T], Any]
+    to_bytes: Callable[[_T], bytes]
+
+
+def stream_format(request: Dict[str, Any]) -> Optional[str]:
+    """
+    The format the response to this request should be streamed in, or None
+    if it shouldn't be.
+    """
+    fmt = request.get("stream")
+    if fmt is None or fmt is False:
+        return None
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported stream format: {fmt}, expected one of: {', '.join(STREAM_FORMATS)}")
+    return str(fmt)
+
+
+async def iterate(items: Iterable[_T]) -> AsyncIterator[_T]:
+    for item in items:
+        yield item
+
+
+async def list_response(request: Dict[str, Any], lists: Dict[str, StreamedList[Any]]) -> Dict[str, Any]:
+    """
+    Returns the lists as they are, to be streamed, if the request asked for
+    it. Otherwise collects the items of each list as JSON.
+    """
+    if stream_format(request) is not None:
+        return dict(lists)
+    return {name: [lst.to_json(item) async for item in lst.items] for name, lst in lists.items()}
+
+
+async def _stream_response(
+    request: aiohttp.web.Request, fmt: str, res_object: Dict[str, Any]
+) -> aiohttp.web.StreamResponse:
+    lists = {name: value for name, value in res_object.items() if isinstance(value, StreamedList)}
+    trailer = {name: value for name, value in res_object.items() if name not in lists}
+    binary = fmt == "binary"
+
+    response = aiohttp.web.StreamResponse(headers={"Content-Type": STREAM_FORMATS[fmt]})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    buf = bytearray()
+    try:
+        for index, (name, lst) in enumerate(lists.items()):
+            async for item in lst.items:
+                if binary:
+                    payload = lst.to_bytes(item)
+                    buf += STREAM_FRAME_HEADER.pack(index, len(payload))
+                    buf += payload
+                else:
+                    buf += dict_to_json_str({name: lst.to_json(item)}).encode()
+                    buf += b"\n"
+                if len(buf) >= STREAM_CHUNK_SIZE:
+                    # this waits for the client to keep up, so the
+                    # buffered response doesn't grow unbounded
+                    await response.write(bytes(buf))
+                    buf.clear()
+    except Exception as e:
+        # the status has been sent already, the error can only be reported in
+        # the trailer
+        log.warning(f"Error while streaming response: {traceback.format_exc()}")
+        trailer = {"success": False, "error": f"{e}"}
+
+    trailer_bytes = dict_to_json_str(trailer).encode()
+    if binary:
+        buf += STREAM_FRAME_HEADER.pack(STREAM_TRAILER_INDEX, len(trailer_bytes))
+        buf += trailer_bytes
+    else:
+        buf += trailer_bytes + b"\n"
+    await response.write(bytes(buf))
+    await response.write_eof()
+    return response
+
+
 def wrap_http_handler(f) -> Callable:
-    async def inner(request) -> aiohttp.web.Response:
+    async def inner(request) -> aiohttp.web.StreamResponse:
         request_data = await request.json()
+        if "stream" not in request_data:
+            accept = request.headers.get("Accept", "")
+            for name, content_type in STREAM_FORMATS.items():
+                if accept == content_type:
+                    request_data["stream"] = name
         try:
             res_object = await f(request_data)
             if res_object is None:
@@ -79,6 +207,10 @@ def wrap_http_handler(f) -> Callable:
             else:
                 res_object = {"success": False, "error": f"{e}"}
 
+        if any(isinstance(value, StreamedList) for value in res_object.values()):
+            fmt = stream_format(request_data)
+            assert fmt is not None
+            return await _stream_response(request, fmt, res_object)
         return obj_to_response(res_object)
 
     return inner
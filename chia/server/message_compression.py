@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import zstandard
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import Message
+from chia.util.ints import uint8
+
+# messages with less data than this are always sent as they are, compressing
+# them doesn't save enough bandwidth to be worth the CPU time
+COMPRESSION_THRESHOLD = 16 * 1024
+
+# compressed messages mustn't decompress to more than the max size of an
+# uncompressed message (the websocket max_msg_size in chia.server.server)
+MAX_DECOMPRESSED_SIZE = 50 * 1024 * 1024
+
+# the most the serialization of a message adds to its data: the type, the
+# optional id and the length of the data
+MESSAGE_OVERHEAD = 1 + 3 + 4
+
+# the zstd compression level, this matches the default of zstd.compress()
+COMPRESSION_LEVEL = 3
+
+
+def compress_message(message: Message) -> Message:
+    """
+    Returns a compressed_message, wrapping the compressed serialization of
+    message. The message id is kept in the wrapped message.
+
+    zstandard compressor objects are not thread safe, this creates a new one
+    so it can be called from executor threads.
+    """
+    compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+    return Message(uint8(ProtocolMessageTypes.compressed_message.value), None, compressor.compress(bytes(message)))
+
+
+def compressed_message_type(message: Message) -> int:
+    """
+    Returns the type of the message wrapped in a compressed_message, by only
+    decompressing its first byte. Raises ValueError if it's malformed.
+    """
+    assert message.type == ProtocolMessageTypes.compressed_message.value
+    try:
+        head = zstandard.ZstdDecompressor().stream_reader(message.data).read(1)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"invalid compressed message: {e!r}") from e
+    if len(head) == 0:
+        raise ValueError("empty compressed message")
+    return head[0]
+
+
+def decompress_message(message: Message, max_size: int) -> Message:
+    """
+    Unwraps a compressed_message. Raises ValueError if it's malformed, or
+    would decompress to more than max_size bytes.
+    """
+    assert message.type == ProtocolMessageTypes.compressed_message.value
+    try:
+        # the frame header is checked first, since decompress() allocates
+        # the content size it claims
+        content_size = zstandard.get_frame_parameters(message.data).content_size
+        if content_size == zstandard.CONTENTSIZE_UNKNOWN or content_size > max_size:
+            raise ValueError(f"invalid decompressed size: {content_size}")
+        data = zstandard.ZstdDecompressor().decompress(message.data, max_output_size=max_size)
+        inner = Message.from_bytes(data)
+    except (zstandard.ZstdError, AssertionError) as e:
+        raise ValueError(f"invalid compressed message: {e!r}") from e
+    if inner.type == ProtocolMessageTypes.compressed_message.value:
+        raise ValueError("nested compressed message")
+    return inner
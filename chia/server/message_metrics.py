@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import bisect
+import dataclasses
+from typing import Any, Dict, Iterable, List, Tuple
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+
+# the upper bounds (in seconds) of the handler latency histogram buckets. The
+# last bucket is unbounded
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+
+def message_type_name(message_type: int) -> str:
+    try:
+        return ProtocolMessageTypes(message_type).name
+    except ValueError:
+        return f"unknown_{message_type}"
+
+
+@dataclasses.dataclass
+class MessageTypeMetrics:
+    received: int = 0
+    received_bytes: int = 0
+    sent: int = 0
+    sent_bytes: int = 0
+    # messages dropped (or delayed, when sending) by the rate limiters
+    inbound_rate_limited: int = 0
+    outbound_rate_limited: int = 0
+    # messages not sent because the peer's outgoing queue was full
+    outbound_dropped: int = 0
+    # the number of handler calls that took at most LATENCY_BUCKETS[i] seconds
+    # (and more than LATENCY_BUCKETS[i - 1]), the last one counts all slower
+    # calls
+    handler_latency_buckets: List[int] = dataclasses.field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    handler_calls: int = 0
+    handler_time: float = 0.0
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "received_bytes": self.received_bytes,
+            "sent": self.sent,
+            "sent_bytes": self.sent_bytes,
+            "inbound_rate_limited": self.inbound_rate_limited,
+            "outbound_rate_limited": self.outbound_rate_limited,
+            "outbound_dropped": self.outbound_dropped,
+            "handler_calls": self.handler_calls,
+            "handler_time": self.handler_time,
+            "handler_latency_buckets": {
+                str(bound): count for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), self.handler_latency_buckets)
+            },
+        }
+
+
+@dataclasses.dataclass(frozen=True)
+class QueueDepths:
+    """
+    A snapshot of the message queues of a connection.
+    """
+
+    peer_host: str
+    peer_port: int
+    node_id: str
+    # messages read, but not yet dispatched to a handler
+    inbound: int
+    # messages waiting to be written to the peer
+    outbound: int
+    # handlers currently running
+    api_tasks: int
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return dataclasses.asdict(self)
+
+
+class MessageMetrics:
+    """
+    Counters of the protocol messages sent and received by a ChiaServer, per
+    message type. There's one instance per server, shared by all of its
+    connections, so the counts aren't lost when peers disconnect. Updating it
+    is a dict lookup and a few additions, cheap enough to always be on.
+    """
+
+    def __init__(self) -> None:
+        self._types: Dict[int, MessageTypeMetrics] = {}
+
+    def _get(self, message_type: int) -> MessageTypeMetrics:
+        metrics = self._types.get(message_type)
+        if metrics is None:
+            metrics = MessageTypeMetrics()
+            self._types[message_type] = metrics
+        return metrics
+
+    def message_received(self, message_type: int, size: int) -> None:
+        metrics = self._get(message_type)
+        metrics.received += 1
+        metrics.received_bytes += size
+
+    def message_sent(self, message_type: int, size: int) -> None:
+        metrics = self._get(message_type)
+        metrics.sent += 1
+        metrics.sent_bytes += size
+
+    def rate_limited(self, message_type: int, *, inbound: bool) -> None:
+        metrics = self._get(message_type)
+        if inbound:
+            metrics.inbound_rate_limited += 1
+        else:
+            metrics.outbound_rate_limited += 1
+
+    def dropped(self, message_type: int) -> None:
+        self._get(message_type).outbound_dropped += 1
+
+    def handler_done(self, message_type: int, duration: float) -> None:
+        metrics = self._get(message_type)
+        metrics.handler_latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+        metrics.handler_calls += 1
+        metrics.handler_time += duration
+
+    def get(self, message_type: int) -> MessageTypeMetrics:
+        return self._types.get(message_type, MessageTypeMetrics())
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {message_type_name(t): metrics.to_json_dict() for t, metrics in sorted(self._types.items())}
+
+    def to_prometheus(self, service_name: str, queues: Iterable[QueueDepths]) -> str:
+        """
+        The counters, and the given queue depths, in the Prometheus text
+        exposition format.
+        """
+        lines: List[str] = []
+        service = _escape(service_name)
+        types = [(_escape(message_type_name(t)), m) for t, m in sorted(self._types.items())]
+
+        def counter(name: str, help_text: str, values: Iterable[Tuple[str, float]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in values:
+                lines.append(f'{name}{{service="{service}",{labels}}} {value}')
+
+        counter(
+            "chia_messages_received_total",
+            "Protocol messages received.",
+            ((f'type="{name}"', m.received) for name, m in types),
+        )
+        counter(
+            "chia_message_bytes_received_total",
+            "Bytes of protocol messages received.",
+            ((f'type="{name}"', m.received_bytes) for name, m in types),
+        )
+        counter(
+            "chia_messages_sent_total",
+            "Protocol messages sent.",
+            ((f'type="{name}"', m.sent) for name, m in types),
+        )
+        counter(
+            "chia_message_bytes_sent_total",
+            "Bytes of protocol messages sent.",
+            ((f'type="{name}"', m.sent_bytes) for name, m in types),
+        )
+        counter(
+            "chia_messages_rate_limited_total",
+            "Protocol messages rejected by the rate limiter.",
+            (
+                (f'type="{name}",direction="{direction}"', value)
+                for name, m in types
+                for direction, value in (("inbound", m.inbound_rate_limited), ("outbound", m.outbound_rate_limited))
+            ),
+        )
+        counter(
+            "chia_messages_dropped_total",
+            "Protocol messages dropped because the peer's outgoing queue was full.",
+            ((f'type="{name}"', m.outbound_dropped) for name, m in types),
+        )
+
+        name = "chia_message_handler_seconds"
+        lines.append(f"# HELP {name} Time spent handling protocol messages.")
+        lines.append(f"# TYPE {name} histogram")
+        for type_name, m in types:
+            labels = f'service="{service}",type="{type_name}"'
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), m.handler_latency_buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {m.handler_time}")
+            lines.append(f"{name}_count{{{labels}}} {m.handler_calls}")
+
+        name = "chia_peer_queue_depth"
+        lines.append(f"# HELP {name} Messages queued per peer connection.")
+        lines.append(f"# TYPE {name} gauge")
+        for q in queues:
+            labels = f'service="{service}",peer="{_escape(q.peer_host)}:{q.peer_port}",node_id="{q.node_id}"'
+            lines.append(f'{name}{{{labels},queue="inbound"}} {q.inbound}')
+            lines.append(f'{name}{{{labels},queue="outbound"}} {q.outbound}')
+            lines.append(f'{name}{{{labels},queue="api_tasks"}} {q.api_tasks}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -47,6 +47,11 @@ class RateLimiter:
     ) -> bool:
         """
         Returns True if message can be processed successfully, false if a rate limit is passed.
+
+        Messages count by the size of their uncompressed data, whether they're
+        sent compressed or not. Both ends of a connection have to count the
+        same size, or a peer within its outbound limits can exceed the
+        inbound limits of the other end.
         """
 
         current_minute = int(time.time() // self.reset_seconds)
@@ -111,3 +116,21 @@ class RateLimiter:
                 self.message_cumulative_sizes[message_type] = new_cumulative_size
                 self.non_tx_message_counts = new_non_tx_count
                 self.non_tx_cumulative_size = new_non_tx_size
+
+    def max_message_size(
+        self, message_type: int, our_capabilities: List[Capability], peer_capabilities: List[Capability]
+    ) -> int:
+        """
+        Returns the size limit of the data of a single message of this type.
+        """
+        rate_limits = get_rate_limits_to_use(our_capabilities, peer_capabilities)
+        limits: RLSettings = rate_limits["default_settings"]
+        try:
+            protocol_message_type = ProtocolMessageTypes(message_type)
+        except ValueError:
+            return limits.max_size
+        if protocol_message_type in rate_limits["rate_limits_tx"]:
+            limits = rate_limits["rate_limits_tx"][protocol_message_type]
+        elif protocol_message_type in rate_limits["rate_limits_other"]:
+            limits = rate_limits["rate_limits_other"][protocol_message_type]
+        return limits.max_size
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
 import math
+import socket
 import time
 import traceback
 from dataclasses import dataclass, field
-from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 from aiohttp import ClientSession, WSCloseCode, WSMessage, WSMsgType
 from aiohttp.client import ClientWebSocketResponse
@@ -25,6 +27,15 @@ from chia.protocols.protocol_timing import (
 from chia.protocols.shared_protocol import Capability, Error, Handshake, protocol_version
 from chia.server.api_protocol import ApiProtocol
 from chia.server.capabilities import known_active_capabilities
+from chia.server.message_compression import (
+    COMPRESSION_THRESHOLD,
+    MAX_DECOMPRESSED_SIZE,
+    MESSAGE_OVERHEAD,
+    compress_message,
+    compressed_message_type,
+    decompress_message,
+)
+from chia.server.message_metrics import MessageMetrics, QueueDepths
 from chia.server.outbound_message import Message, NodeType, make_msg
 from chia.server.rate_limits import RateLimiter
 from chia.types.blockchain_format.sized_bytes import bytes32
@@ -46,11 +57,71 @@ ConnectionCallback = Callable[["WSChiaConnection"], Awaitable[None]]
 
 error_response_version = Version("0.0.35")
 
+# Announcements the peer can do without, or get from other peers. These are
+# dropped rather than queued once a peer's outgoing queue holds
+# DROP_QUEUE_BYTES. Everything else is always queued (and the order of
+# messages is kept), but a peer whose queue grows beyond MAX_QUEUE_BYTES
+# isn't keeping up, and is disconnected
+DROPPABLE_MESSAGE_TYPES = frozenset(
+    {
+        ProtocolMessageTypes.new_transaction.value,
+        ProtocolMessageTypes.new_unfinished_block.value,
+        ProtocolMessageTypes.new_unfinished_block2.value,
+        ProtocolMessageTypes.new_signage_point_or_end_of_sub_slot.value,
+        ProtocolMessageTypes.new_compact_vdf.value,
+        ProtocolMessageTypes.request_peers.value,
+        ProtocolMessageTypes.respond_peers.value,
+    }
+)
+DROP_QUEUE_BYTES = 8 * 1024 * 1024
+MAX_QUEUE_BYTES = 128 * 1024 * 1024
+
+# the max number of queued messages written back to back, see
+# WSChiaConnection.outbound_handler()
+OUTBOUND_BATCH_SIZE = 100
+
 
 def create_default_last_message_time_dict() -> Dict[ProtocolMessageTypes, float]:
     return {message_type: -math.inf for message_type in ProtocolMessageTypes}
 
 
+@dataclass
+class OutgoingMessage:
+    """
+    A message in the outgoing queue of one or more connections. A broadcast
+    is queued as the same instance to all its peers, so it's serialized (and
+    compressed) only once.
+    """
+
+    message: Message
+    _encoded: Optional[bytes] = field(default=None, repr=False)
+    _compressed: Optional[asyncio.Future[Optional[bytes]]] = field(default=None, repr=False)
+
+    def encoded(self) -> bytes:
+        if self._encoded is None:
+            self._encoded = bytes(self.message)
+        return self._encoded
+
+    async def compressed(self) -> Optional[bytes]:
+        """
+        Returns the serialized compressed_message wrapping this message, or
+        None if compressing doesn't make the message smaller.
+        """
+        if self._compressed is None:
+            self._compressed = asyncio.ensure_future(self._compress())
+        # a connection closing while waiting for it mustn't cancel the
+        # compression for the others
+        return await asyncio.shield(self._compressed)
+
+    async def _compress(self) -> Optional[bytes]:
+        # large messages take a while to compress, this keeps the event loop
+        # responsive (zstd releases the GIL)
+        compressed = await asyncio.get_running_loop().run_in_executor(None, compress_message, self.message)
+        if len(compressed.data) >= len(self.message.data):
+            return None
+        return bytes(compressed)
+
+
 class ConnectionClosedCallbackProtocol(Protocol):
     async def __call__(
         self,
@@ -89,7 +160,12 @@ class WSChiaConnection:
     # Messaging
     received_message_callback: Optional[ConnectionCallback] = field(repr=False)
     incoming_queue: asyncio.Queue[Message] = field(default_factory=asyncio.Queue, repr=False)
-    outgoing_queue: asyncio.Queue[Message] = field(default_factory=asyncio.Queue, repr=False)
+    outgoing_queue: asyncio.Queue[OutgoingMessage] = field(default_factory=asyncio.Queue, repr=False)
+    # the size of the data of the messages in outgoing_queue
+    outgoing_queue_bytes: int = field(default=0, repr=False)
+    # set when the queue grew beyond MAX_QUEUE_BYTES, and the connection is
+    # being closed
+    outgoing_queue_overflow: bool = field(default=False, repr=False)
     api_tasks: Dict[bytes32, asyncio.Task[None]] = field(default_factory=dict, repr=False)
     # Contains task ids of api tasks which should not be canceled
     execute_tasks: Set[bytes32] = field(default_factory=set, repr=False)
@@ -99,6 +175,8 @@ class WSChiaConnection:
     bytes_read: int = 0
     bytes_written: int = 0
     last_message_time: float = 0
+    # per message type counters, shared by all connections of the server
+    message_metrics: MessageMetrics = field(default_factory=MessageMetrics, repr=False)
 
     peer_server_port: Optional[uint16] = None
     inbound_task: Optional[asyncio.Task[None]] = field(default=None, repr=False)
@@ -138,6 +216,7 @@ class WSChiaConnection:
         outbound_rate_limit_percent: int,
         local_capabilities_for_handshake: List[Tuple[uint16, str]],
         session: Optional[ClientSession] = None,
+        message_metrics: Optional[MessageMetrics] = None,
     ) -> WSChiaConnection:
         assert ws._writer is not None
         peername = ws._writer.transport.get_extra_info("peername")
@@ -169,6 +248,7 @@ class WSChiaConnection:
             is_outbound=is_outbound,
             received_message_callback=received_message_callback,
             session=session,
+            message_metrics=message_metrics if message_metrics is not None else MessageMetrics(),
         )
 
     def _get_extra_info(self, name: str) -> Optional[Any]:
@@ -366,12 +446,26 @@ class WSChiaConnection:
                 continue
             task.cancel()
 
+    def _next_outgoing(self, item: OutgoingMessage) -> OutgoingMessage:
+        self.outgoing_queue_bytes -= len(item.message.data)
+        return item
+
     async def outbound_handler(self) -> None:
         try:
             while not self.closed:
-                msg = await self.outgoing_queue.get()
-                if msg is not None:
-                    await self._send_message(msg)
+                batch = [self._next_outgoing(await self.outgoing_queue.get())]
+                while not self.outgoing_queue.empty() and len(batch) < OUTBOUND_BATCH_SIZE:
+                    batch.append(self._next_outgoing(self.outgoing_queue.get_nowait()))
+                if len(batch) == 1:
+                    await self._send_outgoing(batch[0])
+                    continue
+                # each message is a websocket frame of its own, written to the
+                # socket as soon as it's sent. When several are queued up,
+                # holding the socket back until all of them are written lets
+                # the kernel coalesce them into fewer packets
+                with self._corked():
+                    for item in batch:
+                        await self._send_outgoing(item)
         except asyncio.CancelledError:
             pass
         except Exception as e:
@@ -391,6 +485,7 @@ class WSChiaConnection:
 
     async def _api_call(self, full_message: Message, task_id: bytes32) -> None:
         start_time = time.time()
+        handler_start: Optional[float] = None
         message_type = ""
         try:
             if self.received_message_callback is not None:
@@ -456,6 +551,7 @@ class WSChiaConnection:
                     raise
                 return None
 
+            handler_start = time.monotonic()
             response: Optional[Message] = await asyncio.wait_for(wrapped_coroutine(), timeout=timeout)
             self.log.debug(
                 f"Time taken to process {message_type} from {self.peer_node_id} is "
@@ -490,6 +586,8 @@ class WSChiaConnection:
             # TODO: actually throw one of the errors from errors.py and pass this to close
             await self.close(ban_time, WSCloseCode.PROTOCOL_ERROR, Err.UNKNOWN)
         finally:
+            if handler_start is not None:
+                self.message_metrics.handler_done(full_message.type, time.monotonic() - handler_start)
             if task_id in self.api_tasks:
                 self.api_tasks.pop(task_id)
             if task_id in self.execute_tasks:
@@ -522,11 +620,53 @@ class WSChiaConnection:
             self.log.error(f"Exception: {e}")
             self.log.error(f"Exception Stack: {error_stack}")
 
+    @contextlib.contextmanager
+    def _corked(self) -> Iterator[None]:
+        # TCP_CORK is only available on Linux. Elsewhere, the messages are
+        # still written back to back, without waiting for the queue in between
+        sock = self._get_extra_info("socket")
+        if sock is None or not hasattr(socket, "TCP_CORK"):
+            yield
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        except OSError:
+            yield
+            return
+        try:
+            yield
+        finally:
+            with contextlib.suppress(OSError):
+                # this sends whatever is left right away
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+
     async def send_message(self, message: Message) -> bool:
         """Send message sends a message with no tracking / callback."""
+        return self.queue_message(OutgoingMessage(message))
+
+    def queue_message(self, item: OutgoingMessage) -> bool:
+        """
+        Adds the message to the outgoing queue. Returns False if the connection
+        is closed, or the message was dropped because the queue is full.
+        """
         if self.closed:
             return False
-        await self.outgoing_queue.put(message)
+        size = len(item.message.data)
+        if item.message.type in DROPPABLE_MESSAGE_TYPES and self.outgoing_queue_bytes >= DROP_QUEUE_BYTES:
+            self.message_metrics.dropped(item.message.type)
+            return False
+        if self.outgoing_queue_overflow or self.outgoing_queue_bytes + size > MAX_QUEUE_BYTES:
+            self.message_metrics.dropped(item.message.type)
+            if not self.outgoing_queue_overflow:
+                self.outgoing_queue_overflow = True
+                self.log.warning(
+                    f"Closing connection to {self.peer_info.host}, it has {self.outgoing_queue_bytes} bytes of "
+                    f"messages waiting to be sent"
+                )
+                asyncio.create_task(self.close())
+            return False
+        self.outgoing_queue_bytes += size
+        self.outgoing_queue.put_nowait(item)
         return True
 
     async def call_api(
@@ -590,40 +730,51 @@ class WSChiaConnection:
         message = Message(message_no_id.type, request_id, message_no_id.data)
         assert message.id is not None
         self.pending_requests[message.id] = event
-        await self.outgoing_queue.put(message)
+        if not self.queue_message(OutgoingMessage(message)):
+            # the request won't be sent, there's no point waiting for a response
+            self.pending_requests.pop(message.id)
+            return None
 
+        result: Optional[Message] = None
         try:
             await asyncio.wait_for(event.wait(), timeout=timeout)
         except asyncio.TimeoutError:
             self.log.debug(f"Request timeout: {message}")
+        finally:
+            # also when the request is cancelled. Otherwise a late response
+            # would be kept, and returned for a later request with the same id
+            self.pending_requests.pop(message.id)
+            result = self.request_results.pop(message.id, None)
 
-        self.pending_requests.pop(message.id)
-        result: Optional[Message] = None
-        if message.id in self.request_results:
-            result = self.request_results[message.id]
-            assert result is not None
+        if result is not None:
             self.log.debug(
                 f"<- {ProtocolMessageTypes(result.type).name} from: {self.peer_info.host}:{self.peer_info.port}"
             )
-            self.request_results.pop(message.id)
-
         return result
 
-    async def _wait_and_retry(self, msg: Message) -> None:
+    async def _wait_and_retry(self, item: OutgoingMessage) -> None:
         try:
             await asyncio.sleep(1)
-            await self.outgoing_queue.put(msg)
+            self.queue_message(item)
         except Exception as e:
             self.log.debug(f"Exception {e} while waiting to retry sending rate limited message")
             return None
 
     async def _send_message(self, message: Message) -> None:
-        encoded: bytes = bytes(message)
+        await self._send_outgoing(OutgoingMessage(message))
+
+    async def _send_outgoing(self, item: OutgoingMessage) -> None:
+        message = item.message
+        compressed: Optional[bytes] = None
+        if len(message.data) >= COMPRESSION_THRESHOLD and self.compression_enabled():
+            compressed = await item.compressed()
+        encoded = item.encoded() if compressed is None else compressed
         size = len(encoded)
         assert len(encoded) < (2 ** (LENGTH_BYTES * 8))
         if not self.outbound_rate_limiter.process_msg_and_check(
             message, self.local_capabilities, self.peer_capabilities
         ):
+            self.message_metrics.rate_limited(message.type, inbound=False)
             if not is_localhost(self.peer_info.host):
                 message_type = ProtocolMessageTypes(message.type)
                 last_time = self.log_rate_limit_last_time[message_type]
@@ -635,7 +786,7 @@ class WSChiaConnection:
 
                 # TODO: fix this special case. This function has rate limits which are too low.
                 if ProtocolMessageTypes(message.type) != ProtocolMessageTypes.respond_peers:
-                    asyncio.create_task(self._wait_and_retry(message))
+                    asyncio.create_task(self._wait_and_retry(item))
 
                 return None
             else:
@@ -649,6 +800,7 @@ class WSChiaConnection:
             f"-> {ProtocolMessageTypes(message.type).name} to peer {self.peer_info.host} {self.peer_node_id}"
         )
         self.bytes_written += size
+        self.message_metrics.message_sent(message.type, size)
 
     async def _read_one_message(self) -> Optional[Message]:
         message: WSMessage = await self.ws.receive()
@@ -681,8 +833,31 @@ class WSChiaConnection:
         elif message.type == WSMsgType.BINARY:
             data = message.data
             full_message_loaded: Message = Message.from_bytes(data)
+            if full_message_loaded.type == ProtocolMessageTypes.compressed_message.value:
+                try:
+                    if Capability.MESSAGE_COMPRESSION not in self.local_capabilities:
+                        raise ValueError("message compression is disabled")
+                    # a message can't decompress to more than the size limit
+                    # of its type, so a small message of zeros can't make us
+                    # allocate and parse more than an uncompressed one could
+                    inner_type = compressed_message_type(full_message_loaded)
+                    max_size = self.inbound_rate_limiter.max_message_size(
+                        inner_type, self.local_capabilities, self.peer_capabilities
+                    )
+                    full_message_loaded = await asyncio.get_running_loop().run_in_executor(
+                        None,
+                        decompress_message,
+                        full_message_loaded,
+                        min(MAX_DECOMPRESSED_SIZE, max_size + MESSAGE_OVERHEAD),
+                    )
+                except ValueError as e:
+                    self.log.error(f"Invalid compressed message from {self.peer_info.host}: {e}")
+                    asyncio.create_task(self.close(300))
+                    await asyncio.sleep(3)
+                    return None
             self.bytes_read += len(data)
             self.last_message_time = time.time()
+            self.message_metrics.message_received(full_message_loaded.type, len(data))
             try:
                 message_type = ProtocolMessageTypes(full_message_loaded.type).name
             except Exception:
@@ -690,6 +865,7 @@ class WSChiaConnection:
             if not self.inbound_rate_limiter.process_msg_and_check(
                 full_message_loaded, self.local_capabilities, self.peer_capabilities
             ):
+                self.message_metrics.rate_limited(full_message_loaded.type, inbound=True)
                 if self.local_type == NodeType.FULL_NODE and not is_localhost(self.peer_info.host):
                     self.log.error(
                         f"Peer has been rate limited and will be disconnected: {self.peer_info.host}, "
@@ -720,6 +896,16 @@ class WSChiaConnection:
             await asyncio.sleep(3)
         return None
 
+    def queue_depths(self) -> QueueDepths:
+        return QueueDepths(
+            peer_host=self.peer_info.host,
+            peer_port=self.peer_info.port,
+            node_id=self.peer_node_id.hex(),
+            inbound=self.incoming_queue.qsize(),
+            outbound=self.outgoing_queue.qsize(),
+            api_tasks=len(self.api_tasks),
+        )
+
     # Used by the Chia Seeder.
     def get_version(self) -> str:
         return self.version
@@ -750,3 +936,9 @@ class WSChiaConnection:
 
     def has_capability(self, capability: Capability) -> bool:
         return capability in self.peer_capabilities
+
+    def compression_enabled(self) -> bool:
+        return (
+            Capability.MESSAGE_COMPRESSION in self.local_capabilities
+            and Capability.MESSAGE_COMPRESSION in self.peer_capabilities
+        )
@@ -1,20 +1,38 @@
 from __future__ import annotations
 
 import functools
-from typing import List, Optional, Sequence, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from chia_rs import AugSchemeMPL, G1Element, G2Element, GTElement
 
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.util.hash import std_hash
 from chia.util.lru_cache import LRUCache
+from chia.util.shared_pairing_cache import SharedPairingCache
 
 
 class BLSCache:
     cache: LRUCache[bytes32, GTElement]
+    # pairings shared with other processes. Pairings not found in the local
+    # cache are looked up here, and new pairings are added to both
+    shared: Optional[SharedPairingCache]
 
-    def __init__(self, size: int = 50000):
+    def __init__(self, size: int = 50000, shared: Optional[SharedPairingCache] = None):
         self.cache = LRUCache(size)
+        self.shared = shared
+
+    def _get(self, h: bytes32) -> Optional[GTElement]:
+        pairing: Optional[GTElement] = self.cache.get(h)
+        if pairing is None and self.shared is not None:
+            pairing = self.shared.get(h)
+            if pairing is not None:
+                self.cache.put(h, pairing)
+        return pairing
+
+    def _put(self, h: bytes32, pairing: GTElement) -> None:
+        self.cache.put(h, pairing)
+        if self.shared is not None:
+            self.shared.put(h, pairing)
 
     def get_pairings(self, pks: List[G1Element], msgs: Sequence[bytes], force_cache: bool) -> List[GTElement]:
         pairings: List[Optional[GTElement]] = []
@@ -22,7 +40,7 @@ class BLSCache:
         for pk, msg in zip(pks, msgs):
             aug_msg: bytes = bytes(pk) + msg
             h: bytes32 = std_hash(aug_msg)
-            pairing: Optional[GTElement] = self.cache.get(h)
+            pairing: Optional[GTElement] = self._get(h)
             if not force_cache and pairing is None:
                 missing_count += 1
                 # Heuristic to avoid more expensive sig validation with pairing
@@ -41,7 +59,7 @@ class BLSCache:
                 pairing = aug_hash.pair(pks[i])
 
                 h = std_hash(aug_msg)
-                self.cache.put(h, pairing)
+                self._put(h, pairing)
                 ret.append(pairing)
             else:
                 ret.append(pairing)
@@ -65,7 +83,37 @@ class BLSCache:
 
     def update(self, other: List[Tuple[bytes32, bytes]]) -> None:
         for key, value in other:
-            self.cache.put(key, GTElement.from_bytes_unchecked(value))
+            self._put(key, GTElement.from_bytes_unchecked(value))
 
     def items(self) -> List[Tuple[bytes32, bytes]]:
         return [(key, value.to_bytes()) for key, value in self.cache.cache.items()]
+
+    def items_for(self, pks: List[G1Element], msgs: Sequence[bytes]) -> List[Tuple[bytes32, bytes]]:
+        """
+        Returns the cached pairings of the specified public keys and messages
+        """
+        ret: List[Tuple[bytes32, bytes]] = []
+        for pk, msg in zip(pks, msgs):
+            h: bytes32 = std_hash(bytes(pk) + msg)
+            pairing: Optional[GTElement] = self.cache.cache.get(h)
+            if pairing is not None:
+                ret.append((h, pairing.to_bytes()))
+        return ret
+
+
+# the caches of worker processes, attached to the shared pairing cache of the
+# process that started them, by name
+_worker_caches: Dict[str, BLSCache] = {}
+
+
+def worker_bls_cache(shared_name: str) -> BLSCache:
+    """
+    Returns the BLSCache of this (worker) process, backed by the
+    SharedPairingCache with the specified name. It's created the first time
+    it's needed, and kept for the lifetime of the process.
+    """
+    cache = _worker_caches.get(shared_name)
+    if cache is None:
+        cache = BLSCache(10000, SharedPairingCache.attach(shared_name))
+        _worker_caches[shared_name] = cache
+    return cache
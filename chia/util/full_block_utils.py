@@ -1,16 +1,17 @@
 from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass
-from typing import Callable, List, Optional, Tuple
+from typing import Callable, Collection, List, Optional, Tuple, Union
 
 from chia_rs import G1Element, G2Element, serialized_length
 from chiabip158 import PyBIP158
 
 from chia.types.blockchain_format.coin import Coin
-from chia.types.blockchain_format.foliage import TransactionsInfo
+from chia.types.blockchain_format.foliage import Foliage, FoliageTransactionBlock, TransactionsInfo
 from chia.types.blockchain_format.serialized_program import SerializedProgram
 from chia.types.blockchain_format.sized_bytes import bytes32
-from chia.util.ints import uint32
+from chia.util.ints import uint32, uint128
 
 
 def skip_list(buf: memoryview, skip_item: Callable[[memoryview], memoryview]) -> memoryview:
@@ -204,27 +205,6 @@ def skip_transactions_info(buf: memoryview) -> memoryview:
     return skip_list(buf, skip_coin)
 
 
-def generator_from_block(buf: memoryview) -> Optional[SerializedProgram]:
-    buf = skip_list(buf, skip_end_of_sub_slot_bundle)  # finished_sub_slots
-    buf = skip_reward_chain_block(buf)  # reward_chain_block
-    buf = skip_optional(buf, skip_vdf_proof)  # challenge_chain_sp_proof
-    buf = skip_vdf_proof(buf)  # challenge_chain_ip_proof
-    buf = skip_optional(buf, skip_vdf_proof)  # reward_chain_sp_proof
-    buf = skip_vdf_proof(buf)  # reward_chain_ip_proof
-    buf = skip_optional(buf, skip_vdf_proof)  # infused_challenge_chain_ip_proof
-    buf = skip_foliage(buf)  # foliage
-    buf = skip_optional(buf, skip_foliage_transaction_block)  # foliage_transaction_block
-    buf = skip_optional(buf, skip_transactions_info)  # transactions_info
-
-    # this is the transactions_generator optional
-    if buf[0] == 0:
-        return None
-
-    buf = buf[1:]
-    length = serialized_length(buf)
-    return SerializedProgram.from_bytes(bytes(buf[:length]))
-
-
 # this implements the BlockInfo protocol
 @dataclass(frozen=True)
 class GeneratorBlockInfo:
@@ -233,89 +213,225 @@ class GeneratorBlockInfo:
     transactions_generator_ref_list: List[uint32]
 
 
-def block_info_from_block(buf: memoryview) -> GeneratorBlockInfo:
-    buf = skip_list(buf, skip_end_of_sub_slot_bundle)  # finished_sub_slots
-    buf = skip_reward_chain_block(buf)  # reward_chain_block
-    buf = skip_optional(buf, skip_vdf_proof)  # challenge_chain_sp_proof
-    buf = skip_vdf_proof(buf)  # challenge_chain_ip_proof
-    buf = skip_optional(buf, skip_vdf_proof)  # reward_chain_sp_proof
-    buf = skip_vdf_proof(buf)  # reward_chain_ip_proof
-    buf = skip_optional(buf, skip_vdf_proof)  # infused_challenge_chain_ip_proof
-    buf, prev_hash = prev_hash_from_foliage(buf)  # foliage
-    buf = skip_optional(buf, skip_foliage_transaction_block)  # foliage_transaction_block
-    buf = skip_optional(buf, skip_transactions_info)  # transactions_info
-
-    # this is the transactions_generator optional
-    generator = None
-    if buf[0] != 0:
-        buf = buf[1:]
-        length = serialized_length(buf)
-        generator = SerializedProgram.from_bytes(bytes(buf[:length]))
-        buf = buf[length:]
-    else:
-        buf = buf[1:]
-
-    refs_length = uint32.from_bytes(buf[:4])
-    buf = buf[4:]
-
-    refs = []
-    for i in range(refs_length):
-        refs.append(uint32.from_bytes(buf[:4]))
+@dataclass(frozen=True)
+class _FieldOffsets:
+    reward_chain_block: int
+    foliage: int
+    foliage_transaction_block_hash: int
+    foliage_transaction_block: int
+    transactions_info: int
+    transactions_generator: int
+    transactions_generator_ref_list: int
+
+
+class FullBlockView:
+    """
+    A read-only view of a serialized FullBlock. The offsets of the fields are
+    found lazily, the first time one of them is accessed, by skipping over the
+    serialized representation. Fields are only copied out of the underlying
+    buffer when they are requested.
+    """
+
+    def __init__(self, buf: Union[bytes, memoryview]) -> None:
+        self._buf = memoryview(buf)
+        self._offsets: Optional[_FieldOffsets] = None
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._buf)
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    @property
+    def data(self) -> memoryview:
+        return self._buf
+
+    def _fields(self) -> _FieldOffsets:
+        if self._offsets is not None:
+            return self._offsets
+
+        size = len(self._buf)
+        buf = skip_list(self._buf, skip_end_of_sub_slot_bundle)  # finished_sub_slots
+        reward_chain_block = size - len(buf)
+        buf = skip_reward_chain_block(buf)  # reward_chain_block
+        buf = skip_optional(buf, skip_vdf_proof)  # challenge_chain_sp_proof
+        buf = skip_vdf_proof(buf)  # challenge_chain_ip_proof
+        buf = skip_optional(buf, skip_vdf_proof)  # reward_chain_sp_proof
+        buf = skip_vdf_proof(buf)  # reward_chain_ip_proof
+        buf = skip_optional(buf, skip_vdf_proof)  # infused_challenge_chain_ip_proof
+        foliage = size - len(buf)
+        buf = skip_bytes32(buf)  # foliage.prev_block_hash
+        buf = skip_bytes32(buf)  # foliage.reward_block_hash
+        buf = skip_foliage_block_data(buf)  # foliage.foliage_block_data
+        buf = skip_g2_element(buf)  # foliage.foliage_block_data_signature
+        foliage_transaction_block_hash = size - len(buf)
+        buf = skip_optional(buf, skip_bytes32)  # foliage.foliage_transaction_block_hash
+        buf = skip_optional(buf, skip_g2_element)  # foliage.foliage_transaction_block_signature
+        foliage_transaction_block = size - len(buf)
+        buf = skip_optional(buf, skip_foliage_transaction_block)  # foliage_transaction_block
+        transactions_info = size - len(buf)
+        buf = skip_optional(buf, skip_transactions_info)  # transactions_info
+        transactions_generator = size - len(buf)
+        # this is the transactions_generator optional
+        if buf[0] != 0:
+            buf = buf[1:]
+            buf = buf[serialized_length(buf) :]
+        else:
+            buf = buf[1:]
+        transactions_generator_ref_list = size - len(buf)
+
+        self._offsets = _FieldOffsets(
+            reward_chain_block,
+            foliage,
+            foliage_transaction_block_hash,
+            foliage_transaction_block,
+            transactions_info,
+            transactions_generator,
+            transactions_generator_ref_list,
+        )
+        return self._offsets
+
+    @property
+    def weight(self) -> uint128:
+        offset = self._fields().reward_chain_block
+        return uint128.from_bytes(self._buf[offset : offset + 16])
+
+    @property
+    def height(self) -> uint32:
+        offset = self._fields().reward_chain_block + 16  # skip weight
+        return uint32.from_bytes(self._buf[offset : offset + 4])
+
+    @property
+    def header_hash(self) -> bytes32:
+        # the header hash is the hash of the foliage
+        fields = self._fields()
+        return bytes32(hashlib.sha256(self._buf[fields.foliage : fields.foliage_transaction_block]).digest())
+
+    @property
+    def prev_header_hash(self) -> bytes32:
+        offset = self._fields().foliage
+        return bytes32(self._buf[offset : offset + 32])
+
+    @property
+    def foliage(self) -> Foliage:
+        fields = self._fields()
+        return Foliage.from_bytes(bytes(self._buf[fields.foliage : fields.foliage_transaction_block]))
+
+    def is_transaction_block(self) -> bool:
+        # the same definition as FullBlock.is_transaction_block()
+        return self._buf[self._fields().foliage_transaction_block_hash] != 0
+
+    @property
+    def foliage_transaction_block(self) -> Optional[FoliageTransactionBlock]:
+        fields = self._fields()
+        if self._buf[fields.foliage_transaction_block] == 0:
+            return None
+        return FoliageTransactionBlock.from_bytes(
+            bytes(self._buf[fields.foliage_transaction_block + 1 : fields.transactions_info])
+        )
+
+    @property
+    def transactions_info(self) -> Optional[TransactionsInfo]:
+        fields = self._fields()
+        if self._buf[fields.transactions_info] == 0:
+            return None
+        return TransactionsInfo.from_bytes(
+            bytes(self._buf[fields.transactions_info + 1 : fields.transactions_generator])
+        )
+
+    @property
+    def transactions_generator(self) -> Optional[SerializedProgram]:
+        fields = self._fields()
+        if self._buf[fields.transactions_generator] == 0:
+            return None
+        return SerializedProgram.from_bytes(
+            bytes(self._buf[fields.transactions_generator + 1 : fields.transactions_generator_ref_list])
+        )
+
+    @property
+    def transactions_generator_ref_list(self) -> List[uint32]:
+        buf = self._buf[self._fields().transactions_generator_ref_list :]
+        refs_length = uint32.from_bytes(buf[:4])
         buf = buf[4:]
 
-    return GeneratorBlockInfo(prev_hash, generator, refs)
+        refs = []
+        for i in range(refs_length):
+            refs.append(uint32.from_bytes(buf[:4]))
+            buf = buf[4:]
+        return refs
+
+    def block_info(self) -> GeneratorBlockInfo:
+        return GeneratorBlockInfo(
+            self.prev_header_hash, self.transactions_generator, self.transactions_generator_ref_list
+        )
+
+    def without_generator(self) -> bytes:
+        """
+        Returns the serialized block with the transactions generator removed,
+        the same as bytes(block.replace(transactions_generator=None)).
+        """
+        fields = self._fields()
+        return b"".join(
+            [
+                self._buf[: fields.transactions_generator],
+                b"\x00",
+                self._buf[fields.transactions_generator_ref_list :],
+            ]
+        )
+
+    def header_block(
+        self,
+        request_filter: bool = True,
+        tx_addition_coins: Collection[Coin] = (),
+        removal_names: Collection[bytes32] = (),
+    ) -> bytes:
+        """
+        Returns the serialized HeaderBlock for this block. If request_filter is
+        False, the transactions filter and transactions info are left empty.
+        """
+        fields = self._fields()
+
+        # we make it optional even if it's not by default
+        # if request_filter is True it will read extra bytes and populate it properly
+        transactions_info_bytes: Union[bytes, memoryview] = b"\x00"
+        encoded_filter = b"\x00"
+
+        if request_filter:
+            transactions_info = self.transactions_info
+            byte_array_tx: List[bytearray] = []
+            if transactions_info is not None:
+                transactions_info_bytes = self._buf[fields.transactions_info : fields.transactions_generator]
+                if self.is_transaction_block():
+                    addition_coins = list(tx_addition_coins) + list(transactions_info.reward_claims_incorporated)
+                    for coin in addition_coins:
+                        byte_array_tx.append(bytearray(coin.puzzle_hash))
+                    for name in removal_names:
+                        byte_array_tx.append(bytearray(name))
+
+            bip158: PyBIP158 = PyBIP158(byte_array_tx)
+            encoded_filter = bytes(bip158.GetEncoded())
+
+        return b"".join(
+            [
+                # everything up to but not including transactions info
+                self._buf[: fields.transactions_info],
+                # transactions filter, potentially with added / removal coins
+                len(encoded_filter).to_bytes(4, "big"),
+                encoded_filter,
+                transactions_info_bytes,
+            ]
+        )
+
+
+def generator_from_block(buf: Union[bytes, memoryview]) -> Optional[SerializedProgram]:
+    return FullBlockView(buf).transactions_generator
+
+
+def block_info_from_block(buf: Union[bytes, memoryview]) -> GeneratorBlockInfo:
+    return FullBlockView(buf).block_info()
 
 
 def header_block_from_block(
     buf: memoryview, request_filter: bool = True, tx_addition_coins: List[Coin] = [], removal_names: List[bytes32] = []
 ) -> bytes:
-    buf2 = buf[:]
-    buf2 = skip_list(buf2, skip_end_of_sub_slot_bundle)  # finished_sub_slots
-    buf2 = skip_reward_chain_block(buf2)  # reward_chain_block
-    buf2 = skip_optional(buf2, skip_vdf_proof)  # challenge_chain_sp_proof
-    buf2 = skip_vdf_proof(buf2)  # challenge_chain_ip_proof
-    buf2 = skip_optional(buf2, skip_vdf_proof)  # reward_chain_sp_proof
-    buf2 = skip_vdf_proof(buf2)  # reward_chain_ip_proof
-    buf2 = skip_optional(buf2, skip_vdf_proof)  # infused_challenge_chain_ip_proof
-    buf2 = skip_foliage(buf2)  # foliage
-    if buf2[0] == 0:
-        is_transaction_block = False
-    else:
-        is_transaction_block = True
-
-    buf2 = skip_optional(buf2, skip_foliage_transaction_block)  # foliage_transaction_block
-
-    transactions_info: Optional[TransactionsInfo] = None
-    # we make it optional even if it's not by default
-    # if request_filter is True it will read extra bytes and populate it properly
-    transactions_info_optional: bytes = bytes([0])
-    encoded_filter = b"\x00"
-
-    if request_filter:
-        # this is the transactions_info optional
-        if buf2[0] == 0:
-            transactions_info_optional = bytes([0])
-        else:
-            transactions_info_optional = bytes([1])
-            transactions_info, advance = TransactionsInfo.parse_rust(buf2[1:])
-        byte_array_tx: List[bytearray] = []
-        if is_transaction_block and transactions_info:
-            addition_coins = tx_addition_coins + list(transactions_info.reward_claims_incorporated)
-            for coin in addition_coins:
-                byte_array_tx.append(bytearray(coin.puzzle_hash))
-            for name in removal_names:
-                byte_array_tx.append(bytearray(name))
-
-        bip158: PyBIP158 = PyBIP158(byte_array_tx)
-        encoded_filter = bytes(bip158.GetEncoded())
-
-    # Takes everything up to but not including transactions info
-    header_block: bytes = bytes(buf[: (len(buf) - len(buf2))])
-    # Transactions filter, potentially with added / removal coins
-    header_block += (len(encoded_filter)).to_bytes(4, "big") + encoded_filter
-    # Add transactions info
-    header_block += transactions_info_optional
-    if transactions_info is not None:
-        header_block += bytes(transactions_info)
-
-    return header_block
+    return FullBlockView(buf).header_block(request_filter, tx_addition_coins, removal_names)
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import dataclasses
 import json
-from typing import Any
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, List, Optional, Type
 
 from aiohttp import web
+from typing_extensions import get_args
 
+from chia.util.streamable import Streamable, is_type_List, is_type_SpecificOptional, is_type_Tuple, recurse_jsonify
 from chia.wallet.util.wallet_types import WalletType
 
 
@@ -25,12 +29,185 @@ class EnhancedJSONEncoder(json.JSONEncoder):
         return super().default(o)
 
 
+_encoder = EnhancedJSONEncoder(sort_keys=True)
+
+# Appends the JSON of an item to a list of strings, that's joined at the end
+JsonWriteFunctionType = Callable[[Any, List[str]], None]
+
+
+def write_json_none_or(write_inner: JsonWriteFunctionType, item: Any, out: List[str]) -> None:
+    if item is None:
+        out.append("null")
+    else:
+        write_inner(item, out)
+
+
+def write_json_bool(item: Any, out: List[str]) -> None:
+    out.append("true" if item else "false")
+
+
+def write_json_int(item: Any, out: List[str]) -> None:
+    out.append(int.__repr__(item))
+
+
+def write_json_bytes(item: Any, out: List[str]) -> None:
+    out.append(f'"0x{item.hex()}"')
+
+
+def write_json_str(item: Any, out: List[str]) -> None:
+    out.append(encode_basestring_ascii(item))
+
+
+def write_json_list(write_inner: JsonWriteFunctionType, item: Any, out: List[str]) -> None:
+    if len(item) == 0:
+        out.append("[]")
+        return
+    separator = "["
+    for inner in item:
+        out.append(separator)
+        write_inner(inner, out)
+        separator = ", "
+    out.append("]")
+
+
+def write_json_tuple(write_inner_funcs: List[JsonWriteFunctionType], item: Any, out: List[str]) -> None:
+    if len(item) == 0:
+        out.append("[]")
+        return
+    separator = "["
+    for write_inner, inner in zip(write_inner_funcs, item):
+        out.append(separator)
+        write_inner(inner, out)
+        separator = ", "
+    out.append("]")
+
+
+def write_json_streamable(item: Any, out: List[str]) -> None:
+    # dispatch on the type of the item, like recurse_jsonify() does, rather
+    # than the type of the field
+    function_to_write_json_streamable(type(item))(item, out)
+
+
+def write_json_other(item: Any, out: List[str]) -> None:
+    # e.g. Program, G1Element or the streamable types implemented in rust
+    out.append(_encoder.encode(recurse_jsonify(item)))
+
+
+def function_to_write_json_one_item(f_type: Type[Any]) -> JsonWriteFunctionType:
+    """
+    The equivalent of recurse_jsonify() followed by json.dumps() with
+    EnhancedJSONEncoder, for an item of this type.
+    """
+    if is_type_SpecificOptional(f_type):
+        write_inner = function_to_write_json_one_item(get_args(f_type)[0])
+        return lambda item, out: write_json_none_or(write_inner, item, out)
+    elif is_type_List(f_type):
+        write_inner = function_to_write_json_one_item(get_args(f_type)[0])
+        return lambda item, out: write_json_list(write_inner, item, out)
+    elif is_type_Tuple(f_type):
+        write_inner_funcs = [function_to_write_json_one_item(inner_type) for inner_type in get_args(f_type)]
+        return lambda item, out: write_json_tuple(write_inner_funcs, item, out)
+    elif f_type is bool:
+        return write_json_bool
+    elif f_type is str:
+        return write_json_str
+    elif issubclass(f_type, bytes):
+        return write_json_bytes
+    elif issubclass(f_type, int):
+        return write_json_int
+    elif issubclass(f_type, Streamable) and dataclasses.is_dataclass(f_type):
+        return write_json_streamable
+    else:
+        return write_json_other
+
+
+_streamable_json_functions: Dict[Type[Streamable], JsonWriteFunctionType] = {}
+
+
+def function_to_write_json_streamable(cls: Type[Streamable]) -> JsonWriteFunctionType:
+    """
+    The JSON writing function for a streamable class, built from its
+    streamable_fields() the first time it's needed. The fields are written
+    in sorted order, since the RPC responses are encoded with sort_keys.
+    """
+    write = _streamable_json_functions.get(cls)
+    if write is not None:
+        return write
+
+    plan = []
+    separator = "{"
+    for field in sorted(cls.streamable_fields(), key=lambda f: f.name):
+        plan.append(
+            (
+                f"{separator}{encode_basestring_ascii(field.name)}: ",
+                field.name,
+                function_to_write_json_one_item(field.type),
+            )
+        )
+        separator = ", "
+
+    def write_json(item: Any, out: List[str]) -> None:
+        if len(plan) == 0:
+            out.append("{}")
+            return
+        for prefix, name, write_field in plan:
+            out.append(prefix)
+            write_field(getattr(item, name), out)
+        out.append("}")
+
+    _streamable_json_functions[cls] = write_json
+    return write_json
+
+
+def _fast_json_function(o: Any) -> Optional[JsonWriteFunctionType]:
+    """
+    The compiled JSON writing function for o, if it's a streamable object
+    whose to_json_dict() isn't overridden.
+    """
+    cls = type(o)
+    if isinstance(o, Streamable) and cls.to_json_dict is Streamable.to_json_dict:
+        return function_to_write_json_streamable(cls)
+    return None
+
+
+def _write_json_value(o: Any, out: List[str], depth: int) -> None:
+    write = _fast_json_function(o)
+    if write is not None:
+        write(o, out)
+    elif depth > 0 and isinstance(o, dict) and len(o) > 0 and all(type(key) is str for key in o):
+        separator = "{"
+        for key in sorted(o):
+            out.append(f"{separator}{encode_basestring_ascii(key)}: ")
+            _write_json_value(o[key], out, depth - 1)
+            separator = ", "
+        out.append("}")
+    elif depth > 0 and isinstance(o, (list, tuple)) and any(_fast_json_function(item) is not None for item in o):
+        separator = "["
+        for item in o:
+            out.append(separator)
+            _write_json_value(item, out, depth - 1)
+            separator = ", "
+        out.append("]")
+    else:
+        # the standard library's encoder is implemented in C, it's the
+        # fastest option for everything but streamable objects
+        out.append(_encoder.encode(o))
+
+
 def dict_to_json_str(o: Any) -> str:
     """
     Converts a python object into json.
+
+    The output is the same as json.dumps(o, cls=EnhancedJSONEncoder,
+    sort_keys=True), but streamable objects in the response (or in its lists)
+    are written directly, without building their to_json_dict() first.
     """
-    json_str = json.dumps(o, cls=EnhancedJSONEncoder, sort_keys=True)
-    return json_str
+    out: List[str] = []
+    # the streamable objects in RPC responses are typically values of the
+    # response dict, or items of lists in it. Deeper than that, it's cheaper to
+    # let the standard library encoder handle it
+    _write_json_value(o, out, 2)
+    return "".join(out)
 
 
 def obj_to_response(o: Any) -> web.Response:
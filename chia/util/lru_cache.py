@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from collections import OrderedDict
-from typing import Generic, Optional, TypeVar
+from typing import Generic, Optional, Tuple, TypeVar
 
 K = TypeVar("K")
 V = TypeVar("V")
@@ -27,3 +27,39 @@ class LRUCache(Generic[K, V]):
 
     def remove(self, key: K) -> None:
         self.cache.pop(key)
+
+
+class SizedLRUCache(Generic[K, V]):
+    """
+    An LRU cache limited by the total size of its values rather than their
+    number, for values whose size varies a lot. The size of a value is passed
+    to put(). The least recently used values are evicted until the rest fit
+    in max_size, a value larger than max_size is not cached at all.
+    """
+
+    def __init__(self, max_size: int):
+        self.cache: OrderedDict[K, Tuple[V, int]] = OrderedDict()
+        self.max_size = max_size
+        self.size = 0
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        self.cache.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: K, value: V, size: int) -> None:
+        if key in self.cache:
+            self.remove(key)
+        if size > self.max_size:
+            return
+        self.cache[key] = (value, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, oldest_size) = self.cache.popitem(last=False)
+            self.size -= oldest_size
+
+    def remove(self, key: K) -> None:
+        _, size = self.cache.pop(key)
+        self.size -= size
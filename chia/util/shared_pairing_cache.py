@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import dataclasses
+import struct
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Optional
+
+from chia_rs import GTElement
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.hash import std_hash
+
+# header: magic, number of slots, hits, misses, inserts
+_HEADER = struct.Struct("<8sQQQQ")
+_HEADER_SIZE = 64
+_MAGIC = b"pairing1"
+_HITS_OFFSET = 16
+_MISSES_OFFSET = 24
+_INSERTS_OFFSET = 32
+
+# slot: checksum, key, pairing
+_CHECKSUM_SIZE = 8
+_KEY_SIZE = 32
+_SLOT_SIZE = _CHECKSUM_SIZE + _KEY_SIZE + GTElement.SIZE
+
+# the number of consecutive slots a key may be stored in
+PROBE_LENGTH = 4
+
+
+def _checksum(key: bytes, value: bytes) -> bytes:
+    return std_hash(key + value)[:_CHECKSUM_SIZE]
+
+
+@dataclasses.dataclass(frozen=True)
+class SharedPairingCacheStats:
+    num_slots: int
+    hits: int
+    misses: int
+    inserts: int
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "num_slots": self.num_slots,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "inserts": self.inserts,
+        }
+
+
+class SharedPairingCache:
+    """
+    A fixed size hash table of BLS pairings, in shared memory. It's keyed by
+    the std_hash() of the augmented message (public key + message), just like
+    BLSCache. The node creates it, and its worker processes attach to it by
+    name, so pairings computed by any process can be used by all of them.
+
+    The table is open-addressed, a key is stored in one of the PROBE_LENGTH
+    slots following its home slot. When they are all taken, the new pairing
+    replaces one of them. There is no locking across processes. Instead, every
+    slot has a checksum of its key and pairing, and a slot that's being
+    written to concurrently fails the checksum and is treated as a miss.
+
+    The hit, miss and insert counters are shared too. Increments may race, so
+    they are approximate.
+    """
+
+    def __init__(self, shm: SharedMemory, num_slots: int) -> None:
+        self._shm = shm
+        self._buf = shm.buf
+        self.num_slots = num_slots
+
+    @classmethod
+    def create(cls, num_slots: int) -> SharedPairingCache:
+        assert num_slots > 0
+        shm = SharedMemory(create=True, size=_HEADER_SIZE + num_slots * _SLOT_SIZE)
+        # the memory is zero-initialized, which means every slot is empty
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, num_slots, 0, 0, 0)
+        return cls(shm, num_slots)
+
+    @classmethod
+    def attach(cls, name: str) -> SharedPairingCache:
+        shm = SharedMemory(name=name)
+        magic, num_slots, _, _, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != _MAGIC:
+            shm.close()
+            raise ValueError(f"shared memory {name} is not a pairing cache")
+        return cls(shm, num_slots)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def close(self) -> None:
+        self._buf.release()
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """
+        Frees the shared memory once all processes have closed it. This must
+        only be called by the process that created it.
+        """
+        self._shm.unlink()
+
+    def _slot_offset(self, key: bytes, probe: int) -> int:
+        home = int.from_bytes(key[:8], "little") % self.num_slots
+        return _HEADER_SIZE + ((home + probe) % self.num_slots) * _SLOT_SIZE
+
+    def _read_slot(self, offset: int) -> Optional[bytes]:
+        """
+        Returns the key and pairing stored in the slot, or None if it's empty
+        (or being written to).
+        """
+        slot = bytes(self._buf[offset : offset + _SLOT_SIZE])
+        key_and_value = slot[_CHECKSUM_SIZE:]
+        if slot[:_CHECKSUM_SIZE] != _checksum(key_and_value[:_KEY_SIZE], key_and_value[_KEY_SIZE:]):
+            return None
+        return key_and_value
+
+    def _count(self, offset: int) -> None:
+        value = int.from_bytes(self._buf[offset : offset + 8], "little")
+        self._buf[offset : offset + 8] = (value + 1).to_bytes(8, "little")
+
+    def get(self, key: bytes32) -> Optional[GTElement]:
+        for probe in range(PROBE_LENGTH):
+            offset = self._slot_offset(key, probe)
+            # cheap check, before copying and validating the whole slot
+            if bytes(self._buf[offset + _CHECKSUM_SIZE : offset + _CHECKSUM_SIZE + _KEY_SIZE]) != key:
+                continue
+            key_and_value = self._read_slot(offset)
+            if key_and_value is None or key_and_value[:_KEY_SIZE] != key:
+                continue
+            self._count(_HITS_OFFSET)
+            return GTElement.from_bytes_unchecked(key_and_value[_KEY_SIZE:])
+        self._count(_MISSES_OFFSET)
+        return None
+
+    def put(self, key: bytes32, pairing: GTElement) -> None:
+        target: Optional[int] = None
+        for probe in range(PROBE_LENGTH):
+            offset = self._slot_offset(key, probe)
+            key_and_value = self._read_slot(offset)
+            if key_and_value is None:
+                if target is None:
+                    target = offset
+            elif key_and_value[:_KEY_SIZE] == key:
+                return
+        if target is None:
+            # all slots are taken, replace one of them
+            target = self._slot_offset(key, key[8] % PROBE_LENGTH)
+
+        value = pairing.to_bytes()
+        # invalidate the slot while it's being written
+        self._buf[target : target + _CHECKSUM_SIZE] = bytes(_CHECKSUM_SIZE)
+        self._buf[target + _CHECKSUM_SIZE : target + _SLOT_SIZE] = key + value
+        self._buf[target : target + _CHECKSUM_SIZE] = _checksum(key, value)
+        self._count(_INSERTS_OFFSET)
+
+    def stats(self) -> SharedPairingCacheStats:
+        _, num_slots, hits, misses, inserts = _HEADER.unpack_from(self._buf, 0)
+        return SharedPairingCacheStats(num_slots, hits, misses, inserts)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import struct
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.ints import uint32
+
+log = logging.getLogger(__name__)
+
+# A snapshot file is a fixed size header followed by the serialized items,
+# back to back. The header is:
+# magic, version, peak hash, peak height, number of items, sha256 of the items
+SNAPSHOT_HEADER = struct.Struct("!8sI32sII32s")
+
+
+@dataclass(frozen=True)
+class SnapshotHeader:
+    # the peak of the blockchain when the snapshot was taken
+    peak_hash: bytes32
+    peak_height: uint32
+    count: int
+
+
+def serialize_snapshot(
+    magic: bytes, version: int, peak_hash: bytes32, peak_height: uint32, items: Iterable[bytes]
+) -> bytes:
+    count = 0
+    body = bytearray()
+    for item in items:
+        body += item
+        count += 1
+    header = SNAPSHOT_HEADER.pack(magic, version, peak_hash, peak_height, count, hashlib.sha256(body).digest())
+    return header + bytes(body)
+
+
+def parse_snapshot_header(buf: memoryview, magic: bytes, version: int, name: str) -> Optional[SnapshotHeader]:
+    """
+    Checks the magic, version and checksum of the snapshot in buf. Returns
+    None if any of them don't match. The items start at SNAPSHOT_HEADER.size,
+    it's up to the caller to parse them and make sure there are no trailing
+    bytes.
+    """
+    if len(buf) < SNAPSHOT_HEADER.size:
+        log.info(f"{name} snapshot is truncated")
+        return None
+    file_magic, file_version, peak_hash, peak_height, count, checksum = SNAPSHOT_HEADER.unpack_from(buf)
+    if file_magic != magic or file_version != version:
+        log.info(f"unsupported {name} snapshot version: {file_version}")
+        return None
+    with buf[SNAPSHOT_HEADER.size :] as body:
+        if hashlib.sha256(body).digest() != checksum:
+            log.info(f"{name} snapshot checksum mismatch")
+            return None
+    return SnapshotHeader(bytes32(peak_hash), uint32(peak_height), count)
@@ -412,7 +412,9 @@ class WalletNode:
             fingerprint = self.get_last_used_fingerprint()
         multiprocessing_start_method = process_config_start_method(config=self.config, log=self.log)
         multiprocessing_context = multiprocessing.get_context(method=multiprocessing_start_method)
-        self._weight_proof_handler = WalletWeightProofHandler(self.constants, multiprocessing_context)
+        self._weight_proof_handler = WalletWeightProofHandler(
+            self.constants, multiprocessing_context, self.config.get("reserved_cores", 0)
+        )
         self.synced_peers = set()
         private_key = await self.get_key(fingerprint, private=True)
         if private_key is None:
@@ -10,10 +10,15 @@ from typing import IO, List, Optional
 
 from chia.consensus.block_record import BlockRecord
 from chia.consensus.constants import ConsensusConstants
-from chia.full_node.weight_proof import _validate_sub_epoch_summaries, validate_weight_proof_inner
+from chia.full_node.weight_proof import (
+    _validate_sub_epoch_summaries,
+    create_weight_proof_executor,
+    validate_weight_proof_inner,
+)
 from chia.types.weight_proof import WeightProof
 from chia.util.ints import uint32
-from chia.util.setproctitle import getproctitle, setproctitle
+from chia.util.misc import available_logical_cores
+from chia.util.setproctitle import getproctitle
 
 log = logging.getLogger(__name__)
 
@@ -27,15 +32,13 @@ class WalletWeightProofHandler:
         self,
         constants: ConsensusConstants,
         multiprocessing_context: BaseContext,
+        reserved_cores: int = 0,
     ):
         self._constants = constants
-        self._num_processes = 4
+        self._num_processes = max(available_logical_cores() - reserved_cores, 1)
         self._executor_shutdown_tempfile: IO[bytes] = _create_shutdown_file()
-        self._executor: ProcessPoolExecutor = ProcessPoolExecutor(
-            self._num_processes,
-            mp_context=multiprocessing_context,
-            initializer=setproctitle,
-            initargs=(f"{getproctitle()}_worker",),
+        self._executor: ProcessPoolExecutor = create_weight_proof_executor(
+            constants, self._num_processes, multiprocessing_context, f"{getproctitle()}_worker"
         )
 
     def cancel_weight_proof_tasks(self) -> None:
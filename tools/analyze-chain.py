@@ -10,10 +10,10 @@ from time import time
 from typing import Callable, List, Optional, Tuple, Union
 
 import click
-import zstd
 from chia_rs import MEMPOOL_MODE, AugSchemeMPL, G1Element, SpendBundleConditions, run_block_generator
 
 from chia.consensus.default_constants import DEFAULT_CONSTANTS
+from chia.full_node.block_compression import BlockCompressor
 from chia.types.block_protocol import BlockInfo
 from chia.types.blockchain_format.serialized_program import SerializedProgram
 from chia.types.blockchain_format.sized_bytes import bytes32
@@ -68,6 +68,14 @@ def main(file: Path, mempool_mode: bool, start: int, end: Optional[int], call: O
 
     c = sqlite3.connect(file)
 
+    compressor = BlockCompressor()
+    try:
+        for dict_id, dict_data in c.execute("SELECT id, dict FROM block_compression_dicts"):
+            compressor.add_dictionary(dict_id, dict_data)
+    except sqlite3.OperationalError:
+        # this database has never had its blocks compressed with a dictionary
+        pass
+
     end_limit_sql = "" if end is None else f"and height <= {end} "
 
     rows = c.execute(
@@ -80,9 +88,9 @@ def main(file: Path, mempool_mode: bool, start: int, end: Optional[int], call: O
         height: int = r[1]
         block: Union[BlockInfo, FullBlock]
         if verify_signatures:
-            block = FullBlock.from_bytes_unchecked(zstd.decompress(r[2]))
+            block = FullBlock.from_bytes_unchecked(compressor.decompress(r[2]))
         else:
-            block = block_info_from_block(zstd.decompress(r[2]))
+            block = block_info_from_block(compressor.decompress(r[2]))
 
         if block.transactions_generator is None:
             sys.stderr.write(f" no-generator. block {height}\r")
@@ -92,7 +100,7 @@ def main(file: Path, mempool_mode: bool, start: int, end: Optional[int], call: O
         generator_blobs = []
         for h in block.transactions_generator_ref_list:
             ref = c.execute("SELECT block FROM full_blocks WHERE height=? and in_main_chain=1", (h,))
-            generator = generator_from_block(zstd.decompress(ref.fetchone()[0]))
+            generator = generator_from_block(compressor.decompress(ref.fetchone()[0]))
             assert generator is not None
             generator_blobs.append(bytes(generator))
             ref.close()
@@ -9,9 +9,8 @@ from typing import Optional
 
 import aiosqlite
 import click
-import zstd
 
-from chia._tests.util.full_sync import FakePeer, FakeServer, run_sync_test
+from chia._tests.util.full_sync import FakePeer, FakeServer, load_block_compressor, run_sync_test
 from chia.cmds.init_funcs import chia_init
 from chia.consensus.constants import replace_str_to_bytes
 from chia.consensus.default_constants import DEFAULT_CONSTANTS
@@ -60,6 +59,13 @@ def main() -> None:
     default=None,
     help="start test from this specified checkpoint state",
 )
+@click.option(
+    "--unspent-coin-cache-size",
+    type=int,
+    required=False,
+    default=0,
+    help="the number of coin changes to keep in memory before writing them to the DB. 0 disables it",
+)
 def run(
     file: Path,
     db_version: int,
@@ -70,6 +76,7 @@ def run(
     db_sync: str,
     node_profiler: bool,
     start_at_checkpoint: Optional[str],
+    unspent_coin_cache_size: int,
 ) -> None:
     """
     The FILE parameter should point to an existing blockchain database file (in v2 format)
@@ -86,6 +93,7 @@ def run(
             db_sync,
             node_profiler,
             start_at_checkpoint,
+            unspent_coin_cache_size,
         )
     )
 
@@ -140,6 +148,7 @@ async def run_sync_checkpoint(
         height = 0
         async with aiosqlite.connect(file) as in_db:
             await in_db.execute("pragma query_only")
+            compressor = await load_block_compressor(in_db)
             rows = await in_db.execute(
                 "SELECT block FROM full_blocks WHERE in_main_chain=1 AND height < ? ORDER BY height", (max_height,)
             )
@@ -147,7 +156,7 @@ async def run_sync_checkpoint(
             block_batch = []
             peer_info = peer.get_peer_logging()
             async for r in rows:
-                block = FullBlock.from_bytes_unchecked(zstd.decompress(r[0]))
+                block = FullBlock.from_bytes_unchecked(compressor.decompress(r[0]))
                 block_batch.append(block)
 
                 if len(block_batch) < 32: